@@ -81,6 +81,35 @@ app.conf.beat_schedule = {
         'options': {'expires': 3600}
     },
     
+    # 每6小時重算問題分類原型（各 worker 記憶體快取過期後載入）
+    'refresh-question-prototypes-periodic': {
+        'task': 'library.rvt_analytics.tasks.refresh_question_prototypes',
+        'schedule': crontab(minute=50, hour='*/6'),  # 每6小時的50分執行
+        'options': {'expires': 3600}
+    },
+    
+    # 每6小時再平衡漂移的聊天聚類（增量聚類，避免完整重建）
+    'rebalance-chat-clusters-periodic': {
+        'task': 'library.rvt_analytics.tasks.rebalance_chat_clusters',
+        'schedule': crontab(minute=45, hour='*/6'),  # 每6小時的45分執行
+        'options': {'expires': 3600}
+    },
+    
+    # 每10分鐘更新對話分析每日彙總（只重算有變動的日期）
+    'refresh-analytics-rollups': {
+        'task': 'library.rvt_analytics.tasks.refresh_analytics_rollups',
+        'schedule': crontab(minute='*/10'),
+        'options': {'expires': 540}
+    },
+    
+    # 每天重算最近 7 天的彙總（涵蓋刪除對話等變動）
+    'rebuild-analytics-rollups-daily': {
+        'task': 'library.rvt_analytics.tasks.refresh_analytics_rollups',
+        'schedule': crontab(hour=4, minute=15),  # 每天凌晨 4:15
+        'kwargs': {'full_days': 7},
+        'options': {'expires': 3600}
+    },
+    
     # 每天清理過期快取
     'cleanup-cache-daily': {
         'task': 'library.rvt_analytics.tasks.cleanup_expired_cache',
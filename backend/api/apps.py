@@ -14,4 +14,18 @@ class ApiConfig(AppConfig):
         設置向量自動生成/刪除機制
         """
         # 導入 signals（觸發 @receiver 裝飾器註冊）
-        import api.signals  # noqa: F401
\ No newline at end of file
+        import api.signals  # noqa: F401
+        
+        # 對話 / 使用記錄延後寫入：行程結束時寫完佇列
+        try:
+            from library.conversation_management.write_behind import install_shutdown_hooks
+            install_shutdown_hooks()
+        except ImportError:
+            pass
+        
+        # 預先建立共用搜尋服務（Dify 外部知識庫 API 不再每個請求重新建立）
+        try:
+            from library.common.knowledge_base.service_registry import warm_up_search_services
+            warm_up_search_services()
+        except ImportError:
+            pass
\ No newline at end of file
@@ -11,12 +11,17 @@ from django.db import connection
 from django.utils import timezone
 import logging
 
+from library.common.vector_bulk_reader import VectorBulkReader
+
 logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
     help = '清理孤立的向量嵌入資料（主表已刪除但向量仍存在）'
     
+    # 每批刪除的向量數量
+    DELETE_BATCH_SIZE = 1000
+    
     def add_arguments(self, parser):
         parser.add_argument(
             '--source-table',
@@ -142,21 +147,36 @@ class Command(BaseCommand):
             return 0
     
     def _cleanup_orphaned_vectors(self, vector_table, source_table):
-        """清理孤立向量"""
+        """清理孤立向量（串流讀取孤立 id，分批刪除，避免長時間鎖表）"""
         try:
             main_table = self._get_main_table_name(source_table)
+            reader = VectorBulkReader(
+                vector_table,
+                where=f"""
+                    source_table = %s
+                    AND NOT EXISTS (
+                        SELECT 1 FROM {main_table} m 
+                        WHERE m.id = {vector_table}.source_id
+                    )
+                """,
+                params=[source_table],
+                chunk_size=self.DELETE_BATCH_SIZE
+            )
             
-            with connection.cursor() as cursor:
-                # 刪除孤立的向量記錄
-                cursor.execute(f"""
-                    DELETE FROM {vector_table}
-                    WHERE source_table = %s
-                    AND source_id NOT IN (
-                        SELECT id FROM {main_table}
+            # 先收集 id 再刪除，避免在伺服器端游標讀取期間修改同一張表
+            orphaned_ids = [vector_id for chunk in reader.iter_ids() for vector_id in chunk]
+            
+            deleted = 0
+            for start in range(0, len(orphaned_ids), self.DELETE_BATCH_SIZE):
+                batch = orphaned_ids[start:start + self.DELETE_BATCH_SIZE]
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"DELETE FROM {vector_table} WHERE id = ANY(%s)",
+                        [batch]
                     )
-                """, [source_table])
-                
-                return cursor.rowcount
+                    deleted += cursor.rowcount
+            
+            return deleted
                 
         except Exception as e:
             logger.error(f"清理孤立向量失敗: {str(e)}")
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""
+Dify Benchmark 離線壓測管理指令
+
+以本機 Dify stub（library/dify_integration/stub_server.py）重播錄製的回答，
+注入延遲與錯誤，量測 Benchmark 流程的吞吐量、延遲與重試行為。
+
+用法：
+    # 離線壓測（不需要 Dify / 資料庫）
+    python manage.py dify_load_test --fixtures tests/test_dify_integration/fixtures/dify_responses.json \\
+        --repeat 20 --latency-ms 800 --jitter-ms 400 --error-rate 0.05 --rate 50
+
+    # 只啟動 stub 伺服器（供 Web / 手動測試指向 http://127.0.0.1:8765）
+    python manage.py dify_load_test --fixtures ... --serve --port 8765
+
+    # 端到端：以 stub 取代 Dify 執行 DifyBatchTester（需要資料庫中的版本與測試案例）
+    python manage.py dify_load_test --fixtures ... --version-ids 1 2 3
+
+    # 由真實 Dify 錄製 fixture 中各問題的回答
+    python manage.py dify_load_test --fixtures ... --record
+"""
+
+import json
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = '以本機 Dify stub 重播錄製回答，離線壓測 Dify Benchmark 流程'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fixtures', type=str, required=True, help='錄製回應 JSON 檔路徑')
+        parser.add_argument('--repeat', type=int, default=10, help='每個 fixture 重複次數')
+        parser.add_argument('--latency-ms', type=float, default=0, help='每個請求的基礎延遲（毫秒）')
+        parser.add_argument('--jitter-ms', type=float, default=0, help='延遲抖動（毫秒）')
+        parser.add_argument('--error-rate', type=float, default=0, help='回傳 429 / 5xx 的機率（0-1）')
+        parser.add_argument('--timeout-rate', type=float, default=0, help='逾時的機率（0-1）')
+        parser.add_argument('--timeout', type=int, default=75, help='DifyAPIClient 請求逾時（秒）')
+        parser.add_argument('--rate', type=float, default=50, help='全域每秒請求數上限')
+        parser.add_argument('--workers', type=int, default=20, help='每個 app key 的最大並行數')
+        parser.add_argument('--seed', type=int, default=None, help='注入亂數種子（可重現）')
+        parser.add_argument('--default-answer', type=str, default=None,
+                            help='未錄製問題的預設回答（未設定時回傳 404）')
+        parser.add_argument('--serve', action='store_true', help='只啟動 stub 伺服器')
+        parser.add_argument('--host', type=str, default='127.0.0.1', help='--serve 綁定位址')
+        parser.add_argument('--port', type=int, default=8765, help='--serve 綁定埠號')
+        parser.add_argument('--version-ids', type=int, nargs='+', help='端到端執行 DifyBatchTester 的版本 ID')
+        parser.add_argument('--record', action='store_true', help='由真實 Dify 錄製 fixture 的回答')
+        parser.add_argument('--json', action='store_true', help='以 JSON 輸出報告')
+
+    def handle(self, *args, **options):
+        from library.dify_integration.stub_server import DifyFixtureStore, DifyStubServer, FaultConfig
+
+        try:
+            store = DifyFixtureStore.load(options['fixtures'], default_answer=options['default_answer'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f"無法載入 fixture: {e}")
+
+        if options['record']:
+            return self._record(store, options['fixtures'])
+
+        try:
+            fault = FaultConfig(
+                latency_ms=options['latency_ms'],
+                jitter_ms=options['jitter_ms'],
+                error_rate=options['error_rate'],
+                timeout_rate=options['timeout_rate'],
+                hang_seconds=options['timeout'] + 5,
+                seed=options['seed']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['serve']:
+            server = DifyStubServer(store, fault=fault, host=options['host'], port=options['port'])
+            self.stdout.write(self.style.SUCCESS(
+                f"🚀 Dify stub: {server.base_url} (API Key: {server.api_key}, fixtures={len(store)})，Ctrl+C 結束"
+            ))
+            server.serve_forever()
+            return
+
+        if options['version_ids']:
+            report = self._run_batch(store, fault, options)
+        else:
+            from library.dify_benchmark.load_test import run_offline_load_test
+
+            self.stdout.write(f"🔥 離線壓測: fixtures={len(store)}, repeat={options['repeat']}")
+            report = run_offline_load_test(
+                store,
+                repeat=options['repeat'],
+                fault=fault,
+                rate_per_second=options['rate'],
+                per_key_limit=options['workers'],
+                timeout=options['timeout']
+            )
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+        else:
+            self._print_report(report)
+
+    def _run_batch(self, store, fault, options):
+        """端到端：以 stub 取代 Dify 執行 DifyBatchTester"""
+        from library.dify_benchmark import DifyBatchTester
+        from library.dify_benchmark.load_test import redirect_protocol_guide_to
+        from library.dify_integration.stub_server import DifyStubServer
+
+        with DifyStubServer(store, fault=fault) as server, redirect_protocol_guide_to(server):
+            self.stdout.write(f"🔥 端到端壓測: versions={options['version_ids']}, stub={server.base_url}")
+            tester = DifyBatchTester(
+                use_parallel=True,
+                max_workers=options['workers'],
+                rate_per_second=options['rate']
+            )
+            result = tester.run_batch_test(
+                version_ids=options['version_ids'],
+                batch_name="Dify stub 壓測"
+            )
+            result['stub'] = server.stats.as_dict()
+        return result
+
+    def _record(self, store, path):
+        """以真實 Dify 回答覆寫 fixture"""
+        from library.dify_benchmark.dify_api_client import DifyAPIClient
+
+        client = DifyAPIClient()
+        recorded = 0
+        for fixture in store.fixtures:
+            response = client.send_question(question=fixture['query'], user_id='fixture_recorder')
+            if response.get('success'):
+                store.record(fixture['query'], response)
+                recorded += 1
+            else:
+                self.stdout.write(self.style.WARNING(f"⚠️ 錄製失敗: {fixture['query']} - {response.get('error')}"))
+        store.save(path)
+        self.stdout.write(self.style.SUCCESS(f"✅ 已錄製 {recorded}/{len(store)} 筆回答: {path}"))
+
+    def _print_report(self, report):
+        if 'throughput' not in report:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2, default=str))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\n📊 完成 {report['total_cases']} 個案例，耗時 {report['elapsed_seconds']}s，"
+            f"吞吐量 {report['throughput']}/s"
+        ))
+        self.stdout.write(
+            f"   成功 {report['success']} / 失敗 {report['failed']}，通過率 {report['pass_rate']}%"
+        )
+        self.stdout.write(f"   排程器: {report['scheduler']}")
+        self.stdout.write(f"   Stub: {report['stub']}")
+        self.stdout.write("\n⏱️ 延遲（秒）:")
+        for name, stats in report['latency'].items():
+            self.stdout.write(
+                f"   {name:<12} p50={stats['p50']:.3f}  p95={stats['p95']:.3f}  "
+                f"max={stats['max']:.3f}  (n={stats['count']})"
+            )
@@ -9,11 +9,14 @@ Django Management Command - 聊天消息向量化遷移
 """
 
 import logging
-from typing import Dict, List
+import time
+from typing import Dict, Iterable, Iterator, List
 from django.core.management.base import BaseCommand, CommandError
 from django.db import connection, transaction
 from django.utils import timezone
 
+from library.common.vector_bulk_reader import iter_query_chunks
+
 # 導入模型
 try:
     from api.models import ChatMessage, ConversationSession
@@ -26,6 +29,7 @@ except ImportError:
 try:
     from library.rvt_analytics.chat_vector_service import get_chat_vector_service
     from library.rvt_analytics.chat_clustering_service import get_clustering_service
+    from library.rvt_analytics.chat_vector_pipeline import ChatVectorPipeline
     VECTOR_SERVICES_AVAILABLE = True
 except ImportError:
     VECTOR_SERVICES_AVAILABLE = False
@@ -116,27 +120,28 @@ class Command(BaseCommand):
             # 初始化服務
             vector_service = get_chat_vector_service()
             
-            # 獲取待處理的聊天消息
-            messages = self._get_chat_messages(user_role, min_length, force_rebuild)
+            # 統計待處理的聊天消息（消息內容以伺服器端游標串流讀取）
+            total_messages = self._count_chat_messages(user_role, min_length, force_rebuild)
             
-            if not messages:
+            if not total_messages:
                 self.stdout.write(
                     self.style.WARNING('⚠️ 沒有找到需要處理的聊天消息')
                 )
                 return
             
-            total_messages = len(messages)
             self.stdout.write(f"📊 找到 {total_messages} 條待處理消息")
             
             if dry_run:
                 self.stdout.write(
                     self.style.WARNING('🔍 模擬執行模式，不會實際處理數據')
                 )
-                self._show_processing_plan(messages, batch_size)
+                self._show_processing_plan(user_role, min_length, force_rebuild,
+                                           total_messages, batch_size)
                 return
             
             # 批量處理向量化
-            results = self._process_vectorization(messages, vector_service, batch_size)
+            message_chunks = self._iter_chat_messages(user_role, min_length, force_rebuild, batch_size)
+            results = self._process_vectorization(message_chunks, total_messages, vector_service)
             
             # 顯示處理結果
             self._show_vectorization_results(results)
@@ -194,59 +199,66 @@ class Command(BaseCommand):
         
         return True
     
-    def _get_chat_messages(self, user_role: str, min_length: int, 
-                          force_rebuild: bool) -> List[Dict]:
-        """獲取待處理的聊天消息"""
-        try:
-            # 構建查詢條件
-            role_filter = ""
-            if user_role != 'all':
-                role_filter = f"AND cm.role = '{user_role}'"
-            
-            # 如果不強制重建，排除已處理的消息
-            exclude_processed = ""
-            if not force_rebuild:
-                exclude_processed = """
-                AND NOT EXISTS (
+    def _build_message_filter(self, user_role: str, min_length: int,
+                              force_rebuild: bool):
+        """構建待處理消息的 WHERE 條件與參數"""
+        conditions = ["LENGTH(cm.content) >= %s"]
+        params = [min_length]
+        
+        if user_role != 'all':
+            conditions.append("cm.role = %s")
+            params.append(user_role)
+        
+        # 如果不強制重建，排除已處理的消息
+        if not force_rebuild:
+            conditions.append("""
+                NOT EXISTS (
                     SELECT 1 FROM chat_message_embeddings_1024 ce 
                     WHERE ce.chat_message_id = cm.id
                 )
-                """
-            
+            """)
+        
+        return " AND ".join(conditions), params
+    
+    def _count_chat_messages(self, user_role: str, min_length: int,
+                             force_rebuild: bool) -> int:
+        """統計待處理的聊天消息數量"""
+        try:
+            where_sql, params = self._build_message_filter(user_role, min_length, force_rebuild)
             with connection.cursor() as cursor:
-                cursor.execute(f"""
-                    SELECT 
-                        cm.id,
-                        cm.conversation_id,
-                        cm.content,
-                        cm.role,
-                        LENGTH(cm.content) as content_length,
-                        cm.created_at
-                    FROM chat_messages cm
-                    WHERE LENGTH(cm.content) >= %s
-                    {role_filter}
-                    {exclude_processed}
-                    ORDER BY cm.created_at DESC
-                """, [min_length])
-                
-                columns = [col[0] for col in cursor.description]
-                results = []
-                
-                for row in cursor.fetchall():
-                    message_data = dict(zip(columns, row))
-                    results.append(message_data)
-                
-                return results
+                cursor.execute(
+                    f"SELECT COUNT(*) FROM chat_messages cm WHERE {where_sql}",
+                    params
+                )
+                return cursor.fetchone()[0]
                 
         except Exception as e:
             self.stdout.write(
-                self.style.ERROR(f'❌ 獲取聊天消息失敗: {str(e)}')
+                self.style.ERROR(f'❌ 統計聊天消息失敗: {str(e)}')
             )
-            return []
+            return 0
+    
+    def _iter_chat_messages(self, user_role: str, min_length: int,
+                            force_rebuild: bool, batch_size: int) -> Iterator[List[Dict]]:
+        """以伺服器端游標分批讀取待處理的聊天消息"""
+        where_sql, params = self._build_message_filter(user_role, min_length, force_rebuild)
+        # 伺服器端游標讀取宣告當下的快照，處理過程中寫入向量表不影響讀取
+        return iter_query_chunks(f"""
+            SELECT 
+                cm.id,
+                cm.conversation_id,
+                cm.content,
+                cm.role,
+                LENGTH(cm.content) as content_length,
+                cm.created_at
+            FROM chat_messages cm
+            WHERE {where_sql}
+            ORDER BY cm.created_at DESC
+        """, params, chunk_size=batch_size)
     
-    def _show_processing_plan(self, messages: List[Dict], batch_size: int):
-        """顯示處理計劃"""
-        total_messages = len(messages)
+    def _show_processing_plan(self, user_role: str, min_length: int, force_rebuild: bool,
+                              total_messages: int, batch_size: int):
+        """顯示處理計劃（以聚合查詢取得分布，不載入消息內容）"""
         total_batches = (total_messages + batch_size - 1) // batch_size
         
         self.stdout.write(f"\n📋 處理計劃:")
@@ -254,89 +266,82 @@ class Command(BaseCommand):
         self.stdout.write(f"   - 批量大小: {batch_size}")
         self.stdout.write(f"   - 總批次數: {total_batches}")
         
-        # 角色分布
-        role_counts = {}
-        for msg in messages:
-            role = msg.get('role', 'unknown')
-            role_counts[role] = role_counts.get(role, 0) + 1
+        where_sql, params = self._build_message_filter(user_role, min_length, force_rebuild)
+        with connection.cursor() as cursor:
+            # 角色分布
+            cursor.execute(
+                f"SELECT cm.role, COUNT(*) FROM chat_messages cm WHERE {where_sql} GROUP BY cm.role",
+                params
+            )
+            role_counts = dict(cursor.fetchall())
+            
+            # 長度分布
+            cursor.execute(f"""
+                SELECT AVG(LENGTH(cm.content)), MIN(LENGTH(cm.content)), MAX(LENGTH(cm.content))
+                FROM chat_messages cm WHERE {where_sql}
+            """, params)
+            avg_length, min_length_found, max_length = cursor.fetchone()
         
         self.stdout.write(f"\n👥 角色分布:")
         for role, count in role_counts.items():
             self.stdout.write(f"   - {role}: {count}")
         
-        # 長度分布
-        lengths = [msg.get('content_length', 0) for msg in messages]
-        if lengths:
-            avg_length = sum(lengths) / len(lengths)
-            min_length = min(lengths)
-            max_length = max(lengths)
-            
+        if avg_length is not None:
             self.stdout.write(f"\n📏 消息長度統計:")
-            self.stdout.write(f"   - 平均長度: {avg_length:.1f}")
-            self.stdout.write(f"   - 最短長度: {min_length}")
+            self.stdout.write(f"   - 平均長度: {float(avg_length):.1f}")
+            self.stdout.write(f"   - 最短長度: {min_length_found}")
             self.stdout.write(f"   - 最長長度: {max_length}")
     
-    def _process_vectorization(self, messages: List[Dict], 
-                             vector_service, batch_size: int) -> Dict:
+    def _process_vectorization(self, message_chunks: Iterable[List[Dict]],
+                             total_messages: int, vector_service) -> Dict:
         """批量處理向量化"""
-        total_messages = len(messages)
         processed = 0
         successful = 0
         failed = 0
+        skipped = 0
         errors = []
+        pipeline = ChatVectorPipeline(vector_service=vector_service)
+        started = time.monotonic()
         
         self.stdout.write(f"\n🔄 開始批量向量化處理...")
         
         # 分批處理
-        for i in range(0, total_messages, batch_size):
-            batch = messages[i:i + batch_size]
-            batch_num = (i // batch_size) + 1
-            total_batches = (total_messages + batch_size - 1) // batch_size
-            
+        for batch_num, batch in enumerate(message_chunks, start=1):
             self.stdout.write(
-                f"⚡ 處理批次 {batch_num}/{total_batches} "
+                f"⚡ 處理批次 {batch_num} "
                 f"({len(batch)} 條消息)..."
             )
             
-            # 處理當前批次
-            for msg in batch:
-                try:
-                    success = vector_service.generate_and_store_vector(
-                        chat_message_id=msg['id'],
-                        content=msg['content'],
-                        conversation_id=msg.get('conversation_id'),
-                        user_role=msg.get('role', 'user')
-                    )
-                    
-                    if success:
-                        successful += 1
-                    else:
-                        failed += 1
-                        
-                    processed += 1
-                    
-                    # 顯示進度
-                    if processed % 10 == 0:
-                        progress = (processed / total_messages) * 100
-                        self.stdout.write(
-                            f"   進度: {processed}/{total_messages} ({progress:.1f}%)"
-                        )
-                
-                except Exception as e:
-                    failed += 1
-                    processed += 1
-                    errors.append({
-                        'message_id': msg['id'],
-                        'error': str(e)
-                    })
-                    self.stdout.write(
-                        self.style.WARNING(f"   ⚠️ 消息 {msg['id']} 處理失敗: {str(e)}")
-                    )
+            # 處理當前批次（雜湊去重 → 批量生成向量 → 批量寫入）
+            try:
+                batch_result = pipeline.process_messages(batch)
+                successful += batch_result['inserted']
+                skipped += batch_result['skipped']
+                failed += batch_result['failed']
+            except Exception as e:
+                failed += len(batch)
+                errors.append({
+                    'message_ids': [msg['id'] for msg in batch],
+                    'error': str(e)
+                })
+                self.stdout.write(
+                    self.style.WARNING(f"   ⚠️ 批次 {batch_num} 處理失敗: {str(e)}")
+                )
+            processed += len(batch)
+            
+            # 顯示進度與吞吐量
+            progress = (processed / total_messages) * 100
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"   進度: {processed}/{total_messages} ({progress:.1f}%) "
+                f"{processed / elapsed if elapsed else 0:.1f} msg/s"
+            )
         
         return {
             'total_processed': processed,
             'successful': successful,
             'failed': failed,
+            'skipped': skipped,
             'errors': errors
         }
     
@@ -346,6 +351,7 @@ class Command(BaseCommand):
         self.stdout.write(f"   - 總處理數: {results['total_processed']}")
         self.stdout.write(f"   - 成功數量: {results['successful']}")
         self.stdout.write(f"   - 失敗數量: {results['failed']}")
+        self.stdout.write(f"   - 跳過數量: {results.get('skipped', 0)}")
         
         if results['successful'] > 0:
             success_rate = (results['successful'] / results['total_processed']) * 100
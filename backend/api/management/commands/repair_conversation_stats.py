@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+"""
+對話會話統計修復管理指令
+
+ChatMessage 寫入時以 F() 增量維護 ConversationSession 的統計與序號計數，
+刪除訊息或繞過 save 的寫入會造成偏差；此指令找出偏差的會話並由訊息完整重算。
+
+用法：
+    # 檢查並修復所有偏差的會話
+    python manage.py repair_conversation_stats
+
+    # 只列出偏差的會話，不修改
+    python manage.py repair_conversation_stats --dry-run
+
+    # 指定會話（不論是否偏差都重算）
+    python manage.py repair_conversation_stats --session-ids 12 34 --force
+"""
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = '找出統計偏差的對話會話並由訊息重新計算 message_count / total_tokens / total_response_time / 序號計數'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--session-ids', type=int, nargs='+', help='只處理這些會話 ID')
+        parser.add_argument('--force', action='store_true', help='不檢查偏差，直接重算指定（或全部）會話')
+        parser.add_argument('--dry-run', action='store_true', help='只列出偏差的會話')
+
+    def handle(self, *args, **options):
+        from api.models import ConversationSession
+        from library.conversation_management.session_stats import find_drifted_sessions, repair_session_stats
+
+        session_ids = options['session_ids']
+        if options['force']:
+            targets = session_ids or list(ConversationSession.objects.values_list('id', flat=True))
+        else:
+            targets = find_drifted_sessions(session_ids)
+
+        if not targets:
+            self.stdout.write(self.style.SUCCESS('✅ 沒有統計偏差的會話'))
+            return
+
+        preview = ', '.join(str(i) for i in targets[:20]) + (' ...' if len(targets) > 20 else '')
+        self.stdout.write(f"🔍 需要重算的會話: {len(targets)} 個 ({preview})")
+        if options['dry_run']:
+            return
+
+        repaired = repair_session_stats(targets)
+        self.stdout.write(self.style.SUCCESS(f"✅ 已重算 {repaired}/{len(targets)} 個會話的統計"))
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+兩階段搜尋推測執行報告管理指令
+
+列出 Stage 2 推測執行（TWO_TIER_SPECULATION）的預測命中率與節省的延遲。
+
+用法：
+    # Protocol Assistant 的推測統計
+    python manage.py two_tier_speculation_report
+
+    # 以 JSON 輸出
+    python manage.py two_tier_speculation_report --json
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = '列出兩階段搜尋推測執行的預測命中率、節省與浪費的時間'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='以 JSON 輸出')
+
+    def handle(self, *args, **options):
+        from library.protocol_guide.two_tier_handler import TwoTierSearchHandler
+
+        report = TwoTierSearchHandler.stage_predictor.report()
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        def percent(value):
+            return '-' if value is None else f"{value:.1%}"
+
+        self.stdout.write(f"📊 兩階段搜尋推測執行（{report['namespace']}）")
+        self.stdout.write(f"   請求數: {report['requests']}（需要 Stage 2: {report['needed']}）")
+        self.stdout.write(
+            f"   推測: {report['speculated']}  命中: {report['hits']}  落空: {report['wasted']}  "
+            f"失敗: {report['failed']}  漏判: {report['missed']}"
+        )
+        self.stdout.write(f"   命中率: {percent(report['hit_rate'])}  涵蓋率: {percent(report['recall'])}")
+        self.stdout.write(
+            f"   節省延遲: {report['saved_seconds']:.1f} 秒"
+            f"（平均 {report['avg_saved_seconds'] or 0:.2f} 秒/命中）  "
+            f"落空 / 失敗耗用: {report['wasted_seconds']:.1f} 秒"
+        )
+        for reason, counts in report['by_reason'].items():
+            self.stdout.write(
+                f"   - {reason}: 命中 {counts['hits']} / 落空 {counts['wasted']} / 失敗 {counts['failed']}"
+            )
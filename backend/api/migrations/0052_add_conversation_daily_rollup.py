@@ -0,0 +1,74 @@
+# Generated by Django 5.2.7 on 2026-10-19 12:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0051_add_account_approval_system'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('chat_type', models.CharField(max_length=50, verbose_name='聊天類型')),
+                ('session_count', models.PositiveIntegerField(default=0, verbose_name='會話數')),
+                ('guest_session_count', models.PositiveIntegerField(default=0, verbose_name='訪客會話數')),
+                ('message_count', models.PositiveIntegerField(default=0, verbose_name='訊息總數')),
+                ('user_message_count', models.PositiveIntegerField(default=0, verbose_name='用戶訊息數')),
+                ('assistant_message_count', models.PositiveIntegerField(default=0, verbose_name='AI回覆數')),
+                ('helpful_count', models.PositiveIntegerField(default=0, verbose_name='有幫助數')),
+                ('unhelpful_count', models.PositiveIntegerField(default=0, verbose_name='無幫助數')),
+                ('response_time_count', models.PositiveIntegerField(default=0, verbose_name='有回應時間的回覆數')),
+                ('response_time_sum', models.FloatField(default=0, verbose_name='回應時間總和(秒)')),
+                ('response_time_max', models.FloatField(blank=True, null=True, verbose_name='最長回應時間(秒)')),
+                ('response_time_min', models.FloatField(blank=True, null=True, verbose_name='最短回應時間(秒)')),
+                ('response_lt_3s_count', models.PositiveIntegerField(default=0, verbose_name='回應 < 3s')),
+                ('response_3_10s_count', models.PositiveIntegerField(default=0, verbose_name='回應 3-10s')),
+                ('response_10_30s_count', models.PositiveIntegerField(default=0, verbose_name='回應 10-30s')),
+                ('response_gt_30s_count', models.PositiveIntegerField(default=0, verbose_name='回應 > 30s')),
+                ('rated_fast_count', models.PositiveIntegerField(default=0, verbose_name='快速回覆評分數')),
+                ('rated_fast_helpful_count', models.PositiveIntegerField(default=0, verbose_name='快速回覆有幫助數')),
+                ('rated_medium_count', models.PositiveIntegerField(default=0, verbose_name='中速回覆評分數')),
+                ('rated_medium_helpful_count', models.PositiveIntegerField(default=0, verbose_name='中速回覆有幫助數')),
+                ('rated_slow_count', models.PositiveIntegerField(default=0, verbose_name='慢速回覆評分數')),
+                ('rated_slow_helpful_count', models.PositiveIntegerField(default=0, verbose_name='慢速回覆有幫助數')),
+                ('total_tokens', models.BigIntegerField(default=0, verbose_name='Token總使用量')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新時間')),
+            ],
+            options={
+                'verbose_name': '對話每日彙總',
+                'verbose_name_plural': '對話每日彙總',
+                'db_table': 'conversation_daily_rollups',
+                'ordering': ['-date', 'chat_type'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['updated_at'], name='msg_updated_idx'),
+        ),
+        migrations.AddField(
+            model_name='conversationdailyrollup',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='用戶'),
+        ),
+        migrations.AddIndex(
+            model_name='conversationdailyrollup',
+            index=models.Index(fields=['chat_type', '-date'], name='rollup_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversationdailyrollup',
+            index=models.Index(fields=['user', '-date'], name='rollup_user_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversationdailyrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'chat_type', 'user'), name='rollup_date_type_user_uniq', nulls_distinct=False),
+        ),
+    ]
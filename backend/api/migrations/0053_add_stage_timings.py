@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0052_add_conversation_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='benchmarktestresult',
+            name='stage_timings',
+            field=models.JSONField(blank=True, default=dict, verbose_name='分段耗時(秒)'),
+        ),
+        migrations.AddField(
+            model_name='benchmarktestrun',
+            name='stage_latency',
+            field=models.JSONField(blank=True, default=dict, verbose_name='分段延遲統計'),
+        ),
+        migrations.AddField(
+            model_name='difytestresult',
+            name='stage_timings',
+            field=models.JSONField(blank=True, default=dict, verbose_name='分段耗時(秒)'),
+        ),
+        migrations.AddField(
+            model_name='difytestrun',
+            name='stage_latency',
+            field=models.JSONField(blank=True, default=dict, verbose_name='分段延遲統計'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0053_add_stage_timings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='benchmarktestresult',
+            name='cache_key',
+            field=models.CharField(blank=True, db_index=True, help_text='版本參數、測試案例內容與知識庫版次的雜湊（library/benchmark/result_cache.py）', max_length=64, verbose_name='結果快取鍵'),
+        ),
+    ]
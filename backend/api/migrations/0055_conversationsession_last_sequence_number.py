@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:10
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_last_sequence_number(apps, schema_editor):
+    """以既有訊息的最大序號初始化會話計數列"""
+    ConversationSession = apps.get_model('api', 'ConversationSession')
+    ChatMessage = apps.get_model('api', 'ChatMessage')
+
+    last_seq = (
+        ChatMessage.objects
+        .filter(conversation=OuterRef('pk'))
+        .values('conversation')
+        .annotate(last_seq=Max('sequence_number'))
+        .values('last_seq')
+    )
+    ConversationSession.objects.update(last_sequence_number=Coalesce(Subquery(last_seq), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0054_benchmarktestresult_cache_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversationsession',
+            name='last_sequence_number',
+            field=models.PositiveIntegerField(default=0, verbose_name='最後訊息序號'),
+        ),
+        migrations.RunPython(backfill_last_sequence_number, migrations.RunPython.noop),
+    ]
@@ -1019,6 +1019,7 @@ class ConversationSession(models.Model):
     total_tokens = models.PositiveIntegerField(default=0, verbose_name="Token總使用量")
     total_response_time = models.FloatField(default=0, verbose_name="總回應時間(秒)")
     satisfaction_score = models.FloatField(null=True, blank=True, verbose_name="滿意度分數")
+    last_sequence_number = models.PositiveIntegerField(default=0, verbose_name="最後訊息序號")
     
     # 狀態管理
     is_active = models.BooleanField(default=True, verbose_name="是否活躍")
@@ -1066,39 +1067,36 @@ class ConversationSession(models.Model):
         return type_mapping.get(self.chat_type, self.chat_type)
     
     def update_stats(self):
-        """更新統計資訊"""
-        from django.db.models import Count, Sum
-        from django.utils import timezone
-        from django.db.models.functions import Cast
-        from django.db.models import IntegerField
+        """
+        由訊息重新計算統計資訊（完整重算）
+        
+        新增訊息時 ChatMessage.save 已以 F() 增量維護統計，
+        此方法只供修復偏差使用（manage.py repair_conversation_stats）。
+        """
+        from django.db.models import Count, Max, Sum
         
         # 基本統計
         basic_stats = self.chatmessage_set.aggregate(
             count=Count('id'),
-            total_time=Sum('response_time')
+            total_time=Sum('response_time'),
+            last_seq=Max('sequence_number'),
+            last_at=Max('created_at')
         )
         
         # 分別計算 token 統計（避免 JSONB 欄位問題）
-        total_tokens = 0
-        try:
-            messages_with_tokens = self.chatmessage_set.exclude(token_usage__isnull=True)
-            for msg in messages_with_tokens:
-                if msg.token_usage and isinstance(msg.token_usage, dict):
-                    tokens = msg.token_usage.get('total_tokens', 0)
-                    if isinstance(tokens, (int, float)):
-                        total_tokens += int(tokens)
-        except Exception as e:
-            # 如果 token 統計失敗，記錄但不影響其他統計
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.warning(f"Token統計計算失敗: {str(e)}")
-            total_tokens = 0
+        total_tokens = sum(
+            ChatMessage.token_count(token_usage)
+            for token_usage in self.chatmessage_set.exclude(token_usage__isnull=True).values_list('token_usage', flat=True)
+        )
         
         self.message_count = basic_stats['count'] or 0
         self.total_tokens = total_tokens
         self.total_response_time = basic_stats['total_time'] or 0
-        self.last_message_at = timezone.now()
-        self.save(update_fields=['message_count', 'total_tokens', 'total_response_time', 'last_message_at'])
+        self.last_sequence_number = basic_stats['last_seq'] or 0
+        self.last_message_at = basic_stats['last_at'] or self.last_message_at
+        self.save(update_fields=[
+            'message_count', 'total_tokens', 'total_response_time', 'last_sequence_number', 'last_message_at'
+        ])
 
 
 class ChatMessage(models.Model):
@@ -1166,6 +1164,7 @@ class ChatMessage(models.Model):
             models.Index(fields=['conversation', 'sequence_number'], name='msg_conv_seq_idx'),
             models.Index(fields=['role', '-created_at'], name='msg_role_created_idx'),
             models.Index(fields=['-created_at'], name='msg_created_idx'),
+            models.Index(fields=['updated_at'], name='msg_updated_idx'),  # 每日彙總增量重算
             models.Index(fields=['content'], name='msg_content_search_idx'),  # 全文搜索
         ]
     
@@ -1173,19 +1172,171 @@ class ChatMessage(models.Model):
         content_preview = self.content[:50] + "..." if len(self.content) > 50 else self.content
         return f"{self.get_role_display()} #{self.sequence_number}: {content_preview}"
     
+    # 影響對話統計的欄位（更新這些欄位時需調整 ConversationSession 的累計值）
+    STATS_FIELDS = ('response_time', 'token_usage')
+    
+    @staticmethod
+    def token_count(token_usage) -> int:
+        """訊息的 token 數（token_usage['total_tokens']，非數值視為 0）"""
+        tokens = token_usage.get('total_tokens', 0) if isinstance(token_usage, dict) else 0
+        if isinstance(tokens, (int, float)) and not isinstance(tokens, bool):
+            return int(tokens)
+        return 0
+    
     def save(self, *args, **kwargs):
-        # 自動設定 sequence_number
+        from django.db import transaction
+        
+        if not self.conversation_id:
+            return super().save(*args, **kwargs)
+        
+        # 新增訊息：同一交易內由會話計數列配發序號並以 F() 累加統計（O(1)，不重新彙總整段對話）
+        if self._state.adding:
+            with transaction.atomic():
+                self._count_in_session()
+                super().save(*args, **kwargs)
+            return
+        
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not set(update_fields) & set(self.STATS_FIELDS):
+            return super().save(*args, **kwargs)
+        
+        # 更新回應時間 / token：只套用與舊值的差額
+        with transaction.atomic():
+            old = ChatMessage.objects.filter(pk=self.pk).values(*self.STATS_FIELDS).first()
+            super().save(*args, **kwargs)
+            if old is not None:
+                self._apply_session_delta(
+                    tokens=self.token_count(self.token_usage) - self.token_count(old['token_usage']),
+                    response_time=(self.response_time or 0) - (old['response_time'] or 0)
+                )
+    
+    def _count_in_session(self):
+        """
+        鎖定會話列並累加統計、配發 sequence_number
+        
+        UPDATE 取得的列鎖持有到交易結束，同一會話的並行寫入依序取得遞增序號。
+        """
+        from django.db.models import F
+        from django.db.models.functions import Greatest
+        
+        updates = {
+            'message_count': F('message_count') + 1,
+            'last_message_at': timezone.now(),
+        }
+        if self.sequence_number:
+            updates['last_sequence_number'] = Greatest(F('last_sequence_number'), self.sequence_number)
+        else:
+            updates['last_sequence_number'] = F('last_sequence_number') + 1
+        
+        tokens = self.token_count(self.token_usage)
+        if tokens:
+            updates['total_tokens'] = F('total_tokens') + tokens
+        if self.response_time:
+            updates['total_response_time'] = F('total_response_time') + self.response_time
+        
+        self._update_session(updates)
         if not self.sequence_number:
-            last_seq = ChatMessage.objects.filter(conversation=self.conversation).aggregate(
-                models.Max('sequence_number')
-            )['sequence_number__max'] or 0
-            self.sequence_number = last_seq + 1
+            self.sequence_number = self._session_stats['last_sequence_number']
+    
+    def _apply_session_delta(self, tokens: int = 0, response_time: float = 0):
+        """以 F() 調整會話的 token / 回應時間累計"""
+        from django.db.models import F
         
-        super().save(*args, **kwargs)
+        updates = {}
+        if tokens:
+            updates['total_tokens'] = F('total_tokens') + tokens
+        if response_time:
+            updates['total_response_time'] = F('total_response_time') + response_time
+        if updates:
+            self._update_session(updates)
+    
+    def _update_session(self, updates):
+        """執行會話列的增量更新，並同步已載入的 conversation 實例"""
+        sessions = ConversationSession.objects.filter(pk=self.conversation_id)
+        sessions.update(**updates)
         
-        # 更新對話統計
-        if self.conversation_id:
-            self.conversation.update_stats()
+        fields = ('message_count', 'total_tokens', 'total_response_time', 'last_sequence_number', 'last_message_at')
+        self._session_stats = sessions.values(*fields).get()
+        
+        conversation_field = self._meta.get_field('conversation')
+        if conversation_field.is_cached(self):
+            conversation = conversation_field.get_cached_value(self)
+            for field, value in self._session_stats.items():
+                setattr(conversation, field, value)
+
+
+class ConversationDailyRollup(models.Model):
+    """
+    對話每日彙總 - 分析儀表板的物化統計
+
+    以 (日期, 聊天類型, 用戶) 為粒度彙總 chat_messages / conversation_sessions，
+    儀表板只讀取此表，不再於每次載入時掃描原始訊息。
+    - 對話記錄器寫入訊息時即時累加
+    - Celery beat 定期重算有變動的日期（含事後反饋），確保與原始資料一致
+    訪客對話的 user 為 NULL。
+    """
+
+    date = models.DateField(verbose_name="日期")
+    chat_type = models.CharField(max_length=50, verbose_name="聊天類型")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, verbose_name="用戶")
+
+    # 會話統計（依會話建立日期）
+    session_count = models.PositiveIntegerField(default=0, verbose_name="會話數")
+    guest_session_count = models.PositiveIntegerField(default=0, verbose_name="訪客會話數")
+
+    # 訊息統計
+    message_count = models.PositiveIntegerField(default=0, verbose_name="訊息總數")
+    user_message_count = models.PositiveIntegerField(default=0, verbose_name="用戶訊息數")
+    assistant_message_count = models.PositiveIntegerField(default=0, verbose_name="AI回覆數")
+
+    # 滿意度（僅 AI 回覆）
+    helpful_count = models.PositiveIntegerField(default=0, verbose_name="有幫助數")
+    unhelpful_count = models.PositiveIntegerField(default=0, verbose_name="無幫助數")
+
+    # 回應時間（僅 AI 回覆，排除 >= 300 秒的異常值）
+    response_time_count = models.PositiveIntegerField(default=0, verbose_name="有回應時間的回覆數")
+    response_time_sum = models.FloatField(default=0, verbose_name="回應時間總和(秒)")
+    response_time_max = models.FloatField(null=True, blank=True, verbose_name="最長回應時間(秒)")
+    response_time_min = models.FloatField(null=True, blank=True, verbose_name="最短回應時間(秒)")
+    response_lt_3s_count = models.PositiveIntegerField(default=0, verbose_name="回應 < 3s")
+    response_3_10s_count = models.PositiveIntegerField(default=0, verbose_name="回應 3-10s")
+    response_10_30s_count = models.PositiveIntegerField(default=0, verbose_name="回應 10-30s")
+    response_gt_30s_count = models.PositiveIntegerField(default=0, verbose_name="回應 > 30s")
+
+    # 回應速度 × 滿意度（已評分的回覆；快 < 3s、中 3-10s、慢 >= 10s）
+    rated_fast_count = models.PositiveIntegerField(default=0, verbose_name="快速回覆評分數")
+    rated_fast_helpful_count = models.PositiveIntegerField(default=0, verbose_name="快速回覆有幫助數")
+    rated_medium_count = models.PositiveIntegerField(default=0, verbose_name="中速回覆評分數")
+    rated_medium_helpful_count = models.PositiveIntegerField(default=0, verbose_name="中速回覆有幫助數")
+    rated_slow_count = models.PositiveIntegerField(default=0, verbose_name="慢速回覆評分數")
+    rated_slow_helpful_count = models.PositiveIntegerField(default=0, verbose_name="慢速回覆有幫助數")
+
+    # Token 使用量
+    total_tokens = models.BigIntegerField(default=0, verbose_name="Token總使用量")
+
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新時間")
+
+    class Meta:
+        ordering = ['-date', 'chat_type']
+        verbose_name = "對話每日彙總"
+        verbose_name_plural = "對話每日彙總"
+        db_table = 'conversation_daily_rollups'
+        constraints = [
+            # 訪客（user 為 NULL）也必須唯一，才能以 ON CONFLICT 累加
+            models.UniqueConstraint(
+                fields=['date', 'chat_type', 'user'],
+                name='rollup_date_type_user_uniq',
+                nulls_distinct=False,
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['chat_type', '-date'], name='rollup_type_date_idx'),
+            models.Index(fields=['user', '-date'], name='rollup_user_date_idx'),
+        ]
+
+    def __str__(self):
+        user_display = self.user.username if self.user_id else "訪客"
+        return f"{self.date} {self.chat_type} - {user_display}"
 
 
 class SearchThresholdSetting(models.Model):
@@ -1606,6 +1757,7 @@ class BenchmarkTestRun(models.Model):
     avg_response_time = models.DecimalField(
         max_digits=10, decimal_places=2, null=True, blank=True, verbose_name="平均響應時間"
     )
+    stage_latency = models.JSONField(default=dict, blank=True, verbose_name="分段延遲統計")
     
     # 時間記錄
     started_at = models.DateTimeField(null=True, blank=True, verbose_name="開始時間")
@@ -1681,6 +1833,11 @@ class BenchmarkTestResult(models.Model):
     pass_reason = models.TextField(blank=True, verbose_name="通過原因")
     
     detailed_results = models.JSONField(default=dict, verbose_name="詳細結果")
+    stage_timings = models.JSONField(default=dict, blank=True, verbose_name="分段耗時(秒)")
+    cache_key = models.CharField(
+        max_length=64, blank=True, db_index=True, verbose_name="結果快取鍵",
+        help_text="版本參數、測試案例內容與知識庫版次的雜湊（library/benchmark/result_cache.py）"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="創建時間")
     
     class Meta:
@@ -2051,6 +2208,11 @@ class DifyTestRun(models.Model):
         blank=True,
         verbose_name="平均響應時間"
     )
+    stage_latency = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="分段延遲統計"
+    )
     
     # 詳細評分
     completeness_score = models.DecimalField(
@@ -2181,6 +2343,11 @@ class DifyTestResult(models.Model):
         blank=True,
         verbose_name="響應時間"
     )
+    stage_timings = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name="分段耗時(秒)"
+    )
     
     # RAG 檢索資訊
     retrieved_documents = models.JSONField(
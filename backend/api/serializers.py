@@ -609,7 +609,7 @@ class BenchmarkTestRunSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'version', 'run_name', 'run_type',
             'total_test_cases', 'completed_test_cases', 'status', 'overall_score',
-            'avg_precision', 'avg_recall', 'avg_f1_score', 'avg_response_time',
+            'avg_precision', 'avg_recall', 'avg_f1_score', 'avg_response_time', 'stage_latency',
             'started_at', 'completed_at', 'duration_seconds', 'triggered_by',
             'triggered_by_username', 'environment', 'git_commit_hash', 'notes',
             'created_at', 'results_count', 'passed_count', 'failed_count', 'pass_rate'
@@ -683,7 +683,7 @@ class BenchmarkTestResultSerializer(serializers.ModelSerializer):
             'returned_document_scores', 'precision_score', 'recall_score',
             'f1_score', 'ndcg_score', 'response_time', 'true_positives',
             'false_positives', 'false_negatives', 'is_passed', 'pass_reason',
-            'detailed_results', 'created_at'
+            'detailed_results', 'stage_timings', 'cache_key', 'created_at'
         ]
         read_only_fields = ['created_at']
 
@@ -792,6 +792,7 @@ class DifyTestResultSerializer(serializers.ModelSerializer):
             'test_case_expected_answer',
             'dify_answer',
             'response_time',
+            'stage_timings',  # ✅ 各階段耗時（秒）
             # 'tokens_used',  # ❌ Model 中不存在，移除
             'dify_message_id',
             # 'dify_conversation_id',  # ❌ Model 中不存在，移除
@@ -828,6 +829,7 @@ class DifyTestRunSerializer(serializers.ModelSerializer):
             'pass_rate',
             'average_score',
             'average_response_time',
+            'stage_latency',  # ✅ 各階段 p50 / p95
             # 'total_tokens',  # ❌ Model 中不存在，移除
             'started_at',
             'completed_at',
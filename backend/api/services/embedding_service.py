@@ -109,39 +109,45 @@ class OpenSourceEmbeddingService:
             # 返回零向量作為備用
             return [0.0] * self.embedding_dimension
     
-    def generate_embeddings_batch(self, texts: List[str]) -> List[List[float]]:
+    def generate_embeddings_batch(self, texts: List[str], batch_size: int = 32) -> List[List[float]]:
         """
         批量生成向量嵌入
         
         Args:
             texts: 文本列表
+            batch_size: 模型每次前向計算的文本數
             
         Returns:
-            向量嵌入列表的列表
+            向量嵌入列表的列表（與輸入順序一致，空文本為零向量）
         """
         try:
             if not texts:
                 return []
                 
-            # 過濾空文本
-            valid_texts = [text.strip() for text in texts if text and text.strip()]
+            # 過濾空文本（保留原始位置）
+            valid_positions = [i for i, text in enumerate(texts) if text and text.strip()]
             
-            if not valid_texts:
-                return [[0.0] * self.embedding_dimension] * len(texts)
+            if not valid_positions:
+                return [[0.0] * self.embedding_dimension for _ in texts]
             
             # 批量生成嵌入
-            embeddings = self.model.encode(valid_texts)
+            embeddings = self.model.encode(
+                [texts[i].strip() for i in valid_positions], batch_size=batch_size
+            )
             
             # 轉換為 Python 列表格式
             if isinstance(embeddings, np.ndarray):
                 embeddings = embeddings.tolist()
-                
-            return embeddings
+            
+            results = [[0.0] * self.embedding_dimension for _ in texts]
+            for position, embedding in zip(valid_positions, embeddings):
+                results[position] = embedding
+            return results
             
         except Exception as e:
             logger.error(f"批量生成嵌入失敗: {str(e)}")
             # 返回零向量作為備用
-            return [[0.0] * self.embedding_dimension] * len(texts)
+            return [[0.0] * self.embedding_dimension for _ in texts]
     
     def get_content_hash(self, content: str) -> str:
         """生成內容哈希值，用於檢查內容是否變更"""
@@ -9,6 +9,9 @@ Django Signals for Automatic Vector Generation
 - RVTGuide: RVT Assistant 知識庫
 - KnowIssue: Know Issue 知識庫
 
+另外在 DifyConfigVersion / SearchThresholdSetting 變更後遞增設定世代，
+讓各 worker 的設定快取失效（library/config/versioned_config_cache.py）。
+
 優點：
 - 無論透過 API、Django Admin、ORM 創建，都會自動生成向量
 - 統一處理邏輯，避免遺漏
@@ -17,7 +20,7 @@ Django Signals for Automatic Vector Generation
 
 from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from api.models import ProtocolGuide, RVTGuide, KnowIssue
+from api.models import ProtocolGuide, RVTGuide, KnowIssue, DifyConfigVersion, SearchThresholdSetting
 import logging
 
 logger = logging.getLogger(__name__)
@@ -352,6 +355,34 @@ def know_issue_post_delete(sender, instance, **kwargs):
         )
 
 
+# ==================== 設定版本快取 Signals ====================
+
+@receiver(post_save, sender=DifyConfigVersion)
+@receiver(post_delete, sender=DifyConfigVersion)
+def dify_config_version_changed(sender, instance, **kwargs):
+    """
+    DifyConfigVersion 變更後遞增設定世代（交易提交後）
+
+    各 worker 的 VersionedConfigCache 在下次讀取時重新載入版本與 Baseline。
+    """
+    from library.config.versioned_config_cache import DIFY_CONFIG_VERSION, bump_generation_on_commit
+
+    bump_generation_on_commit(DIFY_CONFIG_VERSION)
+
+
+@receiver(post_save, sender=SearchThresholdSetting)
+@receiver(post_delete, sender=SearchThresholdSetting)
+def search_threshold_setting_changed(sender, instance, **kwargs):
+    """
+    SearchThresholdSetting 變更後遞增設定世代（交易提交後）
+
+    ThresholdManager 與動態版本的合併設定在各 worker 下次讀取時重新載入。
+    """
+    from library.config.versioned_config_cache import SEARCH_THRESHOLD_SETTING, bump_generation_on_commit
+
+    bump_generation_on_commit(SEARCH_THRESHOLD_SETTING)
+
+
 # ==================== 工具函數 ====================
 
 def disable_signals():
@@ -98,18 +98,21 @@ urlpatterns = [
     
     # Dify OCR Chat API - 專門用於 AI OCR 系統
     path('dify/ocr/chat/', views.dify_ocr_chat, name='dify_ocr_chat'),
+    path('dify/ocr/chat/stream/', views.dify_ocr_chat_stream, name='dify_ocr_chat_stream'),
     
     # OCR 圖片分析 API - 供 Assistant 檔案上傳功能使用
     path('ocr/analyze/', views.OCRAnalyzeView.as_view(), name='ocr_analyze'),
     
     # RVT Guide Chat API
     path('rvt-guide/chat/', views.rvt_guide_chat, name='rvt_guide_chat'),
+    path('rvt-guide/chat/stream/', views.rvt_guide_chat_stream, name='rvt_guide_chat_stream'),
     path('rvt-guide/config/', views.rvt_guide_config, name='rvt_guide_config'),
     
     # Protocol Guide API
     path('dify/protocol-guide/knowledge/retrieval', views.dify_protocol_guide_search, name='dify_protocol_guide_knowledge_no_slash'),
     path('dify/protocol-guide/knowledge/retrieval/', views.dify_protocol_guide_search, name='dify_protocol_guide_knowledge'),
     path('protocol-guide/chat/', views.protocol_guide_chat, name='protocol_guide_chat'),
+    path('protocol-guide/chat/stream/', views.protocol_guide_chat_stream, name='protocol_guide_chat_stream'),
     path('protocol-guide/config/', views.protocol_guide_config, name='protocol_guide_config'),
     
     # Chat Usage Statistics API
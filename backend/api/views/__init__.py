@@ -124,6 +124,9 @@ from .dify_chat_views import (
     dify_ocr_chat,
     rvt_guide_chat,
     protocol_guide_chat,
+    dify_ocr_chat_stream,
+    rvt_guide_chat_stream,
+    protocol_guide_chat_stream,
     
     # Chat 使用統計 API
     chat_usage_statistics,
@@ -314,6 +317,9 @@ __all__ = [
     'rvt_guide_config',
     'protocol_guide_chat',
     'protocol_guide_config',
+    'dify_ocr_chat_stream',
+    'rvt_guide_chat_stream',
+    'protocol_guide_chat_stream',
     
     # Statistics
     'chat_usage_statistics',
@@ -407,11 +407,11 @@ def rvt_analytics_questions(request):
             try:
                 days = int(request.GET.get('days', 7))
                 
-                # 簡化的問題分析
+                # 簡化的問題分析（串流掃描 + Space-Saving，固定記憶體）
                 from django.utils import timezone
                 from datetime import timedelta
                 from api.models import ChatMessage
-                from collections import Counter
+                from library.common.analytics.question_stream import SpaceSaving
                 
                 start_date = timezone.now() - timedelta(days=days)
                 
@@ -421,18 +421,19 @@ def rvt_analytics_questions(request):
                 ).values_list('content', flat=True)
                 
                 # 簡單的關鍵字統計
-                keywords = []
-                for message in user_messages:
-                    words = message.lower().split()
-                    keywords.extend([w for w in words if len(w) > 3])
+                total_questions = 0
+                keyword_sketch = SpaceSaving(capacity=2000)
+                for message in user_messages.iterator(chunk_size=2000):
+                    total_questions += 1
+                    keyword_sketch.update(w for w in message.lower().split() if len(w) > 3)
                 
-                keyword_counts = Counter(keywords).most_common(10)
+                keyword_counts = keyword_sketch.top(10)
                 
                 return JsonResponse({
                     'success': True,
                     'fallback': True,
                     'data': {
-                        'total_questions': len(user_messages),
+                        'total_questions': total_questions,
                         'top_keywords': keyword_counts,
                         'period': f'{days} 天'
                     }
@@ -520,6 +521,57 @@ def rvt_analytics_satisfaction(request):
         }, status=500)
 
 
+def _question_history_response(request, chat_type, owner_id=None):
+    """
+    問題歷史共用實作：以單一查詢取得每頁的問答配對
+
+    Args:
+        request: DRF request
+        chat_type: 對話類型（如 'rvt_assistant_chat'）
+        owner_id: 限制只看此用戶的資料（一般用戶權限）
+    """
+    from datetime import datetime
+    from library.common.analytics.question_history import QuestionHistoryQuery
+
+    # 獲取查詢參數
+    page = int(request.GET.get('page', 1))
+    page_size = int(request.GET.get('page_size', 20))
+    if page_size < 1:
+        raise ValueError(f'page_size 必須大於 0: {page_size}')
+    cursor = request.GET.get('cursor') or None
+    user_id = request.GET.get('user_id')
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date')
+
+    query = QuestionHistoryQuery(
+        chat_type,
+        user_id=int(user_id) if user_id else None,
+        owner_id=owner_id,
+        rating=request.GET.get('rating'),
+        start_date=datetime.strptime(start_date, '%Y-%m-%d') if start_date else None,
+        end_date=(
+            datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+            if end_date else None
+        ),
+        search=request.GET.get('search', '').strip() or None
+    )
+
+    data = {'page_size': page_size}
+    if cursor:
+        # keyset 分頁：不計算總數，深頁成本與第一頁相同
+        page_data = query.fetch_page(page_size, cursor=cursor)
+    else:
+        # 頁碼分頁（與 Paginator.get_page 相同，超出範圍時回到最後一頁）
+        count = query.count()
+        total_pages = max(1, -(-count // page_size))
+        page = min(max(page, 1), total_pages)
+        page_data = query.fetch_page(page_size, page=page)
+        data.update({'count': count, 'total_pages': total_pages, 'current_page': page})
+
+    data.update(page_data)
+    return JsonResponse({'success': True, 'data': data}, status=200)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def rvt_question_history(request):
@@ -530,6 +582,7 @@ def rvt_question_history(request):
     Query parameters:
     - page: 頁碼 (default: 1)
     - page_size: 每頁數量 (default: 20)
+    - cursor: keyset 游標，取自上一頁的 next_cursor；提供時忽略 page 且不計算總數 (optional)
     - user_id: 篩選特定用戶 (optional)
     - rating: 篩選評價 (like/dislike/null) (optional)
     - start_date: 開始日期 (YYYY-MM-DD) (optional)
@@ -537,127 +590,7 @@ def rvt_question_history(request):
     - search: 搜尋問題內容 (optional)
     """
     try:
-        from api.models import ChatMessage, ConversationSession
-        from django.db.models import Q, Prefetch
-        from django.core.paginator import Paginator
-        from datetime import datetime
-        
-        # 獲取查詢參數
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
-        user_id = request.GET.get('user_id')
-        rating = request.GET.get('rating')
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
-        search_query = request.GET.get('search', '').strip()
-        
-        # 基礎查詢：只查詢 user 訊息（問題），且屬於 RVT Assistant
-        queryset = ChatMessage.objects.filter(
-            role='user',
-            conversation__chat_type='rvt_assistant_chat'
-        ).select_related(
-            'conversation',
-            'conversation__user'
-        ).order_by('-created_at')
-        
-        # 篩選條件
-        if user_id:
-            queryset = queryset.filter(conversation__user_id=user_id)
-        
-        # ✅ 修正：篩選評價時，需要 JOIN assistant 訊息
-        if rating:
-            # 獲取所有符合評價條件的 assistant 訊息的對話和序號
-            if rating == 'like':
-                assistant_filter = Q(is_helpful=True)
-            elif rating == 'dislike':
-                assistant_filter = Q(is_helpful=False)
-            elif rating == 'null':
-                assistant_filter = Q(is_helpful__isnull=True)
-            else:
-                assistant_filter = Q()  # 無效的 rating 值，不篩選
-            
-            # 找出符合條件的 assistant 訊息
-            matching_assistants = ChatMessage.objects.filter(
-                role='assistant',
-                conversation__chat_type='rvt_assistant_chat'
-            ).filter(assistant_filter).values_list('conversation_id', 'sequence_number')
-            
-            # 建立對應的 user 訊息條件（sequence_number 要減 1）
-            conversation_seq_pairs = [
-                Q(conversation_id=conv_id, sequence_number=seq_num - 1)
-                for conv_id, seq_num in matching_assistants
-            ]
-            
-            if conversation_seq_pairs:
-                # 使用 OR 連接所有條件
-                from functools import reduce
-                import operator
-                combined_filter = reduce(operator.or_, conversation_seq_pairs)
-                queryset = queryset.filter(combined_filter)
-            else:
-                # 如果沒有符合條件的 assistant 訊息，返回空結果
-                queryset = queryset.none()
-        
-        if start_date:
-            start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
-            queryset = queryset.filter(created_at__gte=start_datetime)
-        
-        if end_date:
-            end_datetime = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
-            queryset = queryset.filter(created_at__lte=end_datetime)
-        
-        if search_query:
-            queryset = queryset.filter(content__icontains=search_query)
-        
-        # 分頁
-        paginator = Paginator(queryset, page_size)
-        page_obj = paginator.get_page(page)
-        
-        # 構建結果
-        results = []
-        for message in page_obj:
-            # 獲取用戶資訊
-            user_info = {
-                'id': message.conversation.user.id if message.conversation.user else None,
-                'username': message.conversation.user.username if message.conversation.user else (message.conversation.guest_identifier or '訪客')
-            }
-            
-            # 獲取對應的 assistant 回覆（如果有）
-            assistant_message = ChatMessage.objects.filter(
-                conversation=message.conversation,
-                role='assistant',
-                sequence_number=message.sequence_number + 1
-            ).first()
-            
-            answer_preview = None
-            rating = None
-            if assistant_message:
-                answer_preview = assistant_message.content[:100] + '...' if len(assistant_message.content) > 100 else assistant_message.content
-                # ✅ 修正：從 assistant 訊息讀取評價，而不是從 user 訊息
-                rating = 'like' if assistant_message.is_helpful is True else ('dislike' if assistant_message.is_helpful is False else None)
-            
-            results.append({
-                'id': message.id,
-                'user': user_info,
-                'question': message.content,
-                'answer_preview': answer_preview,
-                'rating': rating,
-                'created_at': message.created_at.isoformat(),
-                'conversation_id': message.conversation.session_id,
-                'message_id': message.message_id,
-                'question_category': message.question_category
-            })
-        
-        return JsonResponse({
-            'success': True,
-            'data': {
-                'count': paginator.count,
-                'total_pages': paginator.num_pages,
-                'current_page': page,
-                'page_size': page_size,
-                'results': results
-            }
-        }, status=200)
+        return _question_history_response(request, 'rvt_assistant_chat')
         
     except ValueError as e:
         return JsonResponse({
@@ -796,6 +729,7 @@ def protocol_question_history(request):
     Query parameters:
     - page: 頁碼 (default: 1)
     - page_size: 每頁數量 (default: 20)
+    - cursor: keyset 游標，取自上一頁的 next_cursor；提供時忽略 page 且不計算總數 (optional)
     - user_id: 篩選特定用戶 (optional)
     - rating: 篩選評價 (like/dislike/null) (optional)
     - start_date: 開始日期 (YYYY-MM-DD) (optional)
@@ -803,129 +737,9 @@ def protocol_question_history(request):
     - search: 搜尋問題內容 (optional)
     """
     try:
-        from api.models import ChatMessage, ConversationSession
-        from django.db.models import Q, Prefetch
-        from django.core.paginator import Paginator
-        from datetime import datetime
-        
-        # 獲取查詢參數
-        page = int(request.GET.get('page', 1))
-        page_size = int(request.GET.get('page_size', 20))
-        user_id = request.GET.get('user_id')
-        rating = request.GET.get('rating')
-        start_date = request.GET.get('start_date')
-        end_date = request.GET.get('end_date')
-        search_query = request.GET.get('search', '').strip()
-        
-        # 基礎查詢：只查詢 user 訊息（問題），且屬於 Protocol Assistant
-        queryset = ChatMessage.objects.filter(
-            role='user',
-            conversation__chat_type='protocol_assistant_chat'
-        ).select_related(
-            'conversation',
-            'conversation__user'
-        ).order_by('-created_at')
-        
-        # 管理員可以查看所有用戶資料
-        if not (request.user.is_staff or request.user.is_superuser):
-            # 一般用戶只能看自己的資料
-            queryset = queryset.filter(conversation__user=request.user)
-        
-        # 篩選條件
-        if user_id:
-            queryset = queryset.filter(conversation__user_id=user_id)
-        
-        # 篩選評價
-        if rating:
-            # 獲取所有符合評價條件的 assistant 訊息的對話和序號
-            if rating == 'like':
-                assistant_filter = Q(is_helpful=True)
-            elif rating == 'dislike':
-                assistant_filter = Q(is_helpful=False)
-            elif rating == 'null':
-                assistant_filter = Q(is_helpful__isnull=True)
-            else:
-                assistant_filter = Q()
-            
-            # 找出符合條件的 assistant 訊息
-            matching_assistants = ChatMessage.objects.filter(
-                role='assistant',
-                conversation__chat_type='protocol_assistant_chat'
-            ).filter(assistant_filter).values_list('conversation_id', 'sequence_number')
-            
-            # 建立對應的 user 訊息條件
-            conversation_seq_pairs = [
-                Q(conversation_id=conv_id, sequence_number=seq_num - 1)
-                for conv_id, seq_num in matching_assistants
-            ]
-            
-            if conversation_seq_pairs:
-                from functools import reduce
-                import operator
-                combined_filter = reduce(operator.or_, conversation_seq_pairs)
-                queryset = queryset.filter(combined_filter)
-            else:
-                queryset = queryset.none()
-        
-        if start_date:
-            start_datetime = datetime.strptime(start_date, '%Y-%m-%d')
-            queryset = queryset.filter(created_at__gte=start_datetime)
-        
-        if end_date:
-            end_datetime = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
-            queryset = queryset.filter(created_at__lte=end_datetime)
-        
-        if search_query:
-            queryset = queryset.filter(content__icontains=search_query)
-        
-        # 分頁
-        paginator = Paginator(queryset, page_size)
-        page_obj = paginator.get_page(page)
-        
-        # 構建結果
-        results = []
-        for message in page_obj:
-            # 獲取用戶資訊
-            user_info = {
-                'id': message.conversation.user.id if message.conversation.user else None,
-                'username': message.conversation.user.username if message.conversation.user else (message.conversation.guest_identifier or '訪客')
-            }
-            
-            # 獲取對應的 assistant 回覆
-            assistant_message = ChatMessage.objects.filter(
-                conversation=message.conversation,
-                role='assistant',
-                sequence_number=message.sequence_number + 1
-            ).first()
-            
-            answer_preview = None
-            rating = None
-            if assistant_message:
-                answer_preview = assistant_message.content[:100] + '...' if len(assistant_message.content) > 100 else assistant_message.content
-                rating = 'like' if assistant_message.is_helpful is True else ('dislike' if assistant_message.is_helpful is False else None)
-            
-            results.append({
-                'id': message.id,
-                'user': user_info,
-                'question': message.content,
-                'answer_preview': answer_preview,
-                'rating': rating,
-                'created_at': message.created_at.isoformat(),
-                'conversation_id': message.conversation.session_id,
-                'message_id': message.message_id,
-                'question_category': message.question_category
-            })
-        
-        return JsonResponse({
-            'success': True,
-            'data': {
-                'count': paginator.count,
-                'total_pages': paginator.num_pages,
-                'current_page': page,
-                'page_size': page_size,
-                'results': results
-            }
-        }, status=200)
+        # 管理員可以查看所有用戶資料，一般用戶只能看自己的資料
+        owner_id = None if (request.user.is_staff or request.user.is_superuser) else request.user.id
+        return _question_history_response(request, 'protocol_assistant_chat', owner_id=owner_id)
         
     except ValueError as e:
         return JsonResponse({
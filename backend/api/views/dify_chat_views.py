@@ -8,17 +8,22 @@ Dify Chat API Views
 - dify_ocr_chat: AI OCR 聊天
 - rvt_guide_chat: RVT Assistant 聊天
 - protocol_guide_chat: Protocol Guide 聊天
+- dify_ocr_chat_stream / rvt_guide_chat_stream / protocol_guide_chat_stream:
+  上述聊天的 streaming 版本（Server-Sent Events）
 - chat_usage_statistics: 聊天使用統計
 - record_chat_usage: 記錄聊天使用情況
 """
 
 import logging
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from django.views.decorators.csrf import csrf_exempt
 
+from api.renderers import ServerSentEventRenderer
+
 # 設置日誌
 logger = logging.getLogger(__name__)
 
@@ -29,6 +34,7 @@ logger = logging.getLogger(__name__)
 AI_OCR_LIBRARY_AVAILABLE = False
 AIOCRAPIHandler = None
 dify_ocr_chat_api = None
+dify_ocr_chat_stream_api = None
 fallback_dify_chat_with_file = None
 
 try:
@@ -36,7 +42,7 @@ try:
     from library.ai_ocr.fallback_handlers import fallback_dify_chat_with_file
     AI_OCR_LIBRARY_AVAILABLE = True
     # 導入便利函數
-    from library.ai_ocr.api_handlers import dify_ocr_chat_api
+    from library.ai_ocr.api_handlers import dify_ocr_chat_api, dify_ocr_chat_stream_api
 except ImportError as e:
     logger.warning(f"⚠️  AI OCR Library 無法載入: {str(e)}")
 
@@ -217,6 +223,49 @@ def protocol_guide_chat(request):
         }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
 
+# ============= Chat Streaming API（Server-Sent Events）=============
+
+def _stream_unavailable(error):
+    """服務不可用時的 SSE 錯誤回應（前端以同一套事件解析處理）"""
+    from library.dify_integration.stream_relay import sse_response
+    return sse_response([{'event': 'error', 'error': error}], status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@renderer_classes([JSONRenderer, ServerSentEventRenderer])
+def dify_ocr_chat_stream(request):
+    """Dify OCR Chat API（streaming）- 回答片段到達即送出"""
+    if dify_ocr_chat_stream_api:
+        return dify_ocr_chat_stream_api(request)
+    logger.error("AI OCR Library 完全不可用")
+    return _stream_unavailable('AI OCR 聊天服務暫時不可用，請稍後再試或聯絡管理員')
+
+
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@renderer_classes([JSONRenderer, ServerSentEventRenderer])
+def rvt_guide_chat_stream(request):
+    """RVT Guide Chat API（streaming）- 回答片段到達即送出"""
+    if RVT_GUIDE_LIBRARY_AVAILABLE and RVTGuideAPIHandler:
+        return RVTGuideAPIHandler.handle_chat_stream_api(request)
+    logger.error("RVT Guide library 完全不可用")
+    return _stream_unavailable('RVT Guide service temporarily unavailable, please contact administrator')
+
+
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([AllowAny])
+@renderer_classes([JSONRenderer, ServerSentEventRenderer])
+def protocol_guide_chat_stream(request):
+    """Protocol Guide 聊天 API（streaming）- 回答片段到達即送出"""
+    if PROTOCOL_GUIDE_LIBRARY_AVAILABLE and ProtocolGuideAPIHandler:
+        return ProtocolGuideAPIHandler.handle_chat_stream_api(request)
+    return _stream_unavailable('Protocol Guide Library 未安裝，聊天功能不可用')
+
+
 # ============= Chat Analytics API =============
 
 @api_view(['GET'])
@@ -30,62 +30,38 @@ from django.db import models
 
 logger = logging.getLogger(__name__)
 
-# 🆕 Baseline 版本緩存（模組級別）
-_baseline_version_cache = {
-    'version_code': None,
-    'last_updated': None
-}
+from library.common.knowledge_base.service_registry import get_search_service
+from library.config.versioned_config_cache import DIFY_CONFIG_VERSION, bump_generation, get_config_cache
+
+DEFAULT_BASELINE_VERSION_CODE = 'dify-two-tier-v1.2.1'
+
 
 def get_baseline_version_code():
     """
     獲取當前 Baseline 版本代碼（帶緩存）
     
     緩存策略：
-    - 第一次調用時從資料庫讀取並緩存
-    - 後續調用直接返回緩存值
-    - VSA 切換版本時會清除緩存（通過 set_baseline API）
+    - 由 VersionedConfigCache 保存各 worker 解析好的版本設定
+    - DifyConfigVersion 儲存後遞增 Redis 世代，所有 worker 下次讀取時重新載入
     
     Returns:
         str: Baseline 版本代碼（如 'dify-two-tier-v1.1.1'）
     """
-    from api.models import DifyConfigVersion
-    
-    # 檢查緩存
-    if _baseline_version_cache['version_code']:
-        logger.debug(f"📦 使用緩存的 Baseline 版本: {_baseline_version_cache['version_code']}")
-        return _baseline_version_cache['version_code']
+    baseline_version = get_config_cache().get_baseline()
+    if baseline_version:
+        return baseline_version.version_code
     
-    # 從資料庫查詢
-    try:
-        baseline_version = DifyConfigVersion.objects.filter(
-            is_baseline=True,
-            is_active=True
-        ).first()
-        
-        if baseline_version:
-            version_code = baseline_version.version_code
-            # 更新緩存
-            _baseline_version_cache['version_code'] = version_code
-            _baseline_version_cache['last_updated'] = __import__('datetime').datetime.now()
-            logger.info(f"✅ 載入並緩存 Baseline 版本: {version_code}")
-            return version_code
-        else:
-            logger.warning("⚠️ 找不到 Baseline 版本，返回預設值 v1.2.1")
-            return 'dify-two-tier-v1.2.1'
-    except Exception as e:
-        logger.error(f"❌ 查詢 Baseline 版本失敗: {str(e)}")
-        return 'dify-two-tier-v1.2.1'
+    logger.warning(f"⚠️ 找不到 Baseline 版本，返回預設值 {DEFAULT_BASELINE_VERSION_CODE}")
+    return DEFAULT_BASELINE_VERSION_CODE
 
 def clear_baseline_version_cache():
     """
-    清除 Baseline 版本緩存
+    清除 Baseline 版本緩存（所有 worker）
     
-    應該在以下情況調用：
-    - VSA 切換版本時（set_baseline API）
-    - 手動重置時
+    DifyConfigVersion 的 post_save signal 已會在交易提交後遞增世代；
+    以 QuerySet.update() 等不觸發 signal 的方式修改時應該調用此函數。
     """
-    _baseline_version_cache['version_code'] = None
-    _baseline_version_cache['last_updated'] = None
+    bump_generation(DIFY_CONFIG_VERSION)
     logger.info("🗑️ Baseline 版本緩存已清除")
 
 # 導入 Library 服務
@@ -94,13 +70,8 @@ try:
         DifyKnowledgeSearchHandler,
         DIFY_KNOWLEDGE_LIBRARY_AVAILABLE
     )
-    # 導入搜索服務
-    from library.data_processing.database_search import (
-        DatabaseSearchService,
-        search_postgres_knowledge  # 獨立函數
-    )
-    from library.rvt_guide.search_service import RVTGuideSearchService
-    from library.protocol_guide.search_service import ProtocolGuideSearchService
+    # 導入搜索服務（服務實例由 service_registry 提供）
+    from library.data_processing.database_search import search_postgres_knowledge  # 獨立函數
     
     # 導入 Know Issue Library
     from library.know_issue import (
@@ -159,10 +130,10 @@ def get_search_functions_registry():
             }
     """
     try:
-        # 創建服務實例
-        db_service = DatabaseSearchService()
-        rvt_service = RVTGuideSearchService()
-        protocol_service = ProtocolGuideSearchService()
+        # 取得共用服務實例（行程內只建立一次，見 service_registry）
+        db_service = get_search_service('database')
+        rvt_service = get_search_service('rvt_guide')
+        protocol_service = get_search_service('protocol_guide')
         
         # 構建搜索函數字典
         search_functions = {
@@ -225,7 +196,7 @@ def search_know_issue_knowledge(query_text, limit=5):
     """
     try:
         if LIBRARIES_AVAILABLE:
-            service = DatabaseSearchService()
+            service = get_search_service('database')
             return service.search_know_issue_knowledge(query_text, limit)
         else:
             logger.warning("DatabaseSearchService 不可用，使用備用實現")
@@ -252,7 +223,7 @@ def search_rvt_guide_knowledge(query_text, limit=5, threshold=0.7):
     """
     try:
         if LIBRARIES_AVAILABLE:
-            service = RVTGuideSearchService()
+            service = get_search_service('rvt_guide')
             # ✅ 傳遞 threshold 參數到底層搜索服務
             return service.search_knowledge(query_text, limit=limit, threshold=threshold)
         else:
@@ -280,7 +251,7 @@ def search_protocol_guide_knowledge(query_text, limit=5, threshold=0.7):
     """
     try:
         if LIBRARIES_AVAILABLE:
-            service = ProtocolGuideSearchService()
+            service = get_search_service('protocol_guide')
             # ✅ 傳遞 threshold 參數到底層搜索服務
             return service.search_knowledge(query_text, limit=limit, threshold=threshold)
         else:
@@ -311,7 +282,7 @@ def search_ocr_storage_benchmark(query_text, limit=5):
             return search_ocr_storage_benchmark_unified(query_text, limit)
         elif LIBRARIES_AVAILABLE:
             # 備用：使用資料庫搜索服務
-            service = DatabaseSearchService()
+            service = get_search_service('database')
             return service.search_ocr_storage_benchmark(query_text, limit)
         else:
             logger.warning("所有搜索服務都不可用，使用最基本備用")
@@ -460,20 +431,12 @@ def dify_knowledge_search(request):
             
             # 步驟 3：載入版本配置
             try:
-                from api.models import DifyConfigVersion
-                version = DifyConfigVersion.objects.get(
-                    version_code=version_code,
-                    is_active=True
-                )
-                version_config = {
-                    'version_code': version.version_code,
-                    'version_name': version.version_name,
-                    'rag_settings': version.rag_settings,
-                    'model_config': version.model_config
-                }
-                logger.info(f"✅ 載入版本配置: {version_code} (Title Boost Stage1={version.rag_settings.get('stage1', {}).get('title_match_bonus', 0)}%, Stage2={version.rag_settings.get('stage2', {}).get('title_match_bonus', 0)}%)")
-            except DifyConfigVersion.DoesNotExist:
-                logger.warning(f"⚠️ 找不到版本: {version_code}，使用預設配置（無 Title Boost）")
+                cached_version = get_config_cache().get_version(version_code)
+                if cached_version:
+                    version_config = cached_version.as_version_config()
+                    logger.info(f"✅ 載入版本配置: {version_code} (Title Boost Stage1={cached_version.rag_settings.get('stage1', {}).get('title_match_bonus', 0)}%, Stage2={cached_version.rag_settings.get('stage2', {}).get('title_match_bonus', 0)}%)")
+                else:
+                    logger.warning(f"⚠️ 找不到版本: {version_code}，使用預設配置（無 Title Boost）")
             except Exception as e:
                 logger.error(f"❌ 載入版本配置失敗: {str(e)}")
             
@@ -830,7 +793,7 @@ def get_baseline_version_info(request):
             }, status=status.HTTP_404_NOT_FOUND)
         
         # 檢查是否使用快取
-        using_cache = bool(_baseline_version_cache.get('version_code'))
+        using_cache = get_config_cache().get_cache_info()['loaded']
         
         return Response({
             'success': True,
@@ -584,11 +584,15 @@ class SearchAlgorithmVersionViewSet(viewsets.ModelViewSet):
         batch_name = request.data.get('batch_name')
         notes = request.data.get('notes', '')
         force_retest = request.data.get('force_retest', False)
+        use_sweep_engine = request.data.get('use_sweep_engine', False)
+        max_workers = request.data.get('max_workers')
         
         if version_ids and not isinstance(version_ids, list):
             return Response({'error': 'version_ids 必須是陣列'}, status=status.HTTP_400_BAD_REQUEST)
         if test_case_ids and not isinstance(test_case_ids, list):
             return Response({'error': 'test_case_ids 必須是陣列'}, status=status.HTTP_400_BAD_REQUEST)
+        if max_workers is not None and (not isinstance(max_workers, int) or max_workers < 1):
+            return Response({'error': 'max_workers 必須是正整數'}, status=status.HTTP_400_BAD_REQUEST)
         
         try:
             tester = BatchVersionTester(verbose=False)
@@ -597,7 +601,9 @@ class SearchAlgorithmVersionViewSet(viewsets.ModelViewSet):
                 test_case_ids=test_case_ids,
                 batch_name=batch_name,
                 notes=notes,
-                force_retest=force_retest
+                force_retest=force_retest,
+                use_sweep_engine=use_sweep_engine,
+                max_workers=max_workers
             )
             
             if not result.get('success'):
@@ -616,3 +622,46 @@ class SearchAlgorithmVersionViewSet(viewsets.ModelViewSet):
             
         except Exception as e:
             return Response({'error': f'批量測試失敗: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @action(detail=False, methods=['post'])
+    def parameter_sweep(self, request):
+        """
+        參數網格搜尋（一次檢索、記憶體重排，不寫入測試記錄）
+        
+        POST /api/benchmark/versions/parameter_sweep/
+        {
+            "base_params": {"strategy": "hybrid_weighted"},
+            "grid": {"section_weight": [0.5, 0.7], "section_threshold": [0.6, 0.7]},
+            "test_case_ids": [1, 2, 3],  // 可選
+            "top_n": 10                  // 可選
+        }
+        """
+        from library.benchmark.sweep_engine import SweepEngine, expand_grid
+        
+        base_params = request.data.get('base_params') or {}
+        grid = request.data.get('grid') or {}
+        test_case_ids = request.data.get('test_case_ids')
+        top_n = request.data.get('top_n')
+        
+        if not isinstance(base_params, dict) or not isinstance(grid, dict):
+            return Response({'error': 'base_params 與 grid 必須是物件'}, status=status.HTTP_400_BAD_REQUEST)
+        if any(not isinstance(values, list) or not values for values in grid.values()):
+            return Response({'error': 'grid 的每個參數必須是非空陣列'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        test_cases = BenchmarkTestCase.objects.filter(is_active=True)
+        if test_case_ids:
+            test_cases = test_cases.filter(id__in=test_case_ids)
+        test_cases = list(test_cases)
+        if not test_cases:
+            return Response({'error': '沒有可用的測試案例'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            ranking = SweepEngine().grid_search(base_params, grid, test_cases, top_n=top_n)
+            return Response({
+                'success': True,
+                'total_combinations': len(expand_grid(base_params, grid)),
+                'total_test_cases': len(test_cases),
+                'ranking': ranking
+            })
+        except Exception as e:
+            return Response({'error': f'參數掃描失敗: {str(e)}'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -36,6 +36,7 @@ from api.serializers import (
 )
 
 from library.dify_benchmark import DifyBatchTester
+from library.dify_benchmark.request_scheduler import DEFAULT_RATE_PER_SECOND
 
 logger = logging.getLogger(__name__)
 
@@ -342,9 +343,13 @@ class DifyConfigVersionViewSet(viewsets.ModelViewSet):
             "notes": "測試備註",            // 可選：備註
             "use_ai_evaluator": false,      // 可選：是否使用 AI 評分（預設 false）
             "use_parallel": true,           // 可選：是否並行執行（預設 true）
-            "max_workers": 5                // 可選：最大並行線程數（預設 5）
+            "max_workers": 5,               // 可選：每個 Dify app key 的最大並行數（預設 5）
+            "rate_per_second": 10           // 可選：全域 Dify 請求速率上限（每秒）
         }
         
+        多版本並行時，所有 (版本, 測試案例) 共用同一個全域佇列，
+        遇到 429 / 5xx 自動降低並行數並退避重試。
+        
         Returns (立即返回，不等待測試完成):
         {
             "success": true,
@@ -363,6 +368,7 @@ class DifyConfigVersionViewSet(viewsets.ModelViewSet):
         # 並行執行參數
         use_parallel = request.data.get('use_parallel', True)
         max_workers = request.data.get('max_workers', 5)
+        rate_per_second = request.data.get('rate_per_second', DEFAULT_RATE_PER_SECOND)
         
         # 驗證參數
         if not batch_id:
@@ -377,6 +383,16 @@ class DifyConfigVersionViewSet(viewsets.ModelViewSet):
                 'error': 'version_ids 必須是版本 ID 列表'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        try:
+            rate_per_second = float(rate_per_second)
+            if rate_per_second <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            return Response({
+                'success': False,
+                'error': 'rate_per_second 必須是正數'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
         logger.info(f"📥 收到批次測試請求: batch_id={batch_id}, version_ids={version_ids}")
         
         # ✅ 定義背景執行函數
@@ -388,7 +404,8 @@ class DifyConfigVersionViewSet(viewsets.ModelViewSet):
                 tester = DifyBatchTester(
                     use_ai_evaluator=use_ai_evaluator,
                     use_parallel=use_parallel,
-                    max_workers=max_workers
+                    max_workers=max_workers,
+                    rate_per_second=rate_per_second
                 )
                 
                 result = tester.run_batch_test(
@@ -433,7 +450,8 @@ class DifyConfigVersionViewSet(viewsets.ModelViewSet):
         ⚠️ 注意：此端點不需要認證（因為 EventSource API 無法傳遞認證資訊）
         安全性由 batch_id 的隨機性保證（類似 UUID）
         
-        更新頻率：每 0.5 秒
+        更新時機：訂閱 Redis 進度推送，有更新即送出（無推送時每 15 秒重送一次）
+        進度存於 Redis，執行批次與處理 SSE 的 worker 不必是同一個行程
         
         SSE 事件格式：
         data: {
@@ -453,7 +471,6 @@ class DifyConfigVersionViewSet(viewsets.ModelViewSet):
         """
         from django.http import StreamingHttpResponse
         from library.dify_benchmark.progress_tracker import progress_tracker
-        import time
         
         batch_id = request.query_params.get('batch_id')
         if not batch_id:
@@ -484,9 +501,8 @@ class DifyConfigVersionViewSet(viewsets.ModelViewSet):
                     yield f'data: {json.dumps(initial_sse)}\n\n'
                     logger.info(f"✅ 已發送初始 SSE 事件，觸發 onopen: batch_id={batch_id}")
                 
-                while True:
-                    # 獲取進度資料
-                    progress_data = progress_tracker.get_progress(batch_id)
+                # 訂閱 Redis 進度推送（有更新才送出，無推送時定期重送作為保活）
+                for progress_data in progress_tracker.subscribe(batch_id):
                     
                     if not progress_data:
                         # ✅ 檢查批次是否已完成（從資料庫查詢）
@@ -539,9 +555,9 @@ class DifyConfigVersionViewSet(viewsets.ModelViewSet):
                                     logger.info(f"✅ 從資料庫恢復完成狀態: batch_id={batch_id}, 版本數={total_tests}")
                                     break
                                 else:
-                                    # 批次還在執行中，但記憶體丟失
-                                    logger.warning(f"⚠️ 批次正在執行但記憶體丟失: batch_id={batch_id}")
-                                    yield f'data: {json.dumps({"error": "Progress lost due to server restart"})}\n\n'
+                                    # 批次未完成且進度資料已過期
+                                    logger.warning(f"⚠️ 批次未完成但進度資料已過期: batch_id={batch_id}")
+                                    yield f'data: {json.dumps({"error": "Progress expired"})}\n\n'
                                     break
                             else:
                                 # 批次確實不存在
@@ -611,9 +627,6 @@ class DifyConfigVersionViewSet(viewsets.ModelViewSet):
                     if progress_data['status'] in ['completed', 'error']:
                         logger.info(f"批次測試完成，關閉 SSE 連接: {batch_id}")
                         break
-                    
-                    # 等待 0.5 秒後再次查詢
-                    time.sleep(0.5)
             
             except GeneratorExit:
                 logger.info(f"客戶端關閉 SSE 連接: {batch_id}")
@@ -632,6 +645,94 @@ class DifyConfigVersionViewSet(viewsets.ModelViewSet):
         response['X-Accel-Buffering'] = 'no'  # 禁用 Nginx 緩衝
         
         return response
+    
+    @action(detail=False, methods=['get'], permission_classes=[])
+    def resumable_batches(self, request):
+        """
+        列出可續跑的批量測試（未完成且沒有行程在執行，例如服務重啟後）
+        
+        GET /api/dify-benchmark/versions/resumable_batches/
+        """
+        from library.dify_benchmark.progress_tracker import progress_tracker
+        
+        batches = [
+            {
+                'batch_id': progress['batch_id'],
+                'batch_name': progress['batch_name'],
+                'status': progress['status'],
+                'completed_tests': progress['completed_tests'],
+                'total_tests': progress['total_tests'],
+                'last_update': progress.get('last_update')
+            }
+            for progress in progress_tracker.get_resumable_batches()
+        ]
+        
+        return Response({
+            'success': True,
+            'batches': batches
+        })
+    
+    @action(detail=False, methods=['post'], permission_classes=[])
+    def resume_batch_test(self, request):
+        """
+        續跑中斷的批量測試（背景執行，立即返回）
+        
+        POST /api/dify-benchmark/versions/resume_batch_test/
+        
+        Body:
+        {
+            "batch_id": "batch_xxx",        // 必填：要續跑的批次 ID
+            "use_parallel": true,           // 可選：是否並行執行（預設 true）
+            "max_workers": 5                // 可選：最大並行線程數（預設 5）
+        }
+        
+        已完成的版本沿用結果，中斷的版本只補跑尚未有結果的測試案例；
+        進度可繼續透過 batch_test_progress（SSE）追蹤。
+        """
+        from library.dify_benchmark.progress_tracker import progress_tracker
+        
+        batch_id = request.data.get('batch_id')
+        if not batch_id:
+            return Response({
+                'success': False,
+                'error': 'batch_id 必填'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        progress = progress_tracker.get_progress(batch_id)
+        if not progress or not progress.get('params'):
+            return Response({
+                'success': False,
+                'error': f'找不到可續跑的批次: {batch_id}'
+            }, status=status.HTTP_404_NOT_FOUND)
+        
+        # 以 SET NX 取得租約：同時送出的續跑請求只有一個能通過
+        if progress['status'] == 'completed' or not progress_tracker.acquire_lease(batch_id):
+            return Response({
+                'success': False,
+                'error': '批次已完成或仍在執行中'
+            }, status=status.HTTP_409_CONFLICT)
+        
+        use_parallel = request.data.get('use_parallel', True)
+        max_workers = request.data.get('max_workers', 5)
+        
+        def resume_in_background():
+            """在背景線程中續跑測試"""
+            try:
+                logger.info(f"🚀 [背景執行] 續跑批次測試: batch_id={batch_id}")
+                tester = DifyBatchTester(use_parallel=use_parallel, max_workers=max_workers)
+                tester.resume_batch_test(batch_id, lease_acquired=True)
+                logger.info(f"✅ [背景執行] 續跑批次測試完成: batch_id={batch_id}")
+            except Exception as e:
+                logger.error(f"❌ [背景執行] 續跑批次測試失敗: batch_id={batch_id}, error={str(e)}", exc_info=True)
+        
+        thread = threading.Thread(target=resume_in_background, daemon=True)
+        thread.start()
+        
+        return Response({
+            'success': True,
+            'batch_id': batch_id,
+            'message': '批量測試已開始續跑，請透過 SSE 追蹤進度'
+        })
 
 
 class DifyBenchmarkTestCaseViewSet(viewsets.ModelViewSet):
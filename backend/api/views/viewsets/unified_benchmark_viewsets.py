@@ -268,7 +268,7 @@ class UnifiedBenchmarkTestCaseViewSet(viewsets.ModelViewSet):
         Request Body:
         {
             "version_ids": [1, 2, 3, 4, 5],  // 可選，預設測試所有啟用版本
-            "force_retest": false            // 可選，是否強制重測（暫不實作快取）
+            "force_retest": false            // 可選，是否強制重測
         }
         
         Response:
@@ -16,6 +16,9 @@
     # 只測試前 10 個案例（快速測試）
     python backend/batch_test_all_versions.py --limit 10
 
+    # 指定並行行程數（預設使用 CPU 核心數；--workers 1 逐版本序列執行）
+    python backend/batch_test_all_versions.py --workers 8
+
 作者：AI Platform Team
 日期：2025-11-23
 """
@@ -79,6 +82,12 @@ def main():
         help='顯示詳細日誌'
     )
     
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='並行行程數（預設 CPU 核心數，1 表示序列執行）'
+    )
+    
     parser.add_argument(
         '--output',
         type=str,
@@ -118,7 +127,8 @@ def main():
         result = batch_test_selected_versions(
             version_ids=version_ids,
             test_case_ids=test_case_ids,
-            verbose=args.verbose
+            verbose=args.verbose,
+            max_workers=args.workers
         )
     else:
         # 測試所有版本
@@ -127,7 +137,8 @@ def main():
         result = batch_test_all_versions(
             test_case_ids=test_case_ids,
             force_retest=args.force,
-            verbose=args.verbose
+            verbose=args.verbose,
+            max_workers=args.workers
         )
     
     # 檢查結果
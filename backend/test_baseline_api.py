@@ -160,26 +160,26 @@ def test_baseline_cache():
     from api.views.dify_knowledge_views import (
         get_baseline_version_code,
         clear_baseline_version_cache,
-        _baseline_version_cache
     )
+    from library.config.versioned_config_cache import get_config_cache
     
     try:
         # 清除快取
         clear_baseline_version_cache()
         print_info("步驟 1: 清除快取")
-        print(f"  快取狀態: {_baseline_version_cache}")
+        print(f"  快取狀態: {get_config_cache().get_cache_info()}")
         
         # 第一次調用（從資料庫讀取）
         print_info("\n步驟 2: 第一次調用 get_baseline_version_code()")
         version_code_1 = get_baseline_version_code()
         print_success(f"返回: {version_code_1}")
-        print(f"  快取狀態: version_code={_baseline_version_cache.get('version_code')}")
+        print(f"  快取狀態: version_code={get_config_cache().get_cache_info()['baseline_version_code']}")
         
         # 第二次調用（從快取讀取）
         print_info("\n步驟 3: 第二次調用 get_baseline_version_code()（應使用快取）")
         version_code_2 = get_baseline_version_code()
         print_success(f"返回: {version_code_2}")
-        print(f"  快取狀態: {_baseline_version_cache.get('version_code')}")
+        print(f"  快取狀態: {get_config_cache().get_cache_info()['baseline_version_code']}")
         
         # 驗證一致性
         if version_code_1 == version_code_2:
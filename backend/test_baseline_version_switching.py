@@ -35,8 +35,8 @@ from api.models import DifyConfigVersion
 from api.views.dify_knowledge_views import (
     get_baseline_version_code,
     clear_baseline_version_cache,
-    _baseline_version_cache
 )
+from library.config.versioned_config_cache import get_config_cache
 
 
 class Colors:
@@ -148,22 +148,22 @@ def test_cache_mechanism():
     # 清除緩存
     clear_baseline_version_cache()
     print_info("緩存已清除")
-    print_info(f"緩存狀態: {_baseline_version_cache}")
+    print_info(f"緩存狀態: {get_config_cache().get_cache_info()}")
     
     # 第一次調用（應該查詢資料庫）
     print_info("\n第一次調用 get_baseline_version_code()...")
     result1 = get_baseline_version_code()
     print_info(f"返回版本: {result1}")
-    print_info(f"緩存狀態: {_baseline_version_cache}")
+    print_info(f"緩存狀態: {get_config_cache().get_cache_info()}")
     
     # 第二次調用（應該使用緩存）
     print_info("\n第二次調用 get_baseline_version_code()...")
     result2 = get_baseline_version_code()
     print_info(f"返回版本: {result2}")
-    print_info(f"緩存狀態: {_baseline_version_cache}")
+    print_info(f"緩存狀態: {get_config_cache().get_cache_info()}")
     
     # 驗證結果
-    if result1 == result2 and _baseline_version_cache['version_code'] == result1:
+    if result1 == result2 and get_config_cache().get_cache_info()['baseline_version_code'] == result1:
         print_success("測試通過：緩存機制正常工作")
         return True
     else:
@@ -177,15 +177,18 @@ def test_cache_clearing():
     
     # 確保緩存有值
     get_baseline_version_code()
-    print_info(f"調用前緩存狀態: {_baseline_version_cache}")
+    before = get_config_cache().get_cache_info()
+    print_info(f"調用前緩存狀態: {before}")
     
-    # 清除緩存
+    # 清除緩存（遞增設定世代，下次讀取時重新載入）
     clear_baseline_version_cache()
     print_info("調用 clear_baseline_version_cache()")
-    print_info(f"調用後緩存狀態: {_baseline_version_cache}")
+    get_baseline_version_code()
+    after = get_config_cache().get_cache_info()
+    print_info(f"重新讀取後緩存狀態: {after}")
     
     # 驗證結果
-    if _baseline_version_cache['version_code'] is None:
+    if after['generations'] != before['generations']:
         print_success("測試通過：緩存已清除")
         return True
     else:
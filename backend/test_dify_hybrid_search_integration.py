@@ -150,11 +150,12 @@ print("\n\n🔍 步驟 4：檢查 Baseline 版本緩存")
 print("-" * 80)
 
 try:
-    from backend.api.views.dify_knowledge_views import get_baseline_version_code, _baseline_version_cache
+    from backend.api.views.dify_knowledge_views import get_baseline_version_code
+    from library.config.versioned_config_cache import get_config_cache
     
     baseline_code = get_baseline_version_code()
     print(f"✅ Baseline 版本代碼: {baseline_code}")
-    print(f"   緩存狀態: {_baseline_version_cache}")
+    print(f"   緩存狀態: {get_config_cache().get_cache_info()}")
     
     if baseline_code != 'dify-two-tier-v1.2.2':
         print(f"\n⚠️  警告：Baseline 版本不是 v1.2.2！")
@@ -17,6 +17,7 @@ try:
     from .api_handlers import (
         AIOCRAPIHandler,
         dify_ocr_chat_api,
+        dify_ocr_chat_stream_api,
         dify_chat_with_file_api,
         dify_ocr_storage_benchmark_search_api
     )
@@ -89,6 +90,7 @@ except ImportError as e:
     # 設定所有組件為 None
     AIOCRAPIHandler = None
     dify_ocr_chat_api = None
+    dify_ocr_chat_stream_api = None
     dify_chat_with_file_api = None
     dify_ocr_storage_benchmark_search_api = None
     OCRTestClassViewSetManager = None
@@ -162,6 +164,7 @@ __all__ = [
     # 核心組件
     'AIOCRAPIHandler',
     'dify_ocr_chat_api',
+    'dify_ocr_chat_stream_api',
     'dify_chat_with_file_api', 
     'dify_ocr_storage_benchmark_search_api',
     'OCRTestClassViewSetManager',
@@ -191,6 +191,69 @@ class AIOCRAPIHandler:
                 'error': f'AI OCR 服務器錯誤: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    @staticmethod
+    def handle_dify_ocr_chat_stream_api(request):
+        """
+        處理 Dify OCR 聊天 API 的 streaming 版本（Server-Sent Events）
+        
+        Dify 的回答片段到達即轉送；對話已過期時與 blocking 版本相同，改為開新對話重試。
+        """
+        from library.dify_integration import DifyChatClient
+        from library.dify_integration.stream_relay import (
+            StreamAccumulator, build_stream_result, relay_answer, sse_response
+        )
+        
+        logger.info(f"Dify OCR chat stream request from: {request.META.get('REMOTE_ADDR')}")
+        
+        data = request.data
+        message = data.get('message', '').strip()
+        conversation_id = data.get('conversation_id', '')
+        
+        if not message:
+            return sse_response([{'event': 'error', 'error': '訊息內容不能為空'}], status=400)
+        
+        try:
+            from library.config.dify_config_manager import get_report_analyzer_config
+            dify_config = get_report_analyzer_config()
+        except Exception as config_error:
+            logger.error(f"Failed to load Report Analyzer 3 config: {config_error}")
+            return sse_response([{'event': 'error', 'error': f'AI OCR 配置載入失敗: {str(config_error)}'}], status=500)
+        
+        if not dify_config.api_url or not dify_config.api_key:
+            return sse_response([{'event': 'error', 'error': 'AI OCR API 配置不完整'}], status=500)
+        
+        client = DifyChatClient(api_url=dify_config.api_url, api_key=dify_config.api_key)
+        user = f"ocr_user_{request.user.id if request.user.is_authenticated else 'guest'}"
+        
+        def events():
+            start_time = time.time()
+            accumulator = StreamAccumulator(start_time)
+            yield from relay_answer(
+                client.stream_chat_events(message, conversation_id=conversation_id, user=user),
+                accumulator
+            )
+            
+            warning = None
+            if conversation_id and 'Conversation Not Exists' in (accumulator.error or ''):
+                logger.warning("AI OCR conversation not exists, retrying without conversation_id")
+                warning = '原對話已過期，已開始新對話'
+                accumulator = StreamAccumulator(start_time)
+                yield from relay_answer(client.stream_chat_events(message, user=user), accumulator)
+            
+            if accumulator.error or not accumulator.finished:
+                error_msg = f"AI OCR API 錯誤: {accumulator.error or '串流中斷'}"
+                logger.error(f"AI OCR chat stream error: {error_msg}")
+                yield {'event': 'error', 'error': error_msg}
+                return
+            
+            logger.info(f"AI OCR chat stream success: {message[:50]}...")
+            result = build_stream_result(accumulator, '', start_time, success=True)
+            if warning:
+                result['warning'] = warning
+            yield {'event': 'message_end', **result}
+        
+        return sse_response(events())
+    
     @staticmethod
     def handle_dify_chat_with_file_api(request):
         """
@@ -460,6 +523,16 @@ def dify_ocr_chat_api(request):
     return AIOCRAPIHandler.handle_dify_ocr_chat_api(request)
 
 
+def dify_ocr_chat_stream_api(request):
+    """
+    便利函數：Dify OCR 聊天 API（Server-Sent Events）
+    
+    可以直接在 views.py 中使用：
+    from library.ai_ocr.api_handlers import dify_ocr_chat_stream_api
+    """
+    return AIOCRAPIHandler.handle_dify_ocr_chat_stream_api(request)
+
+
 def dify_chat_with_file_api(request):
     """
     便利函數：Dify 檔案分析 API
@@ -7,13 +7,15 @@ class BatchVersionTester:
     def __init__(self, verbose=False):
         self.verbose = verbose
 
-    def run_batch_test(self, version_ids=None, test_case_ids=None, batch_name=None, notes="", force_retest=False):
+    def run_batch_test(self, version_ids=None, test_case_ids=None, batch_name=None, notes="", force_retest=False,
+                       use_sweep_engine=False, max_workers=None):
         from api.models import SearchAlgorithmVersion, BenchmarkTestCase
+        from library.benchmark.parallel_executor import default_worker_count
         batch_id = datetime.now().strftime("%Y%m%d_%H%M%S")
         if not batch_name:
             batch_name = "批量測試 " + datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        versions = self._prepare_versions(version_ids, force_retest, test_case_ids)
+        versions = self._prepare_versions(version_ids)
         if not versions:
             return {"success": False, "error": "沒有版本需要測試", "batch_id": batch_id}
         
@@ -24,10 +26,26 @@ class BatchVersionTester:
         print("準備測試 " + str(len(versions)) + " 個版本，" + str(len(test_cases)) + " 個測試案例")
         test_runs, test_run_ids, start_time = [], [], datetime.now()
         
+        # 結果快取：未變更的 (版本, 案例) 配對沿用既有結果；force_retest 時全部重新搜尋
+        result_cache = None if force_retest or use_sweep_engine else self._prepare_result_cache()
+        
+        if use_sweep_engine:
+            # 一次檢索、多次重排：所有版本共用每個測試案例的候選池
+            test_runs = self._run_sweep_versions_test(versions, test_cases, batch_id, batch_name, notes)
+            test_run_ids = [t.id for t in test_runs]
+            versions = []
+        elif default_worker_count(max_workers, len(versions) * len(test_cases)) > 1:
+            # 多行程並行（未指定 max_workers 時使用 CPU 核心數，max_workers=1 逐版本執行）：
+            # (版本, 測試案例) 配對並行執行，報告依版本順序
+            test_runs = self._run_parallel_versions_test(versions, test_cases, batch_id, batch_name, notes, max_workers,
+                                                         result_cache)
+            test_run_ids = [t.id for t in test_runs]
+            versions = []
+        
         for idx, version in enumerate(versions, 1):
             print("測試版本 " + str(idx) + "/" + str(len(versions)) + ": " + version.version_name)
             try:
-                test_run = self._run_single_version_test(version, test_cases, batch_id, batch_name, notes)
+                test_run = self._run_single_version_test(version, test_cases, batch_id, batch_name, notes, result_cache)
                 test_runs.append(test_run)
                 test_run_ids.append(test_run.id)
                 print("  完成")
@@ -45,19 +63,27 @@ class BatchVersionTester:
             "summary": self._generate_summary(test_runs, test_cases, execution_time)
         }
 
-    def _prepare_versions(self, version_ids, force_retest, test_case_ids):
+    def _prepare_versions(self, version_ids):
         from api.models import SearchAlgorithmVersion
         if version_ids:
             return list(SearchAlgorithmVersion.objects.filter(id__in=version_ids))
         return list(SearchAlgorithmVersion.objects.all())
 
+    def _prepare_result_cache(self):
+        from library.benchmark.result_cache import BenchmarkResultCache
+        try:
+            return BenchmarkResultCache()
+        except Exception as e:
+            logger.warning("無法計算知識庫版次，停用結果快取: " + str(e))
+            return None
+
     def _prepare_test_cases(self, test_case_ids):
         from api.models import BenchmarkTestCase
         if test_case_ids:
             return list(BenchmarkTestCase.objects.filter(id__in=test_case_ids, is_active=True))
         return list(BenchmarkTestCase.objects.filter(is_active=True))
 
-    def _run_single_version_test(self, version, test_cases, batch_id, batch_name, notes):
+    def _run_single_version_test(self, version, test_cases, batch_id, batch_name, notes, result_cache=None):
         from library.benchmark.test_runner import BenchmarkTestRunner
         runner = BenchmarkTestRunner(version_id=version.id, verbose=self.verbose)
         
@@ -70,9 +96,48 @@ class BatchVersionTester:
             test_cases=test_cases, 
             run_name=batch_name + " - " + version.version_name, 
             run_type="batch_comparison", 
-            notes=batch_notes
+            notes=batch_notes,
+            result_cache=result_cache
         )
 
+    def _run_parallel_versions_test(self, versions, test_cases, batch_id, batch_name, notes, max_workers,
+                                    result_cache=None):
+        from library.benchmark.parallel_executor import ParallelBenchmarkExecutor
+        executor = ParallelBenchmarkExecutor(max_workers=max_workers, verbose=self.verbose)
+        
+        batch_notes = "批次 ID: " + batch_id
+        if notes:
+            batch_notes = batch_notes + "\n" + notes
+        
+        return executor.run(
+            versions, test_cases,
+            run_names=[batch_name + " - " + v.version_name for v in versions],
+            run_type="batch_comparison",
+            notes=batch_notes,
+            result_cache=result_cache
+        )
+
+    def _run_sweep_versions_test(self, versions, test_cases, batch_id, batch_name, notes):
+        from library.benchmark.sweep_engine import SweepEngine
+        engine = SweepEngine(verbose=self.verbose)
+        
+        batch_notes = "批次 ID: " + batch_id + "\n評估方式: 參數掃描引擎（一次檢索、記憶體重排）"
+        if notes:
+            batch_notes = batch_notes + "\n" + notes
+        
+        summaries = engine.evaluate({v.id: (v.parameters or {}) for v in versions}, test_cases)
+        test_runs = []
+        for version in versions:
+            summary = summaries[version.id]
+            print("版本 " + version.version_name + ": " + str(summary["overall_score"]) +
+                  "（exact 比例 " + str(summary["exact_ratio"]) + "）")
+            test_runs.append(engine.save_test_run(
+                version, summary,
+                run_name=batch_name + " - " + version.version_name,
+                notes=batch_notes
+            ))
+        return test_runs
+
     def _generate_comparison(self, test_runs):
         vdata = []
         for t in test_runs:
@@ -89,17 +154,25 @@ class BatchVersionTester:
         return {"versions": vdata, "ranking": rank, "best_version": best, "trade_offs": []}
 
     def _generate_summary(self, test_runs, test_cases, execution_time):
+        from api.models import BenchmarkTestResult
+        cached = BenchmarkTestResult.objects.filter(
+            test_run__in=test_runs, detailed_results__has_key="cached_from_run"
+        ).count() if test_runs else 0
         return {
             "total_versions_tested": len(test_runs), 
             "total_test_cases": len(test_cases), 
-            "total_tests_executed": len(test_runs) * len(test_cases), 
+            "total_tests_executed": len(test_runs) * len(test_cases) - cached, 
+            "total_tests_cached": cached, 
             "execution_time": execution_time
         }
 
-def batch_test_all_versions(test_case_ids=None, force_retest=False, verbose=False):
+def batch_test_all_versions(test_case_ids=None, force_retest=False, verbose=False, max_workers=None):
     tester = BatchVersionTester(verbose=verbose)
-    return tester.run_batch_test(version_ids=None, test_case_ids=test_case_ids, force_retest=force_retest)
+    return tester.run_batch_test(version_ids=None, test_case_ids=test_case_ids, force_retest=force_retest,
+                                 max_workers=max_workers)
 
-def batch_test_selected_versions(version_ids, test_case_ids=None, batch_name=None, notes="", verbose=False):
+def batch_test_selected_versions(version_ids, test_case_ids=None, batch_name=None, notes="", verbose=False,
+                                 max_workers=None):
     tester = BatchVersionTester(verbose=verbose)
-    return tester.run_batch_test(version_ids=version_ids, test_case_ids=test_case_ids, batch_name=batch_name, notes=notes)
+    return tester.run_batch_test(version_ids=version_ids, test_case_ids=test_case_ids, batch_name=batch_name, notes=notes,
+                                 max_workers=max_workers)
@@ -0,0 +1,232 @@
+"""
+Parallel Benchmark Executor - 多行程並行基準測試執行器
+
+BatchVersionTester 逐版本、BenchmarkTestRunner 逐案例執行，整體耗時等於所有搜尋的總和。
+此執行器將 (版本, 測試案例) 配對分派到行程池並行執行：
+
+- 行程數預設等於 CPU 核心數（上限 MAX_WORKERS）
+- 以 spawn 啟動子行程：每個子行程各自 django.setup()、擁有獨立的資料庫連線，
+  並在初始化時預載嵌入模型（避免 fork 已使用 torch 的父行程造成死鎖）
+- 結果以 as_completed 串流回父行程，交給 BenchmarkResultSink 每累積 chunk_size 筆
+  以 bulk_create 提交一次，同時更新各 BenchmarkTestRun 的進度
+- 最終彙總依「版本順序 × 測試案例順序」計算，與完成先後無關，報告結果固定
+- 提供 result_cache 時，快取命中的配對直接沿用既有結果，只派送失效的配對
+
+Usage:
+    from library.benchmark.parallel_executor import ParallelBenchmarkExecutor
+
+    executor = ParallelBenchmarkExecutor(max_workers=8)
+    test_runs = executor.run(versions, test_cases, run_names=[...], run_type='batch_comparison')
+"""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .result_sink import BenchmarkResultSink
+
+logger = logging.getLogger(__name__)
+
+# 行程數上限（每個行程各自載入嵌入模型並佔用一條資料庫連線）
+MAX_WORKERS = 16
+
+# 每次提交的結果筆數
+DEFAULT_CHUNK_SIZE = 50
+
+# 子行程內快取（每個行程各自一份）
+_worker_runners: Dict[int, Any] = {}
+_worker_test_cases: Dict[int, Any] = {}
+
+
+def _init_worker(torch_threads: int):
+    """子行程初始化：Django、資料庫連線、torch 執行緒數、預載嵌入模型"""
+    import django
+    django.setup()
+
+    from django.db import connections
+    connections.close_all()
+
+    try:
+        import torch
+        torch.set_num_threads(torch_threads)
+    except ImportError:
+        pass
+
+    try:
+        from api.services.embedding_service import get_embedding_service
+        get_embedding_service('ultra_high').model
+    except Exception as e:
+        logger.warning(f"子行程預載嵌入模型失敗，改為首次搜尋時載入: {e}")
+
+
+def _run_pair(seq: int, version_id: int, test_case_id: int) -> Tuple[int, Dict[str, Any]]:
+    """子行程：執行單一 (版本, 測試案例)，回傳可序列化的結果"""
+    from api.models import BenchmarkTestCase
+    from library.benchmark.test_runner import BenchmarkTestRunner
+
+    runner = _worker_runners.get(version_id)
+    if runner is None:
+        runner = _worker_runners[version_id] = BenchmarkTestRunner(version_id=version_id)
+
+    test_case = _worker_test_cases.get(test_case_id)
+    if test_case is None:
+        test_case = _worker_test_cases[test_case_id] = BenchmarkTestCase.objects.get(id=test_case_id)
+
+    result = runner.run_single_test(test_case)
+    result.pop('test_case', None)
+    return seq, result
+
+
+def failed_result(test_case, error: str = '') -> Dict[str, Any]:
+    """子行程異常時的失敗結果（格式同 run_single_test 的失敗分支）"""
+    return {'search_query': test_case.question, 'is_passed': False, 'error': error,
+            'precision': 0, 'recall': 0, 'f1_score': 0, 'ndcg': 0, 'speed_score': 0,
+            'overall_score': 0, 'true_positives': 0, 'false_positives': 0,
+            'false_negatives': len(test_case.expected_document_ids), 'response_time': 0,
+            'returned_document_ids': [], 'returned_document_scores': []}
+
+
+def plan_pairs(version_ids: List[int], test_case_ids: List[int]) -> List[Tuple[int, int, int]]:
+    """
+    產生 (seq, version_id, test_case_id) 配對
+
+    seq = 版本索引 × 案例數 + 案例索引，用於還原固定順序
+    """
+    n = len(test_case_ids)
+    return [
+        (vi * n + ci, version_id, test_case_id)
+        for vi, version_id in enumerate(version_ids)
+        for ci, test_case_id in enumerate(test_case_ids)
+    ]
+
+
+def default_worker_count(max_workers: Optional[int] = None, total_pairs: Optional[int] = None) -> int:
+    """行程數：預設 CPU 核心數，受 MAX_WORKERS 與配對數限制"""
+    workers = max_workers or os.cpu_count() or 1
+    workers = min(workers, MAX_WORKERS)
+    if total_pairs is not None:
+        workers = min(workers, total_pairs)
+    return max(1, workers)
+
+
+class ParallelBenchmarkExecutor:
+    """多行程並行基準測試執行器"""
+
+    def __init__(self, max_workers: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 verbose: bool = False):
+        """
+        Args:
+            max_workers: 行程數（預設 CPU 核心數）
+            chunk_size: 每次 bulk_create 提交的結果筆數
+            verbose: 是否輸出進度
+        """
+        self.max_workers = max_workers
+        self.chunk_size = max(1, chunk_size)
+        self.verbose = verbose
+
+    def _log(self, msg: str):
+        if self.verbose:
+            print(msg, flush=True)
+
+    def run(self, versions, test_cases, run_names: List[str], run_type: str = 'batch_comparison',
+            notes: str = '', on_result: Optional[Callable[[Any, Any, Dict[str, Any]], None]] = None,
+            result_cache=None):
+        """
+        並行執行所有 (版本, 測試案例)
+
+        Args:
+            versions: SearchAlgorithmVersion 列表（決定報告順序）
+            test_cases: BenchmarkTestCase 列表（決定每個版本內的結果順序）
+            run_names: 與 versions 對應的測試執行名稱
+            run_type: BenchmarkTestRun.run_type
+            notes: 備註
+            on_result: 每完成一筆即呼叫 on_result(version, test_case, result)
+            result_cache: BenchmarkResultCache（提供時重用快取命中的結果，並為新結果記錄快取鍵）
+
+        Returns:
+            List[BenchmarkTestRun]: 與 versions 同順序
+        """
+        from django.utils import timezone
+        from api.models import BenchmarkTestRun
+        from library.benchmark.test_runner import BenchmarkTestRunner
+
+        versions, test_cases = list(versions), list(test_cases)
+        now = timezone.now()
+        test_runs = [
+            BenchmarkTestRun.objects.create(
+                version=version, run_name=run_name, run_type=run_type, notes=notes,
+                total_test_cases=len(test_cases), status='running', started_at=now)
+            for version, run_name in zip(versions, run_names)
+        ]
+        if not versions or not test_cases:
+            return [BenchmarkTestRunner.finalize_test_run(t, []) for t in test_runs]
+
+        n_cases = len(test_cases)
+        cached = result_cache.lookup(versions, test_cases) if result_cache else {}
+        results: Dict[int, Dict[str, Any]] = {}
+        pairs = []
+        for seq, vid, tcid in plan_pairs([v.id for v in versions], [tc.id for tc in test_cases]):
+            if (vid, tcid) in cached:
+                results[seq] = cached[(vid, tcid)]
+            else:
+                pairs.append((seq, vid, tcid))
+
+        workers = default_worker_count(self.max_workers, len(pairs))
+        torch_threads = max(1, (os.cpu_count() or 1) // workers)
+
+        self._log(f"⚡ 並行測試 {len(versions)} 個版本 × {n_cases} 個案例"
+                  f"（快取 {len(results)} 筆，{workers} 個行程）")
+
+        with BenchmarkResultSink(batch_size=self.chunk_size) as sink:
+            for seq, result in results.items():
+                vi, ci = divmod(seq, n_cases)
+                sink.put(test_runs[vi].id, test_cases[ci].id, result)
+                if on_result:
+                    on_result(versions[vi], test_cases[ci], result)
+            if pairs:
+                self._run_pairs(pairs, versions, test_cases, test_runs, results, sink, workers, torch_threads,
+                                on_result, result_cache)
+
+        # 依案例順序彙總，確保結果固定
+        for vi, test_run in enumerate(test_runs):
+            ordered = [results[vi * n_cases + ci] for ci in range(n_cases)]
+            BenchmarkTestRunner.finalize_test_run(test_run, ordered)
+        return test_runs
+
+    def _run_pairs(self, pairs, versions, test_cases, test_runs, results, sink, workers, torch_threads,
+                   on_result, result_cache):
+        """以行程池執行配對，結果寫入 results 並交給 sink"""
+        n_cases = len(test_cases)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(torch_threads,)
+        ) as pool:
+            futures = {pool.submit(_run_pair, seq, vid, tcid): seq for seq, vid, tcid in pairs}
+            for done, future in enumerate(as_completed(futures), 1):
+                seq = futures[future]
+                vi, ci = divmod(seq, n_cases)
+                try:
+                    _, result = future.result()
+                except Exception as e:
+                    logger.exception(f"並行測試失敗 (version={versions[vi].id}, test_case={test_cases[ci].id}): {e}")
+                    result = failed_result(test_cases[ci], str(e))
+
+                if result_cache and 'error' not in result:
+                    result['cache_key'] = result_cache.key(versions[vi], test_cases[ci])
+                results[seq] = result
+                sink.put(test_runs[vi].id, test_cases[ci].id, result)
+                if on_result:
+                    on_result(versions[vi], test_cases[ci], result)
+                self._log(f"  [{done}/{len(pairs)}] {versions[vi].version_name} | {test_cases[ci].question[:30]}...")
+
+
+__all__ = [
+    'ParallelBenchmarkExecutor',
+    'plan_pairs',
+    'default_worker_count',
+    'MAX_WORKERS',
+]
@@ -0,0 +1,184 @@
+"""
+Benchmark Result Cache - 以 (版本配置, 測試案例, 知識庫版次) 雜湊重用既有測試結果
+
+批量測試修改一個測試案例後重跑，原本會重新執行所有「版本 × 案例」配對。
+此模組為每個配對計算穩定的快取鍵：
+
+    cache_key = sha256(CACHE_SCHEMA_VERSION, 版本 parameters, 測試案例內容, 知識庫版次)
+
+- 版本 parameters：以排序鍵的 JSON 雜湊，與欄位順序無關
+- 測試案例內容：question、expected_document_ids、min_required_matches（影響搜尋與評分的欄位）
+- 知識庫版次：protocol_guide 與其向量表（document_embeddings / document_section_embeddings）
+  的 MAX(updated_at) 與筆數（筆數涵蓋刪除）
+
+新結果寫入 BenchmarkTestResult.cache_key；下次執行時鍵相同的配對直接沿用已完成 Test Run
+的結果（以回傳文檔重新計算指標），只有失效的配對需要重新搜尋。
+搜尋或評分邏輯變更時調高 CACHE_SCHEMA_VERSION 使全部快取失效。
+
+Usage:
+    from library.benchmark.result_cache import BenchmarkResultCache
+
+    cache = BenchmarkResultCache()
+    cached = cache.lookup(versions, test_cases)   # {(version_id, test_case_id): result}
+"""
+
+import hashlib
+import json
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .scoring_engine import ScoringEngine
+
+logger = logging.getLogger(__name__)
+
+# 搜尋 / 評分邏輯變更時調高，使既有快取全部失效
+CACHE_SCHEMA_VERSION = 1
+
+# Benchmark 搜尋的知識庫來源與其向量表
+CORPUS_SOURCE_TABLE = 'protocol_guide'
+CORPUS_EMBEDDING_TABLES = ('document_embeddings', 'document_section_embeddings')
+
+# run_single_test 計算指標時的 top_k
+TOP_K = 10
+
+
+def stable_hash(payload: Any) -> str:
+    """排序鍵的 JSON 的 SHA-256（dict 鍵順序不影響結果）"""
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def version_fingerprint(version) -> str:
+    """版本搜尋參數的雜湊"""
+    return stable_hash(version.parameters or {})
+
+
+def test_case_fingerprint(test_case) -> str:
+    """測試案例中影響搜尋與評分的內容雜湊"""
+    return stable_hash({
+        'question': test_case.question,
+        'expected_document_ids': test_case.expected_document_ids or [],
+        'min_required_matches': test_case.min_required_matches,
+    })
+
+
+def corpus_revision(source_table: str = CORPUS_SOURCE_TABLE) -> str:
+    """
+    知識庫版次：來源表與向量表的 MAX(updated_at) 與筆數
+
+    任一文檔或向量新增、修改、刪除都會改變版次。
+    """
+    from django.db import connection
+
+    parts = [f"(SELECT MAX(updated_at) FROM {source_table})", f"(SELECT COUNT(*) FROM {source_table})"]
+    params: List[str] = []
+    for table in CORPUS_EMBEDDING_TABLES:
+        parts.append(f"(SELECT MAX(updated_at) FROM {table} WHERE source_table = %s)")
+        parts.append(f"(SELECT COUNT(*) FROM {table} WHERE source_table = %s)")
+        params.extend([source_table, source_table])
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT " + ", ".join(parts), params)
+        row = cursor.fetchone()
+    return stable_hash(list(row))
+
+
+def result_cache_key(version_hash: str, test_case_hash: str, corpus_rev: str) -> str:
+    """組合配對的快取鍵"""
+    return stable_hash([CACHE_SCHEMA_VERSION, version_hash, test_case_hash, corpus_rev])
+
+
+def result_from_record(record, test_case) -> Dict[str, Any]:
+    """
+    由已儲存的 BenchmarkTestResult 還原 run_single_test 格式的結果
+
+    以回傳文檔與（內容未變的）預期文檔重新計算指標，speed_score 等未儲存的欄位也一併還原。
+    """
+    response_time = float(record.response_time or 0)
+    metrics = ScoringEngine.calculate_all_metrics(
+        record.returned_document_ids, test_case.expected_document_ids, response_time, TOP_K
+    )
+    return {
+        'test_case': test_case,
+        'search_query': record.search_query,
+        'returned_document_ids': record.returned_document_ids,
+        'returned_document_scores': record.returned_document_scores,
+        'response_time': response_time,
+        'stage_timings': record.stage_timings or {},
+        'is_passed': metrics['true_positives'] >= test_case.min_required_matches,
+        'cache_key': record.cache_key,
+        'cached_from_run': record.test_run_id,
+        **metrics,
+    }
+
+
+class BenchmarkResultCache:
+    """
+    Benchmark 結果快取（持久化於 BenchmarkTestResult.cache_key）
+
+    知識庫版次於建立時計算一次，同一批次內所有配對共用。
+    """
+
+    def __init__(self, corpus_rev: Optional[str] = None):
+        """
+        Args:
+            corpus_rev: 知識庫版次（預設查詢資料庫）
+        """
+        self.corpus_revision = corpus_rev if corpus_rev is not None else corpus_revision()
+        self._version_hashes: Dict[int, str] = {}
+        self._test_case_hashes: Dict[int, str] = {}
+
+    def key(self, version, test_case) -> str:
+        """(版本, 測試案例) 的快取鍵"""
+        version_hash = self._version_hashes.get(version.id)
+        if version_hash is None:
+            version_hash = self._version_hashes[version.id] = version_fingerprint(version)
+        case_hash = self._test_case_hashes.get(test_case.id)
+        if case_hash is None:
+            case_hash = self._test_case_hashes[test_case.id] = test_case_fingerprint(test_case)
+        return result_cache_key(version_hash, case_hash, self.corpus_revision)
+
+    def lookup(self, versions: Iterable, test_cases: Iterable) -> Dict[Tuple[int, int], Dict[str, Any]]:
+        """
+        查詢可重用的結果
+
+        Returns:
+            {(version_id, test_case_id): result}（只包含命中的配對）
+        """
+        from api.models import BenchmarkTestResult
+
+        test_cases = list(test_cases)
+        pairs_by_key: Dict[str, List[Tuple[Any, Any]]] = {}
+        for version in versions:
+            for test_case in test_cases:
+                pairs_by_key.setdefault(self.key(version, test_case), []).append((version, test_case))
+        if not pairs_by_key:
+            return {}
+
+        # 每個鍵取最新一筆已完成 Test Run 的結果
+        records = (
+            BenchmarkTestResult.objects
+            .filter(cache_key__in=list(pairs_by_key), test_run__status='completed')
+            .order_by('cache_key', '-id')
+            .distinct('cache_key')
+        )
+
+        cached = {}
+        for record in records:
+            for version, test_case in pairs_by_key[record.cache_key]:
+                cached[(version.id, test_case.id)] = result_from_record(record, test_case)
+
+        logger.info(f"Benchmark 結果快取: 命中 {len(cached)}/{sum(len(p) for p in pairs_by_key.values())} 個配對")
+        return cached
+
+
+__all__ = [
+    'BenchmarkResultCache',
+    'CACHE_SCHEMA_VERSION',
+    'corpus_revision',
+    'result_cache_key',
+    'result_from_record',
+    'stable_hash',
+    'test_case_fingerprint',
+    'version_fingerprint',
+]
@@ -0,0 +1,232 @@
+"""
+Result Sink - 測試結果緩衝寫入器
+
+測試執行器原本每個案例各自 objects.create（Dify 測試還要再建立一筆評分記錄），
+並在每筆完成後重新儲存整筆測試執行統計；max_workers=20 時大量往返與列鎖互相競爭。
+
+BufferedResultSink：
+- 工作執行緒只呼叫 put() 推入佇列，不直接碰資料庫
+- 單一寫入執行緒依「筆數 / 時間」觸發，以 bulk_create 批次寫入
+- 每批寫入後以 UPDATE 增量更新測試執行的統計欄位
+- 批次寫入失敗時逐筆重試，單筆壞資料不會拖垮整批
+- background=False 時在呼叫端執行緒同步寫入（保留外層 transaction.atomic 語意）
+
+Usage:
+    from library.benchmark.result_sink import BenchmarkResultSink
+
+    with BenchmarkResultSink() as sink:
+        sink.put(test_run.id, test_case.id, result)
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 預設每批筆數與最長等待秒數
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_INTERVAL = 2.0
+
+# 佇列上限（寫入落後時讓工作執行緒等待，避免記憶體無限成長）
+DEFAULT_MAX_QUEUE_SIZE = 1000
+
+_STOP = object()
+
+
+class BufferedResultSink:
+    """
+    緩衝寫入器基底類別
+
+    子類實作 write_batch(items)：在一個交易內寫入一批資料並更新統計。
+    """
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 background: bool = True,
+                 max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE):
+        """
+        Args:
+            batch_size: 累積幾筆觸發寫入
+            flush_interval: 距上次寫入超過幾秒觸發寫入
+            background: True 使用獨立寫入執行緒；False 在 put() 的執行緒同步寫入
+            max_queue_size: 背景模式的佇列上限
+        """
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.background = background
+
+        self.written_count = 0
+        self.failed_count = 0
+        self.batch_count = 0
+
+        self._buffer: List[Any] = []
+        self._last_flush = time.monotonic()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._writer: Optional[threading.Thread] = None
+
+        if background:
+            self._queue = queue.Queue(maxsize=max_queue_size)
+            self._start_writer()
+
+    # ------------------------------------------------------------
+    # 公開介面
+    # ------------------------------------------------------------
+
+    def put_item(self, item: Any):
+        """推入一筆待寫入資料"""
+        if self._closed:
+            raise RuntimeError(f"{type(self).__name__} 已關閉")
+        if self.background:
+            self._queue.put(item)
+            return
+        with self._lock:
+            self._buffer.append(item)
+            if self._should_flush():
+                self._flush_buffer()
+
+    def flush(self):
+        """立即寫入同步模式下的緩衝資料（背景模式由寫入執行緒處理）"""
+        if not self.background:
+            with self._lock:
+                self._flush_buffer()
+
+    def close(self):
+        """寫入剩餘資料並停止寫入執行緒"""
+        if self._closed:
+            return
+        self._closed = True
+        if self.background:
+            self._queue.put(_STOP)
+            self._writer.join()
+        else:
+            self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def write_batch(self, items: List[Any]):
+        """寫入一批資料（子類實作）"""
+        raise NotImplementedError
+
+    # ------------------------------------------------------------
+    # 內部
+    # ------------------------------------------------------------
+
+    def _start_writer(self):
+        self._writer = threading.Thread(
+            target=self._writer_loop, name=f"{type(self).__name__}-writer", daemon=True
+        )
+        self._writer.start()
+
+    def _next_item(self, timeout: float) -> Any:
+        """寫入執行緒取下一筆資料（逾時拋出 queue.Empty）"""
+        return self._queue.get(timeout=timeout)
+
+    def _should_flush(self) -> bool:
+        return (len(self._buffer) >= self.batch_size or
+                (self._buffer and time.monotonic() - self._last_flush >= self.flush_interval))
+
+    def _flush_buffer(self):
+        batch, self._buffer = self._buffer, []
+        self._last_flush = time.monotonic()
+        if not batch:
+            return
+        try:
+            self.write_batch(batch)
+            self.written_count += len(batch)
+        except Exception as e:
+            logger.warning(f"批次寫入失敗，改為逐筆寫入 ({len(batch)} 筆): {e}")
+            for item in batch:
+                try:
+                    self.write_batch([item])
+                    self.written_count += 1
+                except Exception as item_error:
+                    self.failed_count += 1
+                    logger.error(f"結果寫入失敗: {item_error}", exc_info=True)
+        self.batch_count += 1
+
+    def _writer_loop(self):
+        from django.db import connection
+        try:
+            while True:
+                timeout = max(0.0, self.flush_interval - (time.monotonic() - self._last_flush))
+                try:
+                    item = self._next_item(timeout)
+                except queue.Empty:
+                    item = None
+
+                if item is _STOP:
+                    self._flush_buffer()
+                    break
+                if item is not None:
+                    self._buffer.append(item)
+                if self._should_flush() or (item is None and self._buffer):
+                    self._flush_buffer()
+                elif item is None:
+                    self._last_flush = time.monotonic()
+        finally:
+            connection.close()
+
+
+class BenchmarkResultSink(BufferedResultSink):
+    """
+    BenchmarkTestResult 緩衝寫入器
+
+    每批寫入後增量更新 BenchmarkTestRun 的 completed / passed / failed 案例數。
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.progress: Dict[int, Dict[str, int]] = {}
+
+    def put(self, test_run_id: int, test_case_id: int, result: Dict[str, Any]):
+        """推入一筆 run_single_test 結果"""
+        self.put_item((test_run_id, test_case_id, result))
+
+    def write_batch(self, items):
+        from django.db import transaction
+        from api.models import BenchmarkTestResult, BenchmarkTestRun
+        from library.benchmark.test_runner import BenchmarkTestRunner
+
+        records = [
+            BenchmarkTestRunner.build_result_record(test_run_id, test_case_id, result)
+            for test_run_id, test_case_id, result in items
+        ]
+        delta: Dict[int, Dict[str, int]] = {}
+        for test_run_id, _, result in items:
+            counts = delta.setdefault(test_run_id, {'completed': 0, 'passed': 0})
+            counts['completed'] += 1
+            counts['passed'] += 1 if result['is_passed'] else 0
+
+        with transaction.atomic():
+            BenchmarkTestResult.objects.bulk_create(records)
+            for test_run_id, counts in delta.items():
+                progress = self.progress.setdefault(test_run_id, {'completed': 0, 'passed': 0})
+                completed = progress['completed'] + counts['completed']
+                passed = progress['passed'] + counts['passed']
+                BenchmarkTestRun.objects.filter(id=test_run_id).update(
+                    completed_test_cases=completed,
+                    passed_test_cases=passed,
+                    failed_test_cases=completed - passed
+                )
+
+        # 交易成功後才累加，逐筆重試時不會重複計算
+        for test_run_id, counts in delta.items():
+            progress = self.progress.setdefault(test_run_id, {'completed': 0, 'passed': 0})
+            progress['completed'] += counts['completed']
+            progress['passed'] += counts['passed']
+
+
+__all__ = [
+    'BufferedResultSink',
+    'BenchmarkResultSink',
+]
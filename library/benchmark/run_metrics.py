@@ -0,0 +1,366 @@
+"""
+Run Metrics - 整個測試執行一次計算的向量化 IR 指標
+
+ScoringEngine 以逐案例的 set 運算與 math.log2 迴圈計算指標，
+run 平均值再以多次 sum(... for r in results) 重算；參數掃描上千組時成本可觀。
+此模組把整個 run 轉為陣列一次計算：
+
+- RunMatrix：回傳 ID 以 -1 補齊寬度、預期 ID 以 -2 補齊，以廣播比對得到相關性遮罩
+- compute_run_metrics：Precision / Recall / F1 / NDCG / MRR / AP / Recall@k 曲線 / 速度分數 / 總分
+  （定義與 ScoringEngine.calculate_all_metrics 完全一致，另加 MRR、AP、Recall@k）
+- bootstrap_ci：以多項分布權重矩陣一次算出所有 run 的 bootstrap 信賴區間
+- paired_test：版本間逐案例配對的符號翻轉置換檢定（可一次比較多個 run 與基準）
+
+Usage:
+    from library.benchmark.run_metrics import build_run_matrix, compute_run_metrics, paired_test
+
+    matrix = build_run_matrix(returned_lists, expected_lists, response_times, top_k=10)
+    metrics = compute_run_metrics(matrix)
+    metrics['precision']      # shape (n_cases,)
+    metrics['recall_at_k']    # shape (n_cases, top_k)
+
+    paired_test(metrics_v2['f1_score'], metrics_v1['f1_score'])
+    # {'mean_diff': 0.05, 'ci_low': 0.01, 'ci_high': 0.09, 'p_value': 0.012, ...}
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .scoring_engine import ScoringEngine
+
+RETURNED_PAD = -1
+EXPECTED_PAD = -2
+
+# 置換檢定每批處理的重抽樣數（控制記憶體：run 數 × 批次大小）
+PERMUTATION_CHUNK = 1000
+
+
+@dataclass
+class RunMatrix:
+    """整個 run 的回傳 / 預期 ID 矩陣"""
+    returned: np.ndarray        # (n, w) 回傳 ID，-1 補齊
+    expected: np.ndarray        # (n, m) 預期 ID，-2 補齊
+    returned_len: np.ndarray    # (n,) 回傳數（含重複）
+    expected_len: np.ndarray    # (n,) 預期數（含重複，Recall 分母）
+    response_time: np.ndarray   # (n,) 回應時間（毫秒）
+    top_k: int
+
+    def __len__(self) -> int:
+        return self.returned.shape[0]
+
+
+def _pad(lists: Sequence[Sequence[int]], pad: int, min_width: int = 0) -> np.ndarray:
+    lengths = np.fromiter((len(x) for x in lists), dtype=np.int64, count=len(lists))
+    width = max(int(lengths.max()) if len(lists) else 0, min_width, 1)
+    out = np.full((len(lists), width), pad, dtype=np.int64)
+    mask = np.arange(width) < lengths[:, None]
+    if mask.any():
+        out[mask] = np.fromiter((int(v) for x in lists for v in x), dtype=np.int64, count=int(lengths.sum()))
+    return out
+
+
+def build_run_matrix(
+    returned_lists: Sequence[Sequence[int]],
+    expected_lists: Sequence[Sequence[int]],
+    response_times: Optional[Sequence[float]] = None,
+    top_k: int = 10
+) -> RunMatrix:
+    """
+    由逐案例的 ID 列表建立 RunMatrix
+
+    Args:
+        returned_lists: 每個案例回傳的文檔 ID（依排名）
+        expected_lists: 每個案例預期的文檔 ID
+        response_times: 每個案例的回應時間（毫秒，預設 0）
+        top_k: NDCG / MRR / AP / Recall@k 的截斷位置
+    """
+    if len(returned_lists) != len(expected_lists):
+        raise ValueError("returned_lists 與 expected_lists 長度不一致")
+    n = len(returned_lists)
+    return RunMatrix(
+        returned=_pad(returned_lists, RETURNED_PAD, min_width=top_k),
+        expected=_pad(expected_lists, EXPECTED_PAD),
+        returned_len=np.fromiter((len(x) for x in returned_lists), dtype=np.int64, count=n),
+        expected_len=np.fromiter((len(x) for x in expected_lists), dtype=np.int64, count=n),
+        response_time=np.zeros(n) if response_times is None else np.asarray(response_times, dtype=np.float64),
+        top_k=top_k,
+    )
+
+
+def _first_occurrence(ids: np.ndarray, pad: int) -> np.ndarray:
+    """(n, w) 遮罩：該位置是此列第一次出現的 ID（用於 set 語意）"""
+    width = ids.shape[1]
+    earlier = np.tril(np.ones((width, width), dtype=bool), k=-1)
+    duplicate = ((ids[:, :, None] == ids[:, None, :]) & earlier).any(axis=2)
+    return (ids != pad) & ~duplicate
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    out = np.zeros(np.broadcast(numerator, denominator).shape)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def speed_scores(response_times: np.ndarray) -> np.ndarray:
+    """向量化的 ScoringEngine.calculate_speed_score"""
+    t = np.asarray(response_times, dtype=np.float64)
+    thresholds = ScoringEngine.SPEED_THRESHOLDS
+    tail = np.clip(50.0 * (1 - (t - 500) / (5000.0 - 500)), 0.0, None)
+    return np.select(
+        [t <= thresholds['excellent'], t <= thresholds['good'], t <= thresholds['acceptable'],
+         t <= thresholds['poor'], t >= 5000.0],
+        [100.0, 90.0, 75.0, 50.0, 0.0],
+        default=tail
+    )
+
+
+def overall_scores(precision, recall, f1, ndcg, speed) -> np.ndarray:
+    """向量化的 ScoringEngine.calculate_overall_score（未四捨五入）"""
+    w = ScoringEngine.WEIGHTS
+    return (precision * 100 * w['precision'] + recall * 100 * w['recall'] + f1 * 100 * w['f1']
+            + ndcg * 100 * w['ndcg'] + speed * w['speed'])
+
+
+def compute_run_metrics(matrix: RunMatrix) -> Dict[str, np.ndarray]:
+    """
+    一次計算整個 run 的逐案例指標
+
+    Returns:
+        {指標: 陣列}；除 recall_at_k 為 (n, top_k) 外皆為 (n,)
+    """
+    k = matrix.top_k
+    returned, expected = matrix.returned, matrix.expected
+
+    relevant = (returned[:, :, None] == expected[:, None, :]).any(axis=2)
+    first = _first_occurrence(returned, RETURNED_PAD)
+    unique_relevant = relevant & first
+
+    hits = relevant.sum(axis=1)
+    true_positives = unique_relevant.sum(axis=1)
+    false_positives = first.sum(axis=1) - true_positives
+    false_negatives = _first_occurrence(expected, EXPECTED_PAD).sum(axis=1) - true_positives
+
+    precision = _safe_divide(hits, matrix.returned_len)
+    recall = _safe_divide(true_positives, matrix.expected_len)
+    f1 = _safe_divide(2 * precision * recall, precision + recall)
+
+    # NDCG@k（與 ScoringEngine 相同：重複的相關文檔各自計分）
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = (relevant[:, :k] * discounts).sum(axis=1)
+    ideal = np.concatenate([[0.0], np.cumsum(discounts)])
+    idcg = ideal[np.minimum(matrix.expected_len, k)]
+    has_both = (matrix.returned_len > 0) & (matrix.expected_len > 0)
+    ndcg = np.where(has_both, _safe_divide(dcg, idcg), 0.0)
+
+    # MRR@k：第一個相關文檔的排名倒數
+    top = relevant[:, :k]
+    first_rank = np.argmax(top, axis=1) + 1
+    reciprocal_rank = np.where(top.any(axis=1), 1.0 / first_rank, 0.0)
+
+    # AP@k 與 Recall@k（以不重複的相關文檔計算）
+    cumulative_hits = np.cumsum(unique_relevant[:, :k], axis=1)
+    precision_at = cumulative_hits / np.arange(1, k + 1)
+    unique_expected = _first_occurrence(expected, EXPECTED_PAD).sum(axis=1)
+    average_precision = _safe_divide(
+        (precision_at * unique_relevant[:, :k]).sum(axis=1), np.minimum(unique_expected, k)
+    )
+    recall_at_k = _safe_divide(cumulative_hits, matrix.expected_len[:, None])
+
+    speed = speed_scores(matrix.response_time)
+    return {
+        'precision': precision,
+        'recall': recall,
+        'f1_score': f1,
+        'ndcg': ndcg,
+        'reciprocal_rank': reciprocal_rank,
+        'average_precision': average_precision,
+        'recall_at_k': recall_at_k,
+        'speed_score': speed,
+        'overall_score': overall_scores(precision, recall, f1, ndcg, speed),
+        'true_positives': true_positives,
+        'false_positives': false_positives,
+        'false_negatives': false_negatives,
+    }
+
+
+def metrics_to_records(matrix: RunMatrix, metrics: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """轉為與 ScoringEngine.calculate_all_metrics 相同格式的逐案例字典"""
+    columns = {name: metrics[name].tolist() for name in (
+        'precision', 'recall', 'f1_score', 'ndcg', 'speed_score', 'overall_score',
+        'true_positives', 'false_positives', 'false_negatives'
+    )}
+    response_time = matrix.response_time.tolist()
+    returned_len = matrix.returned_len.tolist()
+    expected_len = matrix.expected_len.tolist()
+
+    records = []
+    for i in range(len(matrix)):
+        precision, recall = columns['precision'][i], columns['recall'][i]
+        f1, ndcg = columns['f1_score'][i], columns['ndcg'][i]
+        records.append({
+            'precision': round(precision, 4), 'recall': round(recall, 4),
+            'f1_score': round(f1, 4), 'ndcg': round(ndcg, 4),
+            'precision_pct': round(precision * 100, 2), 'recall_pct': round(recall * 100, 2),
+            'f1_score_pct': round(f1 * 100, 2), 'ndcg_pct': round(ndcg * 100, 2),
+            'speed_score': round(columns['speed_score'][i], 2),
+            'overall_score': round(columns['overall_score'][i], 2),
+            'true_positives': columns['true_positives'][i],
+            'false_positives': columns['false_positives'][i],
+            'false_negatives': columns['false_negatives'][i],
+            'response_time_ms': round(response_time[i], 2),
+            'returned_count': returned_len[i], 'expected_count': expected_len[i],
+        })
+    return records
+
+
+def summarize_results(results: Sequence[Dict[str, Any]]) -> Dict[str, float]:
+    """
+    彙總逐案例結果字典（run_single_test / evaluate_case 格式）的平均值
+
+    總分以平均值計算（同 run_batch_tests），不是逐案例總分的平均。
+    """
+    n = len(results)
+    if not n:
+        return {'avg_precision': 0.0, 'avg_recall': 0.0, 'avg_f1_score': 0.0, 'avg_ndcg': 0.0,
+                'avg_speed_score': 0.0, 'avg_response_time': 0.0, 'overall_score': 0.0, 'passed': 0}
+
+    fields = ('precision', 'recall', 'f1_score', 'ndcg', 'speed_score', 'response_time')
+    table = np.array([[r.get(f, 0) for f in fields] for r in results], dtype=np.float64)
+    ap, ar, af, an, asp, art = table.mean(axis=0).tolist()
+    return {
+        'avg_precision': round(ap, 4),
+        'avg_recall': round(ar, 4),
+        'avg_f1_score': round(af, 4),
+        'avg_ndcg': round(an, 4),
+        'avg_speed_score': round(asp, 2),
+        'avg_response_time': round(art, 2),
+        'overall_score': ScoringEngine.calculate_overall_score(ap, ar, af, an, asp),
+        'passed': sum(1 for r in results if r.get('is_passed')),
+    }
+
+
+def summarize_run_metrics(metrics: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """run 層級指標：各指標平均、MRR、MAP 與平均 Recall@k 曲線"""
+    if not len(metrics['precision']):
+        return {'mrr': 0.0, 'map': 0.0, 'recall_at_k': [], 'overall_score': 0.0}
+    return {
+        'avg_precision': round(float(metrics['precision'].mean()), 4),
+        'avg_recall': round(float(metrics['recall'].mean()), 4),
+        'avg_f1_score': round(float(metrics['f1_score'].mean()), 4),
+        'avg_ndcg': round(float(metrics['ndcg'].mean()), 4),
+        'mrr': round(float(metrics['reciprocal_rank'].mean()), 4),
+        'map': round(float(metrics['average_precision'].mean()), 4),
+        'recall_at_k': np.round(metrics['recall_at_k'].mean(axis=0), 4).tolist(),
+        'overall_score': round(float(metrics['overall_score'].mean()), 2),
+    }
+
+
+def bootstrap_ci(
+    values: np.ndarray,
+    n_resamples: int = 1000,
+    confidence: float = 0.95,
+    seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    平均值的 bootstrap 信賴區間
+
+    以 (n_resamples, n) 的多項分布權重矩陣一次重抽樣，
+    values 為 (runs, n) 時所有 run 共用同一組重抽樣（矩陣乘法，記憶體為 runs × n_resamples）。
+
+    Args:
+        values: (n,) 或 (runs, n) 的逐案例數值
+        n_resamples: 重抽樣次數
+        confidence: 信賴水準
+
+    Returns:
+        {'mean', 'low', 'high'}；values 為 2 維時各為長度 runs 的列表
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[-1]
+    if n == 0:
+        raise ValueError("values 不可為空")
+
+    rng = np.random.default_rng(seed)
+    weights = rng.multinomial(n, np.full(n, 1.0 / n), size=n_resamples).astype(np.float64)
+    boot_means = values @ weights.T / n
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(boot_means, [alpha, 1 - alpha], axis=-1)
+    mean = values.mean(axis=-1)
+    if values.ndim == 1:
+        return {'mean': float(mean), 'low': float(low), 'high': float(high)}
+    return {'mean': mean.tolist(), 'low': low.tolist(), 'high': high.tolist()}
+
+
+def paired_test(
+    a: np.ndarray,
+    b: np.ndarray,
+    n_resamples: int = 10000,
+    confidence: float = 0.95,
+    seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    配對的符號翻轉置換檢定（雙尾）
+
+    兩個版本在同一組測試案例上的逐案例差異 d = a - b；
+    虛無假設下每個 d 的正負號可任意交換。a 為 (runs, n) 時一次比較多個 run 與同一基準 b。
+
+    Args:
+        a: (n,) 或 (runs, n) 的逐案例指標
+        b: (n,) 基準版本的逐案例指標
+        n_resamples: 置換次數
+
+    Returns:
+        {'mean_diff', 'ci_low', 'ci_high', 'p_value', 't_statistic', 'wins', 'losses', 'ties'}
+        a 為 2 維時各為長度 runs 的列表
+    """
+    diff = np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)
+    n = diff.shape[-1]
+    if n == 0:
+        raise ValueError("沒有可配對的案例")
+
+    observed = diff.mean(axis=-1)
+    rng = np.random.default_rng(seed)
+    exceed = np.zeros(observed.shape)
+    tolerance = 1e-12
+    for start in range(0, n_resamples, PERMUTATION_CHUNK):
+        size = min(PERMUTATION_CHUNK, n_resamples - start)
+        signs = rng.choice(np.array([-1.0, 1.0]), size=(size, n))
+        permuted = diff @ signs.T / n
+        exceed += (np.abs(permuted) >= np.abs(observed)[..., None] - tolerance).sum(axis=-1)
+    p_value = (exceed + 1) / (n_resamples + 1)
+
+    std = diff.std(axis=-1, ddof=1) if n > 1 else np.zeros(observed.shape)
+    t_statistic = _safe_divide(observed, std / np.sqrt(n))
+    ci = bootstrap_ci(diff, n_resamples=min(n_resamples, 2000), confidence=confidence, seed=seed)
+
+    result = {
+        'mean_diff': observed,
+        'ci_low': np.asarray(ci['low']),
+        'ci_high': np.asarray(ci['high']),
+        'p_value': p_value,
+        't_statistic': t_statistic,
+        'wins': (diff > 0).sum(axis=-1),
+        'losses': (diff < 0).sum(axis=-1),
+        'ties': (diff == 0).sum(axis=-1),
+    }
+    if diff.ndim == 1:
+        return {key: value.item() for key, value in result.items()}
+    return {key: value.tolist() for key, value in result.items()}
+
+
+__all__ = [
+    'RunMatrix',
+    'build_run_matrix',
+    'compute_run_metrics',
+    'metrics_to_records',
+    'summarize_results',
+    'summarize_run_metrics',
+    'speed_scores',
+    'overall_scores',
+    'bootstrap_ci',
+    'paired_test',
+]
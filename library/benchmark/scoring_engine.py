@@ -87,3 +87,11 @@ class ScoringEngine:
             'false_negatives': false_negatives, 'response_time_ms': round(response_time, 2),
             'returned_count': len(returned_ids), 'expected_count': len(expected_ids)
         }
+    
+    @classmethod
+    def calculate_batch_metrics(cls, returned_lists: List[List[int]], expected_lists: List[List[int]],
+                                response_times: List[float], top_k: int = 10) -> List[Dict[str, Any]]:
+        """整個 run 一次計算（結果同逐案例呼叫 calculate_all_metrics，見 run_metrics 模組）"""
+        from .run_metrics import build_run_matrix, compute_run_metrics, metrics_to_records
+        matrix = build_run_matrix(returned_lists, expected_lists, response_times, top_k)
+        return metrics_to_records(matrix, compute_run_metrics(matrix))
@@ -0,0 +1,715 @@
+"""
+Sweep Engine - 一次檢索、多次重排的參數掃描引擎
+
+原本每個版本 × 每個測試案例都要重新生成查詢向量並執行 pgvector 查詢，
+版本越多成本線性成長，網格搜尋數百組參數幾乎不可行。
+
+此引擎對每個測試案例：
+1. 只生成一次查詢向量（原始查詢、清理後查詢各一次）
+2. 撈取寬候選池：段落 / 全文的原始 title_score、content_score，
+   以及關鍵字搜尋的原始回傳列（含資料庫順序）
+3. 在記憶體中重現各策略的加權、閾值、分組、`_weighted_merge`、
+   `_merge_with_rrf`、`_normalize_rrf_scores` 與 `TitleBoostProcessor`
+
+候選池依 GREATEST(title_score, content_score) 排序截斷；池外段落在任何
+權重組合下的分數都不超過 (title_weight + content_weight) × 池底分數，
+因此每次重排都能判斷結果是否與實際搜尋完全一致（exact）。
+
+限制：
+- 僅支援多向量段落資料（title_embedding / content_embedding）
+- 啟用 Window 擴展（context_window > 0）時段落內容會不同，結果標記為非 exact
+- 回應時間為單次檢索時間 + 重排時間（所有版本共用同一次檢索）
+
+Usage:
+    from library.benchmark.sweep_engine import SweepEngine
+
+    engine = SweepEngine()
+    summaries = engine.evaluate(
+        {v.version_name: v.parameters for v in versions}, test_cases
+    )
+    ranking = engine.grid_search(
+        {'strategy': 'hybrid_weighted'},
+        {'section_weight': [0.5, 0.6, 0.7], 'section_threshold': [0.6, 0.7, 0.8]},
+        test_cases
+    )
+"""
+
+import itertools
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .run_metrics import bootstrap_ci, paired_test, summarize_results
+from .scoring_engine import ScoringEngine
+
+logger = logging.getLogger(__name__)
+
+# 與 BenchmarkTestRunner 一致的回傳數量
+RESULT_LIMIT = 10
+
+# 候選池大小
+SECTION_POOL_SIZE = 300
+DOCUMENT_POOL_SIZE = 100
+
+# 未知策略時 BenchmarkTestRunner 使用的 auto 模式閾值
+AUTO_THRESHOLD = 0.7
+
+
+@dataclass
+class QueryPool:
+    """單一查詢文字的向量候選池（原始分數，未套用權重）"""
+    query: str
+    section_ids: np.ndarray
+    section_source_ids: np.ndarray
+    section_title_scores: np.ndarray
+    section_content_scores: np.ndarray
+    section_truncated: bool = False
+    section_floor: float = 0.0
+    doc_source_ids: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.int64))
+    doc_title_scores: np.ndarray = field(default_factory=lambda: np.empty(0))
+    doc_content_scores: np.ndarray = field(default_factory=lambda: np.empty(0))
+    doc_truncated: bool = False
+    doc_floor: float = 0.0
+
+
+@dataclass
+class CandidatePool:
+    """單一測試案例的候選池"""
+    test_case: Any
+    raw: QueryPool
+    query_type: str = 'section'
+    cleaned_query: str = ''
+    cleaned: Optional[QueryPool] = None
+    keyword_rows: List[Dict[str, Any]] = field(default_factory=list)
+    keyword_items: List[Tuple[float, Dict[str, Any]]] = field(default_factory=list)
+    titles: Dict[int, str] = field(default_factory=dict)
+    retrieval_ms: float = 0.0
+    context_window: int = 0
+
+
+def _outside_bound(floor: float, title_weight: float, content_weight: float) -> float:
+    """池外候選在此權重下可能的最高分數"""
+    return (title_weight + content_weight) * max(floor, 0.0)
+
+
+def _top_k_exact(truncated: bool, scores: np.ndarray, order: np.ndarray,
+                 k: int, threshold: float, bound: float) -> bool:
+    """判斷池內 top-k 是否等同全表 top-k"""
+    if not truncated or threshold > bound:
+        return True
+    return len(order) >= k and float(scores[order[k - 1]]) > bound
+
+
+def rank_sections(pool: QueryPool, titles: Dict[int, str], title_weight: float,
+                  content_weight: float, threshold: float, limit: int) -> Tuple[List[Dict[str, Any]], bool, int]:
+    """
+    重現 search_sections + _format_section_results_to_standard
+
+    Returns:
+        (文件級結果, 是否 exact, 通過閾值的段落數)
+    """
+    scores = title_weight * pool.section_title_scores + content_weight * pool.section_content_scores
+    passed = np.flatnonzero(scores >= threshold)
+    order = passed[np.argsort(-scores[passed], kind='stable')][:limit]
+    exact = _top_k_exact(
+        pool.section_truncated, scores, order, limit, threshold,
+        _outside_bound(pool.section_floor, title_weight, content_weight)
+    )
+
+    # 依文件分組：段落已按分數遞減，首次出現即為該文件最高分
+    doc_scores: Dict[int, float] = {}
+    sections_found: Dict[int, int] = {}
+    for idx in order:
+        doc_id = int(pool.section_source_ids[idx])
+        doc_scores.setdefault(doc_id, float(scores[idx]))
+        sections_found[doc_id] = sections_found.get(doc_id, 0) + 1
+
+    results = []
+    for doc_id, score in sorted(doc_scores.items(), key=lambda x: x[1], reverse=True)[:limit]:
+        if doc_id not in titles:
+            continue
+        results.append({
+            'content': '',
+            'score': score,
+            'title': titles[doc_id],
+            'metadata': {
+                'id': doc_id,
+                'sections_found': sections_found[doc_id],
+                'max_similarity': score
+            }
+        })
+    return results, exact, len(passed)
+
+
+def rank_documents(pool: QueryPool, titles: Dict[int, str], title_weight: float,
+                   content_weight: float, threshold: float, limit: int,
+                   source_table: str = '') -> Tuple[List[Dict[str, Any]], bool]:
+    """重現 search_similar_documents_multi + format_vector_results"""
+    scores = title_weight * pool.doc_title_scores + content_weight * pool.doc_content_scores
+    order = np.argsort(-scores, kind='stable')[:limit]
+    exact = _top_k_exact(
+        pool.doc_truncated, scores, order, limit, threshold,
+        _outside_bound(pool.doc_floor, title_weight, content_weight)
+    )
+
+    results = []
+    for idx in order:
+        score = float(scores[idx])
+        doc_id = int(pool.doc_source_ids[idx])
+        if score < threshold or doc_id not in titles:
+            continue
+        results.append({
+            'content': '',
+            'score': score,
+            'final_score': score,
+            'similarity_score': score,
+            'title': titles[doc_id],
+            'source_id': doc_id,
+            'metadata': {'id': doc_id, 'source_table': source_table}
+        })
+    return results, exact
+
+
+def result_ids(results: List[Dict[str, Any]]) -> List[Any]:
+    """與 BenchmarkTestRunner 相同的結果 ID 擷取規則"""
+    ids = []
+    for r in results:
+        doc_id = r.get('metadata', {}).get('id') or r.get('id') or r.get('document_id')
+        if doc_id:
+            ids.append(doc_id)
+    return ids
+
+
+def expand_grid(base_params: Dict[str, Any], grid: Dict[str, Iterable[Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    展開參數網格
+
+    Returns:
+        {標籤: 參數}，標籤格式如 'section_weight=0.6,section_threshold=0.7'
+    """
+    keys = list(grid.keys())
+    param_sets = {}
+    for values in itertools.product(*(list(grid[k]) for k in keys)):
+        params = dict(base_params)
+        params.update(zip(keys, values))
+        label = ','.join(f"{k}={v}" for k, v in zip(keys, values)) or 'base'
+        param_sets[label] = params
+    return param_sets
+
+
+class SweepEngine:
+    """一次檢索、多次重排的參數掃描引擎"""
+
+    def __init__(self, search_service=None, limit: int = RESULT_LIMIT,
+                 section_pool_size: int = SECTION_POOL_SIZE,
+                 document_pool_size: int = DOCUMENT_POOL_SIZE,
+                 stage_weights: Optional[Dict[int, Tuple[float, float]]] = None,
+                 rrf_defaults: Optional[Dict[str, Any]] = None,
+                 verbose: bool = False):
+        """
+        Args:
+            search_service: ProtocolGuideSearchService 實例（預設自動建立）
+            limit: 每次搜尋回傳數量
+            section_pool_size: 段落候選池大小
+            document_pool_size: 全文候選池大小
+            stage_weights: {stage: (title_weight, content_weight)}，預設讀取 SearchThresholdSetting
+            rrf_defaults: HybridRRFStrategy 預設參數，預設讀取資料庫設定
+            verbose: 是否輸出進度
+        """
+        if search_service is None:
+            from library.protocol_guide.search_service import ProtocolGuideSearchService
+            search_service = ProtocolGuideSearchService()
+        from .search_strategies import HybridWeightedStrategy
+
+        self.search_service = search_service
+        self.source_table = search_service.source_table
+        self.limit = limit
+        self.section_pool_size = section_pool_size
+        self.document_pool_size = document_pool_size
+        self.verbose = verbose
+        self._stage_weights = stage_weights
+        self._rrf_defaults = rrf_defaults
+        self._weighted_strategy = HybridWeightedStrategy(search_service)
+
+    def _log(self, msg: str):
+        if self.verbose:
+            print(msg, flush=True)
+
+    # ------------------------------------------------------------
+    # 配置
+    # ------------------------------------------------------------
+
+    @property
+    def stage_weights(self) -> Dict[int, Tuple[float, float]]:
+        if self._stage_weights is None:
+            from library.common.knowledge_base.vector_search_helper import _get_weights_for_assistant
+            self._stage_weights = {
+                stage: _get_weights_for_assistant(self.source_table, stage=stage)
+                for stage in (1, 2)
+            }
+        return self._stage_weights
+
+    @property
+    def rrf_defaults(self) -> Dict[str, Any]:
+        if self._rrf_defaults is None:
+            from .search_strategies import HybridRRFStrategy
+            self._rrf_defaults = HybridRRFStrategy(self.search_service).get_params()
+        return self._rrf_defaults
+
+    def _weights(self, params: Dict[str, Any], stage: int) -> Tuple[float, float]:
+        """stage 權重；參數可用 stageN_title_weight / stageN_content_weight（百分比）覆蓋"""
+        title_key, content_key = f'stage{stage}_title_weight', f'stage{stage}_content_weight'
+        if title_key in params or content_key in params:
+            default_title, default_content = self.stage_weights[stage]
+            return (params.get(title_key, default_title * 100) / 100.0,
+                    params.get(content_key, default_content * 100) / 100.0)
+        return self.stage_weights[stage]
+
+    # ------------------------------------------------------------
+    # 候選池
+    # ------------------------------------------------------------
+
+    def _retrieve(self, query: str) -> QueryPool:
+        """生成一次查詢向量，撈取段落與全文的原始分數"""
+        from django.db import connection
+        from api.services.embedding_service import get_embedding_service
+
+        embedding = get_embedding_service('ultra_high').generate_embedding(query)
+        embedding_str = json.dumps(embedding)
+
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT id, source_id, title_score, content_score,
+                       GREATEST(title_score, content_score) AS best_score
+                FROM (
+                    SELECT dse.id, dse.source_id,
+                           1 - (dse.title_embedding <=> %s::vector) AS title_score,
+                           1 - (dse.content_embedding <=> %s::vector) AS content_score
+                    FROM document_section_embeddings dse
+                    WHERE dse.source_table = %s
+                      AND dse.title_embedding IS NOT NULL
+                      AND dse.content_embedding IS NOT NULL
+                ) s
+                ORDER BY best_score DESC
+                LIMIT %s
+            """, [embedding_str, embedding_str, self.source_table, self.section_pool_size + 1])
+            section_rows = cursor.fetchall()
+
+            cursor.execute("""
+                SELECT source_id, title_score, content_score,
+                       GREATEST(title_score, content_score) AS best_score
+                FROM (
+                    SELECT de.source_id,
+                           1 - (de.title_embedding <=> %s::vector) AS title_score,
+                           1 - (de.content_embedding <=> %s::vector) AS content_score
+                    FROM document_embeddings de
+                    WHERE de.source_table = %s
+                      AND de.title_embedding IS NOT NULL
+                      AND de.content_embedding IS NOT NULL
+                ) d
+                ORDER BY best_score DESC
+                LIMIT %s
+            """, [embedding_str, embedding_str, self.source_table, self.document_pool_size + 1])
+            doc_rows = cursor.fetchall()
+
+        section_truncated = len(section_rows) > self.section_pool_size
+        section_rows = section_rows[:self.section_pool_size]
+        doc_truncated = len(doc_rows) > self.document_pool_size
+        doc_rows = doc_rows[:self.document_pool_size]
+
+        return QueryPool(
+            query=query,
+            section_ids=np.array([r[0] for r in section_rows], dtype=np.int64),
+            section_source_ids=np.array([r[1] for r in section_rows], dtype=np.int64),
+            section_title_scores=np.array([r[2] for r in section_rows], dtype=np.float64),
+            section_content_scores=np.array([r[3] for r in section_rows], dtype=np.float64),
+            section_truncated=section_truncated,
+            section_floor=float(section_rows[-1][4]) if section_rows else 0.0,
+            doc_source_ids=np.array([r[0] for r in doc_rows], dtype=np.int64),
+            doc_title_scores=np.array([r[1] for r in doc_rows], dtype=np.float64),
+            doc_content_scores=np.array([r[2] for r in doc_rows], dtype=np.float64),
+            doc_truncated=doc_truncated,
+            doc_floor=float(doc_rows[-1][3]) if doc_rows else 0.0,
+        )
+
+    def _keyword_items(self, query: str, limit: int) -> List[Tuple[float, Dict[str, Any]]]:
+        """search_with_keywords 的候選（保留資料庫順序，分數未過濾）"""
+        from django.db.models import Q
+
+        service = self.search_service
+        q_objects = Q()
+        for field_name in service.default_search_fields:
+            if hasattr(service.model_class, field_name):
+                q_objects |= Q(**{f"{field_name}__icontains": query})
+
+        items = []
+        for item in service.model_class.objects.filter(q_objects)[:limit]:
+            score = service._calculate_keyword_score(item, query)
+            items.append((score, service._format_item_to_result(item, score=score)))
+        return items
+
+    def build_pool(self, test_case, include_hybrid: bool = True) -> CandidatePool:
+        """
+        建立測試案例的候選池
+
+        Args:
+            test_case: BenchmarkTestCase
+            include_hybrid: 是否一併準備 hybrid_rrf 所需的清理後查詢與關鍵字候選
+        """
+        start = time.time()
+        service = self.search_service
+        raw = self._retrieve(test_case.question)
+        pool = CandidatePool(test_case=test_case, raw=raw)
+        pool.context_window = service._get_context_window_settings().get('context_window', 0)
+
+        if include_hybrid:
+            pool.query_type, pool.cleaned_query = service._classify_and_clean_query(test_case.question)
+            pool.cleaned = raw if pool.cleaned_query == raw.query else self._retrieve(pool.cleaned_query)
+            pool.keyword_rows = service._keyword_search(pool.cleaned_query, limit=self.limit * 2)
+            # search_knowledge 補充時最多取 remaining * 3 筆，remaining 不超過 limit * 2
+            pool.keyword_items = self._keyword_items(pool.cleaned_query, self.limit * 2 * 3)
+
+        doc_ids = set(raw.section_source_ids.tolist()) | set(raw.doc_source_ids.tolist())
+        if pool.cleaned is not None:
+            doc_ids |= set(pool.cleaned.section_source_ids.tolist())
+        pool.titles = dict(
+            service.model_class.objects.filter(id__in=doc_ids).values_list('id', 'title')
+        )
+        pool.retrieval_ms = (time.time() - start) * 1000
+        return pool
+
+    # ------------------------------------------------------------
+    # 記憶體重排
+    # ------------------------------------------------------------
+
+    def _section_only(self, pool: CandidatePool, query_pool: QueryPool, threshold: float,
+                      limit: int, params: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], bool]:
+        title_weight, content_weight = self._weights(params, 1)
+        results, exact, _ = rank_sections(query_pool, pool.titles, title_weight, content_weight, threshold, limit)
+        return results, exact and pool.context_window == 0
+
+    def _document_only(self, pool: CandidatePool, query_pool: QueryPool, threshold: float,
+                       limit: int, params: Dict[str, Any], stage: int = 2) -> Tuple[List[Dict[str, Any]], bool]:
+        title_weight, content_weight = self._weights(params, stage)
+        return rank_documents(
+            query_pool, pool.titles, title_weight, content_weight,
+            max(threshold * 0.85, 0.5), limit, self.source_table
+        )
+
+    def _auto(self, pool: CandidatePool, params: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], bool]:
+        """BenchmarkTestRunner 未知策略：段落優先，無段落時以 stage 2 權重搜尋全文"""
+        title_weight, content_weight = self._weights(params, 1)
+        results, exact, matched = rank_sections(
+            pool.raw, pool.titles, title_weight, content_weight, AUTO_THRESHOLD, self.limit
+        )
+        if matched:
+            return results, exact and pool.context_window == 0
+        results, doc_exact = self._document_only(pool, pool.raw, AUTO_THRESHOLD, self.limit, params)
+        return results, exact and doc_exact and pool.context_window == 0
+
+    def _hybrid_weighted(self, pool: CandidatePool, params: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], bool]:
+        final_params = self._weighted_strategy.get_params(**params)
+        section_weight = final_params.get('section_weight', 0.7)
+        document_weight = final_params.get('document_weight', 0.3)
+        if not self._weighted_strategy._validate_weights(section_weight, document_weight):
+            total = section_weight + document_weight
+            section_weight /= total
+            document_weight /= total
+
+        section_results, section_exact = self._section_only(
+            pool, pool.raw, final_params.get('section_threshold', 0.75), self.limit * 2, params
+        )
+        document_results, document_exact = self._document_only(
+            pool, pool.raw, final_params.get('document_threshold', 0.65), self.limit * 2, params
+        )
+        merged = self._weighted_strategy._weighted_merge(
+            section_results=section_results,
+            document_results=document_results,
+            section_weight=section_weight,
+            document_weight=document_weight
+        )
+        merged = sorted(merged, key=lambda x: x.get('final_score', 0), reverse=True)[:self.limit]
+        return merged, section_exact and document_exact
+
+    def _supplement_with_keywords(self, pool: CandidatePool, results: List[Dict[str, Any]],
+                                  limit: int, threshold: float) -> List[Dict[str, Any]]:
+        """重現 BaseKnowledgeBaseSearchService.search_knowledge 的關鍵字補充"""
+        if len(results) >= limit:
+            return results[:limit]
+        remaining = limit - len(results)
+        keyword_threshold = max(threshold * 0.5, 0.3)
+        candidates = [
+            (score, result) for score, result in pool.keyword_items[:remaining * 3]
+            if score >= keyword_threshold
+        ]
+        candidates.sort(key=lambda x: x[0], reverse=True)
+
+        merged = list(results)
+        existing_ids = {r.get('metadata', {}).get('id') for r in merged}
+        for _, result in candidates[:remaining]:
+            result_id = result.get('metadata', {}).get('id')
+            if result_id not in existing_ids:
+                merged.append(dict(result))
+                existing_ids.add(result_id)
+        return merged[:limit]
+
+    def _hybrid_rrf(self, pool: CandidatePool, params: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], bool]:
+        """重現 HybridRRFStrategy → ProtocolGuideSearchService.search_knowledge 混合搜尋路徑"""
+        from library.common.knowledge_base.title_boost import TitleBoostConfig, TitleBoostProcessor
+
+        if pool.cleaned is None:
+            raise ValueError("候選池未包含混合搜尋資料，請以 include_hybrid=True 建立")
+
+        service = self.search_service
+        final_params = {**self.rrf_defaults, **params}
+        rrf_k = final_params.get('rrf_k', 60)
+        threshold = final_params.get('section_threshold', 0.80)
+        rag_settings = {
+            'stage1': {
+                'use_hybrid_search': True,
+                'rrf_k': rrf_k,
+                'title_match_bonus': final_params.get('title_match_bonus', 0.15),
+                'min_keyword_length': final_params.get('min_keyword_length', 2),
+                'threshold': threshold,
+            }
+        }
+        if final_params.get('retrieval_mode'):
+            rag_settings['retrieval_mode'] = final_params['retrieval_mode']
+
+        # 步驟 A: 向量搜尋（limit × 2，閾值 × 0.8，不足時關鍵字補充）
+        vector_threshold = threshold * 0.8
+        vector_results, exact = self._section_only(
+            pool, pool.cleaned, vector_threshold, self.limit * 2, final_params
+        )
+        vector_results = self._supplement_with_keywords(pool, vector_results, self.limit * 2, vector_threshold)
+
+        # 步驟 B: 關鍵字搜尋（重現 LIMIT limit × 2 後的排序）
+        keyword_results = sorted(
+            (r for r in pool.keyword_rows if r.get('scan_order', 0) < self.limit * 2),
+            key=lambda x: (-x['match_count'], -x['rank'])
+        )
+
+        # 步驟 C ~ E: RRF 融合、正規化、Title Boost
+        results = service._merge_with_rrf(vector_results, keyword_results, k=rrf_k)
+        results = service._normalize_rrf_scores(results)
+        title_boost_config = TitleBoostConfig.from_rag_settings(rag_settings, stage=1)
+        if title_boost_config.get('enabled', False) and results:
+            processor = TitleBoostProcessor(
+                title_match_bonus=title_boost_config.get('title_match_bonus', 0.15),
+                min_keyword_length=title_boost_config.get('min_keyword_length', 2)
+            )
+            results = processor.apply_title_boost(
+                query=pool.cleaned_query, vector_results=results, title_field='title'
+            )
+
+        # 步驟 F: 最終排序
+        results = sorted(results, key=lambda x: x.get('score', 0), reverse=True)[:self.limit]
+        if pool.query_type == 'document' and results:
+            results = service._expand_to_full_document(results)
+        return results, exact
+
+    def rank(self, pool: CandidatePool, params: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        依版本參數在記憶體中重排候選池
+
+        Returns:
+            (搜尋結果, 是否與實際搜尋完全一致)
+        """
+        strategy = params.get('strategy', 'hybrid_weighted')
+        if strategy == 'section_only':
+            return self._section_only(pool, pool.raw, params.get('section_threshold', 0.75), self.limit, params)
+        if strategy == 'document_only':
+            # BenchmarkTestRunner 的 document_only 以 stage=1 呼叫 search_with_vectors
+            return self._document_only(
+                pool, pool.raw, params.get('document_threshold', 0.65), self.limit, params, stage=1
+            )
+        if strategy == 'hybrid_weighted':
+            return self._hybrid_weighted(pool, params)
+        if strategy == 'hybrid_rrf':
+            return self._hybrid_rrf(pool, params)
+        return self._auto(pool, params)
+
+    # ------------------------------------------------------------
+    # 評估
+    # ------------------------------------------------------------
+
+    def rank_case(self, pool: CandidatePool, params: Dict[str, Any]) -> Dict[str, Any]:
+        """單一測試案例 × 單一參數組合的排序結果（尚未計分，見 score_cases）"""
+        test_case = pool.test_case
+        start = time.time()
+        results, exact = self.rank(pool, params)
+        rt = pool.retrieval_ms + (time.time() - start) * 1000
+        return {
+            'test_case': test_case, 'search_query': test_case.question,
+            'returned_document_ids': result_ids(results),
+            'returned_document_scores': [r.get('score', 0) for r in results],
+            'response_time': rt,
+            'exact': exact,
+        }
+
+    def score_cases(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """以 run_metrics 一次計算所有尚未計分案例的指標（原地更新並返回）"""
+        pending = [r for r in records if 'precision' not in r]
+        if not pending:
+            return records
+        metrics = ScoringEngine.calculate_batch_metrics(
+            [r['returned_document_ids'] for r in pending],
+            [r['test_case'].expected_document_ids for r in pending],
+            [r['response_time'] for r in pending],
+            self.limit
+        )
+        for record, m in zip(pending, metrics):
+            record.update(m)
+            record['is_passed'] = m['true_positives'] >= record['test_case'].min_required_matches
+        return records
+
+    def evaluate_case(self, pool: CandidatePool, params: Dict[str, Any]) -> Dict[str, Any]:
+        """單一測試案例 × 單一參數組合（結果格式同 BenchmarkTestRunner.run_single_test）"""
+        return self.score_cases([self.rank_case(pool, params)])[0]
+
+    @staticmethod
+    def summarize(label: str, params: Dict[str, Any], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """彙總單一參數組合的所有案例（計算方式同 run_batch_tests）"""
+        n = len(results) or 1
+        summary = summarize_results(results)
+        return {
+            'label': label,
+            'params': params,
+            'results': results,
+            'overall_score': summary['overall_score'],
+            'avg_precision': summary['avg_precision'],
+            'avg_recall': summary['avg_recall'],
+            'avg_f1_score': summary['avg_f1_score'],
+            'avg_ndcg': summary['avg_ndcg'],
+            'avg_response_time': summary['avg_response_time'],
+            'passed': summary['passed'],
+            'failed': len(results) - summary['passed'],
+            'exact_ratio': round(sum(1 for r in results if r['exact']) / n, 4),
+        }
+
+    def evaluate(self, param_sets: Dict[str, Dict[str, Any]], test_cases) -> Dict[str, Dict[str, Any]]:
+        """
+        以一次檢索評估所有參數組合
+
+        Args:
+            param_sets: {標籤: 版本參數（SearchAlgorithmVersion.parameters 格式）}
+            test_cases: BenchmarkTestCase 列表
+
+        Returns:
+            {標籤: 彙總結果}
+        """
+        include_hybrid = any(p.get('strategy') == 'hybrid_rrf' for p in param_sets.values())
+        per_label: Dict[str, List[Dict[str, Any]]] = {label: [] for label in param_sets}
+
+        for i, test_case in enumerate(test_cases, 1):
+            self._log(f"[{i}/{len(test_cases)}] {test_case.question[:40]}...")
+            try:
+                pool = self.build_pool(test_case, include_hybrid=include_hybrid)
+            except Exception as e:
+                logger.exception(f"建立候選池失敗: {e}")
+                pool = None
+
+            for label, params in param_sets.items():
+                try:
+                    if pool is None:
+                        raise RuntimeError("候選池不可用")
+                    per_label[label].append(self.rank_case(pool, params))
+                except Exception as e:
+                    logger.warning(f"參數組合 {label} 評估失敗: {e}")
+                    per_label[label].append(self._failed_result(test_case))
+
+        return {
+            label: self.summarize(label, param_sets[label], self.score_cases(results))
+            for label, results in per_label.items()
+        }
+
+    def grid_search(self, base_params: Dict[str, Any], grid: Dict[str, Iterable[Any]],
+                    test_cases, top_n: Optional[int] = None, n_resamples: int = 2000,
+                    seed: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        參數網格搜尋
+
+        每組參數另附逐案例總分的 bootstrap 95% 信賴區間（overall_ci），
+        以及與第一名配對置換檢定的 p 值（p_value_vs_best，第一名為 None）。
+
+        Returns:
+            依 overall_score 遞減排序的彙總結果（不含逐案例明細）
+        """
+        summaries = self.evaluate(expand_grid(base_params, grid), test_cases)
+        ranking = sorted(summaries.values(), key=lambda s: s['overall_score'], reverse=True)
+
+        if ranking and ranking[0]['results']:
+            scores = np.array([[r['overall_score'] for r in s['results']] for s in ranking], dtype=np.float64)
+            ci = bootstrap_ci(scores, n_resamples=n_resamples, seed=seed)
+            versus_best = paired_test(scores, scores[0], n_resamples=n_resamples, seed=seed)
+            for i, summary in enumerate(ranking):
+                summary['overall_ci'] = [round(ci['low'][i], 2), round(ci['high'][i], 2)]
+                summary['p_value_vs_best'] = None if i == 0 else round(versus_best['p_value'][i], 4)
+
+        ranking = [{k: v for k, v in s.items() if k != 'results'} for s in ranking]
+        return ranking[:top_n] if top_n else ranking
+
+    @staticmethod
+    def _failed_result(test_case) -> Dict[str, Any]:
+        return {'test_case': test_case, 'search_query': test_case.question, 'is_passed': False,
+                'precision': 0, 'recall': 0, 'f1_score': 0, 'ndcg': 0, 'speed_score': 0,
+                'overall_score': 0, 'true_positives': 0, 'false_positives': 0,
+                'false_negatives': len(test_case.expected_document_ids), 'response_time': 0,
+                'returned_document_ids': [], 'returned_document_scores': [], 'exact': False}
+
+    # ------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def save_test_run(version, summary: Dict[str, Any], run_name: str,
+                      run_type: str = 'batch_comparison', notes: str = ''):
+        """將彙總結果寫入 BenchmarkTestRun / BenchmarkTestResult"""
+        from django.db import transaction
+        from django.utils import timezone
+        from api.models import BenchmarkTestRun, BenchmarkTestResult
+
+        results = summary['results']
+        now = timezone.now()
+        with transaction.atomic():
+            test_run = BenchmarkTestRun.objects.create(
+                version=version, run_name=run_name, run_type=run_type, notes=notes,
+                total_test_cases=len(results), completed_test_cases=len(results),
+                passed_test_cases=summary['passed'], failed_test_cases=summary['failed'],
+                overall_score=Decimal(str(summary['overall_score'])),
+                avg_precision=Decimal(str(summary['avg_precision'])),
+                avg_recall=Decimal(str(summary['avg_recall'])),
+                avg_f1_score=Decimal(str(summary['avg_f1_score'])),
+                avg_response_time=Decimal(str(summary['avg_response_time'])),
+                status='completed', started_at=now, completed_at=now, duration_seconds=0
+            )
+            BenchmarkTestResult.objects.bulk_create([
+                BenchmarkTestResult(
+                    test_run=test_run, test_case=r['test_case'], search_query=r['search_query'],
+                    returned_document_ids=r['returned_document_ids'],
+                    returned_document_scores=r['returned_document_scores'],
+                    precision_score=Decimal(str(r['precision'])), recall_score=Decimal(str(r['recall'])),
+                    f1_score=Decimal(str(r['f1_score'])), ndcg_score=Decimal(str(r['ndcg'])),
+                    response_time=Decimal(str(r['response_time'])), true_positives=r['true_positives'],
+                    false_positives=r['false_positives'], false_negatives=r['false_negatives'],
+                    is_passed=r['is_passed']
+                )
+                for r in results
+            ])
+        return test_run
+
+
+__all__ = [
+    'SweepEngine',
+    'CandidatePool',
+    'QueryPool',
+    'rank_sections',
+    'rank_documents',
+    'result_ids',
+    'expand_grid',
+]
@@ -7,10 +7,16 @@ from django.utils import timezone
 from django.db import transaction
 from api.models import SearchAlgorithmVersion, BenchmarkTestCase, BenchmarkTestRun, BenchmarkTestResult
 from library.protocol_guide.search_service import ProtocolGuideSearchService
+from .run_metrics import summarize_results
 from .scoring_engine import ScoringEngine
+from library.common.stage_timing import collect_stages, summarize_stage_timings
+from .result_sink import BenchmarkResultSink
 
 logger = logging.getLogger(__name__)
 
+# 批次測試每累積幾筆結果寫入一次
+RESULT_BATCH_SIZE = 20
+
 class BenchmarkTestRunner:
     def __init__(self, version_id: int, verbose: bool = False):
         self.version_id = version_id
@@ -26,76 +32,9 @@ class BenchmarkTestRunner:
         try:
             start = time.time()
             
-            # ✅ 使用版本的搜尋參數配置
-            search_params = self.version.parameters or {}
-            strategy = search_params.get('strategy', 'hybrid_weighted')
-            
-            # 根據策略執行搜尋
-            if strategy == 'section_only':
-                # 純段落搜尋
-                search_mode = 'section_only'
-                threshold = search_params.get('section_threshold', 0.75)
-                
-                logger.info(f"🔍 版本 {self.version.version_code} - 策略: section_only, threshold: {threshold}")
-                
-                results = self.search_service.search_with_vectors(
-                    query=test_case.question, 
-                    limit=10, 
-                    threshold=threshold,
-                    search_mode=search_mode,
-                    stage=1
-                )
-                
-            elif strategy == 'document_only':
-                # 純全文搜尋
-                search_mode = 'document_only'
-                threshold = search_params.get('document_threshold', 0.65)
-                
-                logger.info(f"🔍 版本 {self.version.version_code} - 策略: document_only, threshold: {threshold}")
-                
-                results = self.search_service.search_with_vectors(
-                    query=test_case.question, 
-                    limit=10, 
-                    threshold=threshold,
-                    search_mode=search_mode,
-                    stage=1
-                )
-                
-            elif strategy == 'hybrid_weighted':
-                # ✅ 混合權重搜尋 - 使用 HybridWeightedStrategy
-                from library.benchmark.search_strategies import HybridWeightedStrategy
-                
-                section_weight = search_params.get('section_weight', 0.7)
-                document_weight = search_params.get('document_weight', 0.3)
-                section_threshold = search_params.get('section_threshold', 0.75)
-                document_threshold = search_params.get('document_threshold', 0.65)
-                
-                logger.info(
-                    f"🔍 版本 {self.version.version_code} - 策略: hybrid_weighted | "
-                    f"section_weight={section_weight}, document_weight={document_weight} | "
-                    f"section_threshold={section_threshold}, document_threshold={document_threshold}"
-                )
-                
-                hybrid_strategy = HybridWeightedStrategy(self.search_service)
-                results = hybrid_strategy.execute(
-                    query=test_case.question,
-                    limit=10,
-                    section_weight=section_weight,
-                    document_weight=document_weight,
-                    section_threshold=section_threshold,
-                    document_threshold=document_threshold
-                )
-                
-            else:
-                # 未知策略 - 使用 auto 模式
-                logger.warning(f"⚠️ 未知策略 '{strategy}'，使用 auto 模式")
-                results = self.search_service.search_with_vectors(
-                    query=test_case.question, 
-                    limit=10, 
-                    threshold=0.7,
-                    search_mode='auto',
-                    stage=1
-                )
+            # 搜尋期間收集各階段耗時（查詢向量、段落 SQL、Title Boost、RRF 等）
+            with collect_stages() as timings:
+                results = self._search(test_case)
             
             logger.info(f"   ✅ 搜尋完成，返回 {len(results)} 個結果")
             
@@ -105,57 +44,173 @@ class BenchmarkTestRunner:
             passed = m['true_positives'] >= test_case.min_required_matches
             result = {'test_case': test_case, 'search_query': test_case.question,
                      'returned_document_ids': ids, 'returned_document_scores': [r.get('score', 0) for r in results],
-                     'response_time': rt, 'is_passed': passed, **m}
+                     'response_time': rt, 'stage_timings': timings.as_dict(), 'is_passed': passed, **m}
             if save_to_db and test_run:
-                BenchmarkTestResult.objects.create(
-                    test_run=test_run, test_case=test_case, search_query=test_case.question,
-                    returned_document_ids=ids, returned_document_scores=result['returned_document_scores'],
-                    precision_score=Decimal(str(m['precision'])), recall_score=Decimal(str(m['recall'])),
-                    f1_score=Decimal(str(m['f1_score'])), ndcg_score=Decimal(str(m['ndcg'])),
-                    response_time=Decimal(str(rt)), true_positives=m['true_positives'],
-                    false_positives=m['false_positives'], false_negatives=m['false_negatives'], is_passed=passed)
+                self.build_result_record(test_run.id, test_case.id, result).save()
             return result
         except Exception as e:
             logger.exception(f"測試失敗: {e}")
             self._log(f"測試失敗: {e}", 'ERROR')
-            return {'test_case': test_case, 'search_query': test_case.question, 'is_passed': False, 
+            return {'test_case': test_case, 'search_query': test_case.question, 'is_passed': False, 'error': str(e),
                    'precision': 0, 'recall': 0, 'f1_score': 0, 'ndcg': 0, 'speed_score': 0, 
                    'overall_score': 0, 'true_positives': 0, 'false_positives': 0,
                    'false_negatives': len(test_case.expected_document_ids), 'response_time': 0,
                    'returned_document_ids': [], 'returned_document_scores': []}
     
-    @transaction.atomic
-    def run_batch_tests(self, test_cases, run_name, run_type='manual', notes=''):
+    def _search(self, test_case):
+        """依版本的搜尋參數配置執行搜尋"""
+        # ✅ 使用版本的搜尋參數配置
+        search_params = self.version.parameters or {}
+        strategy = search_params.get('strategy', 'hybrid_weighted')
+        
+        # 根據策略執行搜尋
+        if strategy == 'section_only':
+            # 純段落搜尋
+            search_mode = 'section_only'
+            threshold = search_params.get('section_threshold', 0.75)
+            
+            logger.info(f"🔍 版本 {self.version.version_code} - 策略: section_only, threshold: {threshold}")
+            
+            results = self.search_service.search_with_vectors(
+                query=test_case.question, 
+                limit=10, 
+                threshold=threshold,
+                search_mode=search_mode,
+                stage=1
+            )
+            
+        elif strategy == 'document_only':
+            # 純全文搜尋
+            search_mode = 'document_only'
+            threshold = search_params.get('document_threshold', 0.65)
+            
+            logger.info(f"🔍 版本 {self.version.version_code} - 策略: document_only, threshold: {threshold}")
+            
+            results = self.search_service.search_with_vectors(
+                query=test_case.question, 
+                limit=10, 
+                threshold=threshold,
+                search_mode=search_mode,
+                stage=1
+            )
+            
+        elif strategy == 'hybrid_weighted':
+            # ✅ 混合權重搜尋 - 使用 HybridWeightedStrategy
+            from library.benchmark.search_strategies import HybridWeightedStrategy
+            
+            section_weight = search_params.get('section_weight', 0.7)
+            document_weight = search_params.get('document_weight', 0.3)
+            section_threshold = search_params.get('section_threshold', 0.75)
+            document_threshold = search_params.get('document_threshold', 0.65)
+            
+            logger.info(
+                f"🔍 版本 {self.version.version_code} - 策略: hybrid_weighted | "
+                f"section_weight={section_weight}, document_weight={document_weight} | "
+                f"section_threshold={section_threshold}, document_threshold={document_threshold}"
+            )
+            
+            hybrid_strategy = HybridWeightedStrategy(self.search_service)
+            results = hybrid_strategy.execute(
+                query=test_case.question,
+                limit=10,
+                section_weight=section_weight,
+                document_weight=document_weight,
+                section_threshold=section_threshold,
+                document_threshold=document_threshold
+            )
+            
+        else:
+            # 未知策略 - 使用 auto 模式
+            logger.warning(f"⚠️ 未知策略 '{strategy}'，使用 auto 模式")
+            results = self.search_service.search_with_vectors(
+                query=test_case.question, 
+                limit=10, 
+                threshold=0.7,
+                search_mode='auto',
+                stage=1
+            )
+        
+        return results
+    
+    @staticmethod
+    def build_result_record(test_run_id, test_case_id, result):
+        """由 run_single_test 的結果建立（未儲存的）BenchmarkTestResult"""
+        return BenchmarkTestResult(
+            test_run_id=test_run_id, test_case_id=test_case_id, search_query=result['search_query'],
+            returned_document_ids=result['returned_document_ids'],
+            returned_document_scores=result['returned_document_scores'],
+            precision_score=Decimal(str(result['precision'])), recall_score=Decimal(str(result['recall'])),
+            f1_score=Decimal(str(result['f1_score'])), ndcg_score=Decimal(str(result['ndcg'])),
+            response_time=Decimal(str(result['response_time'])), true_positives=result['true_positives'],
+            false_positives=result['false_positives'], false_negatives=result['false_negatives'],
+            is_passed=result['is_passed'], stage_timings=result.get('stage_timings') or {},
+            cache_key=result.get('cache_key') or '',
+            detailed_results={'cached_from_run': result['cached_from_run']} if result.get('cached_from_run') else {})
+    
+    def run_batch_tests(self, test_cases, run_name, run_type='manual', notes='', max_workers=None,
+                        result_cache=None):
+        """
+        執行批量測試
+
+        result_cache（BenchmarkResultCache）：提供時沿用快取鍵相同的既有結果，只搜尋失效的案例，
+        新結果也會記錄快取鍵供下次重用。
+        """
+        if max_workers and max_workers > 1:
+            from .parallel_executor import ParallelBenchmarkExecutor
+            executor = ParallelBenchmarkExecutor(max_workers=max_workers, verbose=self.verbose)
+            return executor.run([self.version], test_cases, [run_name], run_type=run_type, notes=notes,
+                                result_cache=result_cache)[0]
+        with transaction.atomic():
+            return self._run_batch_tests_serial(test_cases, run_name, run_type, notes, result_cache)
+    
+    def _run_batch_tests_serial(self, test_cases, run_name, run_type, notes, result_cache=None):
         self._log(f"開始測試: {run_name}")
         test_run = BenchmarkTestRun.objects.create(
             version=self.version, run_name=run_name, run_type=run_type, notes=notes,
             total_test_cases=len(test_cases), status='running', started_at=timezone.now())
+        cached = result_cache.lookup([self.version], test_cases) if result_cache else {}
         results, passed = [], 0
-        for i, tc in enumerate(test_cases, 1):
-            self._log(f"[{i}/{len(test_cases)}] {tc.question[:40]}...")
-            r = self.run_single_test(tc, True, test_run)
-            results.append(r)
-            if r['is_passed']:
-                passed += 1
-            test_run.completed_test_cases = i
-            test_run.passed_test_cases = passed
-            test_run.failed_test_cases = i - passed
-            test_run.save()
+        # 同步模式：在本執行緒批次寫入，維持外層交易的原子性
+        with BenchmarkResultSink(batch_size=RESULT_BATCH_SIZE, background=False) as sink:
+            for i, tc in enumerate(test_cases, 1):
+                r = cached.get((self.version.id, tc.id))
+                if r is None:
+                    self._log(f"[{i}/{len(test_cases)}] {tc.question[:40]}...")
+                    r = self.run_single_test(tc)
+                    if result_cache and 'error' not in r:
+                        r['cache_key'] = result_cache.key(self.version, tc)
+                else:
+                    self._log(f"[{i}/{len(test_cases)}] (快取) {tc.question[:40]}...")
+                results.append(r)
+                sink.put(test_run.id, tc.id, r)
+                if r['is_passed']:
+                    passed += 1
+        self.finalize_test_run(test_run, results)
+        self._log(f"✅ 完成！分數: {float(test_run.overall_score or 0):.2f} | 通過: {passed}/{len(test_cases)}")
+        return test_run
+    
+    @staticmethod
+    def finalize_test_run(test_run, results):
+        """依測試案例順序彙總結果並標記完成（結果順序固定，彙總值即固定）"""
         n = len(results)
-        ap = sum(r.get('precision', 0) for r in results) / n
-        ar = sum(r.get('recall', 0) for r in results) / n
-        af = sum(r.get('f1_score', 0) for r in results) / n
-        an = sum(r.get('ndcg', 0) for r in results) / n
-        asp = sum(r.get('speed_score', 0) for r in results) / n
-        os = ScoringEngine.calculate_overall_score(ap, ar, af, an, asp)
-        test_run.overall_score = Decimal(str(os))
-        test_run.avg_precision = Decimal(str(round(ap, 4)))
-        test_run.avg_recall = Decimal(str(round(ar, 4)))
-        test_run.avg_f1_score = Decimal(str(round(af, 4)))
-        test_run.avg_response_time = Decimal(str(round(sum(r.get('response_time', 0) for r in results) / n, 2)))
+        passed = sum(1 for r in results if r['is_passed'])
+        test_run.completed_test_cases = n
+        test_run.passed_test_cases = passed
+        test_run.failed_test_cases = n - passed
+        if not n:
+            test_run.status = 'completed'
+            test_run.completed_at = timezone.now()
+            test_run.save()
+            return test_run
+        summary = summarize_results(results)
+        test_run.overall_score = Decimal(str(summary['overall_score']))
+        test_run.avg_precision = Decimal(str(summary['avg_precision']))
+        test_run.avg_recall = Decimal(str(summary['avg_recall']))
+        test_run.avg_f1_score = Decimal(str(summary['avg_f1_score']))
+        test_run.avg_response_time = Decimal(str(summary['avg_response_time']))
+        test_run.stage_latency = summarize_stage_timings(r.get('stage_timings') for r in results)
         test_run.status = 'completed'
         test_run.completed_at = timezone.now()
         test_run.duration_seconds = int((test_run.completed_at - test_run.started_at).total_seconds())
         test_run.save()
-        self._log(f"✅ 完成！分數: {os:.2f} | 通過: {passed}/{len(test_cases)}")
         return test_run
@@ -76,9 +76,32 @@ class ChatUsageRecorder:
                 'user_agent': 'unknown'
             }
     
+    def build_usage_fields(self, request_data: Dict[str, Any], client_info: Dict[str, str], user=None) -> Dict[str, Any]:
+        """
+        組成 ChatUsage 欄位（使用者以 user_id 表示，可直接序列化推入延後寫入佇列）
+        
+        Args:
+            request_data: 請求數據
+            client_info: 客戶端信息
+            user: 用戶對象
+            
+        Returns:
+            Dict[str, Any]: ChatUsage 欄位
+        """
+        return {
+            'user_id': user.id if user and user.is_authenticated else None,
+            'session_id': request_data.get('session_id', ''),
+            'chat_type': request_data.get('chat_type'),
+            'message_count': request_data.get('message_count', 1),
+            'has_file_upload': request_data.get('has_file_upload', False),
+            'response_time': request_data.get('response_time'),
+            'ip_address': client_info['ip_address'],
+            'user_agent': client_info['user_agent']
+        }
+    
     def create_usage_record(self, request_data: Dict[str, Any], client_info: Dict[str, str], user=None) -> Optional[Any]:
         """
-        創建使用記錄
+        創建使用記錄（同步寫入）
         
         Args:
             request_data: 請求數據
@@ -92,16 +115,7 @@ class ChatUsageRecorder:
             # 動態導入避免循環依賴
             from api.models import ChatUsage
             
-            usage_record = ChatUsage.objects.create(
-                user=user if user and user.is_authenticated else None,
-                session_id=request_data.get('session_id', ''),
-                chat_type=request_data.get('chat_type'),
-                message_count=request_data.get('message_count', 1),
-                has_file_upload=request_data.get('has_file_upload', False),
-                response_time=request_data.get('response_time'),
-                ip_address=client_info['ip_address'],
-                user_agent=client_info['user_agent']
-            )
+            usage_record = ChatUsage.objects.create(**self.build_usage_fields(request_data, client_info, user))
             
             self.logger.info(f"聊天使用記錄創建成功: ID={usage_record.id}, 類型={request_data.get('chat_type')}")
             return usage_record
@@ -113,6 +127,19 @@ class ChatUsageRecorder:
             self.logger.error(f"使用記錄創建失敗: {e}")
             return None
     
+    def enqueue_usage_record(self, request_data: Dict[str, Any], client_info: Dict[str, str], user=None) -> bool:
+        """
+        推入延後寫入佇列（停用或推入失敗時回傳 False）
+        
+        Returns:
+            bool: 是否已推入
+        """
+        try:
+            from library.conversation_management.write_behind import enqueue_usage
+        except ImportError:
+            return False
+        return enqueue_usage(self.build_usage_fields(request_data, client_info, user))
+    
     def record_chat_usage(self, request_data: Dict[str, Any], client_info: Dict[str, str], user=None) -> Dict[str, Any]:
         """
         記錄聊天使用
@@ -136,6 +163,15 @@ class ChatUsageRecorder:
                     'valid_types': self.valid_types
                 }
             
+            # 延後寫入：不等待資料庫（record_id 為 None）
+            if self.enqueue_usage_record(request_data, client_info, user):
+                return {
+                    'success': True,
+                    'record_id': None,
+                    'queued': True,
+                    'chat_type': chat_type
+                }
+            
             # 創建使用記錄
             usage_record = self.create_usage_record(request_data, client_info, user)
             
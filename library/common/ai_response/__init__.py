@@ -4,6 +4,7 @@ AI Response Analysis Module
 提供 AI 回答分析相關功能：
 - 不確定性檢測
 - 回答品質評估
+- 兩階段搜尋的 Stage 2 需求預測與推測執行
 """
 
 from .uncertainty_detector import (
@@ -11,9 +12,19 @@ from .uncertainty_detector import (
     UNCERTAINTY_KEYWORDS,
     format_fallback_response,
 )
+from .speculation import (
+    SpeculativeStage,
+    StagePrediction,
+    StagePredictor,
+    speculation_enabled,
+)
 
 __all__ = [
     'is_uncertain_response',
     'UNCERTAINTY_KEYWORDS',
     'format_fallback_response',
+    'SpeculativeStage',
+    'StagePrediction',
+    'StagePredictor',
+    'speculation_enabled',
 ]
@@ -0,0 +1,413 @@
+"""
+兩階段搜尋推測執行（Speculative Stage 2）
+
+兩階段搜尋在 Stage 1 回答不確定後才送出 Stage 2，不確定的問題要等兩次 LLM 往返。
+推測模式在 Stage 1 進行的同時預測是否需要 Stage 2，預測需要時立即送出：
+
+- StagePredictor：依查詢類型（_classify_and_clean_query）、段落搜尋最高分、
+  相似查詢（清理後查詢相同）的歷史不確定率預測是否需要 Stage 2
+- SpeculativeStage：在背景執行預測與 Stage 2（streaming）。Stage 1 確定時中止 Stage 2
+  （關閉串流並呼叫 Dify stop API）；不確定時直接取用已在進行的 Stage 2
+- 每次請求記錄預測是否命中（或推測的 Stage 2 失敗）、節省與浪費的時間，
+  StagePredictor.report() 彙整命中率
+
+歷史與統計存於 Redis（跨 worker 共用），Redis 無法連線時改存於行程內。
+以環境變數 TWO_TIER_SPECULATION=true 啟用；預設停用，因為預測錯誤時會多一次 Dify 生成。
+
+Usage:
+    predictor = StagePredictor('protocol_guide')
+    speculation = SpeculativeStage(predictor, query_type, cleaned_query,
+                                   stream=lambda: client.stream_chat_events(...)).start()
+    stage_1 = client.chat(...)
+    stage_2 = speculation.resolve(needed=is_uncertain, stage_1_end=time.time())
+    # stage_2 為 None 時（未推測或推測失敗）依原流程送出 Stage 2
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'ai_platform:two_tier_speculation'
+HISTORY_TTL = 30 * 24 * 3600  # 相似查詢歷史保留 30 天
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def speculation_enabled() -> bool:
+    """是否啟用推測執行（TWO_TIER_SPECULATION，預設停用）"""
+    return os.getenv('TWO_TIER_SPECULATION', 'false').lower() in ('1', 'true', 'yes', 'on')
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """推測執行共用的執行緒池（TWO_TIER_SPECULATION_WORKERS，預設 8）"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.getenv('TWO_TIER_SPECULATION_WORKERS', '8')),
+                    thread_name_prefix='two-tier-speculation'
+                )
+    return _executor
+
+
+@dataclass
+class StagePrediction:
+    """一次 Stage 2 需求預測"""
+    speculate: bool
+    reason: str                             # document_query / low_section_score / history_uncertain_rate / confident
+    top_score: Optional[float] = None
+    uncertain_rate: Optional[float] = None
+    history_samples: int = 0
+
+
+class _LocalHashes:
+    """Redis 無法連線時的行程內替代（只實作用到的 hash 指令）"""
+
+    def __init__(self):
+        self._hashes = defaultdict(lambda: defaultdict(float))
+        self._lock = threading.Lock()
+
+    def hincrbyfloat(self, key, field, amount):
+        with self._lock:
+            self._hashes[key][field] += amount
+
+    hincrby = hincrbyfloat
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._hashes.get(key, {}))
+
+    def expire(self, key, seconds):
+        pass
+
+    def pipeline(self):
+        return self
+
+    def execute(self):
+        pass
+
+
+class StagePredictor:
+    """
+    Stage 2 需求預測器
+
+    預測規則（依序）：
+    1. 查詢類型為 document（含「完整」「全部」等）→ 段落搜尋通常不足
+    2. 段落搜尋最高分低於 low_score → 知識庫中沒有貼近的段落
+    3. 相似查詢的歷史不確定率 ≥ uncertain_rate_threshold
+       （樣本不足 min_samples 時改用同查詢類型的整體比率）
+    """
+
+    def __init__(self, namespace: str, uncertain_rate_threshold: float = 0.5, min_samples: int = 3,
+                 low_score: float = 0.6, redis_client=None):
+        """
+        Args:
+            namespace: 統計的命名空間（如 'protocol_guide'）
+            uncertain_rate_threshold: 歷史不確定率達此值即推測
+            min_samples: 歷史率至少需要的樣本數
+            low_score: 段落搜尋最高分低於此值即推測
+            redis_client: 統計用的 Redis 連線（預設 django_redis 的 default）
+        """
+        self.namespace = namespace
+        self.uncertain_rate_threshold = uncertain_rate_threshold
+        self.min_samples = min_samples
+        self.low_score = low_score
+        self._store = redis_client
+        self._store_lock = threading.Lock()
+
+    @property
+    def store(self):
+        """Redis 連線（無法連線時改用行程內統計）"""
+        if self._store is None:
+            with self._store_lock:
+                if self._store is None:
+                    try:
+                        from django_redis import get_redis_connection
+                        client = get_redis_connection('default')
+                        client.ping()
+                        self._store = client
+                    except Exception as e:
+                        logger.warning(f"⚠️ [Speculation] Redis 無法連線，預測統計改存於行程內: {e}")
+                        self._store = _LocalHashes()
+        return self._store
+
+    def _key(self, *parts: str) -> str:
+        return ':'.join((KEY_PREFIX, self.namespace) + parts)
+
+    @staticmethod
+    def history_key(cleaned_query: str) -> str:
+        """相似查詢的歸類 key（清理後查詢忽略大小寫與空白）"""
+        normalized = ' '.join((cleaned_query or '').upper().split())
+        return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+    def _read_hash(self, key: str) -> Dict[str, float]:
+        raw = self.store.hgetall(key) or {}
+        return {
+            (k.decode('utf-8') if isinstance(k, bytes) else k): float(v)
+            for k, v in raw.items()
+        }
+
+    def uncertain_rate(self, query_type: str, cleaned_query: str) -> Tuple[Optional[float], int]:
+        """相似查詢的歷史不確定率（樣本不足時退回查詢類型整體）"""
+        for key in (self._key('query', self.history_key(cleaned_query)), self._key('type', query_type)):
+            counts = self._read_hash(key)
+            samples = int(counts.get('total', 0))
+            if samples >= self.min_samples:
+                return counts.get('uncertain', 0) / samples, samples
+        return None, 0
+
+    def predict(self, query_type: str, cleaned_query: str, top_score: Optional[float] = None) -> StagePrediction:
+        """預測這次查詢是否需要 Stage 2"""
+        try:
+            rate, samples = self.uncertain_rate(query_type, cleaned_query)
+        except Exception as e:
+            logger.warning(f"⚠️ [Speculation] 讀取歷史不確定率失敗: {e}")
+            rate, samples = None, 0
+
+        fields = {'top_score': top_score, 'uncertain_rate': rate, 'history_samples': samples}
+        if query_type == 'document':
+            return StagePrediction(True, 'document_query', **fields)
+        if top_score is not None and top_score < self.low_score:
+            return StagePrediction(True, 'low_section_score', **fields)
+        if rate is not None and rate >= self.uncertain_rate_threshold:
+            return StagePrediction(True, 'history_uncertain_rate', **fields)
+        return StagePrediction(False, 'confident', **fields)
+
+    def record(self, query_type: str, cleaned_query: str, prediction: Optional[StagePrediction],
+               needed_stage_2: bool, saved_seconds: float = 0.0, wasted_seconds: float = 0.0,
+               failed: bool = False):
+        """
+        記錄一次請求的結果（更新相似查詢歷史與命中統計）
+
+        Args:
+            prediction: 預測結果（Stage 1 結束時預測尚未完成為 None）
+            needed_stage_2: Stage 1 回答是否不確定
+            saved_seconds: 推測命中時節省的延遲
+            wasted_seconds: 推測落空或失敗時 Stage 2 已執行的時間
+            failed: 推測的 Stage 2 失敗或未完成（呼叫端改為依序送出，沒有節省）
+        """
+        uncertain = int(needed_stage_2)
+        report_key = self._key('report')
+        try:
+            pipe = self.store.pipeline()
+            for key in (self._key('query', self.history_key(cleaned_query)), self._key('type', query_type)):
+                pipe.hincrby(key, 'total', 1)
+                pipe.hincrby(key, 'uncertain', uncertain)
+                pipe.expire(key, HISTORY_TTL)
+
+            pipe.hincrby(report_key, 'requests', 1)
+            pipe.hincrby(report_key, 'needed', uncertain)
+            if prediction is None:
+                pipe.hincrby(report_key, 'unpredicted', 1)
+            elif prediction.speculate:
+                if failed:
+                    outcome = 'failed'
+                else:
+                    outcome = 'hits' if needed_stage_2 else 'wasted'
+                pipe.hincrby(report_key, 'speculated', 1)
+                pipe.hincrby(report_key, outcome, 1)
+                pipe.hincrby(report_key, f'{outcome}:{prediction.reason}', 1)
+                if saved_seconds:
+                    pipe.hincrbyfloat(report_key, 'saved_seconds', saved_seconds)
+                if wasted_seconds:
+                    pipe.hincrbyfloat(report_key, 'wasted_seconds', wasted_seconds)
+            elif needed_stage_2:
+                pipe.hincrby(report_key, 'missed', 1)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"⚠️ [Speculation] 記錄預測結果失敗: {e}")
+
+    def report(self) -> Dict[str, Any]:
+        """
+        預測命中率與節省的延遲
+
+        Returns:
+            Dict: requests / needed / speculated / hits / wasted / failed / missed、
+                  hit_rate（推測中成功取用的比例）、recall（需要 Stage 2 中成功取用推測的比例）、
+                  saved_seconds / avg_saved_seconds、wasted_seconds、by_reason
+        """
+        counts = self._read_hash(self._key('report'))
+
+        def get(name):
+            return int(counts.get(name, 0))
+
+        speculated, hits, missed, failed = get('speculated'), get('hits'), get('missed'), get('failed')
+        saved = counts.get('saved_seconds', 0.0)
+        reasons = sorted({name.split(':', 1)[1] for name in counts if ':' in name})
+        return {
+            'namespace': self.namespace,
+            'requests': get('requests'),
+            'needed': get('needed'),
+            'speculated': speculated,
+            'hits': hits,
+            'wasted': get('wasted'),
+            'failed': failed,
+            'missed': missed,
+            'unpredicted': get('unpredicted'),
+            'hit_rate': hits / speculated if speculated else None,
+            'recall': hits / (hits + failed + missed) if hits + failed + missed else None,
+            'saved_seconds': round(saved, 3),
+            'avg_saved_seconds': round(saved / hits, 3) if hits else None,
+            'wasted_seconds': round(counts.get('wasted_seconds', 0.0), 3),
+            'by_reason': {
+                reason: {outcome: get(f'{outcome}:{reason}') for outcome in ('hits', 'wasted', 'failed')}
+                for reason in reasons
+            },
+        }
+
+
+class SpeculativeStage:
+    """
+    在背景預測並推測執行一次 Stage 2
+
+    推測的 Stage 2 與 Stage 1 同時進行，因此必須送到另一個 Dify 對話（stream 以空的
+    conversation_id 送出）：同一對話中會讓中止的生成留下中斷的一輪。
+    與依序執行的差異（上下文）：
+    - Stage 2 看不到 Stage 1 那一輪問答
+    - 取用時回應的 conversation_id 是 Stage 2 的對話，後續追問接續在該對話
+    因此呼叫端只在尚無對話（沒有先前上下文）時推測。
+    """
+
+    def __init__(self, predictor: StagePredictor, query_type: str, cleaned_query: str,
+                 stream: Callable[[], Iterator[Dict[str, Any]]],
+                 stop: Optional[Callable[[str], Any]] = None,
+                 section_score: Optional[Callable[[], Optional[float]]] = None):
+        """
+        Args:
+            predictor: 預測器
+            query_type / cleaned_query: _classify_and_clean_query 的結果
+            stream: 在另一個對話送出 Stage 2 並產生 Dify streaming 事件（DifyChatClient.stream_chat_events）
+            stop: 以 task_id 中止 Dify 生成（Stage 1 確定時呼叫）
+            section_score: 回傳段落搜尋最高分（在背景執行，不延遲 Stage 1）
+        """
+        self.predictor = predictor
+        self.query_type = query_type
+        self.cleaned_query = cleaned_query
+        self._stream = stream
+        self._stop = stop
+        self._section_score = section_score
+
+        self.prediction: Optional[StagePrediction] = None
+        self.accumulator = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._predicted = threading.Event()
+        self._done = threading.Event()
+        self._cancelled = threading.Event()
+        self._resolved = False
+
+    def start(self) -> 'SpeculativeStage':
+        _get_executor().submit(self._run)
+        return self
+
+    def _run(self):
+        from django.db import close_old_connections
+        from library.dify_integration.stream_relay import StreamAccumulator
+
+        try:
+            top_score = self._section_score() if self._section_score else None
+            self.prediction = self.predictor.predict(self.query_type, self.cleaned_query, top_score)
+        except Exception as e:
+            logger.warning(f"⚠️ [Speculation] 預測失敗，不推測: {e}")
+            self.prediction = StagePrediction(False, 'predict_error')
+        finally:
+            close_old_connections()
+            self._predicted.set()
+
+        try:
+            if not self.prediction.speculate or self._cancelled.is_set():
+                return
+            logger.info(f"   🚀 推測執行 Stage 2（{self.prediction.reason}）")
+            self.started_at = time.time()
+            accumulator = StreamAccumulator(self.started_at)
+            task_id = None
+            events = self._stream()
+            try:
+                for event in events:
+                    task_id = task_id or event.get('task_id')
+                    accumulator.feed(event)
+                    if self._cancelled.is_set():
+                        break
+            finally:
+                events.close()
+                self.finished_at = time.time()
+            if self._cancelled.is_set() and not accumulator.finished and task_id and self._stop:
+                self._stop(task_id)
+            self.accumulator = accumulator
+        except Exception as e:
+            logger.warning(f"⚠️ [Speculation] 推測的 Stage 2 失敗: {e}")
+        finally:
+            self._done.set()
+
+    def cancel(self):
+        """中止推測且不記錄結果（Stage 1 失敗時）"""
+        self._resolved = True
+        self._cancelled.set()
+
+    def resolve(self, needed: bool, stage_1_end: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Stage 1 結束後決定推測的去留並記錄結果
+
+        Args:
+            needed: Stage 1 回答是否不確定（需要 Stage 2）
+            stage_1_end: Stage 1 完成時間（預設為現在）
+
+        Returns:
+            Dict: 需要 Stage 2 且推測成功時，回傳與 DifyChatClient.chat 相同結構的回應；
+                  否則為 None（呼叫端依原流程處理）
+        """
+        if self._resolved:
+            return None
+        self._resolved = True
+        stage_1_end = stage_1_end or time.time()
+
+        if not needed:
+            # Stage 1 已確定：不等待背景工作，直接中止推測
+            self._cancelled.set()
+            prediction = self.prediction if self._predicted.is_set() else None
+            wasted = max(0.0, stage_1_end - self.started_at) if self.started_at else 0.0
+            self.predictor.record(self.query_type, self.cleaned_query, prediction, False, wasted_seconds=wasted)
+            return None
+
+        self._predicted.wait()
+        if not self.prediction.speculate:
+            self.predictor.record(self.query_type, self.cleaned_query, self.prediction, True)
+            return None
+
+        self._done.wait()
+        accumulator = self.accumulator
+        if accumulator is None or accumulator.error or not accumulator.finished:
+            logger.warning("⚠️ [Speculation] 推測的 Stage 2 未完成，改為依序送出")
+            # 多送了一次 Dify 請求且沒有節省：記為失敗而非命中
+            wasted = max(0.0, (self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+            self.predictor.record(self.query_type, self.cleaned_query, self.prediction, True,
+                                  wasted_seconds=wasted, failed=True)
+            return None
+
+        # 依序執行時 Stage 2 於 Stage 1 結束才開始；推測執行節省的是兩者重疊的時間
+        saved = max(0.0, min(self.finished_at - self.started_at, stage_1_end - self.started_at))
+        logger.info(f"   ✅ 推測命中（{self.prediction.reason}），節省 {saved:.2f} 秒")
+        self.predictor.record(self.query_type, self.cleaned_query, self.prediction, True, saved_seconds=saved)
+        response = accumulator.as_response()
+        response['speculation'] = {'reason': self.prediction.reason, 'saved_seconds': saved}
+        return response
+
+
+__all__ = [
+    'HISTORY_TTL',
+    'KEY_PREFIX',
+    'SpeculativeStage',
+    'StagePrediction',
+    'StagePredictor',
+    'speculation_enabled',
+]
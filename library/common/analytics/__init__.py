@@ -8,6 +8,8 @@ Architecture:
 - BaseQuestionAnalyzer: 問題分析基礎類別
 - BaseSatisfactionAnalyzer: 滿意度分析基礎類別
 - BaseAPIHandler: API 處理器基礎類別
+- daily_rollup: 對話每日彙總（儀表板讀取的物化統計）
+- question_stream: 串流問題統計（Space-Saving 草圖，固定記憶體）
 
 Usage:
     from library.common.analytics.base_statistics_manager import BaseStatisticsManager
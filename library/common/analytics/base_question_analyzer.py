@@ -13,10 +13,9 @@ Usage:
 """
 
 import logging
-from typing import Dict, List, Optional, Tuple
-from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from datetime import datetime
 from abc import ABC, abstractmethod
-from collections import Counter
 
 logger = logging.getLogger(__name__)
 
@@ -73,7 +72,7 @@ class BaseQuestionAnalyzer(ABC):
     
     def analyze_questions(self, days=30, user=None, mode='simple') -> Dict:
         """
-        分析問題統計（共用邏輯）
+        分析問題統計（共用邏輯，結果依 (assistant, days, user, mode) 快取）
         
         Args:
             days: 分析天數
@@ -84,39 +83,12 @@ class BaseQuestionAnalyzer(ABC):
             dict: 問題分析結果
         """
         try:
-            # 獲取用戶問題
-            questions = self._get_user_questions(days, user)
+            from .question_stream import cached_question_stats
             
-            if not questions:
-                return {
-                    'total_questions': 0,
-                    'message': '沒有找到相關問題數據',
-                    'assistant_type': self.get_assistant_type()
-                }
-            
-            # 基礎統計
-            total_questions = len(questions)
-            
-            # 關鍵詞提取
-            top_keywords = self._extract_top_keywords(questions)
-            
-            # 問題頻率統計
-            popular_questions = self._analyze_popular_questions(questions, mode)
-            
-            # 分類統計（如果有分類資訊）
-            category_distribution = self._analyze_category_distribution(questions)
-            
-            return {
-                'analysis_period': f'{days} 天',
-                'assistant_type': self.get_assistant_type(),
-                'period': f'最近 {days} 天',
-                'total_questions': total_questions,
-                'top_keywords': top_keywords,
-                'popular_questions': popular_questions,
-                'category_distribution': category_distribution,
-                'analysis_method': mode,
-                'analyzed_at': datetime.now().isoformat()
-            }
+            return cached_question_stats(
+                [self.get_assistant_type(), days, user.id if user else 'all', mode],
+                lambda: self._build_question_analysis(days, user, mode)
+            )
             
         except Exception as e:
             self.logger.error(f"問題分析失敗: {str(e)}", exc_info=True)
@@ -125,94 +97,71 @@ class BaseQuestionAnalyzer(ABC):
                 'assistant_type': self.get_assistant_type()
             }
     
+    def _build_question_analysis(self, days: int, user=None, mode='simple') -> Dict:
+        """單次串流掃描問題，同時累計關鍵詞、熱門問題與分類分布"""
+        from .question_stream import QuestionStreamStats
+        
+        stats = QuestionStreamStats(classify=self._categorize_question)
+        stats.consume(self._iter_user_questions(days, user), key='content')
+        
+        if not stats.total_questions:
+            return {
+                'total_questions': 0,
+                'message': '沒有找到相關問題數據',
+                'assistant_type': self.get_assistant_type()
+            }
+        
+        if mode == 'smart':
+            # 智慧分析需要訊息資料，重新串流一次
+            popular_questions = self._smart_analyze_popular_questions(self._iter_user_questions(days, user))
+        else:
+            popular_questions = self._format_popular_questions(stats.popular_questions(10, merge_similar=True))
+        
+        category_distribution = {category: 0 for category in self.get_question_categories()}
+        category_distribution.update(stats.categories)
+        
+        return {
+            'analysis_period': f'{days} 天',
+            'assistant_type': self.get_assistant_type(),
+            'period': f'最近 {days} 天',
+            'total_questions': stats.total_questions,
+            'top_keywords': stats.top_keywords(10),
+            'popular_questions': popular_questions,
+            'category_distribution': category_distribution,
+            'analysis_method': mode,
+            'analyzed_at': datetime.now().isoformat()
+        }
+    
+    def _iter_user_questions(self, days: int, user=None) -> Iterator[Dict]:
+        """串流讀取用戶問題（共用邏輯）"""
+        from .question_stream import iter_user_questions
+        
+        return iter_user_questions(
+            self.get_system_type_filter(), days, user,
+            fields=('id', 'content', 'conversation_id', 'created_at')
+        )
+    
     def _get_user_questions(self, days: int, user=None) -> List[Dict]:
-        """獲取用戶問題（共用邏輯）"""
+        """獲取用戶問題列表（僅供需要完整列表的呼叫端，分析流程請使用 _iter_user_questions）"""
         try:
-            from django.utils import timezone
-            
-            MessageModel = self.get_message_model()
-            ConversationModel = self.get_conversation_model()
-            
-            start_date = timezone.now() - timedelta(days=days)
-            system_type = self.get_system_type_filter()
-            
-            # 查詢對話
-            sessions_query = ConversationModel.objects.filter(
-                created_at__gte=start_date,
-                system_type=system_type
-            )
-            
-            if user:
-                sessions_query = sessions_query.filter(user=user)
-            
-            conversation_ids = sessions_query.values_list('conversation_id', flat=True)
-            
-            # 查詢用戶問題（role='user'）
-            questions_query = MessageModel.objects.filter(
-                conversation_id__in=conversation_ids,
-                role='user',
-                created_at__gte=start_date
-            ).order_by('-created_at')
-            
-            # 提取數據
-            questions = []
-            for msg in questions_query:
-                data = {
-                    'id': msg.id,
-                    'content': msg.content,
-                    'conversation_id': msg.conversation_id,
-                    'created_at': msg.created_at
-                }
-                questions.append(data)
-            
-            return questions
-            
+            return list(self._iter_user_questions(days, user))
         except Exception as e:
             self.logger.error(f"獲取用戶問題失敗: {str(e)}", exc_info=True)
             return []
     
-    def _extract_top_keywords(self, questions: List[Dict], top_n=10) -> List[Dict]:
-        """提取高頻關鍵詞（共用邏輯）"""
+    def _extract_top_keywords(self, questions: Iterable[Dict], top_n=10) -> List[Dict]:
+        """提取高頻關鍵詞（共用邏輯，Space-Saving 草圖）"""
         try:
-            import jieba
-            from collections import Counter
+            from .question_stream import QuestionStreamStats
             
-            # 停用詞
-            stop_words = {'的', '了', '是', '在', '我', '有', '和', '就', '不', '人', '都', '一', 
-                         '一個', '上', '也', '很', '到', '說', '要', '去', '你', '會', '著', '沒有',
-                         '看', '好', '自己', '這', '嗎', '？', '！', '。', '，', '、', '怎麼', '什麼',
-                         '可以', '請問', '如何', '為什麼', '能', '想', '請', '謝謝', '幫忙'}
+            stats = QuestionStreamStats().consume(questions, key='content')
+            return stats.top_keywords(top_n)
             
-            # 提取所有問題的關鍵詞
-            all_words = []
-            for q in questions:
-                content = q.get('content', '')
-                if content:
-                    words = jieba.cut(content)
-                    # 過濾停用詞和短詞
-                    filtered_words = [
-                        w for w in words 
-                        if w not in stop_words and len(w) > 1
-                    ]
-                    all_words.extend(filtered_words)
-            
-            # 統計詞頻
-            word_counts = Counter(all_words)
-            top_keywords = [
-                {'keyword': word, 'count': count}
-                for word, count in word_counts.most_common(top_n)
-            ]
-            
-            return top_keywords
-            
-        except ImportError:
-            self.logger.warning("jieba 未安裝，跳過關鍵詞提取")
-            return []
         except Exception as e:
             self.logger.error(f"提取關鍵詞失敗: {str(e)}", exc_info=True)
             return []
     
-    def _analyze_popular_questions(self, questions: List[Dict], mode='simple') -> List[Dict]:
+    def _analyze_popular_questions(self, questions: Iterable[Dict], mode='simple') -> List[Dict]:
         """分析熱門問題（共用邏輯）"""
         try:
             if mode == 'smart':
@@ -226,31 +175,30 @@ class BaseQuestionAnalyzer(ABC):
             self.logger.error(f"分析熱門問題失敗: {str(e)}", exc_info=True)
             return []
     
-    def _simple_analyze_popular_questions(self, questions: List[Dict], top_n=10) -> List[Dict]:
-        """簡單頻率統計（共用邏輯）"""
+    def _simple_analyze_popular_questions(self, questions: Iterable[Dict], top_n=10) -> List[Dict]:
+        """簡單頻率統計（共用邏輯，Space-Saving 草圖）"""
         try:
-            from collections import Counter
-            
-            # 統計問題頻率
-            question_counts = Counter(q['content'] for q in questions if q.get('content'))
+            from .question_stream import QuestionStreamStats
             
-            # 取前 N 個高頻問題
-            popular = [
-                {
-                    'question': question,
-                    'count': count,
-                    'pattern': question[:50] + '...' if len(question) > 50 else question
-                }
-                for question, count in question_counts.most_common(top_n)
-            ]
-            
-            return popular
+            stats = QuestionStreamStats(extract_keywords=False).consume(questions, key='content')
+            return self._format_popular_questions(stats.popular_questions(top_n, merge_similar=True))
             
         except Exception as e:
             self.logger.error(f"簡單頻率統計失敗: {str(e)}", exc_info=True)
             return []
     
-    def _smart_analyze_popular_questions(self, questions: List[Dict]) -> List[Dict]:
+    def _format_popular_questions(self, question_counts: List[Tuple[str, int]]) -> List[Dict]:
+        """格式化熱門問題"""
+        return [
+            {
+                'question': question,
+                'count': count,
+                'pattern': question[:50] + '...' if len(question) > 50 else question
+            }
+            for question, count in question_counts
+        ]
+    
+    def _smart_analyze_popular_questions(self, questions: Iterable[Dict]) -> List[Dict]:
         """
         智慧分析熱門問題（使用向量聚類）
         
@@ -260,37 +208,41 @@ class BaseQuestionAnalyzer(ABC):
         self.logger.info("智慧分析模式未實作，降級到簡單統計")
         return self._simple_analyze_popular_questions(questions)
     
-    def _analyze_category_distribution(self, questions: List[Dict]) -> Dict[str, int]:
+    def get_category_keywords(self) -> Dict[str, List[str]]:
+        """
+        返回分類關鍵詞映射（子類別可覆寫）
+        
+        Returns:
+            dict: {分類: [關鍵詞, ...]}，未命中任何分類者歸入「其他」
+        """
+        return {
+            '技術問題': ['錯誤', '失敗', '問題', 'error', 'bug', '不行'],
+            '操作指南': ['如何', '怎麼', '步驟', '教學', '使用'],
+            '故障排除': ['無法', '不能', '卡住', '異常', '修復'],
+            '功能諮詢': ['功能', '支援', '可以', '能不能', '有沒有'],
+        }
+    
+    def _categorize_question(self, content: str) -> Optional[str]:
+        """以關鍵詞判斷單一問題的分類"""
+        content = (content or '').lower()
+        for category, keywords in self.get_category_keywords().items():
+            if any(keyword in content for keyword in keywords):
+                return category
+        return '其他' if '其他' in self.get_question_categories() else None
+    
+    def _analyze_category_distribution(self, questions: Iterable[Dict]) -> Dict[str, int]:
         """
         分析問題分類分布（共用邏輯）
         
-        子類別可以覆寫此方法以實作專屬的分類邏輯
+        子類別可以覆寫 get_category_keywords / _categorize_question 以實作專屬的分類邏輯
         """
         try:
-            # 預設使用簡單分類（基於關鍵詞）
-            categories = self.get_question_categories()
-            distribution = {cat: 0 for cat in categories}
-            
-            # 關鍵詞映射（子類別可以覆寫）
-            category_keywords = {
-                '技術問題': ['錯誤', '失敗', '問題', 'error', 'bug', '不行'],
-                '操作指南': ['如何', '怎麼', '步驟', '教學', '使用'],
-                '故障排除': ['無法', '不能', '卡住', '異常', '修復'],
-                '功能諮詢': ['功能', '支援', '可以', '能不能', '有沒有'],
-            }
+            distribution = {cat: 0 for cat in self.get_question_categories()}
             
             for q in questions:
-                content = q.get('content', '').lower()
-                categorized = False
-                
-                for category, keywords in category_keywords.items():
-                    if any(keyword in content for keyword in keywords):
-                        distribution[category] += 1
-                        categorized = True
-                        break
-                
-                if not categorized and '其他' in distribution:
-                    distribution['其他'] += 1
+                category = self._categorize_question(q.get('content', ''))
+                if category:
+                    distribution[category] = distribution.get(category, 0) + 1
             
             return distribution
             
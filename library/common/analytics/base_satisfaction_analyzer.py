@@ -68,22 +68,31 @@ class BaseSatisfactionAnalyzer(ABC):
             dict: 滿意度分析結果
         """
         try:
-            # 獲取消息數據
-            messages_data = self._get_messages_data(user, days, conversation_id)
-            
-            if not messages_data:
-                return {
-                    'total_messages': 0,
-                    'satisfaction_score': None,
-                    'message': '沒有找到相關消息數據',
-                    'assistant_type': self.get_assistant_type()
-                }
-            
-            # 基礎統計
-            basic_stats = self._calculate_basic_stats(messages_data)
-            
-            # 回應時間與滿意度關係
-            response_time_analysis = self._analyze_response_time_satisfaction(messages_data)
+            if conversation_id:
+                # 單一對話：直接分析訊息
+                messages_data = self._get_messages_data(user, days, conversation_id)
+
+                if not messages_data:
+                    return self._empty_result()
+
+                # 基礎統計
+                basic_stats = self._calculate_basic_stats(messages_data)
+
+                # 回應時間與滿意度關係
+                response_time_analysis = self._analyze_response_time_satisfaction(messages_data)
+            else:
+                # 時間範圍：讀取每日彙總
+                from library.common.analytics.daily_rollup import (
+                    get_daily_rollup_service, satisfaction_from_totals
+                )
+                totals = get_daily_rollup_service().get_totals(self.get_system_type_filter(), days, user)
+
+                if not totals['assistant_message_count']:
+                    return self._empty_result()
+
+                rollup_stats = satisfaction_from_totals(totals)
+                basic_stats = rollup_stats['basic_stats']
+                response_time_analysis = rollup_stats['response_time_analysis']
             
             # 生成建議
             recommendations = self._generate_recommendations(basic_stats, response_time_analysis)
@@ -104,6 +113,15 @@ class BaseSatisfactionAnalyzer(ABC):
                 'assistant_type': self.get_assistant_type()
             }
     
+    def _empty_result(self) -> Dict:
+        """沒有消息數據時的結果"""
+        return {
+            'total_messages': 0,
+            'satisfaction_score': None,
+            'message': '沒有找到相關消息數據',
+            'assistant_type': self.get_assistant_type()
+        }
+
     def _get_messages_data(self, user=None, days=30, conversation_id=None) -> List[Dict]:
         """獲取消息數據（共用邏輯）"""
         try:
@@ -133,8 +133,178 @@ class BaseStatisticsManager(ABC):
                 'assistant_type': self.get_assistant_type()
             }
     
+    def use_rollups(self) -> bool:
+        """
+        是否從每日彙總表（conversation_daily_rollups）讀取統計
+
+        彙總表只以 (日期, chat_type, 用戶) 分組，無法套用自訂的 ORM 過濾條件；
+        子類別定義了額外過濾條件時改為直接查詢原始訊息。
+        """
+        return not (self.get_additional_conversation_filters() or self.get_additional_message_filters())
+
+    def _get_rollup_totals(self, days: int, user=None) -> Dict:
+        """讀取查詢期間的彙總總和"""
+        from library.common.analytics.daily_rollup import get_daily_rollup_service
+        return get_daily_rollup_service().get_totals(self.get_assistant_type(), days, user)
+
     def _get_overview_stats(self, days: int, user=None) -> Dict:
-        """獲取概覽統計（共用邏輯）"""
+        """獲取概覽統計（讀取每日彙總）"""
+        if not self.use_rollups():
+            return self._get_overview_stats_live(days, user)
+
+        try:
+            totals = self._get_rollup_totals(days, user)
+
+            total_sessions = totals['session_count']
+            guest_sessions = totals['guest_session_count']
+            total_messages = totals['message_count']
+            avg_messages_per_session = total_messages / total_sessions if total_sessions > 0 else 0
+
+            return {
+                'total_conversations': total_sessions,
+                # 會話不會被標記為非活躍（is_active 只有預設值），活躍數即會話數
+                'active_conversations': total_sessions,
+                'guest_conversations': guest_sessions,
+                'registered_user_conversations': total_sessions - guest_sessions,
+                'total_messages': total_messages,
+                'user_messages': totals['user_message_count'],
+                'assistant_messages': totals['assistant_message_count'],
+                'avg_messages_per_conversation': round(avg_messages_per_session, 2),
+                'total_tokens': totals['total_tokens']
+            }
+
+        except Exception as e:
+            self.logger.error(f"獲取概覽統計失敗: {str(e)}", exc_info=True)
+            return {
+                'total_conversations': 0,
+                'total_messages': 0,
+                'error': str(e)
+            }
+
+    def _get_performance_stats(self, days: int, user=None) -> Dict:
+        """獲取性能統計（讀取每日彙總）"""
+        if not self.use_rollups():
+            return self._get_performance_stats_live(days, user)
+
+        try:
+            totals = self._get_rollup_totals(days, user)
+
+            total_responses = totals['response_time_count']
+            avg_time = totals['response_time_sum'] / total_responses if total_responses > 0 else 0
+
+            return {
+                'avg_response_time': round(avg_time, 2),
+                'max_response_time': round(totals['response_time_max'], 2) if totals['response_time_max'] else 0,
+                'min_response_time': round(totals['response_time_min'], 2) if totals['response_time_min'] else 0,
+                'total_responses': total_responses,
+                'response_time_distribution': {
+                    '< 3s': totals['response_lt_3s_count'],
+                    '3-10s': totals['response_3_10s_count'],
+                    '10-30s': totals['response_10_30s_count'],
+                    '> 30s': totals['response_gt_30s_count']
+                },
+                'total_tokens': totals['total_tokens']
+            }
+
+        except Exception as e:
+            self.logger.error(f"獲取性能統計失敗: {str(e)}", exc_info=True)
+            return {
+                'avg_response_time': 0,
+                'error': str(e)
+            }
+
+    def _get_trend_stats(self, days: int, user=None) -> Dict:
+        """獲取趨勢統計（讀取每日彙總）"""
+        if not self.use_rollups():
+            return self._get_trend_stats_live(days, user)
+
+        try:
+            from library.common.analytics.daily_rollup import get_daily_rollup_service
+
+            series = get_daily_rollup_service().get_daily_series(self.get_assistant_type(), days, user)
+
+            return {
+                'daily_conversations': {
+                    str(item['date']): item['session_count'] for item in series if item['session_count']
+                },
+                'daily_messages': {
+                    str(item['date']): item['message_count'] for item in series if item['message_count']
+                }
+            }
+
+        except Exception as e:
+            self.logger.error(f"獲取趨勢統計失敗: {str(e)}", exc_info=True)
+            return {
+                'daily_conversations': {},
+                'daily_messages': {},
+                'error': str(e)
+            }
+
+    def get_question_classifier(self):
+        """
+        返回問題分類器（子類別可選覆寫）
+
+        Returns:
+            具有 classify_question(text) -> {'category': ...} 的分類器，None 則不分類
+        """
+        return None
+
+    def _get_question_stats(self, days: int, user=None) -> Dict:
+        """
+        獲取問題統計（串流掃描 + Space-Saving，結果依 (assistant, days, user) 快取）
+        """
+        try:
+            from library.common.analytics.question_stream import cached_question_stats
+
+            return cached_question_stats(
+                [self.get_assistant_type(), 'question_stats', days, user.id if user else 'all'],
+                lambda: self._build_question_stats(days, user)
+            )
+
+        except Exception as e:
+            self.logger.error(f"獲取問題統計失敗: {str(e)}")
+            return {'error': str(e)}
+
+    def _build_question_stats(self, days: int, user=None) -> Dict:
+        """單次串流掃描用戶問題，累計分類分布與熱門問題"""
+        from library.common.analytics.question_stream import QuestionStreamStats, iter_user_questions
+
+        classifier = self.get_question_classifier()
+        classify = (lambda text: classifier.classify_question(text).get('category')) if classifier else None
+
+        stats = QuestionStreamStats(classify=classify, extract_keywords=False)
+        stats.consume(iter_user_questions(self.get_assistant_type(), days, user))
+
+        total_questions = stats.total_questions
+        if not total_questions:
+            return {
+                'total_questions': 0,
+                'category_distribution': {},
+                'top_questions': [],
+                'popular_questions': []
+            }
+
+        category_counts = dict(stats.categories)
+        return {
+            'total_questions': total_questions,
+            'category_distribution': category_counts,
+            'category_percentages': {
+                category: round(count / total_questions * 100, 2)
+                for category, count in category_counts.items()
+            },
+            'top_categories': stats.categories.most_common(5),
+            'popular_questions': [
+                {
+                    'question': question,
+                    'count': count,
+                    'percentage': round((count / total_questions) * 100, 2)
+                }
+                for question, count in stats.popular_questions(20, merge_similar=True)
+            ]
+        }
+
+    def _get_overview_stats_live(self, days: int, user=None) -> Dict:
+        """獲取概覽統計（直接查詢原始訊息，用於自訂過濾條件）"""
         try:
             from django.utils import timezone
             
@@ -203,8 +373,8 @@ class BaseStatisticsManager(ABC):
                 'error': str(e)
             }
     
-    def _get_performance_stats(self, days: int, user=None) -> Dict:
-        """獲取性能統計（共用邏輯）"""
+    def _get_performance_stats_live(self, days: int, user=None) -> Dict:
+        """獲取性能統計（直接查詢原始訊息，用於自訂過濾條件）"""
         try:
             from django.utils import timezone
             from django.db.models import Avg, Max, Min, Count, Q, F
@@ -280,8 +450,8 @@ class BaseStatisticsManager(ABC):
                 'error': str(e)
             }
     
-    def _get_trend_stats(self, days: int, user=None) -> Dict:
-        """獲取趨勢統計（共用邏輯）"""
+    def _get_trend_stats_live(self, days: int, user=None) -> Dict:
+        """獲取趨勢統計（直接查詢原始訊息，用於自訂過濾條件）"""
         try:
             from django.utils import timezone
             from django.db.models.functions import TruncDate
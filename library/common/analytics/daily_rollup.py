@@ -0,0 +1,510 @@
+"""
+Daily Rollup - 對話分析每日彙總
+
+維護 conversation_daily_rollups（ConversationDailyRollup）物化統計表，
+以 (日期, chat_type, 用戶) 為粒度保存訊息數、會話數、滿意度、回應時間與 Token 用量。
+
+資料維護分兩條路徑：
+1. 即時累加：ConversationRecorder 寫入訊息後呼叫 record_message()，
+   以 INSERT ... ON CONFLICT DO UPDATE 原子累加（無競爭條件）
+2. 定期重算：Celery beat 呼叫 refresh_changed_days()，找出自上次水位線後
+   有變動（新增訊息、事後反饋）的日期，從原始資料整日重算並覆蓋
+
+儀表板（BaseStatisticsManager / BaseSatisfactionAnalyzer）只讀取彙總表，
+查詢量與天數成正比，不再與訊息數成正比。
+
+Usage:
+    from library.common.analytics.daily_rollup import get_daily_rollup_service
+
+    service = get_daily_rollup_service()
+    totals = service.get_totals('rvt_assistant_chat', days=30)
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Any
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLE = 'conversation_daily_rollups'
+WATERMARK_CACHE_KEY = 'analytics_rollup:watermark'
+
+# 首次執行（無水位線）時重算的天數
+DEFAULT_REBUILD_DAYS = 90
+
+# 回應時間超過此值（秒）視為異常值，不計入效能統計
+RESPONSE_TIME_OUTLIER = 300
+
+# 可直接相加的計數欄位
+COUNTER_COLUMNS = [
+    'session_count',
+    'guest_session_count',
+    'message_count',
+    'user_message_count',
+    'assistant_message_count',
+    'helpful_count',
+    'unhelpful_count',
+    'response_time_count',
+    'response_time_sum',
+    'response_lt_3s_count',
+    'response_3_10s_count',
+    'response_10_30s_count',
+    'response_gt_30s_count',
+    'rated_fast_count',
+    'rated_fast_helpful_count',
+    'rated_medium_count',
+    'rated_medium_helpful_count',
+    'rated_slow_count',
+    'rated_slow_helpful_count',
+    'total_tokens',
+]
+
+# 與反饋（is_helpful）相關的欄位，反饋變更時只需調整這些欄位
+FEEDBACK_COLUMNS = [
+    'helpful_count',
+    'unhelpful_count',
+    'rated_fast_count',
+    'rated_fast_helpful_count',
+    'rated_medium_count',
+    'rated_medium_helpful_count',
+    'rated_slow_count',
+    'rated_slow_helpful_count',
+]
+
+# 訊息層級的彙總 SQL 運算式（與 message_deltas() 的定義一致）
+_ASSISTANT = "cm.role = 'assistant'"
+_TIMED = f"{_ASSISTANT} AND cm.response_time IS NOT NULL AND cm.response_time < {RESPONSE_TIME_OUTLIER}"
+_RATED = f"{_ASSISTANT} AND cm.response_time IS NOT NULL AND cm.is_helpful IS NOT NULL"
+
+_MESSAGE_AGGREGATES = {
+    'session_count': "0",
+    'guest_session_count': "0",
+    'message_count': "COUNT(*)",
+    'user_message_count': "COUNT(*) FILTER (WHERE cm.role = 'user')",
+    'assistant_message_count': f"COUNT(*) FILTER (WHERE {_ASSISTANT})",
+    'helpful_count': f"COUNT(*) FILTER (WHERE {_ASSISTANT} AND cm.is_helpful IS TRUE)",
+    'unhelpful_count': f"COUNT(*) FILTER (WHERE {_ASSISTANT} AND cm.is_helpful IS FALSE)",
+    'response_time_count': f"COUNT(*) FILTER (WHERE {_TIMED})",
+    'response_time_sum': f"COALESCE(SUM(cm.response_time) FILTER (WHERE {_TIMED}), 0)",
+    'response_lt_3s_count': f"COUNT(*) FILTER (WHERE {_TIMED} AND cm.response_time < 3)",
+    'response_3_10s_count': f"COUNT(*) FILTER (WHERE {_TIMED} AND cm.response_time >= 3 AND cm.response_time < 10)",
+    'response_10_30s_count': f"COUNT(*) FILTER (WHERE {_TIMED} AND cm.response_time >= 10 AND cm.response_time < 30)",
+    'response_gt_30s_count': f"COUNT(*) FILTER (WHERE {_TIMED} AND cm.response_time >= 30)",
+    'rated_fast_count': f"COUNT(*) FILTER (WHERE {_RATED} AND cm.response_time < 3)",
+    'rated_fast_helpful_count': f"COUNT(*) FILTER (WHERE {_RATED} AND cm.response_time < 3 AND cm.is_helpful)",
+    'rated_medium_count': f"COUNT(*) FILTER (WHERE {_RATED} AND cm.response_time >= 3 AND cm.response_time < 10)",
+    'rated_medium_helpful_count': (
+        f"COUNT(*) FILTER (WHERE {_RATED} AND cm.response_time >= 3 AND cm.response_time < 10 AND cm.is_helpful)"
+    ),
+    'rated_slow_count': f"COUNT(*) FILTER (WHERE {_RATED} AND cm.response_time >= 10)",
+    'rated_slow_helpful_count': f"COUNT(*) FILTER (WHERE {_RATED} AND cm.response_time >= 10 AND cm.is_helpful)",
+    'total_tokens': (
+        "COALESCE(SUM(CASE WHEN jsonb_typeof(cm.token_usage -> 'total_tokens') = 'number' "
+        "THEN (cm.token_usage ->> 'total_tokens')::numeric::bigint ELSE 0 END), 0)"
+    ),
+}
+
+_SESSION_AGGREGATES = {
+    'session_count': "COUNT(*)",
+    'guest_session_count': "COUNT(*) FILTER (WHERE cs.is_guest_session)",
+}
+
+
+def to_chat_type(assistant_type: str) -> str:
+    """assistant_type（如 'rvt_assistant'）轉為 conversation_sessions.chat_type"""
+    return assistant_type if assistant_type.endswith('_chat') else f"{assistant_type}_chat"
+
+
+def message_deltas(role: str, response_time: Optional[float] = None,
+                   is_helpful: Optional[bool] = None,
+                   token_usage: Optional[Dict] = None) -> Dict[str, float]:
+    """
+    計算單則訊息對彙總計數欄位的貢獻
+
+    定義與重算 SQL（_MESSAGE_AGGREGATES）一致，供即時累加與反饋調整使用。
+
+    Returns:
+        dict: {欄位: 增量}（只包含非零欄位）
+    """
+    deltas: Dict[str, float] = {'message_count': 1}
+
+    if role == 'user':
+        deltas['user_message_count'] = 1
+    elif role == 'assistant':
+        deltas['assistant_message_count'] = 1
+        if is_helpful is True:
+            deltas['helpful_count'] = 1
+        elif is_helpful is False:
+            deltas['unhelpful_count'] = 1
+
+        if response_time is not None:
+            if response_time < RESPONSE_TIME_OUTLIER:
+                deltas['response_time_count'] = 1
+                deltas['response_time_sum'] = response_time
+                if response_time < 3:
+                    deltas['response_lt_3s_count'] = 1
+                elif response_time < 10:
+                    deltas['response_3_10s_count'] = 1
+                elif response_time < 30:
+                    deltas['response_10_30s_count'] = 1
+                else:
+                    deltas['response_gt_30s_count'] = 1
+
+            if is_helpful is not None:
+                speed = 'fast' if response_time < 3 else 'medium' if response_time < 10 else 'slow'
+                deltas[f'rated_{speed}_count'] = 1
+                if is_helpful:
+                    deltas[f'rated_{speed}_helpful_count'] = 1
+
+    tokens = (token_usage or {}).get('total_tokens') if isinstance(token_usage, dict) else None
+    if isinstance(tokens, (int, float)) and not isinstance(tokens, bool) and tokens:
+        deltas['total_tokens'] = int(tokens)
+
+    return deltas
+
+
+def feedback_deltas(response_time: Optional[float], old_value: Optional[bool],
+                    new_value: Optional[bool]) -> Dict[str, int]:
+    """計算 AI 回覆反饋由 old_value 改為 new_value 時的欄位增量"""
+    before = message_deltas('assistant', response_time, old_value)
+    after = message_deltas('assistant', response_time, new_value)
+    deltas = {}
+    for column in FEEDBACK_COLUMNS:
+        diff = after.get(column, 0) - before.get(column, 0)
+        if diff:
+            deltas[column] = diff
+    return deltas
+
+
+def satisfaction_from_totals(totals: Dict[str, Any]) -> Dict[str, Dict]:
+    """
+    由彙總總和計算滿意度統計（格式與 BaseSatisfactionAnalyzer 一致）
+
+    Returns:
+        dict: {'basic_stats': {...}, 'response_time_analysis': {...}}
+    """
+    total_messages = totals['assistant_message_count']
+    helpful_count = totals['helpful_count']
+    unhelpful_count = totals['unhelpful_count']
+    feedback_count = helpful_count + unhelpful_count
+
+    basic_stats = {
+        'total_messages': total_messages,
+        'helpful_count': helpful_count,
+        'unhelpful_count': unhelpful_count,
+        'unrated_count': total_messages - feedback_count,
+        'feedback_count': feedback_count,
+        'satisfaction_rate': round(helpful_count / feedback_count, 4) if feedback_count else 0,
+        'feedback_rate': round(feedback_count / total_messages, 4) if total_messages else 0,
+    }
+
+    response_time_analysis = {}
+    for speed in ('fast', 'medium', 'slow'):
+        rated = totals[f'rated_{speed}_count']
+        helpful = totals[f'rated_{speed}_helpful_count']
+        response_time_analysis[speed] = {
+            'total_messages': rated,
+            'helpful_count': helpful,
+            'satisfaction_rate': round(helpful / rated, 4) if rated else 0,
+        }
+    response_time_analysis['total_analyzed'] = sum(
+        totals[f'rated_{speed}_count'] for speed in ('fast', 'medium', 'slow')
+    )
+
+    return {'basic_stats': basic_stats, 'response_time_analysis': response_time_analysis}
+
+
+class DailyRollupService:
+    """對話分析每日彙總服務（單例）"""
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super().__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self._initialized = True
+
+    # ------------------------------------------------------------------
+    # 即時累加（對話記錄器）
+    # ------------------------------------------------------------------
+
+    def _upsert(self, day: date, chat_type: str, user_id: Optional[int],
+                deltas: Dict[str, float], response_time: Optional[float] = None):
+        """以 ON CONFLICT 原子累加一列彙總"""
+        columns = [col for col in COUNTER_COLUMNS if deltas.get(col)]
+        if not columns:
+            return
+
+        timed = response_time if deltas.get('response_time_count') else None
+        insert_columns = ['date', 'chat_type', 'user_id'] + columns + [
+            'response_time_max', 'response_time_min', 'updated_at'
+        ]
+        values = [day, chat_type, user_id] + [deltas[col] for col in columns] + [timed, timed]
+        updates = [f"{col} = r.{col} + EXCLUDED.{col}" for col in columns] + [
+            # GREATEST / LEAST 會忽略 NULL
+            "response_time_max = GREATEST(r.response_time_max, EXCLUDED.response_time_max)",
+            "response_time_min = LEAST(r.response_time_min, EXCLUDED.response_time_min)",
+            "updated_at = NOW()",
+        ]
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                INSERT INTO {ROLLUP_TABLE} AS r ({', '.join(insert_columns)})
+                VALUES ({', '.join(['%s'] * len(values))}, NOW())
+                ON CONFLICT (date, chat_type, user_id) DO UPDATE SET {', '.join(updates)}
+            """, values)
+
+    def record_message(self, message, conversation_session) -> bool:
+        """
+        累加一則新訊息（會話的第一則訊息同時計入會話數）
+
+        Args:
+            message: ChatMessage 實例
+            conversation_session: 所屬 ConversationSession
+
+        Returns:
+            bool: 是否成功累加
+        """
+        try:
+            chat_type = conversation_session.chat_type
+            user_id = conversation_session.user_id
+            message_day = (message.created_at or timezone.now()).date()
+
+            deltas = message_deltas(
+                message.role, message.response_time, message.is_helpful, message.token_usage
+            )
+            # savepoint：失敗時不影響呼叫端（如批量記錄）的外層交易
+            with transaction.atomic():
+                self._upsert(message_day, chat_type, user_id, deltas, message.response_time)
+
+                if message.sequence_number == 1:
+                    session_day = (conversation_session.created_at or timezone.now()).date()
+                    session_deltas = {'session_count': 1}
+                    if conversation_session.is_guest_session:
+                        session_deltas['guest_session_count'] = 1
+                    self._upsert(session_day, chat_type, user_id, session_deltas)
+
+            return True
+
+        except Exception as e:
+            self.logger.warning(f"彙總累加失敗（將由定期重算修正）: {str(e)}")
+            return False
+
+    def record_feedback_change(self, message, old_value: Optional[bool]) -> bool:
+        """
+        反饋變更時調整彙總（只更新既有列，缺漏由定期重算補上）
+
+        Args:
+            message: 已更新 is_helpful 的 ChatMessage
+            old_value: 更新前的 is_helpful
+        """
+        if message.role != 'assistant' or old_value == message.is_helpful:
+            return True
+
+        try:
+            deltas = feedback_deltas(message.response_time, old_value, message.is_helpful)
+            if not deltas:
+                return True
+
+            session = message.conversation
+            assignments = [f"{col} = GREATEST({col} + %s, 0)" for col in deltas]
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"""
+                    UPDATE {ROLLUP_TABLE}
+                    SET {', '.join(assignments)}, updated_at = NOW()
+                    WHERE date = %s AND chat_type = %s AND user_id IS NOT DISTINCT FROM %s
+                """, list(deltas.values()) + [message.created_at.date(), session.chat_type, session.user_id])
+            return True
+
+        except Exception as e:
+            self.logger.warning(f"彙總反饋調整失敗（將由定期重算修正）: {str(e)}")
+            return False
+
+    # ------------------------------------------------------------------
+    # 定期重算（Celery beat）
+    # ------------------------------------------------------------------
+
+    def refresh_days(self, days: Iterable[date]) -> Dict[str, Any]:
+        """
+        從原始資料重算指定日期的所有彙總列（覆蓋既有值）
+
+        Args:
+            days: 要重算的日期
+
+        Returns:
+            dict: {'days': 重算日期數, 'rows': 寫入列數}
+        """
+        days = sorted(set(days))
+        if not days:
+            return {'days': 0, 'rows': 0}
+
+        range_start = datetime.combine(days[0], datetime.min.time())
+        range_end = datetime.combine(days[-1] + timedelta(days=1), datetime.min.time())
+        day_params = [range_start, range_end, days]
+
+        message_columns = ',\n                       '.join(
+            f"{_MESSAGE_AGGREGATES[col]} AS {col}" for col in COUNTER_COLUMNS
+        )
+        session_columns = ',\n                       '.join(
+            f"{_SESSION_AGGREGATES.get(col, '0')} AS {col}" for col in COUNTER_COLUMNS
+        )
+        totals = ', '.join(f"SUM({col})" for col in COUNTER_COLUMNS)
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {ROLLUP_TABLE} WHERE date = ANY(%s)", [days])
+                cursor.execute(f"""
+                    INSERT INTO {ROLLUP_TABLE}
+                        (date, chat_type, user_id, {', '.join(COUNTER_COLUMNS)},
+                         response_time_max, response_time_min, updated_at)
+                    SELECT day, chat_type, user_id, {totals},
+                           MAX(rt_max), MIN(rt_min), NOW()
+                    FROM (
+                        SELECT cm.created_at::date AS day, cs.chat_type, cs.user_id,
+                               {message_columns},
+                               MAX(cm.response_time) FILTER (WHERE {_TIMED}) AS rt_max,
+                               MIN(cm.response_time) FILTER (WHERE {_TIMED}) AS rt_min
+                        FROM chat_messages cm
+                        JOIN conversation_sessions cs ON cs.id = cm.conversation_id
+                        WHERE cm.created_at >= %s AND cm.created_at < %s
+                          AND cm.created_at::date = ANY(%s)
+                        GROUP BY 1, 2, 3
+
+                        UNION ALL
+
+                        SELECT cs.created_at::date AS day, cs.chat_type, cs.user_id,
+                               {session_columns},
+                               NULL AS rt_max, NULL AS rt_min
+                        FROM conversation_sessions cs
+                        WHERE cs.created_at >= %s AND cs.created_at < %s
+                          AND cs.created_at::date = ANY(%s)
+                        GROUP BY 1, 2, 3
+                    ) parts
+                    GROUP BY day, chat_type, user_id
+                """, day_params + day_params)
+                rows = cursor.rowcount
+
+        self.logger.info(f"彙總重算完成: {len(days)} 天, {rows} 列")
+        return {'days': len(days), 'rows': rows}
+
+    def _changed_days_since(self, watermark: datetime) -> List[date]:
+        """找出自水位線後有訊息新增/更新或會話建立的日期"""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT DISTINCT created_at::date FROM chat_messages WHERE updated_at >= %s
+                UNION
+                SELECT DISTINCT created_at::date FROM conversation_sessions WHERE created_at >= %s
+            """, [watermark, watermark])
+            return [row[0] for row in cursor.fetchall()]
+
+    def refresh_changed_days(self, fallback_days: int = DEFAULT_REBUILD_DAYS) -> Dict[str, Any]:
+        """
+        重算自上次執行後有變動的日期（水位線存於快取）
+
+        沒有水位線時（首次執行或快取被清除）重算最近 fallback_days 天。
+
+        Returns:
+            dict: 重算結果
+        """
+        # 先取時間再查詢，查詢期間的新變動會在下次執行時被涵蓋
+        started_at = timezone.now()
+        watermark = cache.get(WATERMARK_CACHE_KEY)
+
+        if watermark:
+            days = self._changed_days_since(datetime.fromisoformat(watermark))
+        else:
+            today = date.today()
+            days = [today - timedelta(days=offset) for offset in range(fallback_days + 1)]
+
+        result = self.refresh_days(days)
+        cache.set(WATERMARK_CACHE_KEY, started_at.isoformat(), timeout=None)
+
+        result.update({
+            'success': True,
+            'full_rebuild': not watermark,
+            'watermark': started_at.isoformat(),
+        })
+        return result
+
+    def rebuild_recent(self, days: int = DEFAULT_REBUILD_DAYS) -> Dict[str, Any]:
+        """重算最近 N 天（涵蓋刪除對話等水位線無法偵測的變動）"""
+        today = date.today()
+        result = self.refresh_days(today - timedelta(days=offset) for offset in range(days + 1))
+        result['success'] = True
+        return result
+
+    # ------------------------------------------------------------------
+    # 讀取（儀表板）
+    # ------------------------------------------------------------------
+
+    def get_queryset(self, chat_type: str, days: int, user=None):
+        """
+        取得查詢期間的彙總列
+
+        期間以日為單位：包含 (今天 - days) 起的所有日期。
+        """
+        from api.models import ConversationDailyRollup
+
+        queryset = ConversationDailyRollup.objects.filter(
+            chat_type=to_chat_type(chat_type),
+            date__gte=date.today() - timedelta(days=days)
+        )
+        if user:
+            queryset = queryset.filter(user=user)
+        return queryset
+
+    def get_totals(self, chat_type: str, days: int, user=None) -> Dict[str, Any]:
+        """
+        彙總查詢期間的所有計數欄位
+
+        Returns:
+            dict: {欄位: 總和, 'response_time_max', 'response_time_min'}
+        """
+        from django.db.models import Max, Min, Sum
+
+        aggregates = {col: Sum(col) for col in COUNTER_COLUMNS}
+        aggregates['response_time_max'] = Max('response_time_max')
+        aggregates['response_time_min'] = Min('response_time_min')
+
+        totals = self.get_queryset(chat_type, days, user).aggregate(**aggregates)
+        for col in COUNTER_COLUMNS:
+            totals[col] = totals[col] or 0
+        return totals
+
+    def get_daily_series(self, chat_type: str, days: int, user=None) -> List[Dict[str, Any]]:
+        """
+        依日期彙總的時間序列
+
+        Returns:
+            list: [{'date', 'session_count', 'message_count'}, ...]（依日期遞增）
+        """
+        from django.db.models import Sum
+
+        return list(
+            self.get_queryset(chat_type, days, user)
+            .values('date')
+            .annotate(session_count=Sum('session_count'), message_count=Sum('message_count'))
+            .order_by('date')
+        )
+
+
+# 便利函數
+def get_daily_rollup_service() -> DailyRollupService:
+    """獲取每日彙總服務實例"""
+    return DailyRollupService()
+
+
+def refresh_daily_rollups(fallback_days: int = DEFAULT_REBUILD_DAYS) -> Dict[str, Any]:
+    """重算有變動日期的便利函數"""
+    return get_daily_rollup_service().refresh_changed_days(fallback_days)
@@ -0,0 +1,190 @@
+"""
+Question History - 問題歷史查詢（問答配對 + keyset 分頁）
+
+問題歷史頁面需要每則用戶問題與其後一則 AI 回覆（同對話 sequence_number + 1）。
+原本逐筆查詢回覆（N+1），評價篩選還需先掃描所有 assistant 訊息組成 OR 條件；
+此模組以單一查詢完成：
+- chat_messages 自我 LEFT JOIN (conversation_id, sequence_number + 1) 取得配對回覆
+- 評價篩選直接作用於 JOIN 後的回覆欄位
+- 依 (created_at, id) 遞減排序，支援 keyset 游標分頁（深頁不變慢）；
+  保留頁碼分頁以相容既有前端
+
+Usage:
+    from library.common.analytics.question_history import QuestionHistoryQuery
+
+    query = QuestionHistoryQuery('rvt_assistant_chat', rating='like')
+    page = query.fetch_page(page_size=20, cursor=request.GET.get('cursor'))
+"""
+
+import base64
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# 回答預覽長度
+ANSWER_PREVIEW_LENGTH = 100
+
+# 評價參數 → 回覆條件
+RATING_CONDITIONS = {
+    'like': "a.is_helpful IS TRUE",
+    'dislike': "a.is_helpful IS FALSE",
+    'null': "a.id IS NOT NULL AND a.is_helpful IS NULL",
+}
+
+
+def encode_cursor(created_at: datetime, message_id: int) -> str:
+    """將 (created_at, id) 編碼為不透明游標"""
+    raw = f"{created_at.isoformat()}|{message_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析游標，格式錯誤時拋出 ValueError"""
+    try:
+        created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(created_at), int(message_id)
+    except Exception:
+        raise ValueError(f"無效的分頁游標: {cursor}")
+
+
+class QuestionHistoryQuery:
+    """問答配對查詢"""
+
+    def __init__(self, chat_type: str, user_id: Optional[int] = None,
+                 owner_id: Optional[int] = None,
+                 rating: Optional[str] = None,
+                 start_date: Optional[datetime] = None,
+                 end_date: Optional[datetime] = None,
+                 search: Optional[str] = None):
+        """
+        Args:
+            chat_type: conversation_sessions.chat_type（如 'rvt_assistant_chat'）
+            user_id: 只看特定用戶（篩選條件）
+            owner_id: 權限限制，一般用戶只能看自己的對話
+            rating: 'like' / 'dislike' / 'null'（其他值不篩選）
+            start_date: 問題建立時間下限（含）
+            end_date: 問題建立時間上限（含）
+            search: 問題內容關鍵字（不分大小寫）
+        """
+        self.chat_type = chat_type
+        self.user_id = user_id
+        self.owner_id = owner_id
+        self.rating = rating
+        self.start_date = start_date
+        self.end_date = end_date
+        self.search = search
+
+    def _where(self) -> Tuple[str, List[Any]]:
+        conditions = ["u.role = 'user'", "cs.chat_type = %s"]
+        params: List[Any] = [self.chat_type]
+
+        if self.user_id:
+            conditions.append("cs.user_id = %s")
+            params.append(self.user_id)
+        if self.owner_id:
+            conditions.append("cs.user_id = %s")
+            params.append(self.owner_id)
+        if self.rating in RATING_CONDITIONS:
+            conditions.append(RATING_CONDITIONS[self.rating])
+        if self.start_date:
+            conditions.append("u.created_at >= %s")
+            params.append(self.start_date)
+        if self.end_date:
+            conditions.append("u.created_at <= %s")
+            params.append(self.end_date)
+        if self.search:
+            conditions.append("u.content ILIKE %s")
+            params.append(f"%{self.search}%")
+
+        return ' AND '.join(conditions), params
+
+    _FROM = """
+        FROM chat_messages u
+        JOIN conversation_sessions cs ON cs.id = u.conversation_id
+        LEFT JOIN chat_messages a
+               ON a.conversation_id = u.conversation_id
+              AND a.sequence_number = u.sequence_number + 1
+              AND a.role = 'assistant'
+    """
+
+    def count(self) -> int:
+        """符合條件的問題總數"""
+        where, params = self._where()
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT COUNT(*) {self._FROM} WHERE {where}", params)
+            return cursor.fetchone()[0]
+
+    def fetch_page(self, page_size: int = 20, cursor: Optional[str] = None,
+                   page: Optional[int] = None) -> Dict[str, Any]:
+        """
+        取得一頁問答配對
+
+        Args:
+            page_size: 每頁數量
+            cursor: keyset 游標（上一頁回傳的 next_cursor），優先於 page
+            page: 頁碼（從 1 開始，使用 OFFSET，相容舊介面）
+
+        Returns:
+            dict: {'results': [...], 'next_cursor': str | None}
+        """
+        where, params = self._where()
+        offset = 0
+        if cursor:
+            created_at, message_id = decode_cursor(cursor)
+            where += " AND (u.created_at, u.id) < (%s, %s)"
+            params += [created_at, message_id]
+        elif page and page > 1:
+            offset = (page - 1) * page_size
+
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(f"""
+                SELECT u.id, u.content, u.created_at, u.message_id, u.question_category,
+                       cs.session_id, cs.user_id, cs.guest_identifier, au.username,
+                       LEFT(a.content, %s) AS answer_head, a.is_helpful
+                {self._FROM}
+                LEFT JOIN auth_user au ON au.id = cs.user_id
+                WHERE {where}
+                ORDER BY u.created_at DESC, u.id DESC
+                LIMIT %s OFFSET %s
+            """, [ANSWER_PREVIEW_LENGTH + 1] + params + [page_size + 1, offset])
+            rows = db_cursor.fetchall()
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        results = [self._format_row(row) for row in rows]
+        next_cursor = encode_cursor(rows[-1][2], rows[-1][0]) if has_more and rows else None
+        return {'results': results, 'next_cursor': next_cursor}
+
+    @staticmethod
+    def _format_row(row: tuple) -> Dict[str, Any]:
+        (message_id, content, created_at, dify_message_id, question_category,
+         session_id, user_id, guest_identifier, username, answer_head, is_helpful) = row
+
+        answer_preview = None
+        rating = None
+        if answer_head is not None:
+            answer_preview = (
+                answer_head[:ANSWER_PREVIEW_LENGTH] + '...'
+                if len(answer_head) > ANSWER_PREVIEW_LENGTH else answer_head
+            )
+            rating = 'like' if is_helpful is True else ('dislike' if is_helpful is False else None)
+
+        return {
+            'id': message_id,
+            'user': {
+                'id': user_id,
+                'username': username if user_id else (guest_identifier or '訪客')
+            },
+            'question': content,
+            'answer_preview': answer_preview,
+            'rating': rating,
+            'created_at': created_at.isoformat(),
+            'conversation_id': session_id,
+            'message_id': dify_message_id,
+            'question_category': question_category
+        }
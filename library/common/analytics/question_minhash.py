@@ -0,0 +1,348 @@
+"""
+Question MinHash - 相似問題 MinHash + LSH 索引
+
+相似問題查找原本對每個既有問題重新分詞、逐一計算 Jaccard（每次查詢 O(n)）。
+此模組提供：
+- question_shingles: 問題分詞（英文單字 + 中文字元二元組），每則問題只算一次
+- MinHashLSH: MinHash 簽名 + LSH 分段桶，近似重複查詢只比對候選（次線性），
+  候選再以精確 Jaccard 驗證
+- merge_near_duplicates: 熱門問題批量去重（近似重複合併計數）
+- QuestionHistoryIndex: 歷史用戶問題索引（每個行程一份），
+  以訊息 id 水位增量同步，記錄新訊息時即時加入
+
+LSH 參數依建立時的門檻選擇；查詢門檻低於建立門檻時召回率會下降。
+"""
+
+import logging
+import re
+import time
+import zlib
+from datetime import timedelta
+from threading import Lock
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# MinHash 參數
+DEFAULT_NUM_PERM = 128
+DEFAULT_THRESHOLD = 0.7
+_HASH_PRIME = 4294967291  # 小於 2^32 的最大質數，(a * x + b) 不會溢位 uint64
+
+# 歷史問題索引
+DEFAULT_HISTORY_DAYS = 90
+MAX_INDEXED_QUESTIONS = 50000
+HISTORY_SYNC_INTERVAL = 30       # 秒：查詢時最多每 30 秒同步一次新訊息
+HISTORY_REBUILD_INTERVAL = 6 * 3600  # 秒：定期重建以移除窗口外的問題
+
+# 熱門問題去重時，從草圖取出的候選倍數
+MERGE_CANDIDATE_FACTOR = 10
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+_CJK_SPLIT_PATTERN = re.compile(r'[\u3400-\u9fff]+|[^\u3400-\u9fff]+')
+
+
+def question_shingles(text: str) -> FrozenSet[str]:
+    """
+    問題分詞：英文/數字取完整單字，中文取字元二元組（單字則取單字）
+
+    中文沒有空白分隔，整段視為一個 token 時 Jaccard 幾乎只能判斷完全相同。
+    """
+    shingles: Set[str] = set()
+    for token in _TOKEN_PATTERN.findall((text or '').lower()):
+        for part in _CJK_SPLIT_PATTERN.findall(token):
+            if '\u3400' <= part[0] <= '\u9fff':
+                if len(part) == 1:
+                    shingles.add(part)
+                else:
+                    shingles.update(part[i:i + 2] for i in range(len(part) - 1))
+            else:
+                shingles.add(part)
+    return frozenset(shingles)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """精確 Jaccard 相似度"""
+    if not a and not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def lsh_params(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """
+    選擇 LSH 分段 (bands, rows)
+
+    S 曲線的轉折點約為 (1/bands)^(1/rows)；取不高於門檻且最接近門檻的組合，
+    偏向召回（漏掉的候選無法補回，多出的候選會被精確 Jaccard 濾掉）。
+    """
+    best = (num_perm, 1)
+    best_gap = float('inf')
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        if bands < 1:
+            break
+        turning_point = (1.0 / bands) ** (1.0 / rows)
+        gap = threshold - turning_point
+        if 0 <= gap < best_gap:
+            best, best_gap = (bands, rows), gap
+    return best
+
+
+class MinHashLSH:
+    """MinHash + LSH 近似重複索引（key → 文字）"""
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD,
+                 num_perm: int = DEFAULT_NUM_PERM, seed: int = 1):
+        """
+        Args:
+            threshold: 建立索引時的 Jaccard 門檻（決定 LSH 分段）
+            num_perm: MinHash 排列數
+            seed: 雜湊參數種子（同一種子的簽名可互相比較）
+        """
+        self.threshold = threshold
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _HASH_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _HASH_PRIME, size=num_perm, dtype=np.uint64)
+
+        self._shingles: Dict[object, FrozenSet[str]] = {}
+        self._band_keys: Dict[object, List[bytes]] = {}
+        self._buckets: List[Dict[bytes, Set[object]]] = [{} for _ in range(self.bands)]
+
+    def __len__(self) -> int:
+        return len(self._shingles)
+
+    def __contains__(self, key) -> bool:
+        return key in self._shingles
+
+    def signature(self, shingles: FrozenSet[str]) -> np.ndarray:
+        """計算 MinHash 簽名（一次向量化運算）"""
+        if not shingles:
+            return np.full(len(self._a), _HASH_PRIME, dtype=np.uint64)
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+            dtype=np.uint64, count=len(shingles)
+        )
+        return ((np.outer(self._a, hashes) + self._b[:, None]) % _HASH_PRIME).min(axis=1)
+
+    def _band_hashes(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            for band in range(self.bands)
+        ]
+
+    def add(self, key, text: str) -> FrozenSet[str]:
+        """加入（或覆蓋）一則文字；回傳其分詞結果"""
+        shingles = question_shingles(text)
+        if key in self._shingles:
+            self.remove(key)
+
+        band_keys = self._band_hashes(self.signature(shingles))
+        for bucket, band_key in zip(self._buckets, band_keys):
+            bucket.setdefault(band_key, set()).add(key)
+        self._shingles[key] = shingles
+        self._band_keys[key] = band_keys
+        return shingles
+
+    def remove(self, key):
+        """移除一則文字"""
+        band_keys = self._band_keys.pop(key, None)
+        if band_keys is None:
+            return
+        self._shingles.pop(key, None)
+        for bucket, band_key in zip(self._buckets, band_keys):
+            members = bucket.get(band_key)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del bucket[band_key]
+
+    def candidates(self, shingles: FrozenSet[str]) -> Set[object]:
+        """LSH 候選（至少一個分段完全相同）"""
+        result: Set[object] = set()
+        for bucket, band_key in zip(self._buckets, self._band_hashes(self.signature(shingles))):
+            members = bucket.get(band_key)
+            if members:
+                result.update(members)
+        return result
+
+    def query(self, text: str, threshold: Optional[float] = None,
+              limit: Optional[int] = None) -> List[Tuple[object, float]]:
+        """
+        查詢近似重複
+
+        Returns:
+            [(key, jaccard)]，按相似度遞減排序
+        """
+        threshold = self.threshold if threshold is None else threshold
+        shingles = question_shingles(text)
+        if not shingles:
+            return []
+
+        matches = []
+        for key in self.candidates(shingles):
+            similarity = jaccard(shingles, self._shingles[key])
+            if similarity >= threshold:
+                matches.append((key, similarity))
+        matches.sort(key=lambda item: item[1], reverse=True)
+        return matches[:limit] if limit else matches
+
+
+def merge_near_duplicates(question_counts: Iterable[Tuple[str, int]],
+                          threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[str, int, List[str]]]:
+    """
+    批量合併近似重複的問題（熱門問題去重）
+
+    依計數遞減處理，每則問題併入最相似的代表問題（代表為該組計數最高者）。
+
+    Args:
+        question_counts: [(question, count)]
+        threshold: Jaccard 門檻
+
+    Returns:
+        [(代表問題, 合併計數, [被合併的問題])]，按合併計數遞減排序
+    """
+    index = MinHashLSH(threshold=threshold)
+    groups: Dict[str, List] = {}
+
+    for question, count in sorted(question_counts, key=lambda item: item[1], reverse=True):
+        match = index.query(question, limit=1)
+        if match:
+            group = groups[match[0][0]]
+            group[0] += count
+            group[1].append(question)
+        else:
+            index.add(question, question)
+            groups[question] = [count, []]
+
+    merged = [(question, count, variants) for question, (count, variants) in groups.items()]
+    merged.sort(key=lambda item: item[1], reverse=True)
+    return merged
+
+
+class QuestionHistoryIndex:
+    """
+    歷史用戶問題索引（單一聊天類型）
+
+    索引鍵為問題文字（相同問題只存一份並計數）；以訊息 id 水位增量同步，
+    定期重建以移除時間窗口外的問題。
+    """
+
+    def __init__(self, assistant_type: str, days: int = DEFAULT_HISTORY_DAYS,
+                 threshold: float = DEFAULT_THRESHOLD,
+                 max_questions: int = MAX_INDEXED_QUESTIONS):
+        self.assistant_type = assistant_type
+        self.days = days
+        self.threshold = threshold
+        self.max_questions = max_questions
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+
+        self._lock = Lock()
+        self._index = MinHashLSH(threshold=threshold)
+        self._counts: Dict[str, int] = {}
+        self._recorded_ids: Set[int] = set()
+        self._watermark = 0
+        self._built_at = 0.0
+        self._synced_at = 0.0
+
+    @property
+    def is_built(self) -> bool:
+        return self._built_at > 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _add(self, content: str):
+        text = (content or '').strip()
+        if not text:
+            return
+        if text in self._counts:
+            self._counts[text] += 1
+        elif len(self._counts) < self.max_questions:
+            self._index.add(text, text)
+            self._counts[text] = 1
+
+    def _load_since(self, after_id: int, since=None):
+        from api.models import ChatMessage
+        from library.common.analytics.daily_rollup import to_chat_type
+
+        queryset = ChatMessage.objects.filter(
+            role='user',
+            conversation__chat_type=to_chat_type(self.assistant_type),
+            id__gt=after_id
+        )
+        if since is not None:
+            queryset = queryset.filter(created_at__gte=since)
+
+        for message_id, content in queryset.order_by('id').values_list('id', 'content').iterator(chunk_size=2000):
+            if message_id not in self._recorded_ids:
+                self._add(content)
+            self._watermark = max(self._watermark, message_id)
+        self._recorded_ids.clear()
+
+    def sync(self, force: bool = False):
+        """建立或增量同步索引（重建間隔到期時完整重建）"""
+        now = time.time()
+        with self._lock:
+            try:
+                if force or not self.is_built or now - self._built_at > HISTORY_REBUILD_INTERVAL:
+                    self._index = MinHashLSH(threshold=self.threshold)
+                    self._counts = {}
+                    self._recorded_ids = set()
+                    self._watermark = 0
+                    self._load_since(0, since=timezone.now() - timedelta(days=self.days))
+                    self._built_at = self._synced_at = now
+                    self.logger.info(f"建立歷史問題索引 ({self.assistant_type}): {len(self._index)} 則")
+                elif now - self._synced_at > HISTORY_SYNC_INTERVAL:
+                    self._load_since(self._watermark)
+                    self._synced_at = now
+            except Exception as e:
+                self.logger.error(f"同步歷史問題索引失敗: {str(e)}")
+
+    def record(self, message_id: int, content: str):
+        """記錄新問題（只在本行程索引已建立時加入，不觸發建立）"""
+        if not self.is_built:
+            return
+        with self._lock:
+            if message_id > self._watermark and message_id not in self._recorded_ids:
+                self._recorded_ids.add(message_id)
+                self._add(content)
+
+    def find_similar(self, question_text: str, threshold: Optional[float] = None,
+                     limit: int = 10) -> List[Tuple[str, float]]:
+        """查找相似的歷史問題（排除完全相同的文字）"""
+        self.sync()
+        text = (question_text or '').strip()
+        with self._lock:
+            matches = self._index.query(text, threshold=threshold)
+        return [(question, similarity) for question, similarity in matches if question != text][:limit]
+
+    def question_count(self, question: str) -> int:
+        """歷史問題出現次數"""
+        return self._counts.get(question, 0)
+
+
+_history_indexes: Dict[str, QuestionHistoryIndex] = {}
+_history_lock = Lock()
+
+
+def get_question_history_index(assistant_type: str) -> QuestionHistoryIndex:
+    """獲取（行程內共用的）歷史問題索引"""
+    with _history_lock:
+        if assistant_type not in _history_indexes:
+            _history_indexes[assistant_type] = QuestionHistoryIndex(assistant_type)
+        return _history_indexes[assistant_type]
+
+
+def record_question(message, conversation_session) -> None:
+    """ConversationRecorder 記錄用戶訊息後呼叫：加入本行程已建立的歷史索引"""
+    if getattr(message, 'role', None) != 'user':
+        return
+    chat_type = getattr(conversation_session, 'chat_type', '') or ''
+    assistant_type = chat_type[:-len('_chat')] if chat_type.endswith('_chat') else chat_type
+    index = _history_indexes.get(assistant_type)
+    if index is not None:
+        index.record(message.id, message.content)
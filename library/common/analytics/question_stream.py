@@ -0,0 +1,260 @@
+"""
+Question Stream - 串流式問題統計（固定記憶體）
+
+問題分析不再把時間窗口內的所有用戶訊息載入成列表再建立完整 Counter：
+1. iter_user_questions() 以 QuerySet.iterator(chunk_size) 串流讀取
+2. QuestionStreamStats 單次掃描同時累計總數、關鍵詞、熱門問題與分類分布
+3. 關鍵詞與熱門問題使用 Space-Saving heavy-hitters 草圖，
+   記憶體上限為 capacity 個項目，與歷史資料量無關
+4. cached_question_stats() 依 (assistant, days, ...) 快取分析結果
+
+Space-Saving 的計數為上界估計（誤差不超過被淘汰項目的最小計數）；
+相異項目數不超過 capacity 時結果與精確計數相同。
+
+Usage:
+    from library.common.analytics.question_stream import QuestionStreamStats, iter_user_questions
+
+    stats = QuestionStreamStats().consume(iter_user_questions('rvt_assistant', days=30))
+    stats.top_keywords(10)
+"""
+
+import heapq
+import itertools
+import logging
+from collections import Counter
+from datetime import timedelta
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# 串流讀取的批次大小
+DEFAULT_CHUNK_SIZE = 2000
+
+# 草圖容量
+DEFAULT_KEYWORD_CAPACITY = 2000
+DEFAULT_QUESTION_CAPACITY = 1000
+
+# 分析結果快取
+QUESTION_STATS_CACHE_PREFIX = 'question_stream'
+QUESTION_STATS_CACHE_TTL = 600  # 10 分鐘
+
+# 關鍵詞停用詞
+STOP_WORDS = {
+    '的', '了', '是', '在', '我', '有', '和', '就', '不', '人', '都', '一',
+    '一個', '上', '也', '很', '到', '說', '要', '去', '你', '會', '著', '沒有',
+    '看', '好', '自己', '這', '嗎', '？', '！', '。', '，', '、', '怎麼', '什麼',
+    '可以', '請問', '如何', '為什麼', '能', '想', '請', '謝謝', '幫忙'
+}
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitters 草圖
+
+    最多追蹤 capacity 個項目；新項目在草圖已滿時取代目前計數最小者，
+    並繼承其計數作為誤差上界。最小值以延遲刪除的 min-heap 維護。
+    """
+
+    def __init__(self, capacity: int = DEFAULT_QUESTION_CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity 必須大於 0")
+        self.capacity = capacity
+        self.total = 0
+        self.counts: Dict[Hashable, int] = {}
+        self.errors: Dict[Hashable, int] = {}
+        self._heap: List[Tuple[int, int, Hashable]] = []
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def __contains__(self, item) -> bool:
+        return item in self.counts
+
+    def _pop_min(self) -> Tuple[Hashable, int]:
+        """取出目前計數最小的項目（略過過期的 heap 項）"""
+        while True:
+            count, _, item = heapq.heappop(self._heap)
+            if self.counts.get(item) == count:
+                return item, count
+
+    def _compact(self):
+        """重建 heap，移除過期項目"""
+        self._heap = [(count, next(self._sequence), item) for item, count in self.counts.items()]
+        heapq.heapify(self._heap)
+
+    def add(self, item: Hashable, count: int = 1):
+        """累加一個項目"""
+        self.total += count
+
+        if item in self.counts:
+            self.counts[item] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+        else:
+            evicted, min_count = self._pop_min()
+            del self.counts[evicted]
+            del self.errors[evicted]
+            self.counts[item] = min_count + count
+            self.errors[item] = min_count
+
+        heapq.heappush(self._heap, (self.counts[item], next(self._sequence), item))
+        if len(self._heap) > 4 * self.capacity:
+            self._compact()
+
+    def update(self, items: Iterable[Hashable]):
+        for item in items:
+            self.add(item)
+
+    def top(self, n: int) -> List[Tuple[Hashable, int]]:
+        """計數最高的 n 個項目 [(item, count), ...]"""
+        return heapq.nlargest(n, self.counts.items(), key=lambda pair: pair[1])
+
+    def guaranteed_count(self, item: Hashable) -> int:
+        """項目的保證下界計數（count - error）"""
+        return self.counts.get(item, 0) - self.errors.get(item, 0)
+
+
+def _load_tokenizer() -> Optional[Callable[[str], Iterable[str]]]:
+    try:
+        import jieba
+        return jieba.cut
+    except ImportError:
+        logger.warning("jieba 未安裝，跳過關鍵詞提取")
+        return None
+
+
+class QuestionStreamStats:
+    """單次掃描的問題統計累計器"""
+
+    def __init__(self, keyword_capacity: int = DEFAULT_KEYWORD_CAPACITY,
+                 question_capacity: int = DEFAULT_QUESTION_CAPACITY,
+                 classify: Optional[Callable[[str], Optional[str]]] = None,
+                 extract_keywords: bool = True):
+        """
+        Args:
+            keyword_capacity: 關鍵詞草圖容量
+            question_capacity: 熱門問題草圖容量
+            classify: 問題分類函數（回傳分類名稱），None 則不統計分類
+            extract_keywords: 是否以 jieba 斷詞統計關鍵詞
+        """
+        self.total_questions = 0
+        self.keywords = SpaceSaving(keyword_capacity)
+        self.questions = SpaceSaving(question_capacity)
+        self.categories: Counter = Counter()
+        self.classify = classify
+        self._tokenize = _load_tokenizer() if extract_keywords else None
+
+    def add(self, content: Optional[str]):
+        """累計一則問題"""
+        if not content:
+            return
+
+        self.total_questions += 1
+        self.questions.add(content)
+
+        if self._tokenize:
+            self.keywords.update(
+                word for word in self._tokenize(content)
+                if len(word) > 1 and word not in STOP_WORDS
+            )
+
+        if self.classify:
+            category = self.classify(content)
+            if category:
+                self.categories[category] += 1
+
+    def consume(self, contents: Iterable[Any], key: Optional[str] = None) -> 'QuestionStreamStats':
+        """
+        累計整個串流
+
+        Args:
+            contents: 問題文字（或 dict，搭配 key 取值）的可迭代物件
+            key: contents 為 dict 時的文字欄位名稱
+        """
+        for item in contents:
+            self.add(item.get(key) if key else item)
+        return self
+
+    def top_keywords(self, top_n: int = 10) -> List[Dict[str, Any]]:
+        return [{'keyword': word, 'count': count} for word, count in self.keywords.top(top_n)]
+
+    def popular_questions(self, top_n: int = 10, merge_similar: bool = False) -> List[Tuple[str, int]]:
+        """
+        熱門問題
+
+        Args:
+            top_n: 數量
+            merge_similar: 是否合併近似重複的問題（MinHash LSH，計數加總到代表問題）
+        """
+        if not merge_similar:
+            return self.questions.top(top_n)
+
+        from .question_minhash import MERGE_CANDIDATE_FACTOR, merge_near_duplicates
+        merged = merge_near_duplicates(self.questions.top(top_n * MERGE_CANDIDATE_FACTOR))
+        return [(question, count) for question, count, _ in merged[:top_n]]
+
+
+def iter_user_questions(assistant_type: Optional[str], days: int, user=None,
+                        fields: Tuple[str, ...] = ('content',),
+                        chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator:
+    """
+    串流讀取時間窗口內的用戶問題
+
+    Args:
+        assistant_type: 'rvt_assistant' 等（None 則不限聊天類型）
+        days: 天數
+        user: 特定用戶（可選）
+        fields: 只有 'content' 時回傳文字，否則回傳 dict
+        chunk_size: 每批讀取筆數
+
+    Returns:
+        Iterator: 問題文字或 dict
+    """
+    from api.models import ChatMessage
+    from library.common.analytics.daily_rollup import to_chat_type
+
+    queryset = ChatMessage.objects.filter(
+        role='user',
+        created_at__gte=timezone.now() - timedelta(days=days)
+    )
+    if assistant_type:
+        queryset = queryset.filter(conversation__chat_type=to_chat_type(assistant_type))
+    if user:
+        queryset = queryset.filter(conversation__user=user)
+
+    if tuple(fields) == ('content',):
+        queryset = queryset.values_list('content', flat=True)
+    else:
+        queryset = queryset.values(*fields)
+    return queryset.iterator(chunk_size=chunk_size)
+
+
+def cached_question_stats(key_parts: Iterable[Any], builder: Callable[[], Dict],
+                          timeout: int = QUESTION_STATS_CACHE_TTL) -> Dict:
+    """
+    以 (assistant, days, ...) 快取問題分析結果
+
+    builder 回傳含 'error' 的結果時不快取。
+    """
+    cache_key = ':'.join([QUESTION_STATS_CACHE_PREFIX] + [str(part) for part in key_parts])
+
+    try:
+        cached = cache.get(cache_key)
+    except Exception as e:
+        logger.warning(f"讀取問題統計快取失敗: {str(e)}")
+        cached = None
+    if cached is not None:
+        return cached
+
+    result = builder()
+    if isinstance(result, dict) and 'error' not in result:
+        try:
+            cache.set(cache_key, result, timeout)
+        except Exception as e:
+            logger.warning(f"寫入問題統計快取失敗: {str(e)}")
+    return result
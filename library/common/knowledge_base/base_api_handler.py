@@ -404,7 +404,8 @@ class BaseKnowledgeBaseAPIHandler(ABC):
                     metadata={
                         'dify_message_id': result.get('message_id', ''),
                         'knowledge_base': cls.get_source_table(),
-                    }
+                    },
+                    defer=True
                 )
             
             # 🔍 DEBUG: 記錄完整的 Dify 回應到專用日誌文件（可選）
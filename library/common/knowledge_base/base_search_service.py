@@ -8,6 +8,8 @@
 import logging
 from abc import ABC
 
+from library.common.stage_timing import stage as timed_stage, KEYWORD_SEARCH
+
 logger = logging.getLogger(__name__)
 
 
@@ -128,7 +130,8 @@ class BaseKnowledgeBaseSearchService(ABC):
                 remaining = limit - len(results)
                 # 關鍵字搜索使用較低的 threshold (threshold * 0.5)
                 keyword_threshold = max(threshold * 0.5, 0.3)
-                keyword_results = self.search_with_keywords(query, remaining, keyword_threshold)
+                with timed_stage(KEYWORD_SEARCH):
+                    keyword_results = self.search_with_keywords(query, remaining, keyword_threshold)
                 
                 # 去重（避免重複的結果）
                 existing_ids = {r.get('metadata', {}).get('id') for r in results}
@@ -199,8 +202,8 @@ class BaseKnowledgeBaseSearchService(ABC):
             # === 模式 2：只搜索段落（不降級）===
             elif search_mode == 'section_only':
                 self.logger.info(f"🎯 顯式段落搜索模式 (search_mode='section_only', threshold={threshold}, stage={stage})")
-                from .section_search_service import SectionSearchService
-                section_service = SectionSearchService()
+                from .service_registry import get_search_service
+                section_service = get_search_service('section')
                 
                 # 🆕 讀取 Window 擴展設定
                 ctx_settings = self._get_context_window_settings()
@@ -240,8 +243,8 @@ class BaseKnowledgeBaseSearchService(ABC):
                 
                 # 🎯 優先使用段落向量搜尋
                 try:
-                    from .section_search_service import SectionSearchService
-                    section_service = SectionSearchService()
+                    from .service_registry import get_search_service
+                    section_service = get_search_service('section')
                     
                     # 🆕 讀取 Window 擴展設定
                     ctx_settings = self._get_context_window_settings()
@@ -8,6 +8,7 @@ import logging
 from typing import List, Dict, Any, Optional
 from django.db import connection
 from api.services.embedding_service import get_embedding_service
+from library.common.stage_timing import stage as timed_stage, QUERY_EMBEDDING, SECTION_SQL, CONTEXT_EXPANSION
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +30,7 @@ class SectionSearchService:
         Returns:
             tuple: (title_weight, content_weight, threshold) 範圍 0.0-1.0
         """
-        from api.models import SearchThresholdSetting
+        from library.common.threshold_manager import get_threshold_manager
         
         # 映射表名到助手類型
         table_to_type = {
@@ -42,39 +43,13 @@ class SectionSearchService:
             logger.warning(f"未知的 source_table: {source_table}，使用預設權重 60/40")
             return (0.6, 0.4, 0.7)
         
-        try:
-            setting = SearchThresholdSetting.objects.get(assistant_type=assistant_type)
-            
-            # 根據配置策略選擇權重
-            if setting.use_unified_weights or stage == 1:
-                # 使用第一階段配置
-                title_weight = setting.stage1_title_weight / 100.0
-                content_weight = setting.stage1_content_weight / 100.0
-                threshold = float(setting.stage1_threshold)
-                logger.info(
-                    f"📊 載入第一階段搜尋權重配置: {assistant_type} -> "
-                    f"標題 {setting.stage1_title_weight}% / 內容 {setting.stage1_content_weight}% / "
-                    f"threshold {threshold}"
-                )
-            else:
-                # 使用第二階段配置
-                title_weight = setting.stage2_title_weight / 100.0
-                content_weight = setting.stage2_content_weight / 100.0
-                threshold = float(setting.stage2_threshold)
-                logger.info(
-                    f"📊 載入第二階段搜尋權重配置: {assistant_type} -> "
-                    f"標題 {setting.stage2_title_weight}% / 內容 {setting.stage2_content_weight}% / "
-                    f"threshold {threshold}"
-                )
-            
-            return (title_weight, content_weight, threshold)
-            
-        except SearchThresholdSetting.DoesNotExist:
+        # 由 ThresholdManager 快取（設定變更時重新載入），不再每次查詢資料庫
+        config = get_threshold_manager().get_stage_config(assistant_type, stage)
+        if config is None:
             logger.warning(f"找不到 {assistant_type} 的權重配置，使用預設 60/40/0.7")
             return (0.6, 0.4, 0.7)
-        except Exception as e:
-            logger.error(f"讀取權重配置失敗: {str(e)}，使用預設值")
-            return (0.6, 0.4, 0.7)
+        
+        return config
     
     def search_sections(
         self,
@@ -128,24 +103,27 @@ class SectionSearchService:
             )
             
             # 生成查詢向量
-            query_embedding = self.embedding_service.generate_embedding(query)
+            with timed_stage(QUERY_EMBEDDING):
+                query_embedding = self.embedding_service.generate_embedding(query)
             embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
             
-            # ✅ 檢查是否有多向量欄位資料
+            # ✅ 檢查是否有多向量欄位資料（EXISTS 找到第一筆即停止，不計算全表數量）
             check_sql = """
-                SELECT COUNT(*) 
-                FROM document_section_embeddings 
-                WHERE source_table = %s 
-                  AND title_embedding IS NOT NULL 
-                  AND content_embedding IS NOT NULL
+                SELECT EXISTS (
+                    SELECT 1
+                    FROM document_section_embeddings 
+                    WHERE source_table = %s 
+                      AND title_embedding IS NOT NULL 
+                      AND content_embedding IS NOT NULL
+                )
             """
             
-            with connection.cursor() as cursor:
+            with timed_stage(SECTION_SQL), connection.cursor() as cursor:
                 cursor.execute(check_sql, [source_table])
-                multi_vector_count = cursor.fetchone()[0]
+                has_multi_vector = cursor.fetchone()[0]
             
             # ✅ 如果有多向量資料，使用加權搜尋
-            if multi_vector_count > 0:
+            if has_multi_vector:
                 logger.info(f"✅ 使用多向量搜尋 (權重: {int(title_weight*100)}%/{int(content_weight*100)}%)")
                 
                 sql = f"""
@@ -208,7 +186,7 @@ class SectionSearchService:
                 params.append(max_level)
             
             # 添加相似度閾值（對於多向量，閾值應用於加權後的分數）
-            if multi_vector_count > 0:
+            if has_multi_vector:
                 sql += f" AND (({title_weight} * (1 - (dse.title_embedding <=> %s::vector))) + ({content_weight} * (1 - (dse.content_embedding <=> %s::vector)))) >= %s"
                 params.extend([embedding_str, embedding_str, final_threshold])
             else:
@@ -220,7 +198,7 @@ class SectionSearchService:
             params.append(limit)
             
             # 執行查詢
-            with connection.cursor() as cursor:
+            with timed_stage(SECTION_SQL), connection.cursor() as cursor:
                 cursor.execute(sql, params)
                 columns = [col[0] for col in cursor.description]
                 results = [dict(zip(columns, row)) for row in cursor.fetchall()]
@@ -281,6 +259,20 @@ class SectionSearchService:
         )
         
         # 為每個段落添加上下文
+        with timed_stage(CONTEXT_EXPANSION):
+            self._attach_context(sections, source_table, include_siblings, context_window, context_mode)
+        
+        return sections
+    
+    def _attach_context(
+        self,
+        sections: List[Dict[str, Any]],
+        source_table: str,
+        include_siblings: bool,
+        context_window: int,
+        context_mode: str
+    ):
+        """為搜尋結果的每個段落加上 parent / children / siblings / previous / next"""
         for section in sections:
             try:
                 # ✅ 層級上下文（hierarchical 或 both 模式）
@@ -323,8 +315,6 @@ class SectionSearchService:
                 
             except Exception as e:
                 logger.error(f"獲取段落上下文失敗: {str(e)}", exc_info=True)
-        
-        return sections
     
     def _get_parent_section(
         self,
@@ -0,0 +1,150 @@
+"""
+Search Service Registry - 行程內共用的搜尋服務實例
+
+Dify 外部知識庫 API 每個請求都重新建立 DatabaseSearchService / RVTGuideSearchService /
+ProtocolGuideSearchService，每次段落搜尋也重新建立 SectionSearchService。
+這些服務沒有請求狀態，此模組讓整個行程共用同一組實例：
+
+- get_search_service(name)：取得（必要時建立）共用實例
+- warm_up_search_services()：應用啟動時（api.apps.ApiConfig.ready）預先建立，
+  SEARCH_SERVICE_PRELOAD_MODEL=true 時一併載入嵌入模型，避免第一個請求承擔載入時間
+
+權重與 Threshold 由 ThresholdManager 快取（設定世代變更時重新載入），
+因此 warm-up 不存取資料庫。
+
+Usage:
+    from library.common.knowledge_base.service_registry import get_search_service
+
+    section_service = get_search_service('section')
+    results = section_service.search_sections(query, source_table='protocol_guide')
+"""
+
+import importlib
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 服務名稱 → 類別路徑（延遲導入避免循環依賴）
+SERVICE_CLASSES = {
+    'section': 'library.common.knowledge_base.section_search_service.SectionSearchService',
+    'database': 'library.data_processing.database_search.DatabaseSearchService',
+    'rvt_guide': 'library.rvt_guide.search_service.RVTGuideSearchService',
+    'protocol_guide': 'library.protocol_guide.search_service.ProtocolGuideSearchService',
+}
+
+
+def _import_class(path: str):
+    module_name, class_name = path.rsplit('.', 1)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+class SearchServiceRegistry:
+    """搜尋服務註冊表（Singleton 模式）"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        """Singleton 模式實作"""
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        """初始化（只執行一次）"""
+        if self._initialized:
+            return
+
+        self._services: Dict[str, Any] = {}
+        self._build_lock = threading.Lock()
+        self._initialized = True
+
+    def get(self, name: str):
+        """
+        取得共用的服務實例
+
+        Raises:
+            KeyError: 未註冊的服務名稱
+        """
+        service = self._services.get(name)
+        if service is None:
+            with self._build_lock:
+                service = self._services.get(name)
+                if service is None:
+                    service = _import_class(SERVICE_CLASSES[name])()
+                    self._services[name] = service
+                    logger.debug(f"建立共用搜尋服務: {name}")
+        return service
+
+    def warm_up(self, names: Optional[Iterable[str]] = None, preload_model: bool = False) -> Dict[str, bool]:
+        """
+        預先建立服務實例
+
+        Args:
+            names: 要建立的服務（預設全部）
+            preload_model: 是否一併載入嵌入模型
+
+        Returns:
+            各服務是否建立成功
+        """
+        status = {}
+        for name in names or SERVICE_CLASSES:
+            try:
+                self.get(name)
+                status[name] = True
+            except Exception as e:
+                logger.warning(f"⚠️ 預先建立搜尋服務 {name} 失敗: {e}")
+                status[name] = False
+
+        if preload_model and status.get('section'):
+            try:
+                self.get('section').embedding_service.model
+            except Exception as e:
+                logger.warning(f"⚠️ 預先載入嵌入模型失敗: {e}")
+
+        logger.info(f"✅ 搜尋服務預熱完成: {[name for name, ok in status.items() if ok]}")
+        return status
+
+    def reset(self) -> None:
+        """清除所有實例（測試用）"""
+        with self._build_lock:
+            self._services = {}
+
+
+def get_search_service_registry() -> SearchServiceRegistry:
+    """取得 SearchServiceRegistry 實例（Singleton）"""
+    return SearchServiceRegistry()
+
+
+def get_search_service(name: str):
+    """取得共用的搜尋服務實例（便利函數）"""
+    return get_search_service_registry().get(name)
+
+
+def warm_up_search_services() -> Dict[str, bool]:
+    """
+    應用啟動時預熱搜尋服務
+
+    環境變數：
+        SEARCH_SERVICE_WARMUP: 是否預先建立服務（預設 true）
+        SEARCH_SERVICE_PRELOAD_MODEL: 是否一併載入嵌入模型（預設 false）
+    """
+    if os.environ.get('SEARCH_SERVICE_WARMUP', 'true').lower() not in ('1', 'true', 'yes'):
+        return {}
+    preload_model = os.environ.get('SEARCH_SERVICE_PRELOAD_MODEL', 'false').lower() in ('1', 'true', 'yes')
+    return get_search_service_registry().warm_up(preload_model=preload_model)
+
+
+__all__ = [
+    'SERVICE_CLASSES',
+    'SearchServiceRegistry',
+    'get_search_service',
+    'get_search_service_registry',
+    'warm_up_search_services',
+]
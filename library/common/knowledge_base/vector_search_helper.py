@@ -33,6 +33,8 @@ from typing import List, Type, Dict, Any, Callable, Optional
 from django.db import models
 import logging
 
+from library.common.stage_timing import stage as timed_stage, DOCUMENT_SQL
+
 logger = logging.getLogger(__name__)
 
 
@@ -53,7 +55,7 @@ def _get_weights_for_assistant(source_table: str, stage: int = 1) -> tuple:
         >>> _get_weights_for_assistant('protocol_guide', stage=2)
         (0.5, 0.5)  # 第二階段 50% 標題 / 50% 內容
     """
-    from api.models import SearchThresholdSetting
+    from library.common.threshold_manager import get_threshold_manager
     
     # 映射 source_table 到 assistant_type
     table_to_type = {
@@ -67,35 +69,18 @@ def _get_weights_for_assistant(source_table: str, stage: int = 1) -> tuple:
         logger.warning(f"未知的 source_table: {source_table}，使用預設權重 60/40")
         return 0.6, 0.4
     
-    try:
-        setting = SearchThresholdSetting.objects.get(assistant_type=assistant_type)
-        
-        # 根據配置策略選擇權重
-        if setting.use_unified_weights or stage == 1:
-            # 使用第一階段配置
-            title_weight = setting.stage1_title_weight / 100.0
-            content_weight = setting.stage1_content_weight / 100.0
-            logger.info(
-                f"載入第一階段權重配置: {assistant_type} -> "
-                f"標題 {setting.stage1_title_weight}% / 內容 {setting.stage1_content_weight}%"
-            )
-        else:
-            # 使用第二階段配置
-            title_weight = setting.stage2_title_weight / 100.0
-            content_weight = setting.stage2_content_weight / 100.0
-            logger.info(
-                f"載入第二階段權重配置: {assistant_type} -> "
-                f"標題 {setting.stage2_title_weight}% / 內容 {setting.stage2_content_weight}%"
-            )
-        
-        return title_weight, content_weight
-        
-    except SearchThresholdSetting.DoesNotExist:
+    # 由 ThresholdManager 快取（設定變更時重新載入），不再每次查詢資料庫
+    config = get_threshold_manager().get_stage_config(assistant_type, stage)
+    if config is None:
         logger.warning(f"找不到 {assistant_type} 的權重配置，使用預設值 60/40")
         return 0.6, 0.4
-    except Exception as e:
-        logger.error(f"讀取權重配置失敗: {str(e)}，使用預設值 60/40")
-        return 0.6, 0.4
+    
+    title_weight, content_weight, _ = config
+    logger.debug(
+        f"載入第{'一' if stage == 1 else '二'}階段權重配置: {assistant_type} -> "
+        f"標題 {title_weight:.0%} / 內容 {content_weight:.0%}"
+    )
+    return title_weight, content_weight
 
 
 def search_with_vectors_generic(
@@ -165,15 +150,16 @@ def search_with_vectors_generic(
         model_type = 'ultra_high' if use_1024 else 'standard'
         embedding_service = get_embedding_service(model_type)
         
-        # ✅ 使用支援權重的多向量搜尋方法
-        vector_results = embedding_service.search_similar_documents_multi(
-            query=query,
-            source_table=source_table,
-            limit=limit,
-            threshold=threshold,
-            title_weight=title_weight,
-            content_weight=content_weight
-        )
+        # ✅ 使用支援權重的多向量搜尋方法（分段計時含查詢向量生成）
+        with timed_stage(DOCUMENT_SQL):
+            vector_results = embedding_service.search_similar_documents_multi(
+                query=query,
+                source_table=source_table,
+                limit=limit,
+                threshold=threshold,
+                title_weight=title_weight,
+                content_weight=content_weight
+            )
         
         if not vector_results:
             logger.info(f"向量搜尋無結果: {source_table}, query='{query}', stage={stage}")
@@ -185,10 +171,11 @@ def search_with_vectors_generic(
         )
         
         # 步驟 3: 批量查詢 DB（避免 N+1 問題）
-        items_dict = fetch_records_by_ids(
-            model_class=model_class,
-            source_ids=[r['source_id'] for r in vector_results]
-        )
+        with timed_stage(DOCUMENT_SQL):
+            items_dict = fetch_records_by_ids(
+                model_class=model_class,
+                source_ids=[r['source_id'] for r in vector_results]
+            )
         
         # 步驟 4: 格式化結果
         formatted_results = format_vector_results(
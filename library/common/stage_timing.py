@@ -0,0 +1,158 @@
+"""
+Stage Timing - 搜尋 / 問答流程的分段計時
+
+基準測試原本只記錄一個 response_time，無法看出慢的版本是卡在查詢向量、
+段落 SQL、上下文擴展、Title Boost、RRF 融合、Dify LLM 還是評分。
+
+使用方式：
+- 呼叫端以 collect_stages() 開啟一次收集（例如一個測試案例）
+- 流程中的各段以 with stage('section_sql'): 包住
+- 沒有開啟收集時 stage() 幾乎沒有成本（只讀一次 ContextVar），正式流量不受影響
+
+收集器存在 ContextVar 中：同一執行緒 / 協程內的巢狀呼叫共用同一個收集器，
+不同執行緒各自獨立（ThreadPoolExecutor 的每個測試各自收集）。
+同名 stage 的耗時累加；巢狀 stage 各自計時（外層包含內層時間）。
+
+Usage:
+    from library.common.stage_timing import collect_stages, stage, summarize_stage_timings
+
+    with collect_stages() as timings:
+        with stage('query_embedding'):
+            ...
+    timings.as_dict()   # {'query_embedding': 0.0123}（秒）
+
+    summarize_stage_timings([r['stage_timings'] for r in results])
+    # {'query_embedding': {'count': 10, 'mean': 0.012, 'p50': 0.011, 'p95': 0.02, 'max': 0.03}}
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, Optional
+
+import numpy as np
+
+# 流程階段名稱（各模組共用，避免同一階段出現不同拼法）
+QUERY_CLEANING = 'query_cleaning'
+QUERY_EMBEDDING = 'query_embedding'
+SECTION_SQL = 'section_sql'
+DOCUMENT_SQL = 'document_sql'
+CONTEXT_EXPANSION = 'context_expansion'
+KEYWORD_SEARCH = 'keyword_search'
+RRF_MERGE = 'rrf_merge'
+TITLE_BOOST = 'title_boost'
+DOCUMENT_EXPANSION = 'document_expansion'
+BACKEND_SEARCH = 'backend_search'
+DIFY_LLM = 'dify_llm'
+SMART_ROUTER = 'smart_router'  # SmartSearchRouter 整段（含後端搜尋與 LLM，無法再細分）
+EVALUATION = 'evaluation'
+
+_current: ContextVar[Optional['StageTimings']] = ContextVar('stage_timings', default=None)
+
+
+class StageTimings:
+    """一次收集的分段耗時（秒，同名累加）"""
+
+    def __init__(self, initial: Optional[Dict[str, float]] = None):
+        self._durations: Dict[str, float] = dict(initial or {})
+
+    def add(self, name: str, seconds: float):
+        self._durations[name] = self._durations.get(name, 0.0) + seconds
+
+    def as_dict(self, digits: int = 4) -> Dict[str, float]:
+        return {name: round(seconds, digits) for name, seconds in self._durations.items()}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._durations
+
+    def __getitem__(self, name: str) -> float:
+        return self._durations[name]
+
+
+@contextmanager
+def collect_stages(initial: Optional[Dict[str, float]] = None) -> Iterator[StageTimings]:
+    """
+    開啟一次分段計時收集
+
+    Args:
+        initial: 既有的分段耗時（例如前一步驟已收集的 Dify 呼叫耗時）
+    """
+    timings = StageTimings(initial)
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """計時一個流程階段（未開啟收集時不計時）"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
+
+
+def current_timings() -> Optional[StageTimings]:
+    """目前的收集器（未開啟時為 None）"""
+    return _current.get()
+
+
+def summarize_stage_timings(samples: Iterable[Optional[Dict[str, float]]],
+                            digits: int = 4) -> Dict[str, Dict[str, float]]:
+    """
+    彙總多筆分段耗時為各階段的 p50 / p95
+
+    只統計有出現該階段的樣本（例如未啟用 Title Boost 的案例不計入 title_boost）。
+
+    Args:
+        samples: 每筆測試結果的 stage_timings
+
+    Returns:
+        {stage: {'count', 'mean', 'p50', 'p95', 'max'}}（秒）
+    """
+    values: Dict[str, list] = {}
+    for sample in samples:
+        for name, seconds in (sample or {}).items():
+            values.setdefault(name, []).append(float(seconds))
+
+    summary = {}
+    for name in sorted(values):
+        arr = np.asarray(values[name], dtype=np.float64)
+        p50, p95 = np.percentile(arr, [50, 95])
+        summary[name] = {
+            'count': int(arr.size),
+            'mean': round(float(arr.mean()), digits),
+            'p50': round(float(p50), digits),
+            'p95': round(float(p95), digits),
+            'max': round(float(arr.max()), digits),
+        }
+    return summary
+
+
+__all__ = [
+    'StageTimings',
+    'collect_stages',
+    'stage',
+    'current_timings',
+    'summarize_stage_timings',
+    'QUERY_CLEANING',
+    'QUERY_EMBEDDING',
+    'SECTION_SQL',
+    'DOCUMENT_SQL',
+    'CONTEXT_EXPANSION',
+    'KEYWORD_SEARCH',
+    'RRF_MERGE',
+    'TITLE_BOOST',
+    'DOCUMENT_EXPANSION',
+    'BACKEND_SEARCH',
+    'DIFY_LLM',
+    'SMART_ROUTER',
+    'EVALUATION',
+]
@@ -31,6 +31,8 @@ import time
 from threading import Lock
 from typing import Optional, Dict
 
+from library.config.versioned_config_cache import GenerationGuard, SEARCH_THRESHOLD_SETTING
+
 logger = logging.getLogger(__name__)
 
 # 預設 threshold 值
@@ -44,12 +46,13 @@ class ThresholdManager:
     
     功能：
     1. 從資料庫讀取 threshold 設定
-    2. 快取機制（5 分鐘 TTL）
+    2. 快取機制（設定世代變更即失效，Redis 無法連線時 5 分鐘 TTL）
     3. 三層優先順序處理
     4. 自動計算衍生 threshold
     
     快取策略：
-    - 每 5 分鐘自動重新整理
+    - SearchThresholdSetting 儲存後遞增 Redis 世代，所有 worker 下次讀取時重新整理
+    - Redis 無法連線時每 5 分鐘自動重新整理
     - 可手動觸發重新整理
     - 避免每次查詢都存取資料庫
     """
@@ -74,27 +77,28 @@ class ThresholdManager:
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self._cache = {}
         self._cache_timestamp = 0
+        self._guard = GenerationGuard(SEARCH_THRESHOLD_SETTING, ttl=CACHE_TTL)
         self._initialized = True
         
         self.logger.info("✅ ThresholdManager Singleton 初始化完成")
     
     def _is_cache_valid(self) -> bool:
         """檢查快取是否有效"""
-        if not self._cache:
-            return False
-        
-        current_time = time.time()
-        cache_age = current_time - self._cache_timestamp
-        
-        is_valid = cache_age < CACHE_TTL
+        is_valid = not self._guard.is_stale()
         
         if not is_valid:
-            self.logger.debug(f"快取已過期（{cache_age:.0f} 秒 > {CACHE_TTL} 秒）")
+            cache_age = time.time() - self._cache_timestamp
+            self.logger.debug(f"快取已過期（設定已變更或超過 TTL，已存在 {cache_age:.0f} 秒）")
         
         return is_valid
     
     def _load_from_database(self) -> Dict[str, dict]:
-        """從資料庫載入 threshold 設定（擴充為載入完整配置）"""
+        """
+        從資料庫載入 threshold 設定（擴充為載入完整配置）
+        
+        Raises:
+            Exception: 資料庫查詢失敗（由 _refresh_cache 保留舊快取）
+        """
         try:
             # 延遲導入避免循環依賴
             from api.models import SearchThresholdSetting
@@ -135,13 +139,20 @@ class ThresholdManager:
             
         except Exception as e:
             self.logger.error(f"從資料庫載入 threshold 失敗: {e}")
-            return {}
+            raise
     
     def _refresh_cache(self):
         """重新整理快取"""
         self.logger.info("🔄 重新整理 threshold 快取...")
-        self._cache = self._load_from_database()
+        generations = self._guard.read()
+        try:
+            cache = self._load_from_database()
+        except Exception:
+            # 資料庫異常時保留舊快取且不標記為已載入，下次讀取再試
+            return
+        self._cache = cache
         self._cache_timestamp = time.time()
+        self._guard.loaded(generations)
         self.logger.info(f"✅ 快取重新整理完成（{len(self._cache)} 項設定）")
     
     def get_threshold(
@@ -255,6 +266,35 @@ class ThresholdManager:
         self.logger.warning(f"找不到 {assistant_type} 的權重配置，使用預設 60/40")
         return (0.6, 0.4)
     
+    def get_stage_config(
+        self,
+        assistant_type: str,
+        stage: int = 1
+    ) -> Optional[tuple]:
+        """
+        獲取單一階段的權重與 threshold（無資料庫設定時回傳 None，由呼叫端決定預設值）
+        
+        Args:
+            assistant_type: Assistant 類型
+            stage: 搜尋階段 (1=段落, 2=全文)
+        
+        Returns:
+            (title_weight, content_weight, threshold) 元組（權重 0.0-1.0）或 None
+        """
+        if not self._is_cache_valid():
+            self._refresh_cache()
+        
+        config = self._cache.get(assistant_type)
+        if config is None:
+            return None
+        
+        prefix = 'stage1' if config['use_unified_weights'] or stage == 1 else 'stage2'
+        return (
+            config[f'{prefix}_title_weight'] / 100.0,
+            config[f'{prefix}_content_weight'] / 100.0,
+            config[f'{prefix}_threshold']
+        )
+    
     def get_all_thresholds(
         self,
         assistant_type: str,
@@ -292,6 +332,7 @@ class ThresholdManager:
         self.logger.info("🗑️ 清除 threshold 快取")
         self._cache = {}
         self._cache_timestamp = 0
+        self._guard.reset()
     
     def get_cache_info(self) -> Dict:
         """獲取快取資訊（用於除錯）"""
@@ -303,7 +344,8 @@ class ThresholdManager:
             'cache_age_seconds': cache_age,
             'is_valid': self._is_cache_valid(),
             'cached_assistants': list(self._cache.keys()),
-            'ttl': CACHE_TTL
+            'ttl': CACHE_TTL,
+            'generations': self._guard.generations
         }
 
 
@@ -0,0 +1,274 @@
+"""
+Vector Bulk Reader - pgvector 向量表批量讀取工具
+==================================================
+
+提供向量表（chat_message_embeddings_1024、document_embeddings_1024 ...）的高效批量讀取：
+1. 使用伺服器端游標（named cursor）+ fetchmany 分塊讀取，記憶體不隨資料量暴增
+2. 透過 pgvector psycopg2 adapter 直接解碼為 NumPy 陣列，不再做字串解析
+3. 向量與元數據分離：先讀取 (id, embedding) 矩陣，元數據按需（lazy）再查
+
+使用方式：
+```python
+from library.common.vector_bulk_reader import VectorBulkReader
+
+reader = VectorBulkReader(
+    'chat_message_embeddings_1024',
+    where="user_role = %s AND message_length >= %s",
+    params=['user', 5],
+    order_by='created_at DESC',
+)
+
+matrix = reader.read_matrix()              # VectorMatrix(ids, vectors)
+meta = reader.fetch_metadata(matrix.ids[:3], ['text_content', 'message_length'])
+```
+
+未安裝 pgvector Python 套件時，自動改用 `embedding::real[]` 轉型，
+由 psycopg2 解碼為 float 陣列，仍然避免逐筆字串處理。
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from django.db import connection
+
+try:
+    from pgvector.psycopg2 import register_vector
+    PGVECTOR_ADAPTER_AVAILABLE = True
+except ImportError:
+    PGVECTOR_ADAPTER_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 預設分塊大小（每次 fetchmany 的列數）
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def iter_query_chunks(sql: str, params: Optional[Sequence[Any]] = None,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """
+    以伺服器端游標分塊執行查詢
+
+    Args:
+        sql: SQL 查詢
+        params: 查詢參數
+        chunk_size: 每塊列數
+
+    Yields:
+        每塊的結果列表（dict 格式）
+    """
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params or [])
+        columns = [col[0] for col in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [dict(zip(columns, row)) for row in rows]
+
+
+def to_float32_vector(value: Any) -> np.ndarray:
+    """
+    將資料庫回傳的向量值轉換為 float32 NumPy 陣列
+
+    支援 pgvector Vector 物件、ndarray、list 以及 '[x,y,...]' 文字格式。
+    """
+    if hasattr(value, 'to_numpy'):
+        value = value.to_numpy()
+    elif isinstance(value, str):
+        return np.array(value.strip('[]').split(','), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+@dataclass
+class VectorMatrix:
+    """批量讀取結果：ids 與向量矩陣按列對齊"""
+
+    ids: np.ndarray
+    vectors: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dimension(self) -> int:
+        return self.vectors.shape[1] if self.vectors.ndim == 2 else 0
+
+    def normalized(self) -> np.ndarray:
+        """回傳 L2 正規化後的向量矩陣（餘弦相似度可直接用內積計算）"""
+        norms = np.linalg.norm(self.vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return self.vectors / norms
+
+    def position_map(self) -> Dict[int, int]:
+        """id -> 列索引 映射"""
+        return {int(vector_id): idx for idx, vector_id in enumerate(self.ids)}
+
+
+class VectorBulkReader:
+    """
+    pgvector 向量表批量讀取器
+
+    只讀取 (id, embedding) 兩欄構建矩陣；其他欄位透過 fetch_metadata 按需查詢。
+    """
+
+    def __init__(self, table: str,
+                 where: Optional[str] = None,
+                 params: Optional[Sequence[Any]] = None,
+                 order_by: Optional[str] = None,
+                 id_column: str = 'id',
+                 vector_column: str = 'embedding',
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 limit: Optional[int] = None):
+        """
+        Args:
+            table: 向量表名稱
+            where: WHERE 條件（不含 WHERE 關鍵字，可用 %s 佔位）
+            params: WHERE 條件參數
+            order_by: ORDER BY 子句（不含 ORDER BY 關鍵字）
+            id_column: 主鍵欄位
+            vector_column: 向量欄位
+            chunk_size: 每次 fetchmany 列數
+            limit: 最大讀取列數
+        """
+        self.table = table
+        self.where = where
+        self.params = list(params or [])
+        self.order_by = order_by
+        self.id_column = id_column
+        self.vector_column = vector_column
+        self.chunk_size = chunk_size
+        self.limit = limit
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+
+    def _where_clause(self, require_vector: bool = True) -> str:
+        conditions = [f"{self.vector_column} IS NOT NULL"] if require_vector else ["TRUE"]
+        if self.where:
+            conditions.append(f"({self.where})")
+        return " AND ".join(conditions)
+
+    def _select_sql(self, vector_expr: str) -> str:
+        sql = (
+            f"SELECT {self.id_column}, {vector_expr} FROM {self.table} "
+            f"WHERE {self._where_clause()}"
+        )
+        if self.order_by:
+            sql += f" ORDER BY {self.order_by}"
+        if self.limit:
+            sql += f" LIMIT {int(self.limit)}"
+        return sql
+
+    def _prepare_cursor(self, raw_cursor) -> str:
+        """
+        在游標上註冊 pgvector 解碼器（只作用於此游標，不影響連線上的其他查詢）
+
+        Returns:
+            SELECT 中使用的向量表達式
+        """
+        if PGVECTOR_ADAPTER_AVAILABLE:
+            try:
+                register_vector(raw_cursor, arrays=False)
+                return self.vector_column
+            except Exception as e:
+                self.logger.warning(f"pgvector adapter 註冊失敗，改用 real[] 轉型: {str(e)}")
+        return f"{self.vector_column}::real[]"
+
+    def count(self) -> int:
+        """符合條件的向量數量"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {self.table} WHERE {self._where_clause()}",
+                self.params
+            )
+            total = cursor.fetchone()[0]
+        return min(total, self.limit) if self.limit else total
+
+    def iter_chunks(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        分塊讀取向量
+
+        Yields:
+            (ids, vectors) - ids 為 int64 陣列，vectors 為 (n, dim) float32 矩陣
+        """
+        connection.ensure_connection()
+        with connection.chunked_cursor() as cursor:
+            vector_expr = self._prepare_cursor(cursor.cursor)
+            cursor.execute(self._select_sql(vector_expr), self.params)
+
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+                vectors = np.stack([to_float32_vector(row[1]) for row in rows])
+                yield ids, vectors
+
+    def read_matrix(self) -> VectorMatrix:
+        """
+        讀取所有符合條件的向量到預先配置的矩陣
+
+        Returns:
+            VectorMatrix
+        """
+        expected = self.count()
+        ids = np.empty(expected, dtype=np.int64)
+        vectors: Optional[np.ndarray] = None
+        filled = 0
+
+        for chunk_ids, chunk_vectors in self.iter_chunks():
+            if vectors is None:
+                vectors = np.empty((max(expected, len(chunk_ids)), chunk_vectors.shape[1]),
+                                   dtype=np.float32)
+            end = filled + len(chunk_ids)
+            if end > len(ids):
+                # 讀取期間有新資料寫入，擴充容量
+                ids = np.resize(ids, end)
+                vectors = np.resize(vectors, (end, vectors.shape[1]))
+            ids[filled:end] = chunk_ids
+            vectors[filled:end] = chunk_vectors
+            filled = end
+
+        if vectors is None:
+            return VectorMatrix(ids=np.empty(0, dtype=np.int64),
+                                vectors=np.empty((0, 0), dtype=np.float32))
+
+        self.logger.info(f"批量讀取向量: {self.table} {filled} 筆, 維度 {vectors.shape[1]}")
+        return VectorMatrix(ids=ids[:filled], vectors=vectors[:filled])
+
+    def iter_ids(self) -> Iterator[List[int]]:
+        """分塊讀取符合條件的 id（不讀取向量內容，也不要求向量非空）"""
+        sql = f"SELECT {self.id_column} FROM {self.table} WHERE {self._where_clause(require_vector=False)}"
+        if self.order_by:
+            sql += f" ORDER BY {self.order_by}"
+        for rows in iter_query_chunks(sql, self.params, self.chunk_size):
+            yield [row[self.id_column] for row in rows]
+
+    def fetch_metadata(self, ids: Iterable[int], columns: Sequence[str]) -> Dict[int, Dict[str, Any]]:
+        """
+        按需查詢指定 id 的元數據欄位
+
+        Args:
+            ids: 要查詢的 id
+            columns: 欄位名稱列表
+
+        Returns:
+            {id: {column: value}}
+        """
+        id_list = [int(i) for i in ids]
+        if not id_list or not columns:
+            return {}
+
+        column_sql = ", ".join(columns)
+        metadata = {}
+        for start in range(0, len(id_list), self.chunk_size):
+            batch = id_list[start:start + self.chunk_size]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT {self.id_column}, {column_sql} FROM {self.table} "
+                    f"WHERE {self.id_column} = ANY(%s)",
+                    [batch]
+                )
+                for row in cursor.fetchall():
+                    metadata[row[0]] = dict(zip(columns, row[1:]))
+        return metadata
@@ -0,0 +1,324 @@
+"""
+Versioned Config Cache - DifyConfigVersion / SearchThresholdSetting 的行程內快取與跨 worker 失效
+
+原本每次知識庫搜尋與 Protocol 聊天都以 ORM 查詢 DifyConfigVersion，
+Baseline 版本代碼則存在各 worker 的 dict 中，切換 Baseline 只清得到處理該請求的 worker。
+
+此模組改為：
+- 每個設定來源有一個 Redis 世代計數（generation），model 儲存 / 刪除的交易提交後遞增
+  （api.signals 註冊），所有 worker 共用
+- 每個 worker 保存解析好的版本設定（含預先驗證的 Title Boost 配置、動態 Threshold 合併結果）
+  與載入時的世代；讀取時只比對世代（GENERATION_CHECK_INTERVAL 內不重複查詢 Redis），
+  世代改變才重新載入
+- Redis 無法連線時退回 FALLBACK_TTL 到期重新載入；同一 worker 內的修改仍立即生效
+
+Usage:
+    from library.config.versioned_config_cache import get_config_cache
+
+    version = get_config_cache().get_version('dify-two-tier-v1.2.1')
+    if version:
+        version_config = version.as_version_config()
+
+    baseline = get_config_cache().get_baseline()
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 設定來源（世代計數名稱）
+DIFY_CONFIG_VERSION = 'dify_config_version'
+SEARCH_THRESHOLD_SETTING = 'search_threshold_setting'
+
+GENERATION_KEY_PREFIX = 'ai_platform:config_generation'
+GENERATION_CHECK_INTERVAL = 1.0  # 兩次查詢 Redis 世代的最短間隔（秒）
+FALLBACK_TTL = 300  # Redis 無法連線時的快取存活時間（秒）
+
+# Redis 連線（False 表示無法連線）
+_client = None
+_client_lock = threading.Lock()
+
+# 行程內的世代計數：同一 worker 的修改不需經過 Redis 即可生效
+_local_generations: Dict[str, int] = {}
+_local_lock = threading.Lock()
+
+
+def _get_client():
+    """Redis 連線（無法連線時回傳 None）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                try:
+                    from django_redis import get_redis_connection
+                    client = get_redis_connection('default')
+                    client.ping()
+                    _client = client
+                except Exception as e:
+                    logger.warning(f"⚠️ [ConfigCache] Redis 無法連線，設定快取改以 {FALLBACK_TTL} 秒 TTL 失效: {e}")
+                    _client = False
+    return _client or None
+
+
+def generation_key(source: str) -> str:
+    return f"{GENERATION_KEY_PREFIX}:{source}"
+
+
+def bump_generation(source: str) -> None:
+    """遞增設定來源的世代，所有 worker 在下次讀取時重新載入"""
+    with _local_lock:
+        _local_generations[source] = _local_generations.get(source, 0) + 1
+
+    client = _get_client()
+    if client is not None:
+        try:
+            client.incr(generation_key(source))
+        except Exception as e:
+            logger.warning(f"⚠️ [ConfigCache] 遞增 {source} 世代失敗: {e}")
+    logger.info(f"🔄 [ConfigCache] {source} 設定已變更，快取失效")
+
+
+def bump_generation_on_commit(source: str) -> None:
+    """在目前交易提交後遞增世代（避免其他 worker 讀到尚未提交的舊資料）"""
+    from django.db import transaction
+
+    transaction.on_commit(lambda: bump_generation(source))
+
+
+def read_generations(*sources: str) -> Tuple[Tuple[Optional[int], int], ...]:
+    """
+    讀取多個來源目前的世代
+
+    Returns:
+        每個來源的 (Redis 世代, 行程內世代)；Redis 無法連線時 Redis 世代為 None
+    """
+    remote = [None] * len(sources)
+    client = _get_client()
+    if client is not None:
+        try:
+            remote = [int(value or 0) for value in client.mget([generation_key(s) for s in sources])]
+        except Exception as e:
+            logger.warning(f"⚠️ [ConfigCache] 讀取設定世代失敗: {e}")
+    with _local_lock:
+        return tuple((remote[i], _local_generations.get(s, 0)) for i, s in enumerate(sources))
+
+
+class GenerationGuard:
+    """
+    判斷行程內快取是否過期
+
+    載入前先以 read() 取得世代，載入完成後 loaded(generations)；
+    載入期間若有修改，下次檢查會看到較新的世代而再次載入。
+    """
+
+    def __init__(self, *sources: str, check_interval: Optional[float] = None,
+                 ttl: Optional[float] = None):
+        self.sources = sources
+        self.check_interval = GENERATION_CHECK_INTERVAL if check_interval is None else check_interval
+        self.ttl = FALLBACK_TTL if ttl is None else ttl
+        self.generations = None
+        self.loaded_at = 0.0
+        self.checked_at = 0.0
+
+    def read(self):
+        return read_generations(*self.sources)
+
+    def loaded(self, generations) -> None:
+        self.generations = generations
+        self.loaded_at = self.checked_at = time.monotonic()
+
+    def reset(self) -> None:
+        self.generations = None
+        self.loaded_at = self.checked_at = 0.0
+
+    def is_stale(self) -> bool:
+        if self.generations is None:
+            return True
+        now = time.monotonic()
+        if now - self.checked_at < self.check_interval:
+            return False
+        self.checked_at = now
+
+        current = self.read()
+        if current != self.generations:
+            return True
+        # Redis 無法連線：只能依 TTL 重新載入
+        if any(remote is None for remote, _ in current):
+            return now - self.loaded_at >= self.ttl
+        return False
+
+
+@dataclass(frozen=True)
+class CachedVersion:
+    """解析完成的 DifyConfigVersion"""
+    id: int
+    version_code: str
+    version_name: str
+    rag_settings: Dict[str, Any]
+    model_config: Dict[str, Any]
+    retrieval_mode: str
+    is_baseline: bool
+    is_dynamic: bool
+    # 動態版本合併 SearchThresholdSetting 後的 rag_settings（靜態版本與 rag_settings 相同）
+    effective_rag_settings: Dict[str, Any]
+    # 各階段已驗證的 Title Boost 配置（TitleBoostConfig.get_safe_config）
+    title_boost: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+
+    def as_version_config(self) -> Dict[str, Any]:
+        """搜尋服務使用的 version_config"""
+        return {
+            'version_code': self.version_code,
+            'version_name': self.version_name,
+            'rag_settings': self.rag_settings,
+            'model_config': self.model_config,
+            'retrieval_mode': self.retrieval_mode,
+            'title_boost': self.title_boost,
+        }
+
+
+def _parse_version(version) -> CachedVersion:
+    from library.common.knowledge_base.title_boost.config import TitleBoostConfig
+    from library.dify_integration.dynamic_threshold_loader import DynamicThresholdLoader
+
+    rag_settings = version.rag_settings or {}
+    is_dynamic = DynamicThresholdLoader.is_dynamic_version(rag_settings)
+    effective = rag_settings
+    if is_dynamic:
+        try:
+            effective = DynamicThresholdLoader.load_full_rag_settings(rag_settings)
+        except Exception as e:
+            logger.error(f"版本 {version.version_code} 動態載入失敗，使用靜態配置: {str(e)}")
+
+    title_boost = {
+        stage: TitleBoostConfig.get_safe_config(TitleBoostConfig.from_rag_settings(rag_settings, stage=stage))
+        for stage in (1, 2)
+    }
+
+    return CachedVersion(
+        id=version.id,
+        version_code=version.version_code,
+        version_name=version.version_name,
+        rag_settings=rag_settings,
+        model_config=version.model_config or {},
+        retrieval_mode=rag_settings.get('retrieval_mode', 'two_stage'),
+        is_baseline=version.is_baseline,
+        is_dynamic=is_dynamic,
+        effective_rag_settings=effective,
+        title_boost=title_boost,
+    )
+
+
+class VersionedConfigCache:
+    """
+    啟用中 DifyConfigVersion 的行程內快取（Singleton 模式）
+
+    動態版本的 effective_rag_settings 取自 SearchThresholdSetting，
+    因此兩個來源的世代任一改變都會重新載入。
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        """Singleton 模式實作"""
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        """初始化（只執行一次）"""
+        if self._initialized:
+            return
+
+        self._guard = GenerationGuard(DIFY_CONFIG_VERSION, SEARCH_THRESHOLD_SETTING)
+        self._versions: Dict[str, CachedVersion] = {}
+        self._baseline_code: Optional[str] = None
+        self._reload_lock = threading.Lock()
+        self._initialized = True
+
+    def _load(self) -> Tuple[Dict[str, CachedVersion], Optional[str]]:
+        from api.models import DifyConfigVersion
+
+        versions = {}
+        baseline_code = None
+        for version in DifyConfigVersion.objects.filter(is_active=True):
+            try:
+                parsed = _parse_version(version)
+            except Exception as e:
+                logger.error(f"解析版本 {version.version_code} 失敗: {str(e)}")
+                continue
+            versions[parsed.version_code] = parsed
+            if parsed.is_baseline and baseline_code is None:
+                baseline_code = parsed.version_code
+        return versions, baseline_code
+
+    def _ensure_fresh(self) -> None:
+        if not self._guard.is_stale():
+            return
+        loaded_at = self._guard.loaded_at
+        with self._reload_lock:
+            if self._guard.loaded_at != loaded_at:
+                return  # 其他執行緒已重新載入
+            generations = self._guard.read()
+            try:
+                versions, baseline_code = self._load()
+            except Exception as e:
+                # 資料庫異常時保留舊快取，下次讀取再試
+                logger.error(f"❌ [ConfigCache] 載入 DifyConfigVersion 失敗: {str(e)}")
+                return
+            self._versions, self._baseline_code = versions, baseline_code
+            self._guard.loaded(generations)
+            logger.info(
+                f"✅ [ConfigCache] 已載入 {len(versions)} 個啟用版本"
+                f"（Baseline: {baseline_code or '未設定'}）"
+            )
+
+    def get_version(self, version_code: str) -> Optional[CachedVersion]:
+        """取得啟用中的版本（不存在或未啟用回傳 None）"""
+        self._ensure_fresh()
+        return self._versions.get(version_code)
+
+    def get_baseline(self) -> Optional[CachedVersion]:
+        """取得啟用中的 Baseline 版本"""
+        self._ensure_fresh()
+        return self._versions.get(self._baseline_code) if self._baseline_code else None
+
+    def invalidate(self) -> None:
+        """只讓本 worker 的快取失效（下次讀取重新載入）"""
+        self._guard.reset()
+
+    def get_cache_info(self) -> Dict[str, Any]:
+        """快取資訊（用於除錯）"""
+        return {
+            'loaded': self._guard.generations is not None,
+            'versions': sorted(self._versions),
+            'baseline_version_code': self._baseline_code,
+            'generations': self._guard.generations,
+        }
+
+
+def get_config_cache() -> VersionedConfigCache:
+    """取得 VersionedConfigCache 實例（Singleton）"""
+    return VersionedConfigCache()
+
+
+__all__ = [
+    'CachedVersion',
+    'DIFY_CONFIG_VERSION',
+    'FALLBACK_TTL',
+    'GENERATION_CHECK_INTERVAL',
+    'GenerationGuard',
+    'SEARCH_THRESHOLD_SETTING',
+    'VersionedConfigCache',
+    'bump_generation',
+    'bump_generation_on_commit',
+    'get_config_cache',
+    'read_generations',
+]
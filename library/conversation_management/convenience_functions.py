@@ -250,7 +250,9 @@ def record_complete_exchange(
     assistant_message: str,
     response_time: Optional[float] = None,
     token_usage: Optional[Dict] = None,
-    metadata: Optional[Dict] = None
+    metadata: Optional[Dict] = None,
+    chat_type: str = 'rvt_assistant_chat',
+    defer: bool = False
 ) -> Dict[str, Any]:
     """
     記錄完整的一問一答交互的便利函數
@@ -263,13 +265,22 @@ def record_complete_exchange(
         response_time: 回應時間
         token_usage: Token使用統計
         metadata: 元資料
+        chat_type: 新建會話時的聊天類型
+        defer: 推入延後寫入佇列後立即返回（聊天 API 使用，結果不含 session）
         
     Returns:
         dict: 記錄結果
     """
     try:
+        if defer:
+            from .write_behind import enqueue_exchange
+            if enqueue_exchange(request, session_id, user_message, assistant_message,
+                                response_time=response_time, token_usage=token_usage,
+                                metadata=metadata, chat_type=chat_type):
+                return {"success": True, "queued": True, "message": "Exchange queued for recording"}
+        
         # 獲取或建立會話
-        session_result = get_or_create_session(request, session_id)
+        session_result = get_or_create_session(request, session_id, chat_type=chat_type)
         if not session_result["success"]:
             return session_result
         
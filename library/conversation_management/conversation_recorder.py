@@ -75,13 +75,19 @@ class ConversationRecorder:
                 
                 # 自動更新會話統計（透過模型的 save 方法觸發）
                 logger.info(f"Message recorded: {role} message #{message.sequence_number}")
-                
-                return {
-                    "success": True,
-                    "message_id": message.id,
-                    "sequence_number": message.sequence_number,
-                    "conversation_id": conversation_session.id
-                }
+            
+            # 累加每日分析彙總（失敗不影響記錄，定期重算會修正）
+            ConversationRecorder._update_daily_rollup(message, conversation_session)
+            
+            # 加入本行程的歷史問題相似度索引（只在索引已建立時）
+            ConversationRecorder._update_question_index(message, conversation_session)
+            
+            return {
+                "success": True,
+                "message_id": message.id,
+                "sequence_number": message.sequence_number,
+                "conversation_id": conversation_session.id
+            }
                 
         except Exception as e:
             logger.error(f"Failed to record message: {str(e)}")
@@ -90,6 +96,24 @@ class ConversationRecorder:
                 "error": f"Failed to record message: {str(e)}"
             }
     
+    @staticmethod
+    def _update_daily_rollup(message: Any, conversation_session: Any) -> None:
+        """累加每日分析彙總（conversation_daily_rollups）"""
+        try:
+            from library.common.analytics.daily_rollup import get_daily_rollup_service
+            get_daily_rollup_service().record_message(message, conversation_session)
+        except ImportError:
+            pass
+    
+    @staticmethod
+    def _update_question_index(message: Any, conversation_session: Any) -> None:
+        """加入歷史問題 MinHash 索引（失敗不影響記錄，索引同步時會補上）"""
+        try:
+            from library.common.analytics.question_minhash import record_question
+            record_question(message, conversation_session)
+        except Exception as e:
+            logger.debug(f"更新歷史問題索引失敗: {str(e)}")
+    
     @staticmethod
     def record_user_message(
         conversation_session: Any,
@@ -246,6 +270,7 @@ class ConversationRecorder:
             message = ChatMessage.objects.get(id=message_id)
             
             update_fields = []
+            old_helpful = message.is_helpful
             if is_helpful is not None:
                 message.is_helpful = is_helpful
                 update_fields.append('is_helpful')
@@ -258,6 +283,13 @@ class ConversationRecorder:
                 update_fields.append('updated_at')
                 message.save(update_fields=update_fields)
                 
+                if 'is_helpful' in update_fields:
+                    try:
+                        from library.common.analytics.daily_rollup import get_daily_rollup_service
+                        get_daily_rollup_service().record_feedback_change(message, old_helpful)
+                    except ImportError:
+                        pass
+                
                 return {
                     "success": True,
                     "message": "Feedback updated successfully"
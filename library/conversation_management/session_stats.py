@@ -0,0 +1,106 @@
+"""
+會話統計修復 - Session Stats Repair
+
+ChatMessage.save 以 F() 增量維護 ConversationSession 的 message_count / total_tokens /
+total_response_time，並由 last_sequence_number 計數列配發訊息序號。
+刪除訊息、直接以 SQL 寫入或 bulk 操作不會經過 save，累計值可能偏差；
+此模組以一次集合查詢找出偏差的會話，再逐一完整重算（ConversationSession.update_stats）。
+
+Usage:
+    from library.conversation_management.session_stats import find_drifted_sessions, repair_session_stats
+
+    drifted = find_drifted_sessions()
+    repair_session_stats(drifted)
+
+Author: AI Platform Team
+"""
+
+import logging
+from typing import Iterable, List, Optional
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# 回應時間累加的浮點誤差容忍值（秒）
+RESPONSE_TIME_TOLERANCE = 0.001
+
+_MESSAGE_STATS_SQL = """
+    SELECT
+        conversation_id,
+        COUNT(*) AS message_count,
+        COALESCE(SUM(response_time), 0) AS total_response_time,
+        COALESCE(SUM(CASE WHEN jsonb_typeof(token_usage -> 'total_tokens') = 'number'
+                          THEN TRUNC((token_usage ->> 'total_tokens')::numeric) ELSE 0 END), 0) AS total_tokens,
+        MAX(sequence_number) AS last_sequence_number
+    FROM chat_messages
+    {where}
+    GROUP BY conversation_id
+"""
+
+_DRIFT_SQL = """
+    SELECT cs.id
+    FROM conversation_sessions cs
+    LEFT JOIN ({message_stats}) m ON m.conversation_id = cs.id
+    WHERE (
+        cs.message_count <> COALESCE(m.message_count, 0)
+        OR cs.total_tokens <> COALESCE(m.total_tokens, 0)
+        OR ABS(cs.total_response_time - COALESCE(m.total_response_time, 0)) > %s
+        OR cs.last_sequence_number < COALESCE(m.last_sequence_number, 0)
+    )
+    {session_filter}
+    ORDER BY cs.id
+"""
+
+
+def find_drifted_sessions(session_ids: Optional[Iterable[int]] = None) -> List[int]:
+    """
+    找出統計與訊息不一致的會話
+
+    Args:
+        session_ids: 只檢查這些會話（預設全部）
+
+    Returns:
+        偏差的會話 ID 列表
+    """
+    params: list = []
+    where = session_filter = ''
+    if session_ids is not None:
+        session_ids = list(session_ids)
+        if not session_ids:
+            return []
+        where = 'WHERE conversation_id = ANY(%s)'
+        session_filter = 'AND cs.id = ANY(%s)'
+        params = [session_ids, RESPONSE_TIME_TOLERANCE, session_ids]
+    else:
+        params = [RESPONSE_TIME_TOLERANCE]
+
+    sql = _DRIFT_SQL.format(message_stats=_MESSAGE_STATS_SQL.format(where=where), session_filter=session_filter)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def repair_session_stats(session_ids: Iterable[int]) -> int:
+    """
+    完整重算指定會話的統計與序號計數
+
+    Returns:
+        成功修復的會話數
+    """
+    from api.models import ConversationSession
+
+    repaired = 0
+    for session in ConversationSession.objects.filter(id__in=list(session_ids)).iterator():
+        try:
+            session.update_stats()
+            repaired += 1
+        except Exception as e:
+            logger.error(f"會話統計修復失敗: session={session.id}, error={str(e)}")
+    return repaired
+
+
+__all__ = [
+    'find_drifted_sessions',
+    'repair_session_stats',
+]
@@ -0,0 +1,534 @@
+"""
+對話記錄延後寫入 - Write-Behind Conversation Recorder
+
+聊天 API 在 Dify 回答返回後才同步寫入 ConversationSession / ChatMessage（每則訊息一個交易）、
+每日彙總與 ChatUsage，這些分析寫入全部計入使用者可見的延遲。
+
+ConversationWriteBehind：
+- 請求執行緒只把事件（可 JSON 序列化的 dict）推入行程內有界佇列即返回
+- 佇列滿時溢出到 Redis 清單；溢出期間的新事件一律進 Redis，寫入執行緒先消化行程內佇列
+  再取回 Redis 的事件，整體維持推入順序
+- 單一寫入執行緒批次寫入：同一批內每個會話以一次 F() UPDATE 累加統計並配發連續序號，
+  訊息與使用記錄以 bulk_create 寫入；交易提交後才累加每日彙總與歷史問題索引
+- 行程結束（atexit / SIGTERM）時寫完佇列與本行程的 Redis 溢出
+- 崩潰行程留下的溢出清單在心跳過期後由其他行程接手
+- 環境變數 CONVERSATION_WRITE_BEHIND=false 時停用，呼叫端退回同步寫入
+
+bulk_create 不經過 ChatMessage.save，會話統計與序號由本模組自行維護（與 save 的增量邏輯一致）。
+
+Usage:
+    from library.conversation_management.write_behind import enqueue_exchange, enqueue_usage
+
+    if not enqueue_exchange(request, session_id, question, answer, chat_type='protocol_assistant_chat'):
+        ...  # 停用時同步寫入
+
+Author: AI Platform Team
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import signal
+import socket
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from django.utils import timezone
+
+from library.benchmark.result_sink import BufferedResultSink, _STOP
+
+logger = logging.getLogger(__name__)
+
+# Redis key 前綴（原始連線不套用 CACHES 的 KEY_PREFIX，需自行加上）
+KEY_PREFIX = 'ai_platform:conversation_write_behind'
+
+# 所有行程的溢出清單登記表（用於接手崩潰行程的溢出）
+SPILL_REGISTRY_KEY = f'{KEY_PREFIX}:spills'
+
+# 預設每批事件數、最長等待秒數與行程內佇列上限
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_QUEUE_SIZE = 2000
+
+# 溢出清單心跳存活時間（秒）；過期即視為行程已結束，由其他行程接手
+HEARTBEAT_TTL = 60
+
+# 檢查孤兒溢出清單的間隔（秒）
+ADOPT_INTERVAL = 60.0
+
+
+def write_behind_enabled() -> bool:
+    """是否啟用延後寫入（CONVERSATION_WRITE_BEHIND，預設啟用）"""
+    return os.getenv('CONVERSATION_WRITE_BEHIND', 'true').lower() not in ('0', 'false', 'no', 'off')
+
+
+# ------------------------------------------------------------
+# 事件
+# ------------------------------------------------------------
+
+def session_identity(request, chat_type: str) -> Dict[str, Any]:
+    """
+    於請求執行緒擷取建立會話所需的身分資訊（寫入執行緒拿不到 request）
+
+    標題格式與 ConversationManager.create_session 相同。
+    """
+    from .guest_identifier import get_request_identifier
+
+    identifier = get_request_identifier(request)
+    user = identifier['user']
+    is_guest = identifier['is_guest']
+    now_label = timezone.now().strftime('%m/%d %H:%M')
+    return {
+        'user_id': None if is_guest else user.id,
+        'guest_identifier': identifier['guest_id'] or '',
+        'is_guest_session': is_guest,
+        'chat_type': chat_type,
+        'title': f"訪客對話 - {now_label}" if is_guest else f"{user.username} 的對話 - {now_label}",
+    }
+
+
+def exchange_event(session_id: str, session: Dict[str, Any], user_message: str, assistant_message: str,
+                   response_time: Optional[float] = None, token_usage: Optional[Dict] = None,
+                   metadata: Optional[Dict] = None) -> Dict[str, Any]:
+    """一問一答事件（兩則訊息同一事件，確保在同一批內取得相鄰序號）"""
+    dify_message_id = metadata.get('dify_message_id', '') if isinstance(metadata, dict) else ''
+    return {
+        'type': 'exchange',
+        'session_id': session_id,
+        'session': session,
+        'messages': [
+            {'role': 'user', 'content': user_message},
+            {'role': 'assistant', 'content': assistant_message, 'message_id': dify_message_id or '',
+             'response_time': response_time, 'token_usage': token_usage, 'metadata': metadata},
+        ],
+    }
+
+
+def usage_event(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """ChatUsage 事件（fields 為模型欄位，使用者以 user_id 表示）"""
+    return {'type': 'usage', 'fields': fields}
+
+
+def group_session_messages(events: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    依會話彙整一批事件中的訊息
+
+    Returns:
+        {session_id: {'session': 身分資訊, 'messages': [...]}}，會話與訊息都維持事件順序
+    """
+    groups: Dict[str, Dict[str, Any]] = {}
+    for event in events:
+        if event.get('type') != 'exchange':
+            continue
+        group = groups.setdefault(event['session_id'], {'session': event['session'], 'messages': []})
+        group['messages'].extend(event['messages'])
+    return groups
+
+
+def session_stat_updates(messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """一個會話一批新訊息的 F() 增量（與 ChatMessage._count_in_session 相同的統計）"""
+    from django.db.models import F
+    from api.models import ChatMessage
+
+    count = len(messages)
+    updates = {
+        'message_count': F('message_count') + count,
+        'last_sequence_number': F('last_sequence_number') + count,
+        'last_message_at': timezone.now(),
+    }
+    tokens = sum(ChatMessage.token_count(message.get('token_usage')) for message in messages)
+    if tokens:
+        updates['total_tokens'] = F('total_tokens') + tokens
+    response_time = sum(message.get('response_time') or 0 for message in messages)
+    if response_time:
+        updates['total_response_time'] = F('total_response_time') + response_time
+    return updates
+
+
+# ------------------------------------------------------------
+# 延後寫入器
+# ------------------------------------------------------------
+
+class ConversationWriteBehind(BufferedResultSink):
+    """
+    對話 / 使用記錄延後寫入器（Singleton）
+
+    寫入執行緒在第一筆事件推入時才啟動（避免在 fork 前建立執行緒）。
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """Singleton 模式實作"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+                 redis_client=None, autostart: bool = True):
+        """
+        Args:
+            redis_client: 溢出用的 Redis 連線（預設 django_redis 的 default）
+            autostart: 推入事件時自動啟動寫入執行緒
+        """
+        if self._initialized:
+            return
+        self.autostart = autostart
+        self.spill_key = f"{KEY_PREFIX}:spill:{socket.gethostname()}:{os.getpid()}"
+        self.spilled_count = 0
+
+        self._redis = redis_client
+        self._redis_checked = redis_client is not None
+        self._overflowing = False
+        self._overflow_lock = threading.Lock()
+        self._writer_lock = threading.Lock()
+        self._spilled: Deque[Dict[str, Any]] = deque()
+        self._stop_pending = False
+        self._last_heartbeat = 0.0
+        self._last_adopt = time.monotonic()
+
+        super().__init__(batch_size=batch_size, flush_interval=flush_interval,
+                         background=True, max_queue_size=max_queue_size)
+        self._initialized = True
+
+    # ------------------------------------------------------------
+    # 公開介面
+    # ------------------------------------------------------------
+
+    def put_item(self, event: Dict[str, Any]):
+        """推入一筆事件；行程內佇列已滿（或仍在溢出中）時寫入 Redis"""
+        if self._closed:
+            raise RuntimeError(f"{type(self).__name__} 已關閉")
+        if self.autostart:
+            self._ensure_writer()
+
+        with self._overflow_lock:
+            if not self._overflowing:
+                try:
+                    self._queue.put_nowait(event)
+                    return
+                except queue.Full:
+                    pass
+            if self._spill(event):
+                self._overflowing = True
+                return
+
+        # Redis 無法使用：等待寫入執行緒消化（背壓）
+        self._queue.put(event)
+
+    def close(self):
+        """寫入剩餘事件（含本行程的 Redis 溢出）並停止寫入執行緒"""
+        if self._writer is None:
+            self._closed = True
+            return
+        super().close()
+
+    def write_batch(self, events: List[Dict[str, Any]]):
+        from django.db import close_old_connections, transaction
+        from api.models import ChatMessage, ChatUsage
+        from .conversation_recorder import ConversationRecorder
+
+        close_old_connections()
+        groups = group_session_messages(events)
+        usages = [ChatUsage(**event['fields']) for event in events if event.get('type') == 'usage']
+
+        messages = []
+        with transaction.atomic():
+            sessions = self._resolve_sessions(groups)
+            for session_id, group in groups.items():
+                messages.extend(self._build_messages(sessions[session_id], group['messages']))
+            ChatMessage.objects.bulk_create(messages)
+            if usages:
+                ChatUsage.objects.bulk_create(usages)
+
+        # 交易提交後才累加（失敗由定期重算 / 索引同步修正）
+        for message in messages:
+            ConversationRecorder._update_daily_rollup(message, message.conversation)
+            ConversationRecorder._update_question_index(message, message.conversation)
+
+    # ------------------------------------------------------------
+    # 資料庫寫入
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _resolve_sessions(groups: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """一次查詢取得批次內的會話，不存在的以 bulk_create 建立"""
+        from api.models import ConversationSession
+
+        if not groups:
+            return {}
+        session_ids = list(groups)
+        sessions = {s.session_id: s for s in ConversationSession.objects.filter(session_id__in=session_ids)}
+        missing = [session_id for session_id in session_ids if session_id not in sessions]
+        if missing:
+            ConversationSession.objects.bulk_create(
+                [ConversationSession(session_id=session_id, **groups[session_id]['session']) for session_id in missing],
+                ignore_conflicts=True  # 同步路徑可能同時建立同一會話
+            )
+            sessions.update(
+                (s.session_id, s) for s in ConversationSession.objects.filter(session_id__in=missing)
+            )
+        return sessions
+
+    @staticmethod
+    def _build_messages(session, messages: List[Dict[str, Any]]) -> List[Any]:
+        """
+        鎖定會話列並累加統計、配發連續序號
+
+        UPDATE 取得的列鎖持有到交易結束，與 ChatMessage.save 的同步寫入依序取得遞增序號。
+        """
+        from api.models import ChatMessage, ConversationSession
+
+        rows = ConversationSession.objects.filter(pk=session.pk)
+        rows.update(**session_stat_updates(messages))
+        last_sequence_number = rows.values_list('last_sequence_number', flat=True).get()
+        first = last_sequence_number - len(messages) + 1
+
+        return [
+            ChatMessage(
+                conversation=session,
+                sequence_number=first + offset,
+                role=message['role'],
+                content=message['content'],
+                content_type=message.get('content_type', 'text'),
+                message_id=message.get('message_id', ''),
+                response_time=message.get('response_time'),
+                token_usage=message.get('token_usage'),
+                metadata=message.get('metadata'),
+            )
+            for offset, message in enumerate(messages)
+        ]
+
+    # ------------------------------------------------------------
+    # 寫入執行緒
+    # ------------------------------------------------------------
+
+    def _start_writer(self):
+        """延後到第一筆事件推入時啟動（見 _ensure_writer）"""
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._writer_lock:
+                if self._writer is None:
+                    super()._start_writer()
+
+    def _next_item(self, timeout: float) -> Any:
+        """
+        先取行程內佇列（溢出前推入的事件），佇列空了再取回 Redis 溢出；
+        收到停止訊號時先寫完本行程的溢出
+        """
+        self._heartbeat()
+        if not self._spilled and not self._stop_pending:
+            try:
+                # 溢出中不等待：行程內佇列空了就該輪到 Redis
+                item = self._queue.get(timeout=0 if self._overflowing else timeout)
+                if item is not _STOP or not self._overflowing:
+                    return item
+                self._stop_pending = True
+            except queue.Empty:
+                pass
+
+        if not self._spilled:
+            self._spilled.extend(self._unspill())
+        if not self._spilled and not self._stop_pending:
+            self._spilled.extend(self._adopt_orphans())
+        if self._spilled:
+            return self._spilled.popleft()
+        if self._stop_pending:
+            return _STOP
+        raise queue.Empty
+
+    # ------------------------------------------------------------
+    # Redis 溢出
+    # ------------------------------------------------------------
+
+    @property
+    def redis(self):
+        """Redis 連線（無法連線時為 None，溢出改為背壓等待）"""
+        if not self._redis_checked:
+            self._redis_checked = True
+            try:
+                from django_redis import get_redis_connection
+                client = get_redis_connection('default')
+                client.ping()
+                self._redis = client
+            except Exception as e:
+                logger.warning(f"⚠️ [WriteBehind] Redis 無法連線，佇列滿時改為等待: {e}")
+        return self._redis
+
+    def _spill(self, event: Dict[str, Any]) -> bool:
+        """事件寫入本行程的 Redis 溢出清單"""
+        if self.redis is None:
+            return False
+        try:
+            self.redis.rpush(self.spill_key, json.dumps(event, ensure_ascii=False, default=str))
+            if not self._overflowing:
+                self.redis.sadd(SPILL_REGISTRY_KEY, self.spill_key)
+                self._heartbeat(force=True)
+                logger.warning(f"⚠️ [WriteBehind] 行程內佇列已滿，事件溢出到 Redis: {self.spill_key}")
+            self.spilled_count += 1
+            return True
+        except Exception as e:
+            logger.error(f"❌ [WriteBehind] 溢出到 Redis 失敗: {e}")
+            return False
+
+    def _pop_events(self, key: str) -> List[Dict[str, Any]]:
+        raw = self.redis.lpop(key, self.batch_size) or []
+        return [json.loads(item) for item in raw]
+
+    def _unspill(self) -> List[Dict[str, Any]]:
+        """取回本行程的溢出事件；清單已空時結束溢出狀態"""
+        if not self._overflowing:
+            return []
+        try:
+            events = self._pop_events(self.spill_key)
+            if not events:
+                # 與 put_item 共用鎖：確認清單為空後，新事件才會回到行程內佇列
+                with self._overflow_lock:
+                    if not self.redis.llen(self.spill_key):
+                        self._overflowing = False
+                        self.redis.srem(SPILL_REGISTRY_KEY, self.spill_key)
+            return events
+        except Exception as e:
+            logger.error(f"❌ [WriteBehind] 讀取 Redis 溢出失敗: {e}")
+            if not self._stop_pending:
+                time.sleep(self.flush_interval)
+            return []
+
+    def _heartbeat(self, force: bool = False):
+        """溢出期間定期續約存活標記"""
+        if not (force or self._overflowing) or self.redis is None:
+            return
+        now = time.monotonic()
+        if force or now - self._last_heartbeat >= HEARTBEAT_TTL / 3:
+            self._last_heartbeat = now
+            try:
+                self.redis.set(f"{self.spill_key}:alive", 1, ex=HEARTBEAT_TTL)
+            except Exception as e:
+                logger.debug(f"[WriteBehind] 心跳更新失敗: {e}")
+
+    def _adopt_orphans(self) -> List[Dict[str, Any]]:
+        """接手心跳已過期的其他行程留下的溢出事件"""
+        now = time.monotonic()
+        if now - self._last_adopt < ADOPT_INTERVAL or self.redis is None:
+            return []
+        self._last_adopt = now
+        try:
+            for key in self.redis.smembers(SPILL_REGISTRY_KEY):
+                key = key.decode('utf-8') if isinstance(key, bytes) else key
+                if key == self.spill_key or self.redis.exists(f"{key}:alive"):
+                    continue
+                events = self._pop_events(key)
+                if events:
+                    logger.info(f"[WriteBehind] 接手孤兒溢出清單 {key}: {len(events)} 筆")
+                    # 同一清單還有剩餘時下一輪立即再取
+                    self._last_adopt = 0.0
+                    return events
+                self.redis.srem(SPILL_REGISTRY_KEY, key)
+        except Exception as e:
+            logger.error(f"❌ [WriteBehind] 接手孤兒溢出失敗: {e}")
+        return []
+
+
+# ------------------------------------------------------------
+# 便利函數
+# ------------------------------------------------------------
+
+def get_write_behind_recorder() -> Optional[ConversationWriteBehind]:
+    """取得延後寫入器（停用時回傳 None）"""
+    if not write_behind_enabled():
+        return None
+    return ConversationWriteBehind()
+
+
+def enqueue_exchange(request, session_id: str, user_message: str, assistant_message: str,
+                     response_time: Optional[float] = None, token_usage: Optional[Dict] = None,
+                     metadata: Optional[Dict] = None, chat_type: str = 'rvt_assistant_chat') -> bool:
+    """
+    推入一問一答記錄
+
+    Returns:
+        bool: 是否已推入（False 時呼叫端應同步寫入）
+    """
+    recorder = get_write_behind_recorder()
+    if recorder is None:
+        return False
+    try:
+        recorder.put_item(exchange_event(
+            session_id, session_identity(request, chat_type), user_message, assistant_message,
+            response_time=response_time, token_usage=token_usage, metadata=metadata
+        ))
+        return True
+    except Exception as e:
+        logger.warning(f"對話記錄推入失敗，改為同步寫入: {str(e)}")
+        return False
+
+
+def enqueue_usage(fields: Dict[str, Any]) -> bool:
+    """
+    推入一筆 ChatUsage 記錄
+
+    Returns:
+        bool: 是否已推入（False 時呼叫端應同步寫入）
+    """
+    recorder = get_write_behind_recorder()
+    if recorder is None:
+        return False
+    try:
+        recorder.put_item(usage_event(fields))
+        return True
+    except Exception as e:
+        logger.warning(f"使用記錄推入失敗，改為同步寫入: {str(e)}")
+        return False
+
+
+def shutdown_write_behind():
+    """寫完已推入的事件（行程結束時呼叫）"""
+    recorder = ConversationWriteBehind._instance
+    if recorder is not None and recorder._initialized:
+        recorder.close()
+        logger.info(f"[WriteBehind] 已寫入 {recorder.written_count} 筆事件（失敗 {recorder.failed_count} 筆）")
+
+
+def _handle_sigterm(signum, frame):
+    shutdown_write_behind()
+    signal.signal(signum, signal.SIG_DFL)
+    os.kill(os.getpid(), signum)
+
+
+def install_shutdown_hooks():
+    """
+    註冊行程結束時的寫入（ApiConfig.ready 呼叫）
+
+    SIGTERM 只在主執行緒且尚未被其他程式（gunicorn / celery）接管時處理。
+    """
+    atexit.register(shutdown_write_behind)
+    if threading.current_thread() is threading.main_thread() and \
+            signal.getsignal(signal.SIGTERM) == signal.SIG_DFL:
+        signal.signal(signal.SIGTERM, _handle_sigterm)
+
+
+__all__ = [
+    'ConversationWriteBehind',
+    'enqueue_exchange',
+    'enqueue_usage',
+    'exchange_event',
+    'get_write_behind_recorder',
+    'group_session_messages',
+    'install_shutdown_hooks',
+    'session_identity',
+    'session_stat_updates',
+    'shutdown_write_behind',
+    'usage_event',
+    'write_behind_enabled',
+]
@@ -26,6 +26,7 @@ from typing import Dict, Any, Optional
 
 from library.dify_integration.request_manager import DifyRequestManager
 from library.config.dify_config_manager import get_protocol_guide_config
+from library.common.stage_timing import stage, BACKEND_SEARCH, DIFY_LLM, SMART_ROUTER
 
 logger = logging.getLogger(__name__)
 
@@ -144,10 +145,11 @@ class DifyAPIClient:
             backend_search_used = False
             
             if version_config:
-                search_context, search_results_count = self._perform_backend_search(
-                    question, 
-                    version_config
-                )
+                with stage(BACKEND_SEARCH):
+                    search_context, search_results_count = self._perform_backend_search(
+                        question, 
+                        version_config
+                    )
                 if search_context:
                     backend_search_used = True
                     logger.info(
@@ -177,12 +179,13 @@ class DifyAPIClient:
                 payload['conversation_id'] = conversation_id
             
             # 呼叫 Dify Request Manager
-            response = self.request_manager.make_dify_request(
-                api_url=self.api_url,
-                headers=headers,
-                payload=payload,
-                timeout=self.timeout
-            )
+            with stage(DIFY_LLM):
+                response = self.request_manager.make_dify_request(
+                    api_url=self.api_url,
+                    headers=headers,
+                    payload=payload,
+                    timeout=self.timeout
+                )
             
             # 計算回應時間
             response_time = time.time() - start_time
@@ -236,6 +239,7 @@ class DifyAPIClient:
                     'success': False,
                     'answer': '',
                     'error': error_msg,
+                    'status_code': response.status_code,
                     'response_time': round(response_time, 2)
                 }
             
@@ -301,11 +305,13 @@ class DifyAPIClient:
             router = SmartSearchRouter()
             
             # 使用與 Web 完全一致的邏輯
-            result = router.handle_smart_search(
-                user_query=question,
-                conversation_id=conversation_id or "",
-                user_id=user_id
-            )
+            # 路由內同時執行後端搜尋與 LLM，整段記為 smart_router（不歸入 dify_llm）
+            with stage(SMART_ROUTER):
+                result = router.handle_smart_search(
+                    user_query=question,
+                    conversation_id=conversation_id or "",
+                    user_id=user_id
+                )
             
             response_time = time.time() - start_time
             
@@ -18,6 +18,7 @@ DifyBatchTester (orchestrator)
 import logging
 import sys
 import uuid
+from contextlib import ExitStack
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from django.db import transaction
@@ -25,10 +26,12 @@ from django.db import transaction
 from api.models import (
     DifyConfigVersion,
     DifyBenchmarkTestCase,
-    DifyTestRun
+    DifyTestRun,
+    DifyTestResult
 )
 from .dify_test_runner import DifyTestRunner
 from .progress_tracker import progress_tracker
+from .request_scheduler import DEFAULT_RATE_PER_SECOND, DifyRequestScheduler, SchedulerJob
 
 logger = logging.getLogger(__name__)
 
@@ -62,7 +65,8 @@ class DifyBatchTester:
         self,
         use_ai_evaluator: bool = False,
         use_parallel: bool = True,
-        max_workers: int = 10
+        max_workers: int = 10,
+        rate_per_second: float = DEFAULT_RATE_PER_SECOND
     ):
         """
         初始化批量測試器
@@ -70,7 +74,9 @@ class DifyBatchTester:
         Args:
             use_ai_evaluator: 是否使用 AI 評分（預設 False）
             use_parallel: 是否使用多線程並行執行（預設 True）
-            max_workers: 多線程並行的最大線程數（預設 10）
+                多版本時所有 (版本, 測試案例) 共用 DifyRequestScheduler 的全域佇列
+            max_workers: 每個 Dify app key 的最大並行數（預設 10）
+            rate_per_second: 全域 Dify 請求速率上限（每秒請求數）
         """
         self.use_ai_evaluator = use_ai_evaluator
         self.use_parallel = use_parallel
@@ -86,6 +92,8 @@ class DifyBatchTester:
             logger.warning(f"⚠️ max_workers={max_workers} 過大，限制為 20")
             self.max_workers = 20
         
+        self.rate_per_second = rate_per_second
+        
         logger.info(
             f"DifyBatchTester 初始化完成: "
             f"evaluator={'AI' if use_ai_evaluator else 'Keyword'}, "
@@ -137,22 +145,8 @@ class DifyBatchTester:
             # 4. 載入測試案例
             test_cases = self._load_test_cases(test_case_ids)
             
-            # 5. 初始化進度追蹤
-            total_tests = len(versions) * len(test_cases)
-            versions_info = [
-                {
-                    'id': v.id,
-                    'name': v.version_name,
-                    'test_count': len(test_cases)
-                }
-                for v in versions
-            ]
-            progress_tracker.initialize_batch(
-                batch_id=batch_id,
-                total_tests=total_tests,
-                versions=versions_info,
-                batch_name=batch_name
-            )
+            # 5. 初始化進度追蹤（保存批次參數，崩潰後可續跑）
+            self._initialize_progress(batch_id, batch_name, description, versions, test_cases)
             
             logger.info(
                 f"開始批量測試: "
@@ -164,84 +158,17 @@ class DifyBatchTester:
             sys.stderr.flush()
             
             # 6. 執行所有版本的測試
-            test_runs = []
-            
-            for version in versions:
-                try:
-                    logger.info(f"測試版本: {version.version_name}")
-                    sys.stdout.flush()
-                    sys.stderr.flush()
-                    
-                    # 更新進度：開始測試此版本
-                    progress_tracker.update_version_progress(
-                        batch_id=batch_id,
-                        version_id=version.id,
-                        status='running'
-                    )
-                    progress_tracker.update_progress(
-                        batch_id=batch_id,
-                        current_version=version.id,
-                        current_version_name=version.version_name
-                    )
-                    
-                    # 創建 Test Runner（傳遞並行參數）
-                    runner = DifyTestRunner(
-                        version=version,
-                        use_ai_evaluator=self.use_ai_evaluator,
-                        max_workers=self.max_workers
-                    )
-                    
-                    # 執行測試（根據 use_parallel 選擇方法）
-                    if self.use_parallel:
-                        test_run = runner.run_batch_tests_parallel(
-                            test_cases=test_cases,
-                            run_name=f"{batch_name} - {version.version_name}",
-                            batch_id=batch_id,
-                            description=description
-                        )
-                    else:
-                        test_run = runner.run_batch_tests(
-                            test_cases=test_cases,
-                            run_name=f"{batch_name} - {version.version_name}",
-                            batch_id=batch_id,
-                            description=description
-                        )
-                    
-                    # 獲取測試摘要
-                    summary = runner.get_test_summary(test_run)
-                    test_runs.append(summary)
-                    
-                    # 更新進度：版本測試完成
-                    progress_tracker.update_progress(
-                        batch_id=batch_id,
-                        completed_tests=len(test_cases)
-                    )
-                    progress_tracker.update_version_progress(
-                        batch_id=batch_id,
-                        version_id=version.id,
-                        completed_tests=len(test_cases),
-                        status='completed',
-                        average_score=summary['average_score'],
-                        pass_rate=summary['pass_rate']
-                    )
-                    
-                    logger.info(
-                        f"版本測試完成: "
-                        f"version={version.version_name}, "
-                        f"pass_rate={summary['pass_rate']:.2f}%"
-                    )
-                    sys.stdout.flush()
-                    sys.stderr.flush()
-                    
-                except Exception as e:
-                    logger.error(f"版本測試失敗: {version.version_name}, 錯誤: {str(e)}", exc_info=True)
-                    
-                    # 更新進度：版本測試失敗
-                    progress_tracker.update_version_progress(
-                        batch_id=batch_id,
-                        version_id=version.id,
-                        status='error'
-                    )
+            if self.use_parallel and len(versions) > 1:
+                # 多版本：所有 (版本, 測試案例) 進同一個全域佇列
+                test_runs = self._test_versions_concurrently(
+                    batch_id, batch_name, description, versions, test_cases
+                )
+            else:
+                test_runs = []
+                for version in versions:
+                    summary = self._test_version(batch_id, batch_name, description, version, test_cases)
+                    if summary:
+                        test_runs.append(summary)
             
             # 7. 生成對比報告
             comparison = self._generate_comparison_report(test_runs)
@@ -284,6 +211,352 @@ class DifyBatchTester:
             
             raise
     
+    def resume_batch_test(self, batch_id: str, lease_acquired: bool = False) -> Dict[str, Any]:
+        """
+        續跑中斷的批量測試（行程崩潰或重啟後）
+        
+        依進度追蹤器保存的批次參數重新載入版本與測試案例：
+        - 已完成的 Test Run 直接沿用
+        - 中斷的 Test Run 只補跑尚未有結果的測試案例
+        - 尚未開始的版本正常執行
+        
+        Args:
+            batch_id: 批次 ID
+            lease_acquired: 呼叫端是否已透過 progress_tracker.acquire_lease() 取得租約
+        
+        Returns:
+            與 run_batch_test 相同格式的測試結果字典
+        
+        Raises:
+            ValueError: 批次不存在、已完成，或租約已被其他行程持有
+        """
+        progress = progress_tracker.get_progress(batch_id)
+        if not progress or not progress.get('params'):
+            raise ValueError(f"找不到可續跑的批次: {batch_id}")
+        if progress['status'] == 'completed':
+            raise ValueError(f"批次已完成，無需續跑: {batch_id}")
+        # 檢查與取得租約需為同一個原子操作，避免兩個請求同時續跑
+        if not lease_acquired and not progress_tracker.acquire_lease(batch_id):
+            raise ValueError(f"批次仍在執行中: {batch_id}")
+        
+        params = progress['params']
+        batch_name = params.get('batch_name') or progress['batch_name']
+        description = params.get('description')
+        
+        try:
+            versions = self._load_versions(params['version_ids'])
+            test_cases = self._load_test_cases(params['test_case_ids'])
+            
+            # 重新初始化進度（計數歸零，再依資料庫既有結果補回）
+            self._initialize_progress(batch_id, batch_name, description, versions, test_cases)
+            
+            existing_runs = {}
+            for test_run in DifyTestRun.objects.filter(batch_id=batch_id).order_by('created_at'):
+                existing_runs[test_run.version_id] = test_run
+            
+            logger.info(
+                f"續跑批量測試: "
+                f"batch_id={batch_id}, "
+                f"versions={len(versions)}, "
+                f"existing_runs={len(existing_runs)}"
+            )
+            
+            test_runs = []
+            for version in versions:
+                test_run = existing_runs.get(version.id)
+                
+                if test_run is not None and test_run.completed_at is not None:
+                    # 已完成：沿用結果並補回進度
+                    runner = DifyTestRunner(version=version, max_workers=self.max_workers)
+                    summary = runner.get_test_summary(test_run)
+                    test_runs.append(summary)
+                    done = test_run.passed_cases + test_run.failed_cases
+                    progress_tracker.update_progress(
+                        batch_id=batch_id,
+                        completed_tests=done,
+                        failed_tests=test_run.failed_cases
+                    )
+                    progress_tracker.update_version_progress(
+                        batch_id=batch_id,
+                        version_id=version.id,
+                        completed_tests=done,
+                        failed_tests=test_run.failed_cases,
+                        status='completed',
+                        average_score=summary['average_score'],
+                        pass_rate=summary['pass_rate']
+                    )
+                    continue
+                
+                summary = self._test_version(
+                    batch_id, batch_name, description, version, test_cases, test_run=test_run
+                )
+                if summary:
+                    test_runs.append(summary)
+            
+            comparison = self._generate_comparison_report(test_runs)
+            progress_tracker.mark_completed(batch_id=batch_id, success=True)
+            
+            return {
+                'batch_id': batch_id,
+                'batch_name': batch_name,
+                'total_versions': len(versions),
+                'total_cases': len(test_cases),
+                'test_runs': test_runs,
+                'comparison': comparison,
+                'completed_at': datetime.now().isoformat(),
+                'resumed': True
+            }
+        
+        except Exception as e:
+            logger.error(f"續跑批量測試失敗: {str(e)}", exc_info=True)
+            progress_tracker.mark_completed(batch_id=batch_id, success=False, error_message=str(e))
+            raise
+    
+    def _initialize_progress(
+        self,
+        batch_id: str,
+        batch_name: str,
+        description: Optional[str],
+        versions: List[DifyConfigVersion],
+        test_cases: List[DifyBenchmarkTestCase]
+    ):
+        """初始化進度追蹤，並保存續跑所需的批次參數"""
+        progress_tracker.initialize_batch(
+            batch_id=batch_id,
+            total_tests=len(versions) * len(test_cases),
+            versions=[
+                {
+                    'id': v.id,
+                    'name': v.version_name,
+                    'test_count': len(test_cases)
+                }
+                for v in versions
+            ],
+            batch_name=batch_name,
+            params={
+                'version_ids': [v.id for v in versions],
+                'test_case_ids': [tc.id for tc in test_cases],
+                'batch_name': batch_name,
+                'description': description
+            }
+        )
+    
+    def _test_version(
+        self,
+        batch_id: str,
+        batch_name: str,
+        description: Optional[str],
+        version: DifyConfigVersion,
+        test_cases: List[DifyBenchmarkTestCase],
+        test_run: Optional[DifyTestRun] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        測試單一版本（test_run 不為 None 時續跑該 Test Run）
+        
+        每個測試案例的完成數由 DifyTestRunner 逐筆回報進度，
+        這裡只更新版本狀態與最終分數。
+        
+        Returns:
+            測試摘要；版本測試失敗時返回 None
+        """
+        try:
+            logger.info(f"測試版本: {version.version_name}")
+            sys.stdout.flush()
+            sys.stderr.flush()
+            
+            # 更新進度：開始測試此版本
+            progress_tracker.update_version_progress(
+                batch_id=batch_id,
+                version_id=version.id,
+                status='running'
+            )
+            progress_tracker.update_progress(
+                batch_id=batch_id,
+                current_version=version.id,
+                current_version_name=version.version_name
+            )
+            
+            # 創建 Test Runner（傳遞並行參數）
+            runner = DifyTestRunner(
+                version=version,
+                use_ai_evaluator=self.use_ai_evaluator,
+                max_workers=self.max_workers
+            )
+            
+            if test_run is not None:
+                # 續跑：先補回已寫入結果的進度
+                done = DifyTestResult.objects.filter(test_run=test_run)
+                done_count = done.count()
+                failed_count = done.filter(is_passed=False).count()
+                if done_count:
+                    progress_tracker.update_progress(
+                        batch_id=batch_id, completed_tests=done_count, failed_tests=failed_count
+                    )
+                    progress_tracker.update_version_progress(
+                        batch_id=batch_id, version_id=version.id,
+                        completed_tests=done_count, failed_tests=failed_count
+                    )
+                test_run = runner.resume_test_run(test_run, test_cases)
+            # 執行測試（根據 use_parallel 選擇方法）
+            elif self.use_parallel:
+                test_run = runner.run_batch_tests_parallel(
+                    test_cases=test_cases,
+                    run_name=f"{batch_name} - {version.version_name}",
+                    batch_id=batch_id,
+                    description=description
+                )
+            else:
+                test_run = runner.run_batch_tests(
+                    test_cases=test_cases,
+                    run_name=f"{batch_name} - {version.version_name}",
+                    batch_id=batch_id,
+                    description=description
+                )
+            
+            # 獲取測試摘要
+            summary = runner.get_test_summary(test_run)
+            
+            # 更新進度：版本測試完成
+            progress_tracker.update_version_progress(
+                batch_id=batch_id,
+                version_id=version.id,
+                status='completed',
+                average_score=summary['average_score'],
+                pass_rate=summary['pass_rate']
+            )
+            
+            logger.info(
+                f"版本測試完成: "
+                f"version={version.version_name}, "
+                f"pass_rate={summary['pass_rate']:.2f}%"
+            )
+            sys.stdout.flush()
+            sys.stderr.flush()
+            
+            return summary
+            
+        except Exception as e:
+            logger.error(f"版本測試失敗: {version.version_name}, 錯誤: {str(e)}", exc_info=True)
+            
+            # 更新進度：版本測試失敗
+            progress_tracker.update_version_progress(
+                batch_id=batch_id,
+                version_id=version.id,
+                status='error'
+            )
+            return None
+    
+    def _test_versions_concurrently(
+        self,
+        batch_id: str,
+        batch_name: str,
+        description: Optional[str],
+        versions: List[DifyConfigVersion],
+        test_cases: List[DifyBenchmarkTestCase]
+    ) -> List[Dict[str, Any]]:
+        """
+        以 DifyRequestScheduler 同時測試所有版本
+        
+        工作依「測試案例 × 版本」交錯排入全域佇列，各版本進度同步前進；
+        請求受全域速率與每個 app key 的自適應並行上限控制，
+        回應交回各版本的 DifyTestRunner 評分並批次寫入。
+        
+        Returns:
+            各版本測試摘要（與 versions 同順序，失敗的版本略過）
+        """
+        runners = []
+        for version in versions:
+            try:
+                runner = DifyTestRunner(
+                    version=version,
+                    use_ai_evaluator=self.use_ai_evaluator,
+                    max_workers=self.max_workers
+                )
+                test_run = runner.start_test_run(
+                    test_cases=test_cases,
+                    run_name=f"{batch_name} - {version.version_name}",
+                    batch_id=batch_id,
+                    description=description
+                )
+                runners.append((version, runner, test_run))
+                progress_tracker.update_version_progress(
+                    batch_id=batch_id,
+                    version_id=version.id,
+                    status='running'
+                )
+            except Exception as e:
+                logger.error(f"版本測試失敗: {version.version_name}, 錯誤: {str(e)}", exc_info=True)
+                progress_tracker.update_version_progress(
+                    batch_id=batch_id,
+                    version_id=version.id,
+                    status='error'
+                )
+        
+        progress_tracker.update_progress(
+            batch_id=batch_id,
+            current_version_name=f"{len(runners)} 個版本並行"
+        )
+        
+        jobs = [
+            SchedulerJob(key=runner.api_client.api_key, payload=(runner, test_run, test_case, index))
+            for index, test_case in enumerate(test_cases, 1)
+            for _, runner, test_run in runners
+        ]
+        
+        def call(payload):
+            runner, test_run, test_case, index = payload
+            return runner.ask_dify(test_case, runner.build_user_id(test_run, index), index)
+        
+        def on_done(payload, response, error):
+            runner, test_run, test_case, index = payload
+            if error is not None:
+                response = {'success': False, 'answer': '', 'error': str(error), 'response_time': 0}
+            try:
+                runner._run_single_test_thread_safe(test_run, test_case, index, api_response=response)
+            except Exception:
+                # 失敗已在 runner 內記錄並計入統計
+                pass
+        
+        scheduler = DifyRequestScheduler(
+            rate_per_second=self.rate_per_second,
+            per_key_limit=self.max_workers,
+            max_workers=self.max_workers * len({runner.api_client.api_key for _, runner, _ in runners})
+        )
+        
+        logger.info(
+            f"開始多版本並行測試: "
+            f"batch_id={batch_id}, "
+            f"versions={len(runners)}, "
+            f"jobs={len(jobs)}, "
+            f"workers={scheduler.max_workers}, "
+            f"rate={self.rate_per_second}/s"
+        )
+        
+        with ExitStack() as stack:
+            for _, runner, test_run in runners:
+                stack.enter_context(runner.buffered_results(test_run))
+            scheduler.run(jobs, call=call, on_done=on_done)
+        
+        test_runs = []
+        for version, runner, test_run in runners:
+            runner.finish_test_run(test_run)
+            summary = runner.get_test_summary(test_run)
+            test_runs.append(summary)
+            progress_tracker.update_version_progress(
+                batch_id=batch_id,
+                version_id=version.id,
+                status='completed',
+                average_score=summary['average_score'],
+                pass_rate=summary['pass_rate']
+            )
+            logger.info(
+                f"版本測試完成: "
+                f"version={version.version_name}, "
+                f"pass_rate={summary['pass_rate']:.2f}%"
+            )
+        
+        return test_runs
+    
     def _generate_batch_id(self) -> str:
         """生成唯一的 Batch ID"""
         return f"batch_{uuid.uuid4().hex[:12]}"
@@ -18,10 +18,12 @@ import logging
 import time
 import json
 import concurrent.futures
+from contextlib import contextmanager
 from threading import Lock
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from django.db import transaction
+from django.db.models import Sum
 from django.utils import timezone
 
 from api.models import (
@@ -34,6 +36,8 @@ from api.models import (
 from .dify_api_client import DifyAPIClient
 from .evaluators import KeywordEvaluator
 from .progress_tracker import BatchTestProgressTracker
+from .result_sink import DifyResultSink
+from library.common.stage_timing import collect_stages, stage, summarize_stage_timings, EVALUATION
 
 logger = logging.getLogger(__name__)
 progress_tracker = BatchTestProgressTracker()  # ✅ 全局實例
@@ -116,6 +120,9 @@ class DifyTestRunner:
         self._failed_count = 0
         self._total_score = 0
         
+        # 批次執行期間的結果緩衝寫入器
+        self._result_sink: Optional[DifyResultSink] = None
+        
         logger.info(
             f"DifyTestRunner 初始化完成: "
             f"version={version.version_name}, "
@@ -177,6 +184,7 @@ class DifyTestRunner:
                         failed_count += 1
                     
                     total_score += result.score
+                    self._report_progress(test_run, test_case, result.is_passed)
                     
                     logger.info(
                         f"測試案例完成: "
@@ -187,6 +195,7 @@ class DifyTestRunner:
                 except Exception as e:
                     logger.error(f"測試案例執行失敗 (案例 {i}): {str(e)}", exc_info=True)
                     failed_count += 1
+                    self._report_progress(test_run, test_case, False)
             
             # 3. 更新 Test Run 統計
             self._update_test_run_statistics(
@@ -236,20 +245,14 @@ class DifyTestRunner:
             - 50 個測試：150 秒 → 30 秒（80% 提升）
         """
         try:
-            # 1. 創建 Test Run 記錄
-            test_run = self._create_test_run(
+            # 1. 創建 Test Run 記錄（並重置線程安全計數器）
+            test_run = self.start_test_run(
                 test_cases=test_cases,
                 run_name=run_name,
                 batch_id=batch_id,
                 description=description
             )
             
-            # 重置線程安全計數器
-            with self._lock:
-                self._passed_count = 0
-                self._failed_count = 0
-                self._total_score = 0
-            
             logger.info(
                 f"開始並行測試: "
                 f"run_id={test_run.id}, "
@@ -261,6 +264,72 @@ class DifyTestRunner:
             start_time = time.time()
             
             # 2. 使用 ThreadPoolExecutor 並行執行
+            self._execute_parallel(test_run, test_cases)
+            
+            execution_time = time.time() - start_time
+            
+            # 3. 更新 Test Run 統計
+            self.finish_test_run(test_run)
+            
+            logger.info(
+                f"並行測試完成: "
+                f"passed={self._passed_count}/{len(test_cases)}, "
+                f"avg_score={test_run.average_score:.2f}, "
+                f"pass_rate={test_run.pass_rate:.2f}%, "
+                f"execution_time={execution_time:.2f}s"
+            )
+            
+            return test_run
+            
+        except Exception as e:
+            logger.error(f"並行測試執行失敗: {str(e)}", exc_info=True)
+            raise
+    
+    def start_test_run(
+        self,
+        test_cases: List[DifyBenchmarkTestCase],
+        run_name: str = None,
+        batch_id: str = None,
+        description: str = None
+    ) -> DifyTestRun:
+        """創建 Test Run 記錄並重置線程安全計數器"""
+        test_run = self._create_test_run(
+            test_cases=test_cases,
+            run_name=run_name,
+            batch_id=batch_id,
+            description=description
+        )
+        with self._lock:
+            self._passed_count = 0
+            self._failed_count = 0
+            self._total_score = 0
+        return test_run
+    
+    def finish_test_run(self, test_run: DifyTestRun) -> DifyTestRun:
+        """以線程安全計數器更新 Test Run 統計並標記完成"""
+        self._update_test_run_statistics(
+            test_run=test_run,
+            passed_count=self._passed_count,
+            failed_count=self._failed_count,
+            total_score=self._total_score
+        )
+        return test_run
+    
+    def _execute_parallel(
+        self,
+        test_run: DifyTestRun,
+        test_cases: List[DifyBenchmarkTestCase],
+        initial_stats: Optional[Dict[str, float]] = None
+    ):
+        """
+        以 ThreadPoolExecutor 執行測試案例，結果交由 DifyResultSink 批次寫入
+        
+        Args:
+            test_run: 測試執行記錄
+            test_cases: 要執行的測試案例
+            initial_stats: 既有結果的統計（續跑時使用，讓增量更新從既有數字累加）
+        """
+        with self.buffered_results(test_run, initial_stats=initial_stats):
             with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
                 # 提交所有測試任務
                 future_to_case = {
@@ -272,7 +341,7 @@ class DifyTestRunner:
                     ): test_case
                     for i, test_case in enumerate(test_cases, 1)
                 }
-                
+            
                 # 等待所有任務完成
                 for future in concurrent.futures.as_completed(future_to_case):
                     test_case = future_to_case[future]
@@ -290,36 +359,122 @@ class DifyTestRunner:
                             f"question={test_case.question[:30]}..., "
                             f"error={str(e)}"
                         )
-            
-            execution_time = time.time() - start_time
-            
-            # 3. 更新 Test Run 統計
-            self._update_test_run_statistics(
-                test_run=test_run,
-                passed_count=self._passed_count,
-                failed_count=self._failed_count,
-                total_score=self._total_score
-            )
-            
-            logger.info(
-                f"並行測試完成: "
-                f"passed={self._passed_count}/{len(test_cases)}, "
-                f"avg_score={test_run.average_score:.2f}, "
-                f"pass_rate={test_run.pass_rate:.2f}%, "
-                f"execution_time={execution_time:.2f}s"
-            )
-            
-            return test_run
-            
-        except Exception as e:
-            logger.error(f"並行測試執行失敗: {str(e)}", exc_info=True)
-            raise
+    
+    @contextmanager
+    def buffered_results(
+        self,
+        test_run: DifyTestRun,
+        initial_stats: Optional[Dict[str, float]] = None
+    ):
+        """
+        在此區塊內執行的測試結果交由 DifyResultSink 批次寫入（離開時寫完全部結果）
+        
+        Args:
+            test_run: 測試執行記錄
+            initial_stats: 既有結果的統計（續跑時使用）
+        """
+        with DifyResultSink(test_run, initial_stats=initial_stats) as sink:
+            self._result_sink = sink
+            try:
+                yield sink
+            finally:
+                self._result_sink = None
+        
+        if sink.failed_count:
+            logger.error(f"⚠️ {sink.failed_count} 筆測試結果寫入失敗: run_id={test_run.id}")
+    
+    def resume_test_run(
+        self,
+        test_run: DifyTestRun,
+        test_cases: List[DifyBenchmarkTestCase]
+    ) -> DifyTestRun:
+        """
+        【續跑】補跑中斷的 Test Run 尚未有結果的測試案例
+        
+        已寫入的 DifyTestResult 保留，只執行其餘案例，最後以全部結果重新計算統計。
+        
+        Args:
+            test_run: 中斷的測試執行記錄
+            test_cases: 該次測試的完整案例列表
+        
+        Returns:
+            DifyTestRun 實例
+        """
+        done = dict(
+            DifyTestResult.objects.filter(test_run=test_run).values_list('test_case_id', 'is_passed')
+        )
+        total_score = DifyTestResult.objects.filter(test_run=test_run).aggregate(total=Sum('score'))['total']
+        
+        with self._lock:
+            self._passed_count = sum(1 for is_passed in done.values() if is_passed)
+            self._failed_count = len(done) - self._passed_count
+            self._total_score = float(total_score or 0)
+        
+        remaining = [tc for tc in test_cases if tc.id not in done]
+        self.keyword_evaluator.compile(tc.answer_keywords for tc in remaining)
+        logger.info(
+            f"續跑測試: "
+            f"run_id={test_run.id}, "
+            f"version={self.version.version_name}, "
+            f"done={len(done)}, remaining={len(remaining)}"
+        )
+        
+        self._execute_parallel(test_run, remaining, initial_stats={
+            'passed': self._passed_count,
+            'failed': self._failed_count,
+            'total_score': self._total_score
+        })
+        
+        return self.finish_test_run(test_run)
+    
+    @staticmethod
+    def build_user_id(test_run: DifyTestRun, index: int) -> str:
+        """生成測試專用的 user_id（區分測試與正常用戶）"""
+        return f"benchmark_test_{test_run.id}_{index}"
+    
+    def ask_dify(
+        self,
+        test_case: DifyBenchmarkTestCase,
+        user_id: str,
+        index: int = 0
+    ) -> Dict[str, Any]:
+        """
+        依版本設定呼叫 Dify（SmartSearchRouter 或後端搜尋 + Dify API）
+        
+        Returns:
+            DifyAPIClient 回應字典（失敗時含 status_code，供排程器判斷是否限流；
+            stage_timings 為後端搜尋各階段與 Dify LLM 的耗時）
+        """
+        # ✅ v1.3: 檢查是否使用 SmartSearchRouter（與 Web 完全一致）
+        use_smart_router = self.version_config.get('rag_settings', {}).get('use_smart_router', False)
+        
+        with collect_stages() as timings:
+            if use_smart_router:
+                # 使用 SmartSearchRouter（與 Web Protocol Assistant 完全一致）
+                logger.info(f"[Thread {index}] 🔄 使用 SmartSearchRouter（與 Web 一致）")
+                api_response = self.api_client.send_question_with_smart_router(
+                    question=test_case.question,
+                    user_id=user_id,
+                    conversation_id=None
+                )
+            else:
+                # ✅ v1.2: 呼叫 Dify API（傳遞版本配置以使用後端搜尋）
+                api_response = self.api_client.send_question(
+                    question=test_case.question,
+                    user_id=user_id,                 # ✅ 唯一 user_id
+                    conversation_id=None,            # ✅ 每次新對話
+                    version_config=self.version_config  # ✅ v1.2 新增：傳遞版本配置
+                )
+        
+        api_response['stage_timings'] = timings.as_dict()
+        return api_response
     
     def _run_single_test_thread_safe(
         self,
         test_run: DifyTestRun,
         test_case: DifyBenchmarkTestCase,
-        index: int
+        index: int,
+        api_response: Optional[Dict[str, Any]] = None
     ) -> DifyTestResult:
         """
         【線程安全】執行單個測試案例
@@ -335,13 +490,14 @@ class DifyTestRunner:
             test_run: 測試批次實例
             test_case: 測試案例實例
             index: 測試案例序號（1-based）
+            api_response: 已取得的 Dify 回應（DifyRequestScheduler 先呼叫 ask_dify 再交回評分）
         
         Returns:
             DifyTestResult 實例
         """
         
         # 生成唯一的 user_id（區分測試與正常用戶）
-        unique_user_id = f"benchmark_test_{test_run.id}_{index}"
+        unique_user_id = self.build_user_id(test_run, index)
         
         logger.info(
             f"[Thread {index}] 開始測試: "
@@ -350,25 +506,9 @@ class DifyTestRunner:
         )
         
         try:
-            # ✅ v1.3: 檢查是否使用 SmartSearchRouter（與 Web 完全一致）
-            use_smart_router = self.version_config.get('rag_settings', {}).get('use_smart_router', False)
-            
-            if use_smart_router:
-                # 使用 SmartSearchRouter（與 Web Protocol Assistant 完全一致）
-                logger.info(f"[Thread {index}] 🔄 使用 SmartSearchRouter（與 Web 一致）")
-                api_response = self.api_client.send_question_with_smart_router(
-                    question=test_case.question,
-                    user_id=unique_user_id,
-                    conversation_id=None
-                )
-            else:
-                # ✅ v1.2: 呼叫 Dify API（傳遞版本配置以使用後端搜尋）
-                api_response = self.api_client.send_question(
-                    question=test_case.question,
-                    user_id=unique_user_id,      # ✅ 唯一 user_id
-                    conversation_id=None,        # ✅ 每次新對話
-                    version_config=self.version_config  # ✅ v1.2 新增：傳遞版本配置
-                )
+            # 1. 呼叫 Dify（排程器已先呼叫時直接使用其回應）
+            if api_response is None:
+                api_response = self.ask_dify(test_case, unique_user_id, index)
             
             # 提取資訊
             actual_answer = api_response.get('answer', '')
@@ -399,49 +539,27 @@ class DifyTestRunner:
             # 2. 使用 KeywordEvaluator 評分
             keywords = test_case.answer_keywords  # ✅ 直接訪問 JSONField 欄位
             
-            evaluation_result = self.keyword_evaluator.evaluate(
-                question=test_case.question,
-                expected_answer=test_case.expected_answer,
-                actual_answer=actual_answer,
-                keywords=keywords
-            )
+            with collect_stages(api_response.get('stage_timings')) as timings, stage(EVALUATION):
+                evaluation_result = self.keyword_evaluator.evaluate(
+                    question=test_case.question,
+                    expected_answer=test_case.expected_answer,
+                    actual_answer=actual_answer,
+                    keywords=keywords
+                )
             
             score = evaluation_result['score']
             is_passed = evaluation_result['is_passed']
-            matched_keywords = evaluation_result['matched_keywords']
-            missing_keywords = evaluation_result['missing_keywords']
             
-            # 3. 儲存 TestResult（Django ORM 是線程安全的）
-            test_result = DifyTestResult.objects.create(
+            # 3. 建立 TestResult + AnswerEvaluation，交由緩衝寫入器批次寫入
+            test_result = self._store_result(
                 test_run=test_run,
                 test_case=test_case,
-                dify_answer=actual_answer,  # ✅ 正確欄位名
+                actual_answer=actual_answer,
                 dify_message_id=dify_message_id,
-                score=score,
-                is_passed=is_passed,
                 response_time=response_time,
-                matched_keywords=matched_keywords,
-                missing_keywords=missing_keywords
-                # dify_conversation_id 和 retrieved_documents_count 欄位不存在，移除
-            )
-            
-            # 4. 儲存 AnswerEvaluation
-            DifyAnswerEvaluation.objects.create(
-                test_result=test_result,
-                question=test_case.question,
-                expected_answer=test_case.expected_answer or "",
-                actual_answer=actual_answer,
-                evaluator_model='keyword_only',
-                scores={
-                    'overall_score': score,
-                    'is_passed': is_passed,
-                    'matched_keywords': matched_keywords,
-                    'missing_keywords': missing_keywords,
-                    'total_keywords': len(keywords),
-                    'matched_count': len(matched_keywords),
-                    'missing_count': len(missing_keywords)
-                },
-                feedback=f"關鍵字匹配: {len(matched_keywords)}/{len(keywords)}"
+                evaluation_result=evaluation_result,
+                keywords=keywords,
+                stage_timings=timings.as_dict()
             )
             
             # 5. 線程安全地更新統計（使用 Lock）
@@ -453,32 +571,7 @@ class DifyTestRunner:
                 self._total_score += score
             
             # 6. ✅ 更新進度追蹤器（每個測試完成後立即更新）
-            # 🔍 調試：檢查 batch_id 狀態
-            logger.info(
-                f"🔍 [DEBUG] test_run.batch_id 狀態: "
-                f"hasattr={hasattr(test_run, 'batch_id')}, "
-                f"value='{test_run.batch_id if hasattr(test_run, 'batch_id') else 'N/A'}', "
-                f"type={type(test_run.batch_id) if hasattr(test_run, 'batch_id') else 'N/A'}"
-            )
-            
-            if hasattr(test_run, 'batch_id') and test_run.batch_id:
-                # 使用 completed_tests=1 表示完成 1 個測試（會自動累加）
-                progress_tracker.update_progress(
-                    batch_id=test_run.batch_id,
-                    completed_tests=1,  # 每次增加 1
-                    failed_tests=1 if not is_passed else 0,
-                    current_test_case=test_case.question[:50]  # 顯示當前測試案例
-                )
-                
-                logger.info(
-                    f"[Thread {index}] 📊 進度已更新: "
-                    f"batch_id={test_run.batch_id}, "
-                    f"test_case={test_case.question[:30]}..."
-                )
-            else:
-                logger.warning(
-                    f"⚠️ [Thread {index}] batch_id 為空或不存在，無法更新進度！"
-                )
+            self._report_progress(test_run, test_case, is_passed)
             
             logger.info(
                 f"[Thread {index}] 測試完成: "
@@ -495,6 +588,7 @@ class DifyTestRunner:
             # 統計失敗次數
             with self._lock:
                 self._failed_count += 1
+            self._report_progress(test_run, test_case, False)
             
             raise
     
@@ -520,6 +614,9 @@ class DifyTestRunner:
             # description 和 status 欄位不存在，移除
         )
         
+        # 整個測試集的關鍵字編譯成一個自動機，各案例評分時共用
+        self.keyword_evaluator.compile(tc.answer_keywords for tc in test_cases)
+        
         return test_run
     
     def _run_single_test(
@@ -541,22 +638,34 @@ class DifyTestRunner:
         # ✅ v1.3: 檢查是否使用 SmartSearchRouter
         use_smart_router = self.version_config.get('rag_settings', {}).get('use_smart_router', False)
         
-        # 1. 呼叫 Dify API
-        if use_smart_router:
-            # 使用 SmartSearchRouter（與 Web Protocol Assistant 完全一致）
-            logger.info(f"🔄 使用 SmartSearchRouter（與 Web 一致）")
-            api_response = self.api_client.send_question_with_smart_router(
-                question=test_case.question,
-                user_id=f"test_run_{test_run.id}",
-                conversation_id=None
-            )
-        else:
-            # 使用原有的 send_question 方法
-            api_response = self.api_client.send_question(
-                question=test_case.question,
-                user_id=f"test_run_{test_run.id}",
-                conversation_id=None  # 每個測試案例使用獨立對話
-            )
+        # 1. 呼叫 Dify API（同時收集分段耗時）
+        with collect_stages() as timings:
+            if use_smart_router:
+                # 使用 SmartSearchRouter（與 Web Protocol Assistant 完全一致）
+                logger.info(f"🔄 使用 SmartSearchRouter（與 Web 一致）")
+                api_response = self.api_client.send_question_with_smart_router(
+                    question=test_case.question,
+                    user_id=f"test_run_{test_run.id}",
+                    conversation_id=None
+                )
+            else:
+                # 使用原有的 send_question 方法
+                api_response = self.api_client.send_question(
+                    question=test_case.question,
+                    user_id=f"test_run_{test_run.id}",
+                    conversation_id=None  # 每個測試案例使用獨立對話
+                )
+            
+            # 2. 使用 KeywordEvaluator 評分
+            keywords = test_case.answer_keywords  # ✅ 直接訪問 JSONField 欄位
+            
+            with stage(EVALUATION):
+                evaluation_result = self.keyword_evaluator.evaluate(
+                    question=test_case.question,
+                    expected_answer=test_case.expected_answer,
+                    actual_answer=api_response.get('answer', ''),
+                    keywords=keywords
+                )
         
         # 提取資訊
         actual_answer = api_response.get('answer', '')
@@ -574,23 +683,43 @@ class DifyTestRunner:
                 f"fallback={api_response.get('is_fallback', False)}"
             )
         
-        # 2. 使用 KeywordEvaluator 評分
-        keywords = test_case.answer_keywords  # ✅ 直接訪問 JSONField 欄位
-        
-        evaluation_result = self.keyword_evaluator.evaluate(
-            question=test_case.question,
-            expected_answer=test_case.expected_answer,
+        # 3. 儲存 TestResult 和 AnswerEvaluation
+        test_result = self._store_result(
+            test_run=test_run,
+            test_case=test_case,
             actual_answer=actual_answer,
-            keywords=keywords
+            dify_message_id=dify_message_id,
+            response_time=response_time,
+            evaluation_result=evaluation_result,
+            keywords=keywords,
+            stage_timings=timings.as_dict()
         )
         
+        return test_result
+    
+    def _store_result(
+        self,
+        test_run: DifyTestRun,
+        test_case: DifyBenchmarkTestCase,
+        actual_answer: str,
+        dify_message_id: str,
+        response_time: float,
+        evaluation_result: Dict[str, Any],
+        keywords: List[str],
+        stage_timings: Optional[Dict[str, float]] = None
+    ) -> DifyTestResult:
+        """
+        建立 TestResult 與 AnswerEvaluation
+        
+        批次執行期間推入 DifyResultSink 由寫入執行緒批次寫入（回傳尚未儲存的實例）；
+        單獨呼叫時直接寫入資料庫。
+        """
         score = evaluation_result['score']
         is_passed = evaluation_result['is_passed']
         matched_keywords = evaluation_result['matched_keywords']
         missing_keywords = evaluation_result['missing_keywords']
         
-        # 3. 儲存 TestResult
-        test_result = DifyTestResult.objects.create(
+        test_result = DifyTestResult(
             test_run=test_run,
             test_case=test_case,
             dify_answer=actual_answer,  # ✅ 正確欄位名
@@ -598,14 +727,11 @@ class DifyTestRunner:
             score=score,
             is_passed=is_passed,
             response_time=response_time,
+            stage_timings=stage_timings or {},
             matched_keywords=matched_keywords,
             missing_keywords=missing_keywords
-            # dify_conversation_id 和 retrieved_documents_count 欄位不存在，移除
         )
-        
-        # 4. 儲存 AnswerEvaluation
-        DifyAnswerEvaluation.objects.create(
-            test_result=test_result,
+        evaluation = DifyAnswerEvaluation(
             question=test_case.question,
             expected_answer=test_case.expected_answer or "",
             actual_answer=actual_answer,
@@ -623,8 +749,43 @@ class DifyTestRunner:
             feedback=f"關鍵字匹配: {len(matched_keywords)}/{len(keywords)}"
         )
         
+        if self._result_sink is not None:
+            self._result_sink.put(test_result, evaluation)
+        else:
+            with transaction.atomic():
+                test_result.save()
+                evaluation.test_result = test_result
+                evaluation.save()
         return test_result
     
+    def _report_progress(
+        self,
+        test_run: DifyTestRun,
+        test_case: DifyBenchmarkTestCase,
+        is_passed: bool
+    ):
+        """更新進度追蹤器：批次與版本的完成數各 +1"""
+        if not test_run.batch_id:
+            return
+        
+        failed = 0 if is_passed else 1
+        try:
+            progress_tracker.update_progress(
+                batch_id=test_run.batch_id,
+                completed_tests=1,
+                failed_tests=failed,
+                current_test_case=test_case.question[:50]  # 顯示當前測試案例
+            )
+            progress_tracker.update_version_progress(
+                batch_id=test_run.batch_id,
+                version_id=self.version.id,
+                completed_tests=1,
+                failed_tests=failed
+            )
+        except Exception as e:
+            # 進度追蹤失敗不影響測試本身
+            logger.warning(f"⚠️ 進度更新失敗: batch_id={test_run.batch_id}, error={str(e)}")
+    
     def _update_test_run_statistics(
         self,
         test_run: DifyTestRun,
@@ -640,6 +801,9 @@ class DifyTestRunner:
         test_run.failed_cases = failed_count
         test_run.pass_rate = (passed_count / total_cases * 100) if total_cases > 0 else 0
         test_run.average_score = (total_score / total_cases) if total_cases > 0 else 0
+        test_run.stage_latency = summarize_stage_timings(
+            DifyTestResult.objects.filter(test_run=test_run).values_list('stage_timings', flat=True)
+        )
         # status 欄位不存在於 Model，移除
         test_run.completed_at = timezone.now()
         test_run.save()
@@ -657,7 +821,8 @@ class DifyTestRunner:
                 'failed_cases': int,
                 'pass_rate': float,
                 'average_score': float,
-                'duration': float (seconds)
+                'duration': float (seconds),
+                'stage_latency': {stage: {'count', 'mean', 'p50', 'p95', 'max'}}
             }
         """
         duration = 0
@@ -673,5 +838,6 @@ class DifyTestRunner:
             'pass_rate': test_run.pass_rate,
             'average_score': test_run.average_score,
             'duration': round(duration, 2),
+            'stage_latency': test_run.stage_latency,
             # status 欄位不存在，移除
         }
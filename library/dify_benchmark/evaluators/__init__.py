@@ -2,12 +2,15 @@
 Dify Benchmark Evaluators Package
 
 提供多種評分方式：
-1. KeywordEvaluator: 100% 關鍵字匹配評分
+1. KeywordEvaluator: 100% 關鍵字匹配評分（KeywordMatcher: Aho-Corasick 關鍵字自動機）
 2. AIEvaluator: GPT-4 基於的智能評分（可選）
 """
 
 from .keyword_evaluator import KeywordEvaluator
+from .keyword_matcher import KeywordMatcher, normalize_text
 
 __all__ = [
     'KeywordEvaluator',
+    'KeywordMatcher',
+    'normalize_text',
 ]
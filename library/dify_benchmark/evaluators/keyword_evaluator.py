@@ -5,13 +5,20 @@ Keyword Evaluator - 100% 關鍵字匹配評分
 1. 完全基於關鍵字匹配（不使用 AI）
 2. 匹配度 = (匹配的關鍵字數 / 總關鍵字數) * 100
 3. 及格標準：60 分（即 60% 關鍵字匹配）
-4. 大小寫不敏感
+4. 大小寫、全形 / 半形、空白與標點不敏感（見 keyword_matcher.normalize_text）
 5. 支援中英文關鍵字
+6. 可選模糊匹配（有界編輯距離）
+
+效能：
+- 整個測試集的關鍵字可先以 compile() 編譯成一個 Aho-Corasick 自動機，
+  之後每個回答只正規化與掃描一次（DifyTestRunner 於建立 Test Run 時編譯）
+- batch_evaluate() 自動以該批案例的全部關鍵字編譯一次
 """
 
-import json
 import logging
-from typing import Dict, List, Any
+from typing import Any, Dict, Iterable, List, Optional
+
+from .keyword_matcher import KeywordMatcher
 
 logger = logging.getLogger(__name__)
 
@@ -42,21 +49,56 @@ class KeywordEvaluator:
     # 及格標準（可配置）
     PASSING_SCORE = 60
     
-    def __init__(self, passing_score: int = None):
+    def __init__(self, passing_score: int = None, fuzzy_distance: int = 0):
         """
         初始化評分器
         
         Args:
             passing_score: 自定義及格分數（預設 60）
+            fuzzy_distance: 模糊匹配允許的最大編輯距離（預設 0 = 只做精確匹配；
+                            實際上限另依關鍵字長度縮減，短關鍵字一律精確匹配）
         """
         self.passing_score = passing_score or self.PASSING_SCORE
+        self.fuzzy_distance = fuzzy_distance
+        self._matcher: Optional[KeywordMatcher] = None
+    
+    def compile(self, keyword_lists: Iterable[Iterable[str]]) -> KeywordMatcher:
+        """
+        將測試集所有案例的關鍵字編譯成一個自動機，之後的 evaluate() 共用
+        
+        編譯完成才替換參照，評分執行緒不會看到半成品。
+        
+        Args:
+            keyword_lists: 各測試案例的關鍵字列表
+        
+        Returns:
+            編譯後的 KeywordMatcher
+        """
+        matcher = self._build_matcher(keyword_lists)
+        self._matcher = matcher
+        logger.info(f"關鍵字自動機編譯完成: keywords={len(matcher)}, fuzzy_distance={self.fuzzy_distance}")
+        return matcher
+    
+    def _build_matcher(self, keyword_lists: Iterable[Iterable[str]]) -> KeywordMatcher:
+        return KeywordMatcher(
+            (keyword for keywords in keyword_lists for keyword in (keywords or [])),
+            max_distance=self.fuzzy_distance
+        )
+    
+    def _matcher_for(self, keywords: List[str]) -> KeywordMatcher:
+        """已編譯的自動機涵蓋這組關鍵字時直接共用，否則臨時編譯"""
+        matcher = self._matcher
+        if matcher is not None and matcher.covers(keywords):
+            return matcher
+        return self._build_matcher([keywords])
     
     def evaluate(
         self,
         question: str,
         expected_answer: str,
         actual_answer: str,
-        keywords: List[str]
+        keywords: List[str],
+        matcher: Optional[KeywordMatcher] = None
     ) -> Dict[str, Any]:
         """
         執行關鍵字評分
@@ -66,6 +108,7 @@ class KeywordEvaluator:
             expected_answer: 預期答案（用於參考，不直接用於評分）
             actual_answer: Dify 實際回答
             keywords: 關鍵字列表（JSON 陣列）
+            matcher: 已編譯的關鍵字自動機（預設使用 compile() 的結果）
         
         Returns:
             評分結果字典：
@@ -74,7 +117,8 @@ class KeywordEvaluator:
                 'is_passed': bool,
                 'matched_keywords': List[str],
                 'missing_keywords': List[str],
-                'match_details': Dict[str, bool]
+                'match_details': Dict[str, bool],
+                'fuzzy_matches': Dict[str, int]  # 僅在有模糊命中時出現（關鍵字 → 編輯距離）
             }
         """
         try:
@@ -93,20 +137,23 @@ class KeywordEvaluator:
                     'match_details': {}
                 }
             
-            # 2. 正規化文本（轉小寫，移除空白）
-            normalized_answer = actual_answer.lower().strip()
+            # 2. 正規化回答並以自動機掃描一次
+            matcher = matcher or self._matcher_for(keywords)
+            matches = matcher.match(actual_answer, keywords)
             
             # 3. 檢查每個關鍵字
             matched_keywords = []
             missing_keywords = []
             match_details = {}
+            fuzzy_matches = {}
             
             for keyword in keywords:
                 if not keyword or not keyword.strip():
                     continue
                 
-                normalized_keyword = keyword.lower().strip()
-                is_matched = normalized_keyword in normalized_answer
+                is_matched = keyword in matches
+                if matches.get(keyword):
+                    fuzzy_matches[keyword] = matches[keyword]
                 
                 match_details[keyword] = is_matched
                 
@@ -135,13 +182,16 @@ class KeywordEvaluator:
                 f"passed={'✅' if is_passed else '❌'}"
             )
             
-            return {
+            result = {
                 'score': score,
                 'is_passed': is_passed,
                 'matched_keywords': matched_keywords,
                 'missing_keywords': missing_keywords,
                 'match_details': match_details
             }
+            if fuzzy_matches:
+                result['fuzzy_matches'] = fuzzy_matches
+            return result
             
         except Exception as e:
             logger.error(f"關鍵字評分失敗: {str(e)}", exc_info=True)
@@ -186,8 +236,11 @@ class KeywordEvaluator:
         
         Returns:
             評分結果列表
+        
+        所有案例的關鍵字先編譯成一個自動機，每個回答只掃描一次。
         """
         results = []
+        matcher = self._build_matcher(case.get('keywords') for case in test_cases)
         
         for i, case in enumerate(test_cases, 1):
             try:
@@ -195,7 +248,8 @@ class KeywordEvaluator:
                     question=case.get('question', ''),
                     expected_answer=case.get('expected_answer', ''),
                     actual_answer=case.get('actual_answer', ''),
-                    keywords=case.get('keywords', [])
+                    keywords=case.get('keywords', []),
+                    matcher=matcher
                 )
                 result['case_index'] = i
                 results.append(result)
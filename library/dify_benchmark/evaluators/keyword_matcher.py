@@ -0,0 +1,226 @@
+"""
+Keyword Matcher - 以 Aho-Corasick 自動機一次掃描完成關鍵字匹配
+
+KeywordEvaluator 的匹配引擎：
+1. 正規化：回答只正規化一次（NFKC 全形 / 半形折疊、casefold、移除空白與標點），
+   關鍵字套用相同規則，因此「Burn-in」可匹配「burn in」、「ＩＯＬ」可匹配「IOL」
+2. 編譯：整個測試集的關鍵字編譯成一個自動機，各回答共用（編譯後唯讀，可跨執行緒使用）
+3. 掃描：每個回答只掃描一次，取得所有出現的關鍵字
+4. 模糊匹配（可選）：精確未命中的關鍵字再以有界編輯距離做子字串比對
+
+使用方式：
+    matcher = KeywordMatcher(['I3C', 'MIPI', '通訊協定'], max_distance=1)
+    matcher.match('I3C 是 MIPI 定義的通訊協定', ['I3C', 'MIPI'])
+    # {'I3C': 0, 'MIPI': 0}（值為編輯距離，0 表示精確匹配）
+"""
+
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+# 移除空白、標點與其他符號；保留常見有語意的符號（C#、C++、100%、R&D、@）
+# 以及數字間的小數點（PCIe 4.0 ≠ PCIe 40）
+_SEPARATOR_PATTERN = re.compile(r'[^\w#%&@+.]+|_+|(?<!\d)\.|\.(?!\d)')
+
+# 模糊匹配：關鍵字每 FUZZY_CHARS_PER_EDIT 個字元允許 1 個編輯，
+# 短關鍵字（如 I3C、USB）只做精確匹配
+FUZZY_CHARS_PER_EDIT = 4
+
+
+def normalize_text(text: str) -> str:
+    """
+    正規化文本（回答與關鍵字共用）
+
+    NFKC 將全形英數與標點折疊為半形，casefold 處理大小寫，
+    再移除空白與標點，讓中英文混排的斷詞差異不影響匹配。
+    """
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return _SEPARATOR_PATTERN.sub('', text)
+
+
+class AhoCorasickAutomaton:
+    """多模式字串匹配自動機（goto / fail / output 三表，純 Python）"""
+
+    def __init__(self, patterns: Sequence[str]):
+        """
+        Args:
+            patterns: 模式字串（非空；search 回傳其索引）
+        """
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[tuple] = [()]
+
+        for pattern_id, pattern in enumerate(patterns):
+            if pattern:
+                self._insert(pattern, pattern_id)
+        self._build_fail_links()
+
+    def _insert(self, pattern: str, pattern_id: int):
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[node][char] = next_node
+            node = next_node
+        self._output[node] = self._output[node] + (pattern_id,)
+
+    def _build_fail_links(self):
+        """以 BFS 建立失敗連結，並把失敗節點的輸出併入（掃描時不必再追連結）"""
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                if node:
+                    self._fail[child] = self._goto[fail].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def search(self, text: str) -> Set[int]:
+        """掃描一次，回傳出現過的模式索引"""
+        goto, fail, output = self._goto, self._fail, self._output
+        found: Set[int] = set()
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                found.update(output[node])
+        return found
+
+
+def bounded_edit_distance(pattern: str, text: str, max_distance: int) -> Optional[int]:
+    """
+    pattern 與 text 任一子字串的最小編輯距離（Sellers 演算法）
+
+    Returns:
+        最小編輯距離；超過 max_distance 時回傳 None
+    """
+    m = len(pattern)
+    if not m:
+        return 0
+    if max_distance <= 0:
+        return 0 if pattern in text else None
+
+    previous = list(range(m + 1))
+    best = m
+    for char in text:
+        current = [0]
+        for i in range(1, m + 1):
+            cost = previous[i - 1] + (pattern[i - 1] != char)
+            current.append(min(cost, previous[i] + 1, current[i - 1] + 1))
+        if current[m] < best:
+            best = current[m]
+            if best == 0:
+                break
+        previous = current
+    return best if best <= max_distance else None
+
+
+class KeywordMatcher:
+    """
+    編譯後的關鍵字集合
+
+    同一測試集的所有關鍵字編譯一次，之後每個回答只正規化與掃描一次；
+    正規化後相同的關鍵字（如 'I3C' 與 'ｉ３ｃ'）共用同一個模式。
+    """
+
+    def __init__(self, keywords: Iterable[str], max_distance: int = 0):
+        """
+        Args:
+            keywords: 關鍵字（空白關鍵字會被略過）
+            max_distance: 模糊匹配允許的最大編輯距離（0 = 只做精確匹配）
+        """
+        self.max_distance = max(0, int(max_distance or 0))
+        self._pattern_ids: Dict[tuple, int] = {}
+        self._keyword_patterns: Dict[str, int] = {}
+        self._raw_patterns: Dict[int, str] = {}
+        patterns: List[str] = []
+
+        for keyword in keywords:
+            if not keyword or not keyword.strip() or keyword in self._keyword_patterns:
+                continue
+            # 全由標點組成的關鍵字正規化後為空，改以原字串（僅折疊寬度與大小寫）比對原文
+            pattern = normalize_text(keyword)
+            is_raw = not pattern
+            if is_raw:
+                pattern = unicodedata.normalize('NFKC', keyword.strip()).casefold()
+            pattern_id = self._pattern_ids.get((pattern, is_raw))
+            if pattern_id is None:
+                pattern_id = self._pattern_ids[(pattern, is_raw)] = len(patterns)
+                patterns.append('' if is_raw else pattern)
+            self._keyword_patterns[keyword] = pattern_id
+            if is_raw:
+                self._raw_patterns[pattern_id] = pattern
+
+        self._patterns = patterns
+        self._automaton = AhoCorasickAutomaton(patterns)
+
+    def __len__(self) -> int:
+        return len(self._keyword_patterns)
+
+    def covers(self, keywords: Iterable[str]) -> bool:
+        """是否已編譯所有（非空白）關鍵字"""
+        return all(
+            keyword in self._keyword_patterns
+            for keyword in keywords
+            if keyword and keyword.strip()
+        )
+
+    def match(self, text: str, keywords: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """
+        匹配回答中出現的關鍵字
+
+        Args:
+            text: 回答原文
+            keywords: 要檢查的關鍵字（預設為全部已編譯關鍵字；未編譯的關鍵字視為未命中）
+
+        Returns:
+            {命中的關鍵字: 編輯距離}（0 表示精確匹配）
+        """
+        if keywords is None:
+            keywords = self._keyword_patterns.keys()
+
+        normalized = normalize_text(text)
+        found = self._automaton.search(normalized)
+        raw_text = None
+
+        matched: Dict[str, int] = {}
+        fuzzy_distances: Dict[int, Optional[int]] = {}
+        for keyword in keywords:
+            pattern_id = self._keyword_patterns.get(keyword)
+            if pattern_id is None:
+                continue
+            if pattern_id in found:
+                matched[keyword] = 0
+                continue
+
+            if pattern_id in self._raw_patterns:
+                if raw_text is None:
+                    raw_text = unicodedata.normalize('NFKC', text).casefold()
+                if self._raw_patterns[pattern_id] in raw_text:
+                    matched[keyword] = 0
+                continue
+
+            pattern = self._patterns[pattern_id]
+            allowed = min(self.max_distance, len(pattern) // FUZZY_CHARS_PER_EDIT)
+            if allowed <= 0:
+                continue
+            if pattern_id not in fuzzy_distances:
+                fuzzy_distances[pattern_id] = bounded_edit_distance(pattern, normalized, allowed)
+            distance = fuzzy_distances[pattern_id]
+            if distance is not None:
+                matched[keyword] = distance
+
+        return matched
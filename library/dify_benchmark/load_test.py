@@ -0,0 +1,190 @@
+"""
+Dify Benchmark Load Test - 以本機 Dify stub 離線壓測 Benchmark 流程
+
+啟動 DifyStubServer 重播錄製的回答，並以與批量測試相同的元件執行：
+DifyAPIClient（含 DifyRequestManager 重試）→ DifyRequestScheduler（速率 / AIMD / 退避重試）
+→ KeywordEvaluator。不需要 Dify、資料庫或 Redis，可在 CI 量測：
+
+- 吞吐量（每秒完成的測試案例數）
+- 端到端與各階段延遲的 p50 / p95（dify_llm、evaluation）
+- 限流重試次數、最終失敗數、Stub 注入的錯誤數
+
+Usage:
+    from library.dify_benchmark.load_test import run_offline_load_test
+    from library.dify_integration.stub_server import DifyFixtureStore, FaultConfig
+
+    report = run_offline_load_test(
+        DifyFixtureStore.load('fixtures/dify_responses.json'),
+        repeat=10,
+        fault=FaultConfig(latency_ms=500, jitter_ms=300, error_rate=0.05),
+        rate_per_second=50
+    )
+    print(report['throughput'], report['latency']['total'])
+"""
+
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from library.common.stage_timing import collect_stages, stage, summarize_stage_timings, EVALUATION
+from library.dify_integration.stub_server import DifyFixtureStore, DifyStubServer, FaultConfig
+from .dify_api_client import DifyAPIClient
+from .evaluators import KeywordEvaluator
+from .request_scheduler import DifyRequestScheduler, SchedulerJob
+
+logger = logging.getLogger(__name__)
+
+
+def build_stub_client(server: DifyStubServer, timeout: int = 75, max_retries: int = 3) -> DifyAPIClient:
+    """建立指向 stub 伺服器的 DifyAPIClient"""
+    client = DifyAPIClient(timeout=timeout)
+    client.api_url = server.api_url
+    client.api_key = server.api_key
+    client.request_manager.max_retries = max_retries
+    return client
+
+
+@contextmanager
+def redirect_protocol_guide_to(server: DifyStubServer):
+    """
+    在此區塊內讓 Protocol Guide 的 Dify 配置指向 stub 伺服器
+
+    供端到端執行 DifyBatchTester（需要資料庫）時使用：
+    以 DIFY_PROTOCOL_GUIDE_API_URL / _API_KEY / _BASE_URL 環境變數覆蓋並清除配置緩存。
+    """
+    from library.config.dify_config_manager import default_config_manager
+
+    overrides = {
+        'DIFY_PROTOCOL_GUIDE_API_URL': server.api_url,
+        'DIFY_PROTOCOL_GUIDE_API_KEY': server.api_key,
+        'DIFY_PROTOCOL_GUIDE_BASE_URL': server.base_url,
+    }
+    previous = {key: os.environ.get(key) for key in overrides}
+    os.environ.update(overrides)
+    default_config_manager.clear_cache()
+    try:
+        yield server
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        default_config_manager.clear_cache()
+
+
+def run_offline_load_test(
+    store: DifyFixtureStore,
+    repeat: int = 1,
+    fault: Optional[FaultConfig] = None,
+    rate_per_second: float = 50.0,
+    per_key_limit: int = 20,
+    max_workers: Optional[int] = None,
+    timeout: int = 75,
+    client_retries: int = 0
+) -> Dict[str, Any]:
+    """
+    對 stub 伺服器執行一次壓測
+
+    Args:
+        store: 錄製的回應（每個 fixture 為一個測試案例，answer_keywords 作為評分關鍵字）
+        repeat: 每個案例重複次數
+        fault: 延遲與錯誤注入設定
+        rate_per_second: 排程器全域速率
+        per_key_limit: 每個 app key 的並行上限
+        max_workers: 排程器工作執行緒數
+        timeout: DifyAPIClient 請求逾時（秒）
+        client_retries: DifyRequestManager 的連線 / 逾時重試次數（預設 0，只測排程器重試）
+
+    Returns:
+        壓測報告字典
+    """
+    fixtures = store.fixtures
+    if not fixtures:
+        raise ValueError("沒有可用的 fixture")
+
+    evaluator = KeywordEvaluator()
+    evaluator.compile(fixture.get('answer_keywords') for fixture in fixtures)
+    samples = []
+    outcome = {'success': 0, 'failed': 0, 'passed': 0}
+    lock = threading.Lock()
+
+    with DifyStubServer(store, fault=fault) as server:
+        client = build_stub_client(server, timeout=timeout, max_retries=client_retries)
+        scheduler = DifyRequestScheduler(
+            rate_per_second=rate_per_second,
+            burst=rate_per_second,
+            per_key_limit=per_key_limit,
+            max_workers=max_workers
+        )
+
+        def call(payload):
+            index, fixture = payload
+            with collect_stages() as timings:
+                response = client.send_question(
+                    question=fixture['query'],
+                    user_id=f"load_test_{index}",
+                    conversation_id=None
+                )
+            response['stage_timings'] = timings.as_dict()
+            return response
+
+        def on_done(payload, response, error):
+            _, fixture = payload
+            if error is not None or not response or not response.get('success'):
+                with lock:
+                    outcome['failed'] += 1
+                return
+
+            with collect_stages(response.get('stage_timings')) as timings, stage(EVALUATION):
+                evaluation = evaluator.evaluate(
+                    question=fixture['query'],
+                    expected_answer=fixture.get('expected_answer', ''),
+                    actual_answer=response.get('answer', ''),
+                    keywords=fixture.get('answer_keywords', [])
+                )
+            sample = timings.as_dict()
+            sample['total'] = sum(sample.values())
+            with lock:
+                outcome['success'] += 1
+                outcome['passed'] += 1 if evaluation['is_passed'] else 0
+                samples.append(sample)
+
+        jobs = [
+            SchedulerJob(key=server.api_key, payload=(i, fixture))
+            for i, fixture in enumerate(fixtures * max(1, repeat), 1)
+        ]
+
+        started = time.perf_counter()
+        scheduler_stats = scheduler.run(jobs, call=call, on_done=on_done)
+        elapsed = time.perf_counter() - started
+        stub_stats = server.stats.as_dict()
+
+    total = len(jobs)
+    report = {
+        'total_cases': total,
+        'success': outcome['success'],
+        'failed': outcome['failed'],
+        'passed': outcome['passed'],
+        'pass_rate': round(outcome['passed'] / total * 100, 2) if total else 0,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput': round(total / elapsed, 2) if elapsed > 0 else 0,
+        'latency': summarize_stage_timings(samples),
+        'scheduler': scheduler_stats,
+        'stub': stub_stats,
+    }
+    logger.info(
+        f"離線壓測完成: cases={total}, success={report['success']}, failed={report['failed']}, "
+        f"throughput={report['throughput']}/s, elapsed={report['elapsed_seconds']}s"
+    )
+    return report
+
+
+__all__ = [
+    'run_offline_load_test',
+    'build_stub_client',
+    'redirect_protocol_guide_to',
+]
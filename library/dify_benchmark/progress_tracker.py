@@ -1,27 +1,55 @@
 """
 批量測試進度追蹤器
 
-提供線程安全的進度追蹤機制，用於追蹤批量測試的執行進度。
+提供跨行程的進度追蹤機制，用於追蹤批量測試的執行進度。
 支援多個批次同時執行，每個批次獨立追蹤進度。
 
+儲存方式（Redis）：
+- 批次與各版本進度各存一個 Hash，計數以 HINCRBY 原子累加
+  （多個 gunicorn worker / 多執行緒同時更新不會互相覆蓋）
+- 每次更新後在頻道 PUBLISH 通知，SSE 端點以 subscribe() 等待推送，不再輪詢
+- 執行中的批次持有租約（lease），每次更新時續約；
+  行程崩潰後租約過期，批次可透過 DifyBatchTester.resume_batch_test() 續跑
+- Redis 無法連線時退回行程內儲存（行為同舊版單行程追蹤器）
+
 作者: AI Platform Team
 日期: 2025-11-24
 """
 
+import json
 import threading
 import time
 import sys
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any
 from datetime import datetime
 
 # 配置日誌
 logger = logging.getLogger(__name__)
 
+# Redis key 前綴（原始連線不套用 CACHES 的 KEY_PREFIX，需自行加上）
+KEY_PREFIX = 'ai_platform:dify_progress'
+
+# 進度資料保留時間（秒）
+PROGRESS_TTL = 7 * 24 * 3600
+
+# 執行租約時間（秒）：需大於單一 Dify API 請求的逾時（75 秒）
+LEASE_SECONDS = 300
+
+# 無推送時多久重送一次目前進度（秒，同時作為 SSE 保活）
+KEEPALIVE_SECONDS = 15.0
+
+# 行程內儲存（無 pub/sub）時的輪詢間隔（秒）
+POLL_INTERVAL = 0.5
+
+# 整數計數欄位（以 HINCRBY 更新）
+_COUNTER_FIELDS = ('completed_tests', 'failed_tests')
+
+
 def _log_and_flush(level, message):
     """
     記錄日誌並強制刷新輸出緩衝
-    
+
     解決 Python 日誌緩衝問題，確保日誌即時輸出
     """
     if level == 'info':
@@ -32,28 +60,147 @@ def _log_and_flush(level, message):
         logger.error(message)
     elif level == 'debug':
         logger.debug(message)
-    
+
     # 強制刷新標準輸出和錯誤輸出
     sys.stdout.flush()
     sys.stderr.flush()
 
 
+def _encode(mapping: Dict[str, Any]) -> Dict[str, str]:
+    """Hash 欄位一律存 JSON（整數的 JSON 表示可直接 HINCRBY）"""
+    return {field: json.dumps(value, ensure_ascii=False) for field, value in mapping.items()}
+
+
+def _decode(raw: Dict[Any, Any]) -> Dict[str, Any]:
+    """還原 HGETALL 結果（相容 bytes 與 str）"""
+    decoded = {}
+    for field, value in raw.items():
+        if isinstance(field, bytes):
+            field = field.decode('utf-8')
+        if isinstance(value, bytes):
+            value = value.decode('utf-8')
+        try:
+            decoded[field] = json.loads(value)
+        except (TypeError, ValueError):
+            decoded[field] = value
+    return decoded
+
+
+def estimate_remaining_time(start_time: Optional[str], completed: int, total: int,
+                            now: Optional[datetime] = None) -> Optional[int]:
+    """依已完成數量的平均耗時預估剩餘秒數"""
+    if not start_time or completed <= 0:
+        return None
+    elapsed_seconds = ((now or datetime.now()) - datetime.fromisoformat(start_time)).total_seconds()
+    return int(elapsed_seconds / completed * max(total - completed, 0))
+
+
+class _LocalStore:
+    """
+    行程內儲存（Redis 無法連線時使用）
+
+    僅實作追蹤器用到的 Redis 指令；不支援 pub/sub，subscribe() 改為輪詢。
+    """
+
+    supports_pubsub = False
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def pipeline(self, transaction: bool = True):
+        return _LocalPipeline(self)
+
+    def hset(self, key, mapping):
+        with self._lock:
+            self._data.setdefault(key, {}).update(mapping)
+
+    def hsetnx(self, key, field, value):
+        with self._lock:
+            self._data.setdefault(key, {}).setdefault(field, value)
+
+    def hincrby(self, key, field, amount=1):
+        with self._lock:
+            data = self._data.setdefault(key, {})
+            data[field] = str(int(data.get(field, 0)) + amount)
+            return int(data[field])
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._data.get(key, {}))
+
+    def sadd(self, key, *members):
+        with self._lock:
+            self._data.setdefault(key, set()).update(members)
+
+    def srem(self, key, *members):
+        with self._lock:
+            self._data.get(key, set()).difference_update(members)
+
+    def smembers(self, key):
+        with self._lock:
+            return set(self._data.get(key, set()))
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            if nx and key in self._data:
+                return None
+            self._data[key] = value
+            return True
+
+    def exists(self, key):
+        with self._lock:
+            return int(key in self._data)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def expire(self, key, seconds):
+        pass
+
+    def publish(self, channel, message):
+        return 0
+
+
+class _LocalPipeline:
+    """_LocalStore 的 pipeline：逐一執行並收集回傳值"""
+
+    def __init__(self, store: _LocalStore):
+        self._store = store
+        self._results: List[Any] = []
+
+    def __getattr__(self, name):
+        method = getattr(self._store, name)
+
+        def call(*args, **kwargs):
+            self._results.append(method(*args, **kwargs))
+            return self
+        return call
+
+    def execute(self):
+        results, self._results = self._results, []
+        return results
+
+
 class BatchTestProgressTracker:
     """
     批量測試進度追蹤器 (Singleton)
-    
-    使用線程鎖確保多線程環境下的資料安全。
+
+    進度存於 Redis，任何行程都能讀取與更新。
     追蹤資訊包括：
     - 整體進度（已完成/總數）
     - 當前執行的版本和測試案例
     - 每個版本的詳細進度
     - 預估剩餘時間
     - 執行狀態（running, completed, error）
+    - 批次參數（用於崩潰後續跑）
     """
-    
+
     _instance = None
     _lock = threading.Lock()
-    
+
     def __new__(cls):
         """Singleton 模式實作"""
         if cls._instance is None:
@@ -62,82 +209,148 @@ class BatchTestProgressTracker:
                     cls._instance = super().__new__(cls)
                     cls._instance._initialized = False
         return cls._instance
-    
+
     def __init__(self):
         """初始化進度追蹤器"""
         if self._initialized:
             return
-        
-        self._progress_data: Dict[str, Dict[str, Any]] = {}
-        self._data_lock = threading.Lock()
+
+        self._client = None
+        self._client_lock = threading.Lock()
         self._initialized = True
-    
+
+    # ------------------------------------------------------------
+    # 儲存層
+    # ------------------------------------------------------------
+
+    @property
+    def client(self):
+        """Redis 連線（無法連線時退回行程內儲存）"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._connect()
+        return self._client
+
+    @staticmethod
+    def _connect():
+        try:
+            from django_redis import get_redis_connection
+            client = get_redis_connection('default')
+            client.ping()
+            return client
+        except Exception as e:
+            _log_and_flush('warning', f"⚠️ [ProgressTracker] Redis 無法連線，改用行程內儲存: {e}")
+            return _LocalStore()
+
+    @staticmethod
+    def _batch_key(batch_id: str) -> str:
+        return f"{KEY_PREFIX}:{batch_id}"
+
+    @staticmethod
+    def _version_key(batch_id: str, version_id: int) -> str:
+        return f"{KEY_PREFIX}:{batch_id}:v:{version_id}"
+
+    @staticmethod
+    def _lease_key(batch_id: str) -> str:
+        return f"{KEY_PREFIX}:{batch_id}:lease"
+
+    @staticmethod
+    def _channel(batch_id: str) -> str:
+        return f"{KEY_PREFIX}:{batch_id}:events"
+
+    @staticmethod
+    def _active_key() -> str:
+        return f"{KEY_PREFIX}:active"
+
+    def _exists(self, batch_id: str) -> bool:
+        return bool(self.client.exists(self._batch_key(batch_id)))
+
+    def _touch(self, pipe, batch_id: str, *keys: str):
+        """更新時間戳、續約並延長保留時間"""
+        batch_key = self._batch_key(batch_id)
+        pipe.hset(batch_key, mapping=_encode({'last_update': datetime.now().isoformat()}))
+        pipe.set(self._lease_key(batch_id), '1', ex=LEASE_SECONDS)
+        for key in (batch_key,) + keys:
+            pipe.expire(key, PROGRESS_TTL)
+
+    def _publish(self, batch_id: str, event: str):
+        try:
+            self.client.publish(self._channel(batch_id), json.dumps({'batch_id': batch_id, 'event': event}))
+        except Exception as e:
+            logger.debug(f"[ProgressTracker] 發布進度事件失敗: {e}")
+
+    # ------------------------------------------------------------
+    # 寫入
+    # ------------------------------------------------------------
+
     def initialize_batch(
         self,
         batch_id: str,
         total_tests: int,
         versions: List[Dict[str, Any]],
-        batch_name: str = None
+        batch_name: str = None,
+        params: Dict[str, Any] = None
     ) -> None:
         """
-        初始化批次進度追蹤
-        
+        初始化批次進度追蹤（同一 batch_id 重新初始化會重置計數）
+
         Args:
             batch_id: 批次唯一識別碼
             total_tests: 總測試數量
             versions: 版本列表 [{'id': 1, 'name': 'v1.0', 'test_count': 10}, ...]
             batch_name: 批次名稱
+            params: 批次參數（version_ids / test_case_ids 等），用於崩潰後續跑
         """
-        logger.info(
+        _log_and_flush(
+            'info',
             f"📝 [ProgressTracker] 初始化批次追蹤: "
             f"batch_id={batch_id}, "
             f"total_tests={total_tests}, "
             f"versions={len(versions)}, "
             f"batch_name='{batch_name}'"
         )
-        sys.stdout.flush()
-        sys.stderr.flush()
-        
-        with self._data_lock:
-            self._progress_data[batch_id] = {
-                'batch_id': batch_id,
-                'batch_name': batch_name or f'Batch {batch_id}',
-                'status': 'running',
-                'total_tests': total_tests,
+
+        now = datetime.now().isoformat()
+        version_keys = [self._version_key(batch_id, v['id']) for v in versions]
+
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(self._batch_key(batch_id), *version_keys)
+        pipe.hset(self._batch_key(batch_id), mapping=_encode({
+            'batch_id': batch_id,
+            'batch_name': batch_name or f'Batch {batch_id}',
+            'status': 'running',
+            'total_tests': total_tests,
+            'completed_tests': 0,
+            'failed_tests': 0,
+            'current_version': None,
+            'current_version_name': None,
+            'current_test_case': None,
+            'start_time': now,
+            'end_time': None,
+            'error_message': None,
+            'version_ids': [v['id'] for v in versions],
+            'params': params,
+        }))
+        for v, key in zip(versions, version_keys):
+            pipe.hset(key, mapping=_encode({
+                'version_id': v['id'],
+                'version_name': v['name'],
+                'total_tests': v['test_count'],
                 'completed_tests': 0,
                 'failed_tests': 0,
-                'current_version': None,
-                'current_version_name': None,
-                'current_test_case': None,
-                'start_time': datetime.now().isoformat(),
+                'status': 'pending',  # pending, running, completed, error
                 'end_time': None,
-                'estimated_remaining_time': None,
-                'versions': {
-                    v['id']: {
-                        'version_id': v['id'],
-                        'version_name': v['name'],
-                        'total_tests': v['test_count'],
-                        'completed_tests': 0,
-                        'failed_tests': 0,
-                        'status': 'pending',  # pending, running, completed, error
-                        'start_time': None,
-                        'end_time': None,
-                        'average_score': None,
-                        'pass_rate': None
-                    }
-                    for v in versions
-                },
-                'error_message': None,
-                'last_update': datetime.now().isoformat()
-            }
-            
-            logger.info(
-                f"✅ [ProgressTracker] 批次初始化完成: batch_id={batch_id}, "
-                f"versions={list(self._progress_data[batch_id]['versions'].keys())}"
-            )
-            sys.stdout.flush()
-            sys.stderr.flush()
-    
+                'average_score': None,
+                'pass_rate': None
+            }))
+        pipe.sadd(self._active_key(), batch_id)
+        self._touch(pipe, batch_id, *version_keys)
+        pipe.execute()
+
+        self._publish(batch_id, 'initialized')
+        _log_and_flush('info', f"✅ [ProgressTracker] 批次初始化完成: batch_id={batch_id}")
+
     def update_progress(
         self,
         batch_id: str,
@@ -149,7 +362,7 @@ class BatchTestProgressTracker:
     ) -> None:
         """
         更新整體進度
-        
+
         Args:
             batch_id: 批次識別碼
             completed_tests: 已完成測試數（增量）
@@ -158,65 +371,30 @@ class BatchTestProgressTracker:
             current_version_name: 當前版本名稱
             current_test_case: 當前測試案例名稱
         """
-        with self._data_lock:
-            if batch_id not in self._progress_data:
-                logger.warning(f"⚠️ [ProgressTracker] 嘗試更新不存在的批次: {batch_id}")
-                return
-            
-            progress = self._progress_data[batch_id]
-            
-            # 記錄更新前的數量
-            old_completed = progress['completed_tests']
-            
-            # 更新計數
-            if completed_tests is not None:
-                progress['completed_tests'] += completed_tests
-            if failed_tests is not None:
-                progress['failed_tests'] += failed_tests
-            
-            # 更新當前執行資訊
-            if current_version is not None:
-                progress['current_version'] = current_version
-            if current_version_name is not None:
-                progress['current_version_name'] = current_version_name
-            if current_test_case is not None:
-                progress['current_test_case'] = current_test_case
-            
-            # 更新時間戳
-            progress['last_update'] = datetime.now().isoformat()
-            
-            # 計算進度百分比
-            progress_pct = (progress['completed_tests'] / progress['total_tests'] * 100) if progress['total_tests'] > 0 else 0
-            
-            # 只在測試完成數有變化時記錄日誌（避免過多日誌）
-            if completed_tests is not None and completed_tests > 0:
-                logger.info(
-                    f"📊 [ProgressTracker] 進度更新: "
-                    f"batch_id={batch_id}, "
-                    f"progress={progress_pct:.1f}%, "
-                    f"completed={progress['completed_tests']}/{progress['total_tests']}, "
-                    f"failed={progress['failed_tests']}, "
-                    f"current_version='{progress['current_version_name']}', "
-                    f"current_test='{progress['current_test_case'][:50] if progress['current_test_case'] else None}...'"
-                )
-                sys.stdout.flush()
-                sys.stderr.flush()
-                progress['current_version'] = current_version
-            if current_version_name is not None:
-                progress['current_version_name'] = current_version_name
-            if current_test_case is not None:
-                progress['current_test_case'] = current_test_case
-            
-            # 計算預估剩餘時間
-            if progress['completed_tests'] > 0:
-                start_time = datetime.fromisoformat(progress['start_time'])
-                elapsed_seconds = (datetime.now() - start_time).total_seconds()
-                avg_time_per_test = elapsed_seconds / progress['completed_tests']
-                remaining_tests = progress['total_tests'] - progress['completed_tests']
-                progress['estimated_remaining_time'] = int(avg_time_per_test * remaining_tests)
-            
-            progress['last_update'] = datetime.now().isoformat()
-    
+        if not self._exists(batch_id):
+            logger.warning(f"⚠️ [ProgressTracker] 嘗試更新不存在的批次: {batch_id}")
+            return
+
+        batch_key = self._batch_key(batch_id)
+        pipe = self.client.pipeline(transaction=True)
+        for field, amount in zip(_COUNTER_FIELDS, (completed_tests, failed_tests)):
+            if amount:
+                pipe.hincrby(batch_key, field, amount)
+
+        # 更新當前執行資訊
+        current = {
+            'current_version': current_version,
+            'current_version_name': current_version_name,
+            'current_test_case': current_test_case,
+        }
+        current = {field: value for field, value in current.items() if value is not None}
+        if current:
+            pipe.hset(batch_key, mapping=_encode(current))
+
+        self._touch(pipe, batch_id)
+        pipe.execute()
+        self._publish(batch_id, 'progress')
+
     def update_version_progress(
         self,
         batch_id: str,
@@ -229,7 +407,7 @@ class BatchTestProgressTracker:
     ) -> None:
         """
         更新特定版本的進度
-        
+
         Args:
             batch_id: 批次識別碼
             version_id: 版本 ID
@@ -239,38 +417,39 @@ class BatchTestProgressTracker:
             average_score: 平均分數
             pass_rate: 通過率
         """
-        with self._data_lock:
-            if batch_id not in self._progress_data:
-                return
-            
-            progress = self._progress_data[batch_id]
-            if version_id not in progress['versions']:
-                return
-            
-            version_progress = progress['versions'][version_id]
-            
-            # 更新計數
-            if completed_tests is not None:
-                version_progress['completed_tests'] += completed_tests
-            if failed_tests is not None:
-                version_progress['failed_tests'] += failed_tests
-            
-            # 更新狀態
-            if status is not None:
-                version_progress['status'] = status
-                if status == 'running' and version_progress['start_time'] is None:
-                    version_progress['start_time'] = datetime.now().isoformat()
-                elif status in ['completed', 'error']:
-                    version_progress['end_time'] = datetime.now().isoformat()
-            
-            # 更新測試結果
-            if average_score is not None:
-                version_progress['average_score'] = round(average_score, 2)
-            if pass_rate is not None:
-                version_progress['pass_rate'] = round(pass_rate, 2)
-            
-            progress['last_update'] = datetime.now().isoformat()
-    
+        version_key = self._version_key(batch_id, version_id)
+        if not self.client.exists(version_key):
+            return
+
+        pipe = self.client.pipeline(transaction=True)
+
+        # 更新計數
+        for field, amount in zip(_COUNTER_FIELDS, (completed_tests, failed_tests)):
+            if amount:
+                pipe.hincrby(version_key, field, amount)
+
+        # 更新狀態
+        fields: Dict[str, Any] = {}
+        if status is not None:
+            fields['status'] = status
+            if status in ['completed', 'error']:
+                fields['end_time'] = datetime.now().isoformat()
+
+        # 更新測試結果
+        if average_score is not None:
+            fields['average_score'] = round(float(average_score), 2)
+        if pass_rate is not None:
+            fields['pass_rate'] = round(float(pass_rate), 2)
+
+        if fields:
+            pipe.hset(version_key, mapping=_encode(fields))
+        if status == 'running':
+            # start_time 只在第一次進入 running 時設定
+            pipe.hsetnx(version_key, 'start_time', json.dumps(datetime.now().isoformat()))
+        self._touch(pipe, batch_id, version_key)
+        pipe.execute()
+        self._publish(batch_id, 'version')
+
     def mark_completed(
         self,
         batch_id: str,
@@ -279,68 +458,170 @@ class BatchTestProgressTracker:
     ) -> None:
         """
         標記批次完成
-        
+
         Args:
             batch_id: 批次識別碼
             success: 是否成功完成
             error_message: 錯誤訊息（如果失敗）
         """
-        with self._data_lock:
-            if batch_id not in self._progress_data:
-                return
-            
-            progress = self._progress_data[batch_id]
-            progress['status'] = 'completed' if success else 'error'
-            progress['end_time'] = datetime.now().isoformat()
-            progress['estimated_remaining_time'] = 0
-            
-            if error_message:
-                progress['error_message'] = error_message
-            
-            progress['last_update'] = datetime.now().isoformat()
-    
+        if not self._exists(batch_id):
+            return
+
+        fields: Dict[str, Any] = {
+            'status': 'completed' if success else 'error',
+            'end_time': datetime.now().isoformat(),
+        }
+        if error_message:
+            fields['error_message'] = error_message
+
+        pipe = self.client.pipeline(transaction=True)
+        pipe.hset(self._batch_key(batch_id), mapping=_encode(fields))
+        self._touch(pipe, batch_id)
+        pipe.delete(self._lease_key(batch_id))
+        if success:
+            pipe.srem(self._active_key(), batch_id)
+        pipe.execute()
+        self._publish(batch_id, 'completed' if success else 'error')
+
+    def cleanup_batch(self, batch_id: str) -> None:
+        """
+        清理批次資料
+
+        Args:
+            batch_id: 批次識別碼
+        """
+        progress = self.get_progress(batch_id)
+        keys = [self._batch_key(batch_id), self._lease_key(batch_id)]
+        if progress:
+            keys += [self._version_key(batch_id, vid) for vid in progress['versions']]
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(*keys)
+        pipe.srem(self._active_key(), batch_id)
+        pipe.execute()
+
+    # ------------------------------------------------------------
+    # 讀取
+    # ------------------------------------------------------------
+
     def get_progress(self, batch_id: str) -> Optional[Dict[str, Any]]:
         """
         獲取批次進度資料
-        
+
         Args:
             batch_id: 批次識別碼
-            
+
         Returns:
             進度資料字典，如果不存在則返回 None
         """
-        with self._data_lock:
-            if batch_id not in self._progress_data:
-                return None
-            
-            # 返回深拷貝，避免外部修改
-            import copy
-            return copy.deepcopy(self._progress_data[batch_id])
-    
-    def cleanup_batch(self, batch_id: str) -> None:
+        progress = _decode(self.client.hgetall(self._batch_key(batch_id)))
+        if not progress:
+            return None
+
+        version_ids = progress.pop('version_ids', None) or []
+        pipe = self.client.pipeline(transaction=False)
+        for version_id in version_ids:
+            pipe.hgetall(self._version_key(batch_id, version_id))
+        version_rows = pipe.execute() if version_ids else []
+
+        progress['versions'] = {}
+        for version_id, row in zip(version_ids, version_rows):
+            if row:
+                version_progress = _decode(row)
+                version_progress.setdefault('start_time', None)
+                progress['versions'][version_id] = version_progress
+
+        # 計算預估剩餘時間
+        if progress.get('status') == 'running':
+            progress['estimated_remaining_time'] = estimate_remaining_time(
+                progress.get('start_time'), progress.get('completed_tests', 0), progress.get('total_tests', 0)
+            )
+        else:
+            progress['estimated_remaining_time'] = 0
+        return progress
+
+    def is_batch_alive(self, batch_id: str) -> bool:
+        """批次是否仍有行程在執行（租約未過期）"""
+        return bool(self.client.exists(self._lease_key(batch_id)))
+
+    def acquire_lease(self, batch_id: str) -> bool:
         """
-        清理批次資料（測試完成後呼叫）
-        
-        Args:
-            batch_id: 批次識別碼
+        原子地取得批次租約（SET NX EX），用於續跑前確保只有一個行程執行
+
+        Returns:
+            是否取得租約（False 表示批次仍在執行中）
         """
-        with self._data_lock:
-            if batch_id in self._progress_data:
-                del self._progress_data[batch_id]
-    
+        return bool(self.client.set(self._lease_key(batch_id), '1', nx=True, ex=LEASE_SECONDS))
+
     def get_all_active_batches(self) -> List[str]:
         """
         獲取所有執行中的批次 ID
-        
+
         Returns:
             批次 ID 列表
         """
-        with self._data_lock:
-            return [
-                batch_id 
-                for batch_id, data in self._progress_data.items()
-                if data['status'] == 'running'
-            ]
+        return [batch_id for batch_id in self._active_batch_ids() if self.is_batch_alive(batch_id)]
+
+    def get_resumable_batches(self) -> List[Dict[str, Any]]:
+        """
+        獲取可續跑的批次（未完成且租約已過期，例如行程崩潰或重啟）
+
+        Returns:
+            進度資料列表（含 params）
+        """
+        resumable = []
+        for batch_id in self._active_batch_ids():
+            if self.is_batch_alive(batch_id):
+                continue
+            progress = self.get_progress(batch_id)
+            if progress is None:
+                # 進度已過期，移出執行中集合
+                self.client.srem(self._active_key(), batch_id)
+                continue
+            if progress.get('params'):
+                resumable.append(progress)
+        return resumable
+
+    def _active_batch_ids(self) -> List[str]:
+        return sorted(
+            member.decode('utf-8') if isinstance(member, bytes) else member
+            for member in self.client.smembers(self._active_key())
+        )
+
+    def subscribe(self, batch_id: str, keepalive: float = KEEPALIVE_SECONDS) -> Iterator[Optional[Dict[str, Any]]]:
+        """
+        訂閱批次進度
+
+        先送出目前進度，之後每收到更新推送（同時到達的多筆推送合併）送出最新進度；
+        keepalive 秒內沒有推送時重送一次（更新預估時間並保持 SSE 連線）。
+        批次不存在時送出 None；批次結束（completed / error）送出最終進度後停止。
+
+        Args:
+            batch_id: 批次識別碼
+            keepalive: 無推送時的重送間隔（秒）
+        """
+        pubsub = None
+        if getattr(self.client, 'supports_pubsub', True):
+            # 先訂閱再讀取，避免兩者之間的更新遺失
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(self._channel(batch_id))
+
+        try:
+            while True:
+                progress = self.get_progress(batch_id)
+                yield progress
+                if progress is None or progress['status'] in ('completed', 'error'):
+                    return
+
+                if pubsub is None:
+                    time.sleep(POLL_INTERVAL)
+                    continue
+
+                if pubsub.get_message(timeout=keepalive):
+                    while pubsub.get_message(timeout=0):
+                        pass
+        finally:
+            if pubsub is not None:
+                pubsub.close()
 
 
 # 全局單例實例
@@ -0,0 +1,314 @@
+"""
+Dify Request Scheduler - 多版本共用的 Dify 請求排程器
+
+DifyBatchTester 原本逐版本執行，每個版本內最多 20 個執行緒，
+8 個版本 × 100 個案例時總耗時與版本數成正比，Dify 後端始終吃不滿。
+此排程器把所有 (版本, 測試案例) 放進同一個全域工作佇列：
+
+- TokenBucket：全域請求速率上限（每秒 rate 個，允許 burst 個突發）
+- AdaptiveConcurrencyLimiter：每個 Dify app key 的並行上限，
+  以 AIMD 調整（成功時緩慢加 1，遇到 429 / 5xx / 逾時減半）
+- 被限流的請求以指數退避（含隨機抖動）重新排入佇列，超過 max_attempts 才視為失敗
+
+總耗時因此由 Dify 的實際承載量決定，而不是版本數。
+
+Usage:
+    from library.dify_benchmark.request_scheduler import DifyRequestScheduler, SchedulerJob
+
+    scheduler = DifyRequestScheduler(rate_per_second=10, per_key_limit=20)
+    scheduler.run(
+        jobs=[SchedulerJob(key=api_key, payload=...) for ...],
+        call=lambda payload: runner.ask_dify(...),
+        on_done=lambda payload, response, error: ...
+    )
+"""
+
+import logging
+import queue
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 全域速率（每秒請求數）與突發量
+DEFAULT_RATE_PER_SECOND = 10.0
+DEFAULT_BURST = 20
+
+# 每個 Dify app key 的並行上限（同舊版單一版本的執行緒上限）
+DEFAULT_PER_KEY_LIMIT = 20
+
+# 工作執行緒上限
+MAX_WORKERS = 64
+
+# 被限流請求的最大嘗試次數與退避時間（秒）
+DEFAULT_MAX_ATTEMPTS = 4
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+_HTTP_STATUS_PATTERN = re.compile(r'HTTP (\d{3})')
+
+
+def is_throttled_response(response: Optional[Dict[str, Any]], error: Optional[BaseException] = None) -> bool:
+    """
+    判斷請求是否因 Dify 過載而失敗（429 / 5xx / 逾時）
+
+    Args:
+        response: DifyAPIClient 回應字典
+        error: 呼叫時拋出的例外
+    """
+    if error is not None:
+        return True
+    if not response or response.get('success'):
+        return False
+
+    status_code = response.get('status_code')
+    if status_code is None:
+        match = _HTTP_STATUS_PATTERN.search(response.get('error') or '')
+        status_code = int(match.group(1)) if match else None
+    if status_code is not None:
+        return status_code == 429 or status_code >= 500
+
+    return 'timed out' in (response.get('error') or '').lower()
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, maximum: float = BACKOFF_MAX) -> float:
+    """第 attempt 次重試前的等待秒數（指數退避 + 抖動）"""
+    delay = min(maximum, base * (2 ** max(attempt - 1, 0)))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class TokenBucket:
+    """執行緒安全的 Token Bucket 速率限制器"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: 每秒補充的 token 數
+            capacity: 桶容量（允許的突發量，預設等於 rate）
+        """
+        if rate <= 0:
+            raise ValueError("rate 必須大於 0")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1.0))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """有足夠 token 時立即取得，否則返回 False"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens: float = 1.0):
+        """阻塞直到取得 token"""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD 並行上限
+
+    - 成功：limit += 1 / limit（約每完成 limit 個請求加 1）
+    - 限流：limit 減半（不低於 min_limit）
+    """
+
+    def __init__(self, limit: int, min_limit: int = 1, max_limit: Optional[int] = None):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit or limit)
+        self._limit = float(min(max(limit, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, throttled: bool = False):
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self._limit = max(float(self.min_limit), self._limit / 2)
+            else:
+                self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+            self._cond.notify_all()
+
+
+@dataclass
+class SchedulerJob:
+    """排程工作"""
+    key: str            # Dify app key（並行上限以此分組）
+    payload: Any        # 交給 call / on_done 的內容
+    attempts: int = 0
+
+
+class DifyRequestScheduler:
+    """全域工作佇列 + 速率限制 + 每個 app key 的自適應並行上限"""
+
+    def __init__(
+        self,
+        rate_per_second: float = DEFAULT_RATE_PER_SECOND,
+        burst: Optional[float] = DEFAULT_BURST,
+        per_key_limit: int = DEFAULT_PER_KEY_LIMIT,
+        max_workers: Optional[int] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    ):
+        """
+        Args:
+            rate_per_second: 全域每秒請求數上限
+            burst: 允許的突發請求數
+            per_key_limit: 每個 app key 的最大並行數
+            max_workers: 工作執行緒數（預設 per_key_limit，上限 MAX_WORKERS）
+            max_attempts: 被限流請求的最大嘗試次數
+        """
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self.per_key_limit = max(1, int(per_key_limit))
+        self.max_workers = min(MAX_WORKERS, max(1, int(max_workers or self.per_key_limit)))
+        self.max_attempts = max(1, int(max_attempts))
+
+        self._limiters: Dict[str, AdaptiveConcurrencyLimiter] = {}
+        self._limiters_lock = threading.Lock()
+
+        self.stats = {'completed': 0, 'throttled': 0, 'retried': 0}
+        self._stats_lock = threading.Lock()
+
+    def limiter(self, key: str) -> AdaptiveConcurrencyLimiter:
+        """取得 app key 的並行上限（第一次使用時建立）"""
+        with self._limiters_lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = AdaptiveConcurrencyLimiter(
+                    limit=self.per_key_limit, max_limit=self.per_key_limit
+                )
+            return limiter
+
+    def _count(self, field: str):
+        with self._stats_lock:
+            self.stats[field] += 1
+
+    def run(
+        self,
+        jobs: Iterable[SchedulerJob],
+        call: Callable[[Any], Dict[str, Any]],
+        on_done: Callable[[Any, Optional[Dict[str, Any]], Optional[BaseException]], None],
+        is_throttled: Callable[..., bool] = is_throttled_response
+    ) -> Dict[str, int]:
+        """
+        執行所有工作，全部完成後返回
+
+        Args:
+            jobs: 排程工作（依序放入全域佇列）
+            call: 發送請求 call(payload) -> response
+            on_done: 每個工作最終完成時呼叫 on_done(payload, response, error)
+            is_throttled: 判斷回應是否為限流（會退避重試）
+
+        Returns:
+            統計 {'completed', 'throttled', 'retried'}
+        """
+        work: queue.Queue = queue.Queue()
+        for job in jobs:
+            work.put(job)
+
+        def worker():
+            while True:
+                job = work.get()
+                if job is None:
+                    work.task_done()
+                    return
+                try:
+                    self._process(job, work, call, on_done, is_throttled)
+                finally:
+                    work.task_done()
+
+        threads = [
+            threading.Thread(target=worker, name=f"dify-scheduler-{i}", daemon=True)
+            for i in range(self.max_workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        work.join()
+        for _ in threads:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+
+        logger.info(
+            f"Dify 排程完成: completed={self.stats['completed']}, "
+            f"throttled={self.stats['throttled']}, retried={self.stats['retried']}, "
+            f"limits={ {key[-6:]: lim.limit for key, lim in self._limiters.items()} }"
+        )
+        return dict(self.stats)
+
+    def _process(self, job: SchedulerJob, work: queue.Queue, call, on_done, is_throttled):
+        self.bucket.acquire()
+        limiter = self.limiter(job.key)
+        limiter.acquire()
+
+        response, error = None, None
+        try:
+            response = call(job.payload)
+        except Exception as e:
+            error = e
+        throttled = is_throttled(response, error)
+        limiter.release(throttled=throttled)
+        job.attempts += 1
+
+        if throttled:
+            self._count('throttled')
+            if job.attempts < self.max_attempts:
+                delay = backoff_delay(job.attempts)
+                logger.warning(
+                    f"Dify 請求被限流，{delay:.1f}s 後重試 "
+                    f"(attempt={job.attempts}/{self.max_attempts}, limit={limiter.limit})"
+                )
+                self._count('retried')
+                # 在此執行緒退避後重新排入佇列（不佔用 app key 的並行名額）
+                time.sleep(delay)
+                work.put(job)
+                return
+
+        try:
+            on_done(job.payload, response, error)
+        except Exception as e:
+            logger.error(f"排程工作完成處理失敗: {e}", exc_info=True)
+        self._count('completed')
+
+
+__all__ = [
+    'DifyRequestScheduler',
+    'SchedulerJob',
+    'TokenBucket',
+    'AdaptiveConcurrencyLimiter',
+    'is_throttled_response',
+    'backoff_delay',
+]
@@ -0,0 +1,83 @@
+"""
+Dify Result Sink - Dify 測試結果緩衝寫入器
+
+DifyTestRunner 的工作執行緒只負責呼叫 Dify API 與評分，
+DifyTestResult 與 DifyAnswerEvaluation 交由單一寫入執行緒以 bulk_create 成批寫入，
+並在每批寫入後增量更新 DifyTestRun 的通過數、失敗數、通過率與平均分數。
+
+Usage:
+    from library.dify_benchmark.result_sink import DifyResultSink
+
+    with DifyResultSink(test_run) as sink:
+        sink.put(test_result, evaluation)   # 皆為尚未儲存的 model 實例
+"""
+
+import logging
+from typing import Dict, Optional
+
+from library.benchmark.result_sink import BufferedResultSink
+
+logger = logging.getLogger(__name__)
+
+
+class DifyResultSink(BufferedResultSink):
+    """DifyTestResult + DifyAnswerEvaluation 緩衝寫入器"""
+
+    def __init__(self, test_run, initial_stats: Optional[Dict[str, float]] = None, **kwargs):
+        """
+        Args:
+            test_run: DifyTestRun 實例（統計欄位會被增量更新）
+            initial_stats: 既有結果的 passed / failed / total_score（續跑時從既有數字累加）
+            **kwargs: BufferedResultSink 參數
+        """
+        self.test_run = test_run
+        self.stats: Dict[str, float] = {'passed': 0, 'failed': 0, 'total_score': 0.0}
+        self.stats.update(initial_stats or {})
+        super().__init__(**kwargs)
+
+    def put(self, test_result, evaluation=None):
+        """
+        推入一筆結果
+
+        Args:
+            test_result: 尚未儲存的 DifyTestResult
+            evaluation: 尚未儲存的 DifyAnswerEvaluation（test_result 於寫入時補上）
+        """
+        self.put_item((test_result, evaluation))
+
+    def write_batch(self, items):
+        from django.db import transaction
+        from api.models import DifyAnswerEvaluation, DifyTestResult, DifyTestRun
+
+        passed = sum(1 for result, _ in items if result.is_passed)
+        failed = len(items) - passed
+        total_score = sum(float(result.score) for result, _ in items)
+
+        with transaction.atomic():
+            # PostgreSQL 的 bulk_create 會回填主鍵，評分記錄可直接關聯
+            results = DifyTestResult.objects.bulk_create([result for result, _ in items])
+            evaluations = []
+            for result, (_, evaluation) in zip(results, items):
+                if evaluation is not None:
+                    evaluation.test_result = result
+                    evaluations.append(evaluation)
+            if evaluations:
+                DifyAnswerEvaluation.objects.bulk_create(evaluations)
+
+            total_passed = self.stats['passed'] + passed
+            total_failed = self.stats['failed'] + failed
+            total = total_passed + total_failed
+            DifyTestRun.objects.filter(id=self.test_run.id).update(
+                passed_cases=total_passed,
+                failed_cases=total_failed,
+                pass_rate=round(total_passed / total * 100, 2),
+                average_score=round((self.stats['total_score'] + total_score) / total, 2)
+            )
+
+        # 交易成功後才累加，逐筆重試時不會重複計算
+        self.stats['passed'] += passed
+        self.stats['failed'] += failed
+        self.stats['total_score'] += total_score
+
+
+__all__ = ['DifyResultSink']
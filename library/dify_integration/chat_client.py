@@ -8,9 +8,10 @@ Dify Chat Client 模組
 import requests
 import json
 import time
-from typing import Dict, Optional, Any
+from typing import Dict, Iterator, Optional, Any
 from ..config.dify_config import get_chat_config
 from ..data_processing.file_utils import get_file_info, get_content_type_for_dify, get_default_analysis_query
+from .stream_relay import parse_stream_line
 
 
 class DifyChatClient:
@@ -311,12 +312,14 @@ class DifyChatClient:
                 return {
                     'success': True,
                     'stream': response.iter_lines(),
+                    'response': response,
                     'response_time': time.time() - start_time
                 }
             else:
                 return {
                     'success': False,
                     'error': f"HTTP {response.status_code}: {response.text}",
+                    'status_code': response.status_code,
                     'response_time': time.time() - start_time
                 }
                 
@@ -327,6 +330,57 @@ class DifyChatClient:
                 'response_time': 0
             }
     
+    def stream_chat_events(self, question: str, conversation_id: str = "", user: str = "default_user",
+                           inputs: Dict[str, Any] = None) -> Iterator[Dict[str, Any]]:
+        """
+        調用 Dify Chat 應用並逐一產生解析後的 streaming 事件
+        
+        請求失敗時產生一個 {'event': 'error', 'message': ..., 'status': ...} 事件；
+        產生器提前關閉（前端中斷）時一併關閉與 Dify 的連線。
+        
+        Args:
+            question: 問題內容
+            conversation_id: 對話 ID
+            user: 用戶標識
+            inputs: 額外的輸入參數
+            
+        Yields:
+            Dict: Dify 事件（message / message_replace / message_end / error ...）
+        """
+        result = self.chat_stream(question, conversation_id=conversation_id, user=user, inputs=inputs)
+        if not result['success']:
+            yield {'event': 'error', 'message': result['error'], 'status': result.get('status_code')}
+            return
+        
+        try:
+            for line in result['stream']:
+                event = parse_stream_line(line)
+                if event is not None:
+                    yield event
+        finally:
+            result['response'].close()
+    
+    def stop_message(self, task_id: str, user: str = "default_user") -> bool:
+        """
+        中止進行中的 streaming 生成（POST /chat-messages/:task_id/stop）
+        
+        Args:
+            task_id: streaming 事件中的 task_id
+            user: 用戶標識（需與送出請求時相同）
+            
+        Returns:
+            bool: 是否成功中止
+        """
+        try:
+            response = self.session.post(
+                f"{self.config['api_url'].rstrip('/')}/{task_id}/stop",
+                json={'user': user},
+                timeout=10
+            )
+            return response.status_code == 200
+        except Exception:
+            return False
+    
     def get_conversations(self, user: str = "default_user", limit: int = 20) -> Dict[str, Any]:
         """
         獲取用戶的對話列表
@@ -111,13 +111,15 @@ class ProtocolChatHandler:
     
     def _load_version_config(self, version_code=None):
         """
-        🆕 從資料庫載入版本配置（優先使用 Baseline 版本）
+        🆕 從版本快取載入版本配置（優先使用 Baseline 版本）
         
         優先順序：
         1. 如果提供了 version_code，使用指定版本
         2. 否則，使用 Baseline 版本（is_baseline=True）
         3. 如果沒有 Baseline，使用預設搜尋模式
         
+        版本設定由 VersionedConfigCache 保存在行程內，設定變更時才重新查詢資料庫。
+        
         Args:
             version_code: 版本代碼（可選，例如 'dify-two-tier-v1.2'）
             
@@ -125,45 +127,30 @@ class ProtocolChatHandler:
             版本配置字典或 None
         """
         try:
-            from api.models import DifyConfigVersion
+            from library.config.versioned_config_cache import get_config_cache
+            
+            config_cache = get_config_cache()
+            version = None
             
             # 步驟 1：如果提供了 version_code，使用指定版本
             if version_code:
-                try:
-                    version = DifyConfigVersion.objects.get(
-                        version_code=version_code,
-                        is_active=True
-                    )
+                version = config_cache.get_version(version_code)
+                if version:
                     logger.info(f"📌 使用指定版本: {version.version_name}")
-                except DifyConfigVersion.DoesNotExist:
+                else:
                     logger.warning(f"⚠️ 找不到指定版本: {version_code}，嘗試使用 Baseline")
-                    version_code = None
             
             # 步驟 2：如果沒有指定 version_code，使用 Baseline 版本
-            if not version_code:
-                try:
-                    version = DifyConfigVersion.objects.filter(
-                        is_baseline=True,
-                        is_active=True
-                    ).first()
-                    
-                    if version:
-                        logger.info(f"✅ 使用 Baseline 版本: {version.version_name} ({version.version_code})")
-                    else:
-                        logger.warning("⚠️ 找不到 Baseline 版本，使用預設搜尋模式")
-                        return None
-                        
-                except Exception as e:
-                    logger.error(f"❌ 查詢 Baseline 版本失敗: {e}")
+            if not version:
+                version = config_cache.get_baseline()
+                if version:
+                    logger.info(f"✅ 使用 Baseline 版本: {version.version_name} ({version.version_code})")
+                else:
+                    logger.warning("⚠️ 找不到 Baseline 版本，使用預設搜尋模式")
                     return None
             
             # 步驟 3：構建版本配置
-            version_config = {
-                'version_code': version.version_code,
-                'version_name': version.version_name,
-                'rag_settings': version.rag_settings,
-                'retrieval_mode': version.rag_settings.get('retrieval_mode', 'two_stage')
-            }
+            version_config = version.as_version_config()
             
             # 記錄詳細配置資訊
             stage1_config = version.rag_settings.get('stage1', {})
@@ -0,0 +1,204 @@
+"""
+Dify Stream Relay - Dify streaming 回應的解析、組裝與 SSE 轉送
+
+聊天 API 原本以 response_mode=blocking 呼叫 Dify，完整回答生成完才回應前端，
+首字延遲等於整段生成時間。此模組讓各助手的 handler 以 streaming 呼叫 Dify：
+
+- parse_stream_line：解析 Dify SSE 的 `data: {...}` 行
+- StreamAccumulator：一邊轉送片段一邊組裝完整回答，結束後輸出與 DifyChatClient.chat
+  相同結構的回應（不確定檢測、對話記錄沿用既有取值方式）
+- relay_answer：把 Dify 事件轉為前端事件（message / message_replace）
+- sse_response：以 StreamingHttpResponse 送出（停用 nginx 緩衝）
+
+送給前端的事件（data 為 JSON，event 欄位區分類型）：
+    {"event": "message", "answer": "片段", "stage": 1}
+    {"event": "message_replace", "answer": "完整取代內容", "stage": 1}
+    {"event": "stage_retry", "stage": 2, "reason": "..."}   # 前端清除已顯示的回答
+    {"event": "message_end", "answer": "完整回答", "mode": ..., "metadata": {...}, ...}
+    {"event": "error", "error": "..."}
+
+Usage:
+    from library.dify_integration.stream_relay import StreamAccumulator, relay_answer
+
+    accumulator = StreamAccumulator()
+    yield from relay_answer(client.stream_chat_events(query), accumulator, stage=1)
+    answer = accumulator.answer
+"""
+
+import json
+import time
+from typing import Any, Dict, Iterable, Iterator, Optional, Union
+
+# Dify 中帶回答片段的事件
+ANSWER_EVENTS = ('message', 'agent_message')
+
+# 不確定回答的降級提示（與 blocking 模式的組合回答相同）
+FALLBACK_SUFFIX = "\n\n---\n\n💡 **建議您參考以下文件以獲取更準確的資訊。**"
+
+
+def parse_stream_line(line: Union[bytes, str, None]) -> Optional[Dict[str, Any]]:
+    """解析一行 Dify SSE（非 data 行或無效 JSON 回傳 None）"""
+    if not line:
+        return None
+    if isinstance(line, bytes):
+        line = line.decode('utf-8', 'replace')
+    line = line.strip()
+    if not line.startswith('data:'):
+        return None
+    try:
+        event = json.loads(line[5:].strip())
+    except ValueError:
+        return None
+    return event if isinstance(event, dict) else None
+
+
+def format_sse(payload: Dict[str, Any]) -> str:
+    """一個 SSE data 事件"""
+    return f"data: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n"
+
+
+class StreamAccumulator:
+    """組裝一次 Dify streaming 回應"""
+
+    def __init__(self, started_at: Optional[float] = None):
+        """
+        Args:
+            started_at: 計算首字時間的起點（預設為建立時間）
+        """
+        self.started_at = started_at or time.time()
+        self.chunks = []
+        self.message_id = ''
+        self.conversation_id = ''
+        self.metadata: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.finished = False
+        self.first_token_time: Optional[float] = None
+
+    @property
+    def answer(self) -> str:
+        return ''.join(self.chunks)
+
+    def feed(self, event: Dict[str, Any]) -> str:
+        """
+        處理一個 Dify 事件
+
+        Returns:
+            本事件新增的回答片段（非回答事件為空字串）
+        """
+        kind = event.get('event')
+        self.message_id = event.get('message_id') or self.message_id
+        self.conversation_id = event.get('conversation_id') or self.conversation_id
+
+        if kind in ANSWER_EVENTS:
+            chunk = event.get('answer') or ''
+            if chunk and self.first_token_time is None:
+                self.first_token_time = time.time() - self.started_at
+            self.chunks.append(chunk)
+            return chunk
+        if kind == 'message_replace':
+            self.chunks = [event.get('answer') or '']
+        elif kind == 'message_end':
+            self.metadata = event.get('metadata') or {}
+            self.finished = True
+        elif kind == 'error':
+            self.error = event.get('message') or event.get('code') or 'Dify streaming 錯誤'
+        return ''
+
+    def as_response(self) -> Dict[str, Any]:
+        """與 DifyChatClient.chat 相同結構的回應"""
+        answer = self.answer
+        return {
+            'success': self.error is None,
+            'answer': answer,
+            'message_id': self.message_id,
+            'conversation_id': self.conversation_id,
+            'metadata': self.metadata,
+            'usage': self.metadata.get('usage', {}),
+            'response_time': time.time() - self.started_at,
+            'raw_response': {
+                'answer': answer,
+                'message_id': self.message_id,
+                'conversation_id': self.conversation_id,
+                'metadata': self.metadata,
+            },
+            **({'error': self.error} if self.error else {}),
+        }
+
+    def raise_for_error(self):
+        """Dify 回報錯誤或串流未正常結束時拋出 RuntimeError"""
+        if self.error:
+            raise RuntimeError(f"Dify streaming 失敗: {self.error}")
+        if not self.finished:
+            raise RuntimeError("Dify streaming 未收到 message_end 即中斷")
+
+
+def relay_answer(events: Iterable[Dict[str, Any]], accumulator: StreamAccumulator,
+                 **extra) -> Iterator[Dict[str, Any]]:
+    """
+    轉送 Dify 事件中的回答片段，同時餵給 accumulator
+
+    Args:
+        events: Dify 事件（DifyChatClient.stream_chat_events）
+        accumulator: 組裝完整回答
+        **extra: 附加到每個前端事件的欄位（如 stage）
+    """
+    for event in events:
+        chunk = accumulator.feed(event)
+        if chunk:
+            yield {'event': 'message', 'answer': chunk, **extra}
+        elif event.get('event') == 'message_replace':
+            yield {'event': 'message_replace', 'answer': accumulator.answer, **extra}
+
+
+def build_stream_result(accumulator: StreamAccumulator, conversation_id: str, started_at: float,
+                        answer: Optional[str] = None, **fields) -> Dict[str, Any]:
+    """
+    組成與 blocking handler 相同格式的最終結果
+
+    Args:
+        accumulator: 最後一次 Dify 回應
+        conversation_id: 請求的對話 ID（Dify 未回傳時沿用）
+        started_at: 整個請求的開始時間
+        answer: 最終回答（預設為 accumulator.answer）
+        **fields: mode / stage / is_fallback 等欄位
+    """
+    return {
+        'answer': accumulator.answer if answer is None else answer,
+        'message_id': accumulator.message_id,
+        'conversation_id': accumulator.conversation_id or conversation_id,
+        'response_time': time.time() - started_at,
+        'first_token_time': accumulator.first_token_time,
+        'tokens': accumulator.metadata.get('usage', {}),
+        'metadata': accumulator.metadata,
+        **fields,
+    }
+
+
+def sse_response(events: Iterable[Dict[str, Any]], status: int = 200):
+    """
+    以 Server-Sent Events 送出事件（Django StreamingHttpResponse）
+
+    X-Accel-Buffering 停用 nginx 緩衝，片段到達即送出。
+    """
+    from django.http import StreamingHttpResponse
+
+    response = StreamingHttpResponse(
+        (format_sse(event) for event in events),
+        content_type='text/event-stream',
+        status=status
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+__all__ = [
+    'ANSWER_EVENTS',
+    'FALLBACK_SUFFIX',
+    'StreamAccumulator',
+    'build_stream_result',
+    'format_sse',
+    'parse_stream_line',
+    'relay_answer',
+    'sse_response',
+]
@@ -0,0 +1,463 @@
+"""
+Dify Stub Server - 本機 Dify 相容替身（錄製回應重播 + 延遲 / 錯誤注入）
+
+DifyAPIClient、DifyChatClient、ProtocolChatHandler 原本只能對真實 Dify 執行，
+Benchmark 的並行、重試與評分器吞吐量無法在 CI 或離線環境量測。
+此模組在本機啟動一個與 Dify API 相容的 HTTP 服務：
+
+- POST /v1/chat-messages          blocking 回傳 JSON；streaming 回傳 SSE（message / message_end）
+- POST /v1/chat-messages/<task_id>/stop  中止 streaming 生成（回傳 success）
+- POST /v1/files/upload           回傳上傳檔案資訊
+- POST /v1/datasets/<id>/retrieve 回傳知識庫檢索 records
+
+回答來自錄製的 fixture（以正規化後的 query 為 key）；每個對話收到的 query 記錄於
+DifyStubServer.messages(conversation_id)（與 Dify 相同，中止的生成也會留在對話中）。
+並可設定延遲（基礎 + 抖動）、錯誤率（429 / 5xx）與逾時率（超過 client timeout 才回應）。
+
+Fixture 格式（JSON）：
+    {
+        "fixtures": [
+            {
+                "query": "IOL 測試步驟",
+                "answer": "IOL 測試需要 ...",
+                "answer_keywords": ["IOL", "測試"],
+                "retriever_resources": [{"document_name": "IOL SOP", "content": "...", "score": 0.82}]
+            }
+        ]
+    }
+
+Usage:
+    from library.dify_integration.stub_server import DifyFixtureStore, DifyStubServer, FaultConfig
+
+    store = DifyFixtureStore.load('fixtures/dify_responses.json')
+    with DifyStubServer(store, fault=FaultConfig(latency_ms=800, error_rate=0.05)) as server:
+        client = DifyChatClient(api_url=server.api_url, api_key=server.api_key)
+        client.chat("IOL 測試步驟")
+"""
+
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STUB_API_KEY = 'app-stub-key'
+
+_WHITESPACE = re.compile(r'\s+')
+_RETRIEVE_PATH = re.compile(r'^/v1/datasets/([^/]+)/retrieve$')
+_STOP_PATH = re.compile(r'^/v1/chat-messages/([^/]+)/stop$')
+_FILENAME_PATTERN = re.compile(rb'filename="([^"]*)"')
+
+# 各錯誤狀態碼對應的 Dify 錯誤內容
+_ERROR_BODIES = {
+    429: {'code': 'too_many_requests', 'message': 'Too many requests, please try again later.'},
+    500: {'code': 'internal_server_error', 'message': 'Internal Server Error.'},
+    502: {'code': 'bad_gateway', 'message': 'Bad Gateway.'},
+    503: {'code': 'service_unavailable', 'message': 'Service Unavailable.'},
+}
+
+
+def normalize_query(query: str) -> str:
+    """Fixture key：去頭尾空白、合併連續空白、轉小寫"""
+    return _WHITESPACE.sub(' ', (query or '').strip()).lower()
+
+
+class DifyFixtureStore:
+    """錄製的 Dify 回應（以正規化後的 query 查詢）"""
+
+    def __init__(self, fixtures: Optional[Iterable[Dict[str, Any]]] = None, default_answer: Optional[str] = None):
+        """
+        Args:
+            fixtures: fixture 列表（至少含 query 與 answer）
+            default_answer: 未錄製的 query 使用的回答（None 時回傳 404）
+        """
+        self.default_answer = default_answer
+        self._fixtures: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        for fixture in fixtures or []:
+            self.add(fixture)
+
+    @classmethod
+    def load(cls, path: str, default_answer: Optional[str] = None) -> 'DifyFixtureStore':
+        """從 JSON 檔載入（支援 {"fixtures": [...]} 或直接為列表）"""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        fixtures = data.get('fixtures', []) if isinstance(data, dict) else data
+        return cls(fixtures, default_answer=default_answer)
+
+    def save(self, path: str):
+        """寫回 JSON 檔"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'fixtures': self.fixtures}, f, ensure_ascii=False, indent=2)
+
+    def add(self, fixture: Dict[str, Any]):
+        if not fixture.get('query'):
+            raise ValueError("fixture 缺少 query")
+        with self._lock:
+            self._fixtures[normalize_query(fixture['query'])] = dict(fixture)
+
+    def record(self, query: str, api_response: Dict[str, Any], answer_keywords: Optional[List[str]] = None):
+        """
+        由 DifyAPIClient.send_question 的成功回應錄製 fixture
+
+        Args:
+            query: 問題
+            api_response: DifyAPIClient 回應字典
+            answer_keywords: 評分用關鍵字（保留既有 fixture 的設定）
+        """
+        existing = self.get(query) or {}
+        self.add({
+            'query': query,
+            'answer': api_response.get('answer', ''),
+            'answer_keywords': answer_keywords if answer_keywords is not None
+            else existing.get('answer_keywords', []),
+            'retriever_resources': api_response.get('retrieved_documents', []),
+            'usage': api_response.get('tokens', {}),
+        })
+
+    def get(self, query: str) -> Optional[Dict[str, Any]]:
+        return self._fixtures.get(normalize_query(query))
+
+    def resolve(self, query: str) -> Optional[Dict[str, Any]]:
+        """取得 query 的 fixture（未錄製時使用 default_answer）"""
+        fixture = self.get(query)
+        if fixture is None and self.default_answer is not None:
+            fixture = {'query': query, 'answer': self.default_answer, 'retriever_resources': []}
+        return fixture
+
+    @property
+    def fixtures(self) -> List[Dict[str, Any]]:
+        return list(self._fixtures.values())
+
+    def __len__(self) -> int:
+        return len(self._fixtures)
+
+
+@dataclass
+class FaultConfig:
+    """延遲與錯誤注入設定"""
+    latency_ms: float = 0.0                 # 每個請求的基礎延遲
+    jitter_ms: float = 0.0                  # 延遲抖動（均勻分布 0 ~ jitter_ms）
+    error_rate: float = 0.0                 # 回傳錯誤狀態碼的機率
+    error_statuses: Tuple[int, ...] = (429, 500, 503)
+    timeout_rate: float = 0.0               # 逾時的機率（hang_seconds 後才回應）
+    hang_seconds: float = 90.0
+    stream_chunk_chars: int = 20            # streaming 每個 message 事件的字數
+    stream_chunk_delay_ms: float = 0.0      # streaming 事件之間的間隔
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        if not 0 <= self.error_rate <= 1 or not 0 <= self.timeout_rate <= 1:
+            raise ValueError("error_rate / timeout_rate 必須介於 0 與 1")
+        self._random = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> Tuple[float, Optional[int], bool]:
+        """抽一次注入結果 (延遲秒數, 錯誤狀態碼或 None, 是否逾時)"""
+        with self._lock:
+            delay = (self.latency_ms + self._random.uniform(0, self.jitter_ms)) / 1000.0
+            roll = self._random.random()
+            status = self._random.choice(self.error_statuses) if self.error_statuses else 500
+        if roll < self.timeout_rate:
+            return delay, None, True
+        if roll < self.timeout_rate + self.error_rate:
+            return delay, status, False
+        return delay, None, False
+
+
+@dataclass
+class StubStats:
+    """Stub 伺服器統計（執行緒安全）"""
+    requests: Dict[str, int] = field(default_factory=dict)
+    injected_errors: int = 0
+    injected_timeouts: int = 0
+    unknown_queries: int = 0
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def count(self, endpoint: str):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+
+    def incr(self, name: str):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'requests': dict(self.requests),
+                'injected_errors': self.injected_errors,
+                'injected_timeouts': self.injected_timeouts,
+                'unknown_queries': self.unknown_queries,
+            }
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """Dify API 相容的請求處理器（由 DifyStubServer 注入 stub）"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'DifyStub/1.0'
+    stub: 'DifyStubServer' = None
+
+    def log_message(self, format, *args):
+        logger.debug("dify-stub: " + format, *args)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        if self.headers.get('Authorization') != f'Bearer {self.stub.api_key}':
+            return self._send_json(401, {'code': 'unauthorized', 'message': 'Access token is invalid'})
+
+        path = self.path.split('?', 1)[0]
+        if path == '/v1/chat-messages':
+            endpoint = 'chat-messages'
+        elif path == '/v1/files/upload':
+            endpoint = 'files-upload'
+        elif _RETRIEVE_PATH.match(path):
+            endpoint = 'dataset-retrieve'
+        elif _STOP_PATH.match(path):
+            endpoint = 'chat-stop'
+        else:
+            return self._send_json(404, {'code': 'not_found', 'message': f'{path} not found'})
+        self.stub.stats.count(endpoint)
+
+        delay, error_status, hang = self.stub.fault.draw()
+        if hang:
+            self.stub.stats.incr('injected_timeouts')
+            time.sleep(self.stub.fault.hang_seconds)
+        elif delay:
+            time.sleep(delay)
+        if error_status is not None:
+            self.stub.stats.incr('injected_errors')
+            return self._send_json(error_status, {
+                'status': error_status, **_ERROR_BODIES.get(error_status, {'code': 'error', 'message': 'Error'})
+            })
+
+        if endpoint == 'files-upload':
+            return self._handle_upload(body)
+        if endpoint == 'chat-stop':
+            return self._send_json(200, {'result': 'success'})
+
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            return self._send_json(400, {'code': 'invalid_param', 'message': 'Invalid JSON body'})
+
+        if endpoint == 'chat-messages':
+            return self._handle_chat(payload)
+        return self._handle_retrieve(payload)
+
+    def _handle_chat(self, payload: Dict[str, Any]):
+        query = payload.get('query')
+        if not query:
+            return self._send_json(400, {'code': 'invalid_param', 'message': 'query is required'})
+
+        fixture = self.stub.store.resolve(query)
+        if fixture is None:
+            self.stub.stats.incr('unknown_queries')
+            return self._send_json(404, {'code': 'not_found', 'message': f'No recorded answer for: {query}'})
+
+        message = {
+            'message_id': str(uuid.uuid4()),
+            'task_id': str(uuid.uuid4()),
+            'conversation_id': payload.get('conversation_id') or str(uuid.uuid4()),
+            'created_at': int(time.time()),
+        }
+        self.stub.record_message(message['conversation_id'], query)
+        metadata = {
+            'usage': fixture.get('usage') or _usage_for(query, fixture.get('answer', '')),
+            'retriever_resources': fixture.get('retriever_resources', []),
+        }
+
+        if payload.get('response_mode') == 'streaming':
+            return self._send_stream(fixture.get('answer', ''), message, metadata)
+        return self._send_json(200, {
+            'event': 'message',
+            'mode': 'chat',
+            'answer': fixture.get('answer', ''),
+            'metadata': metadata,
+            **message,
+        })
+
+    def _send_stream(self, answer: str, message: Dict[str, Any], metadata: Dict[str, Any]):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        size = max(1, self.stub.fault.stream_chunk_chars)
+        chunks = [answer[i:i + size] for i in range(0, len(answer), size)] or ['']
+        try:
+            for chunk in chunks:
+                self._write_event({'event': 'message', 'answer': chunk, **message})
+                if self.stub.fault.stream_chunk_delay_ms:
+                    time.sleep(self.stub.fault.stream_chunk_delay_ms / 1000.0)
+            self._write_event({'event': 'message_end', 'metadata': metadata, **message})
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("dify-stub: streaming 用戶端提前中斷")
+
+    def _write_event(self, event: Dict[str, Any]):
+        self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def _handle_upload(self, body: bytes):
+        match = _FILENAME_PATTERN.search(body)
+        name = match.group(1).decode('utf-8', 'replace') if match else 'upload.bin'
+        extension = name.rsplit('.', 1)[-1].lower() if '.' in name else ''
+        return self._send_json(201, {
+            'id': str(uuid.uuid4()),
+            'name': name,
+            'size': len(body),
+            'extension': extension,
+            'mime_type': self.headers.get('Content-Type', '').split(';', 1)[0],
+            'created_by': str(uuid.uuid4()),
+            'created_at': int(time.time()),
+        })
+
+    def _handle_retrieve(self, payload: Dict[str, Any]):
+        query = payload.get('query', '')
+        fixture = self.stub.store.resolve(query) or {}
+        records = []
+        for i, resource in enumerate(fixture.get('retriever_resources', [])):
+            records.append({
+                'segment': {
+                    'id': resource.get('segment_id') or f'segment-{i}',
+                    'position': resource.get('position', i + 1),
+                    'content': resource.get('content', ''),
+                    'document': {
+                        'id': resource.get('document_id') or f'document-{i}',
+                        'name': resource.get('document_name') or resource.get('title', ''),
+                    },
+                },
+                'score': resource.get('score', 0.0),
+            })
+        return self._send_json(200, {'query': {'content': query}, 'records': records})
+
+    def _send_json(self, status: int, data: Dict[str, Any]):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # 用戶端已逾時離開
+            self.close_connection = True
+
+
+def _usage_for(query: str, answer: str) -> Dict[str, int]:
+    """未錄製 usage 時以字數估算 token 數"""
+    prompt_tokens, completion_tokens = len(query), len(answer)
+    return {
+        'prompt_tokens': prompt_tokens,
+        'completion_tokens': completion_tokens,
+        'total_tokens': prompt_tokens + completion_tokens,
+    }
+
+
+class DifyStubServer:
+    """在背景執行緒啟動的本機 Dify 相容伺服器"""
+
+    def __init__(
+        self,
+        store: DifyFixtureStore,
+        fault: Optional[FaultConfig] = None,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        api_key: str = STUB_API_KEY
+    ):
+        """
+        Args:
+            store: 錄製的回應
+            fault: 延遲與錯誤注入設定
+            host: 綁定位址
+            port: 綁定埠號（0 表示由系統分配）
+            api_key: 要求的 Bearer token
+        """
+        self.store = store
+        self.fault = fault or FaultConfig()
+        self.host = host
+        self.port = port
+        self.api_key = api_key
+        self.stats = StubStats()
+        self._conversations: Dict[str, List[str]] = {}
+        self._conversations_lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def api_url(self) -> str:
+        return f"{self.base_url}/v1/chat-messages"
+
+    def record_message(self, conversation_id: str, query: str):
+        with self._conversations_lock:
+            self._conversations.setdefault(conversation_id, []).append(query)
+
+    def messages(self, conversation_id: str) -> List[str]:
+        """對話中收到的 query（依序）"""
+        with self._conversations_lock:
+            return list(self._conversations.get(conversation_id, []))
+
+    def start(self) -> 'DifyStubServer':
+        handler = type('DifyStubHandler', (_StubHandler,), {'stub': self})
+        self._httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='dify-stub', daemon=True)
+        self._thread.start()
+        logger.info(f"Dify stub 已啟動: {self.base_url} (fixtures={len(self.store)})")
+        return self
+
+    def stop(self):
+        if self._httpd is None:
+            return
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join(timeout=5)
+        self._httpd = None
+        logger.info(f"Dify stub 已停止: {self.stats.as_dict()}")
+
+    def serve_forever(self):
+        """前景執行（供管理命令 --serve 使用，Ctrl+C 結束）"""
+        self.start()
+        try:
+            while self._thread.is_alive():
+                self._thread.join(timeout=1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def __enter__(self) -> 'DifyStubServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+
+__all__ = [
+    'DifyFixtureStore',
+    'DifyStubServer',
+    'FaultConfig',
+    'StubStats',
+    'normalize_query',
+    'STUB_API_KEY',
+]
@@ -180,15 +180,12 @@ class DifyKnowledgeSearchHandler:
         這消除了循環依賴風險。
         """
         try:
-            # 從 library 內部導入搜索服務
-            from library.data_processing.database_search import DatabaseSearchService
-            from library.rvt_guide.search_service import RVTGuideSearchService
-            from library.protocol_guide.search_service import ProtocolGuideSearchService
+            # 從 library 內部取得共用搜索服務（行程內只建立一次）
+            from library.common.knowledge_base.service_registry import get_search_service
             
-            # 創建服務實例
-            db_service = DatabaseSearchService()
-            rvt_service = RVTGuideSearchService()
-            protocol_service = ProtocolGuideSearchService()
+            db_service = get_search_service('database')
+            rvt_service = get_search_service('rvt_guide')
+            protocol_service = get_search_service('protocol_guide')
             
             # 設置搜索函數
             self.search_know_issue_knowledge = db_service.search_know_issue_knowledge
@@ -147,3 +147,45 @@ class ProtocolGuideAPIHandler(BaseKnowledgeBaseAPIHandler):
                 'success': False,
                 'error': f'服務器錯誤: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    @classmethod
+    def handle_chat_stream_api(cls, request):
+        """
+        處理知識庫聊天 API 的 streaming 版本（Server-Sent Events）
+        
+        與 handle_chat_api 使用相同的智能搜尋路由，Dify 的回答片段到達即轉送給前端，
+        不確定檢測與對話記錄在串流結束後以完整回答進行。
+        
+        Args:
+            request: Django request 對象
+            
+        Returns:
+            StreamingHttpResponse: text/event-stream
+        """
+        from library.dify_integration.stream_relay import sse_response
+        import logging
+        
+        logger = logging.getLogger(__name__)
+        
+        data = request.data
+        message = data.get('message', '').strip()
+        conversation_id = data.get('conversation_id', '')
+        
+        if not message:
+            return sse_response([{'event': 'error', 'error': '訊息內容不能為空'}], status=400)
+        
+        user_id = f"protocol_guide_user_{request.user.id if request.user.is_authenticated else 'guest'}"
+        
+        logger.info(f"📩 Protocol Guide Chat Stream Request")
+        logger.info(f"   Message: {message[:50]}...")
+        logger.info(f"   Conversation ID: {conversation_id if conversation_id else 'New'}")
+        
+        from .smart_search_router import SmartSearchRouter
+        
+        router = SmartSearchRouter()
+        return sse_response(router.stream_smart_search(
+            user_query=message,
+            conversation_id=conversation_id,
+            user_id=user_id,
+            request=request
+        ))
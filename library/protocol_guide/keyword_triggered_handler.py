@@ -18,9 +18,12 @@ Updated: 2025-11-13 (改用 search_mode 參數，取代查詢重寫)
 
 import logging
 import time
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
 
 from library.dify_integration.chat_client import DifyChatClient
+from library.dify_integration.stream_relay import (
+    FALLBACK_SUFFIX, StreamAccumulator, build_stream_result, relay_answer
+)
 from library.config.dify_config_manager import get_protocol_guide_config
 from library.common.ai_response import is_uncertain_response  # ✅ 移除 format_fallback_response
 
@@ -162,13 +165,7 @@ class ProtocolGuideKeywordTriggeredHandler:
             # 注意：Dify 不會將 inputs 參數傳遞給外部知識庫 API
             # 所以必須使用查詢字串中的特殊標記來觸發全文搜尋
             # 與模式 B Stage 2 保持一致的行為
-            full_search_query = f"{query} __FULL_SEARCH__"
-            logger.info(f"   🏷️ Mode A 查詢（含標記）: {full_search_query}")
-            
-            inputs = {
-                'search_mode': 'document_only',  # ← 保留作為備用機制
-                'require_detailed_answer': 'true'
-            }
+            full_search_query, inputs = self._full_search_request(query)
             
             # 使用 DifyChatClient
             response = self.dify_client.chat(
@@ -184,6 +181,69 @@ class ProtocolGuideKeywordTriggeredHandler:
         except Exception as e:
             logger.error(f"❌ Protocol Dify 請求失敗: {str(e)}", exc_info=True)
             raise
+    
+    @staticmethod
+    def _full_search_request(query: str):
+        """Mode A 的查詢（含 __FULL_SEARCH__ 標記）與 inputs"""
+        full_search_query = f"{query} __FULL_SEARCH__"
+        logger.info(f"   🏷️ Mode A 查詢（含標記）: {full_search_query}")
+        
+        inputs = {
+            'search_mode': 'document_only',  # ← 保留作為備用機制
+            'require_detailed_answer': 'true'
+        }
+        return full_search_query, inputs
+    
+    def stream_keyword_triggered_search(
+        self,
+        user_query: str,
+        conversation_id: str,
+        user_id: str,
+        **kwargs
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        關鍵字優先全文搜尋的 streaming 版本
+        
+        片段到達即轉送；串流結束後以完整回答檢測不確定，不確定時補上降級提示。
+        最後送出 message_end，內容與 handle_keyword_triggered_search 的回傳格式相同。
+        
+        Yields:
+            Dict: 前端事件（見 library.dify_integration.stream_relay）
+        """
+        start_time = time.time()
+        logger.info(f"📋 模式 A: 關鍵字優先全文搜尋（streaming）")
+        
+        full_search_query, inputs = self._full_search_request(user_query)
+        accumulator = StreamAccumulator(start_time)
+        yield from relay_answer(
+            self.dify_client.stream_chat_events(
+                question=full_search_query,
+                conversation_id=conversation_id if conversation_id else "",
+                user=user_id,
+                inputs=inputs
+            ),
+            accumulator
+        )
+        accumulator.raise_for_error()
+        
+        is_uncertain, matched_keyword = is_uncertain_response(accumulator.answer)
+        if not is_uncertain:
+            logger.info(f"   ✅ AI 回答確定（首字 {accumulator.first_token_time or 0:.2f} 秒）")
+            yield {'event': 'message_end', **build_stream_result(
+                accumulator, conversation_id, start_time, mode='mode_a', is_fallback=False
+            )}
+            return
+        
+        # 降級模式：AI 原始回答 + 友善提示
+        logger.info(f"   ⚠️ AI 回答不確定 (含關鍵字: {matched_keyword})，進入降級模式")
+        yield {'event': 'message', 'answer': FALLBACK_SUFFIX}
+        yield {'event': 'message_end', **build_stream_result(
+            accumulator, conversation_id, start_time,
+            answer=f"{accumulator.answer.strip()}{FALLBACK_SUFFIX}",
+            mode='mode_a',
+            is_fallback=True,
+            fallback_reason=f'AI 回答不確定 (含: {matched_keyword})'
+        )}
 
 
 # ✅ 向後兼容：提供舊名稱的別名
@@ -16,6 +16,9 @@ Protocol Guide 搜索服務
 """
 
 from library.common.knowledge_base import BaseKnowledgeBaseSearchService
+from library.common.stage_timing import (
+    stage as timed_stage, QUERY_CLEANING, KEYWORD_SEARCH, RRF_MERGE, TITLE_BOOST, DOCUMENT_EXPANSION
+)
 from api.models import ProtocolGuide
 from django.db import connection
 import logging
@@ -478,7 +481,8 @@ class ProtocolGuideSearchService(BaseKnowledgeBaseSearchService):
                         'document_title': document_title,
                         'rank': rank,
                         'match_count': match_count,
-                        'matched_keywords': matched_keywords
+                        'matched_keywords': matched_keywords,
+                        'scan_order': len(results)  # 資料庫回傳順序（排序前），供參數掃描重現 LIMIT
                     })
                 
                 # 🆕 按 match_count 降序排序（匹配越多越前面）
@@ -756,7 +760,8 @@ class ProtocolGuideSearchService(BaseKnowledgeBaseSearchService):
                 logger.info(f"🔄 混合搜尋已啟用 (Stage {stage}): RRF k={rrf_k}")
         
         # 步驟 1: 分類查詢 + 清理關鍵字
-        query_type, cleaned_query = self._classify_and_clean_query(query)
+        with timed_stage(QUERY_CLEANING):
+            query_type, cleaned_query = self._classify_and_clean_query(query)
         
         # 🆕 步驟 1.5: 檢查混合搜尋模式（v1.2.2）+ 初始化算分日誌
         scoring_logger = None
@@ -813,10 +818,11 @@ class ProtocolGuideSearchService(BaseKnowledgeBaseSearchService):
                 
                 # 步驟 B: 關鍵字搜尋
                 logger.info("📍 步驟 2/3: 執行關鍵字搜尋")
-                keyword_results = self._keyword_search(
-                    query=cleaned_query,
-                    limit=limit * 2
-                )
+                with timed_stage(KEYWORD_SEARCH):
+                    keyword_results = self._keyword_search(
+                        query=cleaned_query,
+                        limit=limit * 2
+                    )
                 logger.info(f"✅ 關鍵字搜尋完成: {len(keyword_results)} 個結果")
                 
                 # 記錄關鍵字搜尋結果（傳入分詞後的關鍵字）
@@ -826,11 +832,12 @@ class ProtocolGuideSearchService(BaseKnowledgeBaseSearchService):
                 
                 # 步驟 C: RRF 融合
                 logger.info(f"📍 步驟 3/6: RRF 融合 (k={rrf_k})")
-                results = self._merge_with_rrf(
-                    vector_results=vector_results,
-                    keyword_results=keyword_results,
-                    k=rrf_k
-                )
+                with timed_stage(RRF_MERGE):
+                    results = self._merge_with_rrf(
+                        vector_results=vector_results,
+                        keyword_results=keyword_results,
+                        k=rrf_k
+                    )
                 logger.info(f"✅ RRF 融合完成: {len(results)} 個結果")
                 
                 # 記錄 RRF 融合結果
@@ -846,7 +853,8 @@ class ProtocolGuideSearchService(BaseKnowledgeBaseSearchService):
                     min_score = min(rrf_scores) if rrf_scores else 0
                     max_score = max(rrf_scores) if rrf_scores else 0
                 
-                results = self._normalize_rrf_scores(results)
+                with timed_stage(RRF_MERGE):
+                    results = self._normalize_rrf_scores(results)
                 highest_score = results[0]['score'] if results else 0
                 logger.info(f"✅ 分數正規化完成: 最高分={highest_score:.4f}")
                 
@@ -860,7 +868,11 @@ class ProtocolGuideSearchService(BaseKnowledgeBaseSearchService):
                         from library.common.knowledge_base.title_boost import TitleBoostConfig, TitleBoostProcessor
                         
                         rag_settings = version_config.get('rag_settings', {})
-                        title_boost_config = TitleBoostConfig.from_rag_settings(rag_settings, stage=stage)
+                        # 版本快取（VersionedConfigCache）已預先解析並驗證，否則即時解析
+                        title_boost_config = (
+                            (version_config.get('title_boost') or {}).get(stage)
+                            or TitleBoostConfig.from_rag_settings(rag_settings, stage=stage)
+                        )
                         enable_title_boost = title_boost_config.get('enabled', False)
                         
                         if enable_title_boost and results:
@@ -873,11 +885,12 @@ class ProtocolGuideSearchService(BaseKnowledgeBaseSearchService):
                             )
                             
                             # ✅ 修正：正確的參數名稱是 vector_results，不是 results
-                            results = processor.apply_title_boost(
-                                query=cleaned_query,
-                                vector_results=results,
-                                title_field='title'
-                            )
+                            with timed_stage(TITLE_BOOST):
+                                results = processor.apply_title_boost(
+                                    query=cleaned_query,
+                                    vector_results=results,
+                                    title_field='title'
+                                )
                             
                             boosted_count = sum(1 for r in results if r.get('title_boost_applied', False))
                             logger.info(f"✅ Title Boost 完成: {boosted_count}/{len(results)} 個結果獲得加分")
@@ -903,7 +916,8 @@ class ProtocolGuideSearchService(BaseKnowledgeBaseSearchService):
                 # 如果是文檔級查詢，擴展為完整文檔
                 if query_type == 'document' and results:
                     logger.info(f"🔄 將 {len(results)} 個混合搜尋結果擴展為完整文檔")
-                    results = self._expand_to_full_document(results)
+                    with timed_stage(DOCUMENT_EXPANSION):
+                        results = self._expand_to_full_document(results)
                 
                 # 記錄搜尋完成
                 if scoring_logger:
@@ -929,7 +943,11 @@ class ProtocolGuideSearchService(BaseKnowledgeBaseSearchService):
                 from library.common.knowledge_base.title_boost import TitleBoostConfig
                 
                 rag_settings = version_config.get('rag_settings', {})
-                title_boost_config = TitleBoostConfig.from_rag_settings(rag_settings, stage=stage)
+                # 版本快取（VersionedConfigCache）已預先解析並驗證，否則即時解析
+                title_boost_config = (
+                    (version_config.get('title_boost') or {}).get(stage)
+                    or TitleBoostConfig.from_rag_settings(rag_settings, stage=stage)
+                )
                 enable_title_boost = title_boost_config.get('enabled', False)
                 
                 if enable_title_boost:
@@ -958,7 +976,8 @@ class ProtocolGuideSearchService(BaseKnowledgeBaseSearchService):
             # 擴展為完整文檔
             if results:
                 logger.info(f"🔄 將 {len(results)} 個關鍵字搜尋結果擴展為完整文檔")
-                results = self._expand_to_full_document(results)
+                with timed_stage(DOCUMENT_EXPANSION):
+                    results = self._expand_to_full_document(results)
             
             return results
         
@@ -991,11 +1010,12 @@ class ProtocolGuideSearchService(BaseKnowledgeBaseSearchService):
                     min_keyword_length=title_boost_config.get('min_keyword_length', 2)
                 )
                 
-                boosted_results = processor.apply_title_boost(
-                    query=cleaned_query,
-                    vector_results=section_results,
-                    title_field='title'
-                )
+                with timed_stage(TITLE_BOOST):
+                    boosted_results = processor.apply_title_boost(
+                        query=cleaned_query,
+                        vector_results=section_results,
+                        title_field='title'
+                    )
                 
                 # 統計資訊
                 boosted_count = sum(1 for r in boosted_results if r.get('title_boost_applied', False))
@@ -1070,7 +1090,8 @@ class ProtocolGuideSearchService(BaseKnowledgeBaseSearchService):
         # 步驟 3: 如果是文檔級查詢，擴展為完整文檔
         if query_type == 'document' and results:
             logger.info(f"🔄 將 {len(results)} 個 section 結果擴展為完整文檔")
-            results = self._expand_to_full_document(results)
+            with timed_stage(DOCUMENT_EXPANSION):
+                results = self._expand_to_full_document(results)
         
         return results
     
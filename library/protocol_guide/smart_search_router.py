@@ -10,7 +10,7 @@ Date: 2025-11-11
 """
 
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Iterator
 
 # 導入關鍵字檢測器
 from library.common.query_analysis import contains_full_document_keywords
@@ -134,6 +134,55 @@ class SmartSearchRouter:
                 'error': str(e),
             }
     
+    def stream_smart_search(
+        self,
+        user_query: str,
+        conversation_id: str,
+        user_id: str,
+        **kwargs
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        智能搜尋的 streaming 版本
+        
+        路由方式與 handle_smart_search 相同，Dify 的回答片段到達即轉送；
+        送出 message_end 後以組裝好的完整結果記錄對話。
+        
+        Yields:
+            Dict: 前端事件（見 library.dify_integration.stream_relay）
+        """
+        search_mode = self.route_search_strategy(user_query)
+        
+        try:
+            if search_mode == 'mode_a':
+                events = self.mode_a_handler.stream_keyword_triggered_search(
+                    user_query=user_query,
+                    conversation_id=conversation_id,
+                    user_id=user_id,
+                    **kwargs
+                )
+            else:
+                events = self.mode_b_handler.stream_two_tier_search(
+                    user_query=user_query,
+                    conversation_id=conversation_id,
+                    user_id=user_id,
+                    **kwargs
+                )
+            
+            for event in events:
+                yield event
+                if event.get('event') == 'message_end':
+                    result = {key: value for key, value in event.items() if key != 'event'}
+                    self._record_conversation(
+                        user_query=user_query,
+                        conversation_id=conversation_id,
+                        result=result,
+                        kwargs=kwargs
+                    )
+        
+        except Exception as e:
+            logger.error(f"❌ 智能搜尋串流失敗: {str(e)}", exc_info=True)
+            yield {'event': 'error', 'error': str(e)}
+    
     def _record_conversation(
         self,
         user_query: str,
@@ -170,19 +219,6 @@ class SmartSearchRouter:
                 logger.info("搜尋失敗，跳過對話記錄")
                 return
             
-            # 先確保會話存在並設置正確的 chat_type
-            from library.conversation_management import get_or_create_session
-            
-            session_result = get_or_create_session(
-                request=request,
-                session_id=result.get('conversation_id', conversation_id),
-                chat_type='protocol_assistant_chat'  # ⚠️ 重要！指定正確的類型
-            )
-            
-            if not session_result.get('success'):
-                logger.warning(f"⚠️ 無法建立會話: {session_result.get('error')}")
-                return
-            
             # 記錄完整的對話交互
             conversation_result = record_complete_exchange(
                 request=request,
@@ -200,7 +236,9 @@ class SmartSearchRouter:
                     'dify_metadata': result.get('metadata', {}),
                     'workspace': 'Protocol_Guide',
                     'app_name': 'Protocol Assistant'
-                }
+                },
+                chat_type='protocol_assistant_chat',  # ⚠️ 重要！指定正確的類型
+                defer=True  # 延後寫入，不計入回應延遲
             )
             
             if conversation_result.get('success'):
@@ -23,11 +23,15 @@ Updated: 2025-11-13 (使用顯式 search_mode 參數，取代查詢重寫)
 
 import logging
 import time
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
 
 from library.dify_integration.chat_client import DifyChatClient
+from library.dify_integration.stream_relay import (
+    FALLBACK_SUFFIX, StreamAccumulator, build_stream_result, relay_answer
+)
 from library.config.dify_config_manager import get_protocol_guide_config
 from library.common.ai_response import is_uncertain_response  # ✅ 移除 format_fallback_response
+from library.common.ai_response.speculation import SpeculativeStage, StagePredictor, speculation_enabled
 
 logger = logging.getLogger(__name__)
 
@@ -44,8 +48,17 @@ class TwoTierSearchHandler:
     - 不再執行 Protocol Assistant 向量搜尋
     - 不再使用查詢重寫（添加「完整」關鍵字）
     - 引用來源來自 Dify 的 metadata.retriever_resources
+    
+    推測執行（TWO_TIER_SPECULATION=true）：
+    - Stage 1 進行時於背景預測是否需要 Stage 2，需要時立即送出 Stage 2
+    - Stage 1 確定時中止 Stage 2；不確定時直接使用已在進行的 Stage 2
+    - 只在新對話（尚無 conversation_id）推測：推測的 Stage 2 另開一個 Dify 對話，
+      中止時不會在用戶的對話留下中斷的一輪；既有對話的 Stage 2 需要先前的上下文，依序執行
     """
     
+    # Stage 2 需求預測（歷史與命中統計跨請求共用）
+    stage_predictor = StagePredictor('protocol_guide')
+    
     def __init__(self):
         """初始化處理器"""
         # Dify 客戶端（延遲加載）
@@ -87,7 +100,11 @@ class TwoTierSearchHandler:
         logger.info(f"🔄 模式 B: 兩階段搜尋（方案 B）")
         logger.info(f"   查詢: {user_query[:50]}...")
         
+        speculation = None
         try:
+            if speculation_enabled() and not conversation_id:
+                speculation = self._start_speculation(user_query, user_id)
+            
             # === 階段 1：段落級搜尋 ===
             logger.info(f"   階段 1: 發送原查詢給 Dify（段落級搜尋）...")
             
@@ -104,6 +121,9 @@ class TwoTierSearchHandler:
             # 檢測 AI 回答是否不確定
             is_stage_1_uncertain, stage_1_keyword = is_uncertain_response(stage_1_answer)
             
+            # 推測執行：確定時中止 Stage 2，不確定時取用已在進行的 Stage 2
+            speculative_response = speculation.resolve(needed=is_stage_1_uncertain) if speculation else None
+            
             if not is_stage_1_uncertain:
                 # 階段 1 回答確定，直接返回
                 logger.info(f"   ✅ 階段 1 回答確定")
@@ -133,12 +153,16 @@ class TwoTierSearchHandler:
             stage_2_query = f"{user_query} __FULL_SEARCH__"
             logger.info(f"   🏷️ Stage 2 查詢（含標記）: {stage_2_query}")
             
-            stage_2_response = self._request_dify_chat(
-                query=stage_2_query,
-                conversation_id=conversation_id,
-                user_id=user_id,
-                is_full_search=True  # Stage 2 = 全文搜尋
-            )
+            if speculative_response is not None:
+                logger.info(f"   ⚡ 使用推測執行的 Stage 2 回應")
+                stage_2_response = speculative_response
+            else:
+                stage_2_response = self._request_dify_chat(
+                    query=stage_2_query,
+                    conversation_id=conversation_id,
+                    user_id=user_id,
+                    is_full_search=True  # Stage 2 = 全文搜尋
+                )
             
             stage_2_answer = stage_2_response.get('answer', '')
             
@@ -187,8 +211,38 @@ class TwoTierSearchHandler:
         
         except Exception as e:
             logger.error(f"❌ 模式 B 處理失敗: {str(e)}", exc_info=True)
+            if speculation:
+                speculation.cancel()
             raise
     
+    def _start_speculation(self, user_query: str, user_id: str) -> SpeculativeStage:
+        """
+        在背景預測並推測送出 Stage 2（不延遲 Stage 1）
+        
+        預測依據：查詢類型、段落搜尋最高分、相似查詢的歷史不確定率
+        （見 library.common.ai_response.speculation）
+        
+        Stage 2 以空的 conversation_id 送出（另開對話），與 Stage 1 的對話互不影響。
+        """
+        from library.common.knowledge_base.service_registry import get_search_service
+        
+        search_service = get_search_service('protocol_guide')
+        query_type, cleaned_query = search_service._classify_and_clean_query(user_query)
+        dify_client = self.dify_client
+        
+        def section_score():
+            results = search_service.section_search(user_query, top_k=1, threshold=0.0)
+            return results[0]['similarity'] if results else 0.0
+        
+        return SpeculativeStage(
+            self.stage_predictor, query_type, cleaned_query,
+            stream=lambda: self._stream_dify_chat(
+                f"{user_query} __FULL_SEARCH__", "", user_id, is_full_search=True
+            ),
+            stop=lambda task_id: dify_client.stop_message(task_id, user=user_id),
+            section_score=section_score
+        ).start()
+    
     def _request_dify_chat(
         self,
         query: str,
@@ -220,19 +274,7 @@ class TwoTierSearchHandler:
             # 保持原查詢不變
             rewritten_query = query
             
-            if is_full_search:
-                # Stage 2：通過 inputs 傳遞文檔搜索模式
-                logger.info(f"   📝 Stage 2: 使用文檔搜索模式 (search_mode='document_only')")
-                inputs = {
-                    'search_mode': 'document_only',  # ← 顯式指定文檔搜索
-                    'require_detailed_answer': 'true'
-                }
-            else:
-                # Stage 1：使用自動模式（段落優先）
-                logger.info(f"   📝 Stage 1: 使用自動搜索模式 (search_mode='auto')")
-                inputs = {
-                    'search_mode': 'auto'
-                }
+            inputs = self._search_inputs(is_full_search)
             
             # 使用 DifyChatClient
             response = self.dify_client.chat(
@@ -248,3 +290,108 @@ class TwoTierSearchHandler:
         except Exception as e:
             logger.error(f"❌ Protocol Dify 請求失敗: {str(e)}", exc_info=True)
             raise
+    
+    @staticmethod
+    def _search_inputs(is_full_search: bool) -> Dict[str, Any]:
+        """Stage 1 段落搜尋 / Stage 2 文檔搜尋的 Dify inputs"""
+        if is_full_search:
+            # Stage 2：通過 inputs 傳遞文檔搜索模式
+            logger.info(f"   📝 Stage 2: 使用文檔搜索模式 (search_mode='document_only')")
+            return {
+                'search_mode': 'document_only',  # ← 顯式指定文檔搜索
+                'require_detailed_answer': 'true'
+            }
+        # Stage 1：使用自動模式（段落優先）
+        logger.info(f"   📝 Stage 1: 使用自動搜索模式 (search_mode='auto')")
+        return {
+            'search_mode': 'auto'
+        }
+    
+    # ------------------------------------------------------------
+    # Streaming（SSE 轉送）
+    # ------------------------------------------------------------
+    
+    def stream_two_tier_search(
+        self,
+        user_query: str,
+        conversation_id: str,
+        user_id: str,
+        **kwargs
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        兩階段搜尋的 streaming 版本
+        
+        Stage 1 的片段到達即轉送；串流結束後以組裝好的完整回答檢測不確定，
+        不確定時送出 stage_retry（前端清除已顯示內容）再轉送 Stage 2。
+        最後送出 message_end，內容與 handle_two_tier_search 的回傳格式相同。
+        
+        Yields:
+            Dict: 前端事件（見 library.dify_integration.stream_relay）
+        """
+        start_time = time.time()
+        logger.info(f"🔄 模式 B: 兩階段搜尋（streaming）")
+        
+        # === 階段 1：段落級搜尋 ===
+        stage_1 = StreamAccumulator(start_time)
+        yield from relay_answer(
+            self._stream_dify_chat(user_query, conversation_id, user_id, is_full_search=False),
+            stage_1, stage=1
+        )
+        stage_1.raise_for_error()
+        
+        is_stage_1_uncertain, stage_1_keyword = is_uncertain_response(stage_1.answer)
+        if not is_stage_1_uncertain:
+            logger.info(f"   ✅ 階段 1 回答確定（首字 {stage_1.first_token_time or 0:.2f} 秒）")
+            yield {'event': 'message_end', **build_stream_result(
+                stage_1, conversation_id, start_time, mode='mode_b', stage=1, is_fallback=False
+            )}
+            return
+        
+        # === 階段 2：全文級搜尋 ===
+        logger.info(f"   ⚠️ 階段 1 回答不確定 (含關鍵字: {stage_1_keyword})，進入階段 2")
+        yield {'event': 'stage_retry', 'stage': 2, 'reason': f'階段 1 AI 回答不確定 (含: {stage_1_keyword})'}
+        
+        # 與 blocking 模式相同：以查詢字串中的標記觸發外部知識庫全文搜尋
+        stage_2_query = f"{user_query} __FULL_SEARCH__"
+        stage_2 = StreamAccumulator(start_time)
+        yield from relay_answer(
+            self._stream_dify_chat(stage_2_query, conversation_id, user_id, is_full_search=True),
+            stage_2, stage=2
+        )
+        stage_2.raise_for_error()
+        
+        is_stage_2_uncertain, stage_2_keyword = is_uncertain_response(stage_2.answer)
+        result_fields = {'mode': 'mode_b', 'stage': 2, 'first_token_time': stage_1.first_token_time}
+        if not is_stage_2_uncertain:
+            logger.info(f"   ✅ 階段 2 回答確定")
+            yield {'event': 'message_end', **build_stream_result(
+                stage_2, conversation_id, start_time, is_fallback=False, **result_fields
+            )}
+            return
+        
+        # 階段 2 仍不確定：降級模式（AI 原始回答 + 友善提示）
+        logger.info(f"   ⚠️ 階段 2 回答不確定 (含關鍵字: {stage_2_keyword})，進入降級模式")
+        yield {'event': 'message', 'answer': FALLBACK_SUFFIX, 'stage': 2}
+        yield {'event': 'message_end', **build_stream_result(
+            stage_2, conversation_id, start_time,
+            answer=f"{stage_2.answer.strip()}{FALLBACK_SUFFIX}",
+            is_fallback=True,
+            fallback_reason=f'階段 2 AI 回答不確定 (含: {stage_2_keyword})',
+            **result_fields
+        )}
+    
+    def _stream_dify_chat(
+        self,
+        query: str,
+        conversation_id: str,
+        user_id: str,
+        is_full_search: bool = False
+    ) -> Iterator[Dict[str, Any]]:
+        """以 streaming 請求 Dify AI 回答（inputs 與 _request_dify_chat 相同）"""
+        return self.dify_client.stream_chat_events(
+            question=query,
+            conversation_id=conversation_id if conversation_id else "",
+            user=user_id,
+            inputs=self._search_inputs(is_full_search)
+        )
+
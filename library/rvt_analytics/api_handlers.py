@@ -15,9 +15,6 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
-from django.utils import timezone
-from datetime import timedelta
-from collections import Counter
 
 logger = logging.getLogger(__name__)
 
@@ -82,10 +79,26 @@ def get_smart_analysis(days=7):
         # 出錯時回退到頻率模式
         return get_raw_frequency_analysis(days)
 
+def _frequency_category(question):
+    """頻率模式的簡單關鍵詞分類"""
+    question = question.lower()
+    if 'ucc' in question:
+        return 'UCC相關'
+    elif 'rvt' in question:
+        return 'RVT相關'
+    elif 'hello' in question or 'hi' in question:
+        return '問候語'
+    elif any(keyword in question for keyword in ['error', 'fail', 'exception']):
+        return '錯誤問題'
+    return '其他'
+
 def get_raw_frequency_analysis(days=7):
     """
     獲取原始問題頻率分析（不經過聚類）
     
+    以串流方式掃描用戶問題，熱門問題使用 Space-Saving 草圖（固定記憶體），
+    結果依天數快取。
+    
     Args:
         days: 分析天數
         
@@ -93,60 +106,37 @@ def get_raw_frequency_analysis(days=7):
         Dict: 包含熱門問題的原始頻率統計
     """
     try:
-        from api.models import ChatMessage
-        
-        # 獲取指定天數內的用戶問題
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=days)
-        
-        recent_messages = ChatMessage.objects.filter(
-            role='user',
-            created_at__gte=start_date
+        from library.common.analytics.question_stream import (
+            QuestionStreamStats, cached_question_stats, iter_user_questions
         )
         
-        # 統計問題頻率
-        question_counts = Counter(recent_messages.values_list('content', flat=True))
-        
-        # 生成熱門問題列表
-        popular_questions = []
-        for i, (question, count) in enumerate(question_counts.most_common(20)):
-            popular_questions.append({
-                'rank': i + 1,
-                'question': question,
-                'pattern': question,  # 在頻率模式下，問題就是模式
-                'count': count,
-                'is_vector_based': False,  # 標記為非向量分析
-                'analysis_mode': 'frequency',  # 分析模式標記
-                'examples': [question]  # 例子就是問題本身
-            })
-        
-        # 統計總問題數和分類
-        total_questions = recent_messages.count()
+        def build():
+            stats = QuestionStreamStats(classify=_frequency_category, extract_keywords=False)
+            stats.consume(iter_user_questions('rvt_assistant', days))
+            
+            # 生成熱門問題列表
+            popular_questions = []
+            for i, (question, count) in enumerate(stats.popular_questions(20)):
+                popular_questions.append({
+                    'rank': i + 1,
+                    'question': question,
+                    'pattern': question,  # 在頻率模式下，問題就是模式
+                    'count': count,
+                    'is_vector_based': False,  # 標記為非向量分析
+                    'analysis_mode': 'frequency',  # 分析模式標記
+                    'examples': [question]  # 例子就是問題本身
+                })
+            
+            return {
+                'total_questions': stats.total_questions,
+                'popular_questions': popular_questions,
+                'category_distribution': dict(stats.categories),
+                'analysis_method': 'raw_frequency',
+                'is_vector_enhanced': False,
+                'period': f'最近{days}天'
+            }
         
-        # 簡單的關鍵詞分類
-        category_distribution = {}
-        for question, count in question_counts.items():
-            if 'ucc' in question.lower():
-                category = 'UCC相關'
-            elif 'rvt' in question.lower():
-                category = 'RVT相關'
-            elif 'hello' in question.lower() or 'hi' in question.lower():
-                category = '問候語'
-            elif any(keyword in question.lower() for keyword in ['error', 'fail', 'exception']):
-                category = '錯誤問題'
-            else:
-                category = '其他'
-                
-            category_distribution[category] = category_distribution.get(category, 0) + count
-        
-        return {
-            'total_questions': total_questions,
-            'popular_questions': popular_questions,
-            'category_distribution': category_distribution,
-            'analysis_method': 'raw_frequency',
-            'is_vector_enhanced': False,
-            'period': f'最近{days}天'
-        }
+        return cached_question_stats(['rvt_assistant', 'raw_frequency', days], build)
         
     except Exception as e:
         logger.error(f"Raw frequency analysis error: {str(e)}")
@@ -424,21 +414,24 @@ class RVTAnalyticsAPIHandler:
                     'error': '此功能僅限管理員使用'
                 }, status=403)
             
-            # 獲取滿意度分析
-            from .satisfaction_analyzer import analyze_user_satisfaction
-            satisfaction_data = analyze_user_satisfaction(days=days)
-            
-            # 如果不需要詳細信息，只返回基礎統計
+            # 如果不需要詳細信息，只返回基礎統計（讀取每日彙總）
             if not include_detail:
-                basic_stats = satisfaction_data.get('basic_stats', {})
+                from library.common.analytics.daily_rollup import (
+                    get_daily_rollup_service, satisfaction_from_totals
+                )
+                totals = get_daily_rollup_service().get_totals('rvt_assistant', days)
                 return JsonResponse({
                     'success': True,
                     'data': {
-                        'basic_stats': basic_stats,
-                        'analysis_period': satisfaction_data.get('analysis_period')
+                        'basic_stats': satisfaction_from_totals(totals)['basic_stats'],
+                        'analysis_period': f'{days} 天'
                     }
                 }, status=200)
-            
+
+            # 詳細分析（含問題類型滿意度，需逐則分析訊息）
+            from .satisfaction_analyzer import analyze_user_satisfaction
+            satisfaction_data = analyze_user_satisfaction(days=days)
+
             return JsonResponse({
                 'success': True,
                 'data': satisfaction_data
@@ -0,0 +1,373 @@
+"""
+Category Prototypes - 問題分類原型向量（向量分類用）
+
+原本的向量分類每次都要嵌入問題、對整張 chat_message_embeddings_1024 做相似度搜索，
+再對鄰居投票；批量預計算時逐筆重複。此模組改為「類別原型」分類：
+- 每個類別一個原型向量（已標記消息的平均向量；不足時使用已標記聚類質心）
+- 原型矩陣（類別數 × 1024）保存在行程記憶體（TTL 快取），
+  由排程任務重算後寫入 Django 快取，各 worker 過期時重新載入
+- 單筆分類 = 一次 embedding + 一次小型矩陣乘法
+- 批量分類直接使用已存的向量，不需重新 embedding
+
+標記來源：chat_message_embeddings_1024.predicted_category，
+或 chat_messages.question_category（人工標記）。
+尚無任何原型時，批量分類以規則分類為未標記消息產生初始標記。
+"""
+
+import logging
+import time
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from django.core.cache import cache
+from django.db import connection
+
+from library.common.vector_bulk_reader import VectorBulkReader, to_float32_vector
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_TABLE = 'chat_message_embeddings_1024'
+CENTROID_TABLE = 'chat_cluster_centroids'
+
+# 共享快取（排程任務寫入，各 worker 讀取）
+PROTOTYPE_CACHE_KEY = 'question_classifier:prototypes'
+PROTOTYPE_CACHE_TIMEOUT = 2 * 24 * 3600
+# 行程記憶體快取存活時間（秒）
+PROTOTYPE_MEMORY_TTL = 300
+
+# 不作為原型的類別（規則分類的預設值）
+EXCLUDED_CATEGORIES = ('general', 'unknown')
+
+
+@dataclass
+class CategoryPrototypes:
+    """類別原型矩陣：categories 與 matrix 的列對齊（matrix 已 L2 正規化）"""
+
+    categories: List[str] = field(default_factory=list)
+    matrix: np.ndarray = field(default_factory=lambda: np.empty((0, 0), dtype=np.float32))
+    sample_counts: List[int] = field(default_factory=list)
+    built_at: float = 0.0
+
+    def __len__(self) -> int:
+        return len(self.categories)
+
+    def classify_matrix(self, vectors: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        批量分類（一次矩陣乘法）
+
+        Args:
+            vectors: (n, dim) 向量矩陣（不需預先正規化）
+
+        Returns:
+            每列的 {'category', 'similarity', 'margin', 'runner_up'}
+        """
+        if not len(self) or not len(vectors):
+            return []
+
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        similarities = (vectors / norms) @ self.matrix.T
+
+        if len(self) > 1:
+            # 只需前兩名：argpartition 比完整排序便宜
+            top2 = np.argpartition(-similarities, 1, axis=1)[:, :2]
+            top2_scores = np.take_along_axis(similarities, top2, axis=1)
+            order = np.argsort(-top2_scores, axis=1)
+            top2 = np.take_along_axis(top2, order, axis=1)
+            top2_scores = np.take_along_axis(top2_scores, order, axis=1)
+        else:
+            top2 = np.zeros((len(vectors), 1), dtype=np.int64)
+            top2_scores = similarities
+
+        results = []
+        for row_idx in range(len(vectors)):
+            best_score = float(top2_scores[row_idx, 0])
+            has_runner_up = top2.shape[1] > 1
+            results.append({
+                'category': self.categories[int(top2[row_idx, 0])],
+                'similarity': best_score,
+                'margin': best_score - float(top2_scores[row_idx, 1]) if has_runner_up else best_score,
+                'runner_up': self.categories[int(top2[row_idx, 1])] if has_runner_up else None,
+            })
+        return results
+
+
+def build_prototypes(labels: Sequence[str], vectors: np.ndarray,
+                     weights: Optional[Sequence[float]] = None) -> CategoryPrototypes:
+    """
+    由（類別, 向量）樣本計算原型：同類別向量加權平均後 L2 正規化
+
+    Args:
+        labels: 每列向量的類別
+        vectors: (n, dim) 向量矩陣；若已是類別平均向量，以 weights 傳入樣本數
+        weights: 每列權重（預設 1）
+    """
+    if not len(labels):
+        return CategoryPrototypes(built_at=time.time())
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    weights = np.ones(len(labels), dtype=np.float32) if weights is None \
+        else np.asarray(weights, dtype=np.float32)
+
+    categories = sorted(set(labels))
+    index = {category: idx for idx, category in enumerate(categories)}
+    rows = np.fromiter((index[label] for label in labels), dtype=np.int64, count=len(labels))
+
+    sums = np.zeros((len(categories), vectors.shape[1]), dtype=np.float32)
+    np.add.at(sums, rows, vectors * weights[:, None])
+    counts = np.bincount(rows, weights=weights, minlength=len(categories))
+
+    norms = np.linalg.norm(sums, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return CategoryPrototypes(
+        categories=categories,
+        matrix=sums / norms,
+        sample_counts=[int(count) for count in counts],
+        built_at=time.time(),
+    )
+
+
+class CategoryPrototypeIndex:
+    """
+    類別原型索引（Singleton 模式）
+
+    記憶體中的原型矩陣按 TTL 從共享快取重新載入；refresh() 由排程任務呼叫。
+    """
+
+    # 分類門檻：與最近原型的相似度低於此值視為無法判斷（交由規則分類）
+    MIN_SIMILARITY = 0.55
+    # 每個類別至少需要的標記樣本數
+    MIN_SAMPLES_PER_CATEGORY = 3
+
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """Singleton 模式實作"""
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        """初始化（只執行一次）"""
+        if self._initialized:
+            return
+
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self._cache_lock = Lock()
+        self._prototypes = CategoryPrototypes()
+        self._loaded_at = 0.0
+        self._embedding_service = None
+        self._initialized = True
+
+    # ------------------------------------------------------------------
+    # 原型建立 / 載入
+    # ------------------------------------------------------------------
+
+    def _labeled_means(self):
+        """已標記消息的類別平均向量（pgvector AVG 在資料庫端聚合）"""
+        placeholders = ', '.join(['%s'] * len(EXCLUDED_CATEGORIES))
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT label, AVG(embedding)::real[], COUNT(*)
+                FROM (
+                    SELECT COALESCE(ce.predicted_category, cm.question_category) AS label,
+                           ce.embedding
+                    FROM {EMBEDDING_TABLE} ce
+                    LEFT JOIN chat_messages cm ON cm.id = ce.chat_message_id
+                    WHERE ce.user_role = 'user' AND ce.embedding IS NOT NULL
+                ) labeled
+                WHERE label IS NOT NULL AND label NOT IN ({placeholders})
+                GROUP BY label
+                HAVING COUNT(*) >= %s
+            """, list(EXCLUDED_CATEGORIES) + [self.MIN_SAMPLES_PER_CATEGORY])
+            return cursor.fetchall()
+
+    def _labeled_centroids(self):
+        """已標記類別的聚類質心（以成員數加權）"""
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"""
+                    SELECT predicted_category, centroid::real[], GREATEST(member_count, 1)
+                    FROM {CENTROID_TABLE}
+                    WHERE predicted_category IS NOT NULL
+                """)
+                return cursor.fetchall()
+        except Exception as e:
+            self.logger.debug(f"讀取聚類質心失敗（略過）: {str(e)}")
+            return []
+
+    def compute_prototypes(self) -> CategoryPrototypes:
+        """從資料庫計算原型：標記消息優先，缺少的類別以聚類質心補足"""
+        rows = self._labeled_means()
+        covered = {row[0] for row in rows}
+        rows += [row for row in self._labeled_centroids()
+                 if row[0] not in covered and row[0] not in EXCLUDED_CATEGORIES]
+
+        if not rows:
+            return CategoryPrototypes(built_at=time.time())
+
+        return build_prototypes(
+            [row[0] for row in rows],
+            np.stack([to_float32_vector(row[1]) for row in rows]),
+            [row[2] for row in rows],
+        )
+
+    def refresh(self) -> Dict[str, Any]:
+        """重算原型並寫入共享快取（排程任務呼叫）"""
+        try:
+            prototypes = self.compute_prototypes()
+            cache.set(PROTOTYPE_CACHE_KEY, prototypes, PROTOTYPE_CACHE_TIMEOUT)
+            with self._cache_lock:
+                self._prototypes = prototypes
+                self._loaded_at = time.time()
+
+            self.logger.info(f"問題分類原型已更新: {len(prototypes)} 個類別")
+            return {
+                'success': True,
+                'categories': dict(zip(prototypes.categories, prototypes.sample_counts))
+            }
+        except Exception as e:
+            self.logger.error(f"更新問題分類原型失敗: {str(e)}")
+            return {'success': False, 'error': str(e)}
+
+    def get_prototypes(self) -> CategoryPrototypes:
+        """取得原型矩陣，過期時從共享快取重新載入"""
+        with self._cache_lock:
+            if time.time() - self._loaded_at < PROTOTYPE_MEMORY_TTL:
+                return self._prototypes
+
+            try:
+                cached = cache.get(PROTOTYPE_CACHE_KEY)
+                if cached is not None:
+                    self._prototypes = cached
+            except Exception as e:
+                self.logger.warning(f"載入問題分類原型失敗: {str(e)}")
+            self._loaded_at = time.time()
+            return self._prototypes
+
+    # ------------------------------------------------------------------
+    # 分類
+    # ------------------------------------------------------------------
+
+    def _get_embedding_service(self):
+        if self._embedding_service is None:
+            from api.services.embedding_service import get_embedding_service
+            self._embedding_service = get_embedding_service('ultra_high')  # 1024 維模型
+        return self._embedding_service
+
+    def _to_result(self, match: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if match['similarity'] < self.MIN_SIMILARITY:
+            return None
+        return {
+            'category': match['category'],
+            'confidence': min(0.95, match['similarity']),  # 最高信心度限制為 0.95
+            'method': 'vector_prototype',
+            'details': {
+                'similarity': match['similarity'],
+                'margin': match['margin'],
+                'runner_up': match['runner_up'],
+            }
+        }
+
+    def classify_vectors(self, vectors: np.ndarray) -> List[Optional[Dict[str, Any]]]:
+        """批量分類已有的向量；低於門檻的列為 None"""
+        prototypes = self.get_prototypes()
+        if not len(prototypes):
+            return [None] * len(vectors)
+        return [self._to_result(match) for match in prototypes.classify_matrix(vectors)]
+
+    def classify_texts(self, texts: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """批量分類文本（批量 embedding + 一次矩陣乘法）"""
+        if not texts or not len(self.get_prototypes()):
+            return [None] * len(texts)
+        embeddings = self._get_embedding_service().generate_embeddings_batch(texts)
+        return self.classify_vectors(np.asarray(embeddings, dtype=np.float32))
+
+    def classify_text(self, text: str) -> Optional[Dict[str, Any]]:
+        """分類單一文本"""
+        return self.classify_texts([text])[0]
+
+    # ------------------------------------------------------------------
+    # 批量標記（預計算任務）
+    # ------------------------------------------------------------------
+
+    def label_unclassified(self, rule_classifier=None) -> Dict[str, Any]:
+        """
+        為尚未分類的用戶問題向量寫入 predicted_category / confidence_score
+
+        有原型時使用已存向量批量分類；尚無原型時以 rule_classifier 產生初始標記，
+        供下一次 refresh() 建立原型。
+
+        Args:
+            rule_classifier: 具有 _rule_based_classify(text) 的分類器（初始標記用）
+        """
+        prototypes = self.get_prototypes()
+        reader = VectorBulkReader(
+            EMBEDDING_TABLE,
+            where="user_role = 'user' AND predicted_category IS NULL",
+            order_by='id'
+        )
+        processed = 0
+        labeled = 0
+
+        try:
+            if len(prototypes):
+                method = 'vector_prototype'
+                for ids, vectors in reader.iter_chunks():
+                    processed += len(ids)
+                    updates = [
+                        (result['category'], result['confidence'], int(embedding_id))
+                        for embedding_id, result in zip(ids, self.classify_vectors(vectors))
+                        if result
+                    ]
+                    labeled += self._write_labels(updates)
+            elif rule_classifier is not None:
+                method = 'rule_based_seed'
+                for id_chunk in reader.iter_ids():
+                    processed += len(id_chunk)
+                    texts = reader.fetch_metadata(id_chunk, ['text_content'])
+                    updates = []
+                    for embedding_id, meta in texts.items():
+                        result = rule_classifier._rule_based_classify(meta.get('text_content') or '')
+                        if result['category'] not in EXCLUDED_CATEGORIES:
+                            updates.append((result['category'], result['confidence'], embedding_id))
+                    labeled += self._write_labels(updates)
+            else:
+                return {'success': False, 'error': '尚無分類原型'}
+
+            self.logger.info(f"批量問題分類完成 ({method}): 處理 {processed} 筆，標記 {labeled} 筆")
+            return {'success': True, 'method': method, 'processed': processed, 'labeled': labeled}
+
+        except Exception as e:
+            self.logger.error(f"批量問題分類失敗: {str(e)}")
+            return {'success': False, 'error': str(e), 'processed': processed, 'labeled': labeled}
+
+    @staticmethod
+    def _write_labels(updates: List[tuple]) -> int:
+        if not updates:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.executemany(f"""
+                UPDATE {EMBEDDING_TABLE}
+                SET predicted_category = %s, confidence_score = %s, updated_at = NOW()
+                WHERE id = %s
+            """, updates)
+        return len(updates)
+
+
+# 便利函數
+def get_category_prototype_index() -> CategoryPrototypeIndex:
+    """獲取類別原型索引實例"""
+    return CategoryPrototypeIndex()
+
+
+def refresh_category_prototypes() -> Dict[str, Any]:
+    """重算問題分類原型便利函數"""
+    return get_category_prototype_index().refresh()
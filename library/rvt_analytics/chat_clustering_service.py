@@ -12,10 +12,12 @@ import logging
 import numpy as np
 from typing import List, Dict, Optional, Any, Tuple
 from django.db import connection, transaction
-from collections import Counter, defaultdict
+from collections import Counter
 import json
 import math
 
+from library.common.vector_bulk_reader import VectorBulkReader, VectorMatrix
+
 logger = logging.getLogger(__name__)
 
 class ChatClusteringService:
@@ -25,11 +27,46 @@ class ChatClusteringService:
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.min_cluster_size = min_cluster_size
         self.max_clusters = max_clusters
+        self._reader: Optional[VectorBulkReader] = None
+    
+    # 元數據欄位（向量之外的欄位按需查詢）
+    METADATA_COLUMNS = ['chat_message_id', 'conversation_id', 'text_content',
+                        'message_length', 'question_keywords', 'language_detected', 'created_at']
+    
+    def _get_reader(self, user_role: str = 'user', min_message_length: int = 5) -> VectorBulkReader:
+        """建立聊天向量批量讀取器"""
+        return VectorBulkReader(
+            'chat_message_embeddings_1024',
+            where="user_role = %s AND message_length >= %s",
+            params=[user_role, min_message_length],
+            order_by='created_at DESC'
+        )
+    
+    def get_vector_matrix(self, user_role: str = 'user',
+                          min_message_length: int = 5) -> Optional[VectorMatrix]:
+        """
+        獲取向量矩陣用於聚類（只讀取 id 與向量，元數據按需查詢）
+        
+        Args:
+            user_role: 用戶角色過濾
+            min_message_length: 最小消息長度過濾
+            
+        Returns:
+            VectorMatrix，失敗時返回 None
+        """
+        try:
+            self._reader = self._get_reader(user_role, min_message_length)
+            matrix = self._reader.read_matrix()
+            self.logger.info(f"獲取向量矩陣: {len(matrix)} 筆記錄")
+            return matrix
+        except Exception as e:
+            self.logger.error(f"獲取向量矩陣失敗: {str(e)}")
+            return None
     
     def get_vector_data(self, user_role: str = 'user', 
                        min_message_length: int = 5) -> List[Dict]:
         """
-        獲取向量數據用於聚類
+        獲取向量數據用於聚類（相容舊介面，包含完整元數據）
         
         Args:
             user_role: 用戶角色過濾
@@ -39,44 +76,32 @@ class ChatClusteringService:
             向量數據列表
         """
         try:
-            with connection.cursor() as cursor:
-                cursor.execute("""
-                    SELECT 
-                        id,
-                        chat_message_id,
-                        conversation_id,
-                        text_content,
-                        embedding,
-                        message_length,
-                        question_keywords,
-                        language_detected,
-                        created_at
-                    FROM chat_message_embeddings_1024
-                    WHERE user_role = %s
-                    AND message_length >= %s
-                    AND embedding IS NOT NULL
-                    ORDER BY created_at DESC
-                """, [user_role, min_message_length])
-                
-                columns = [col[0] for col in cursor.description]
-                results = []
-                
-                for row in cursor.fetchall():
-                    data = dict(zip(columns, row))
-                    # 轉換向量數據
-                    if data['embedding']:
-                        # PostgreSQL vector 類型轉換為 Python list
-                        embedding_str = data['embedding'].replace('[', '').replace(']', '')
-                        data['embedding'] = [float(x) for x in embedding_str.split(',')]
-                    results.append(data)
-                
-                self.logger.info(f"獲取向量數據: {len(results)} 筆記錄")
-                return results
+            matrix = self.get_vector_matrix(user_role, min_message_length)
+            if matrix is None or len(matrix) == 0:
+                return []
+            
+            metadata = self._reader.fetch_metadata(matrix.ids, self.METADATA_COLUMNS)
+            results = []
+            for vector_id, embedding in zip(matrix.ids.tolist(), matrix.vectors):
+                data = {'id': vector_id, 'embedding': embedding}
+                data.update(metadata.get(vector_id, {}))
+                results.append(data)
+            
+            self.logger.info(f"獲取向量數據: {len(results)} 筆記錄")
+            return results
                 
         except Exception as e:
             self.logger.error(f"獲取向量數據失敗: {str(e)}")
             return []
     
+    def _as_vector_matrix(self, vector_data) -> VectorMatrix:
+        """將舊格式的向量數據列表轉換為 VectorMatrix"""
+        if isinstance(vector_data, VectorMatrix):
+            return vector_data
+        ids = np.array([data.get('id', idx) for idx, data in enumerate(vector_data)], dtype=np.int64)
+        vectors = np.stack([np.asarray(data['embedding'], dtype=np.float32) for data in vector_data])
+        return VectorMatrix(ids=ids, vectors=vectors)
+    
     def cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
         """
         計算餘弦相似度
@@ -107,14 +132,21 @@ class ChatClusteringService:
             self.logger.error(f"計算相似度失敗: {str(e)}")
             return 0.0
     
-    def simple_kmeans_clustering(self, vector_data: List[Dict], 
+    @staticmethod
+    def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+        """L2 正規化（每列）"""
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+    
+    def simple_kmeans_clustering(self, vector_data, 
                                 k: Optional[int] = None,
                                 max_iterations: int = 100) -> Dict:
         """
-        簡化版 K-means 聚類
+        簡化版 K-means 聚類（餘弦距離，矩陣運算）
         
         Args:
-            vector_data: 向量數據
+            vector_data: VectorMatrix 或向量數據列表
             k: 聚類數量（None 則自動決定）
             max_iterations: 最大迭代次數
             
@@ -122,76 +154,66 @@ class ChatClusteringService:
             聚類結果
         """
         try:
-            if not vector_data:
+            if vector_data is None or len(vector_data) == 0:
                 return {'clusters': {}, 'centroids': {}, 'stats': {}}
             
-            # 提取向量
-            embeddings = [data['embedding'] for data in vector_data]
-            n_samples = len(embeddings)
+            matrix = self._as_vector_matrix(vector_data)
+            normalized = self._normalize_rows(matrix.vectors)
+            n_samples = len(matrix)
             
             # 自動決定 k 值
             if k is None:
                 k = min(self.max_clusters, max(2, int(math.sqrt(n_samples / 2))))
+            k = min(k, n_samples)
             
             self.logger.info(f"開始 K-means 聚類: 樣本數={n_samples}, k={k}")
             
             # 初始化質心（隨機選擇）
             np.random.seed(42)  # 固定隨機種子以確保結果可重現
-            centroids = [embeddings[i] for i in np.random.choice(n_samples, k, replace=False)]
+            centroids = matrix.vectors[np.random.choice(n_samples, k, replace=False)].copy()
             
-            clusters = {}
+            assignments = np.zeros(n_samples, dtype=np.int64)
             
             for iteration in range(max_iterations):
-                # 分配每個點到最近的質心
-                new_clusters = defaultdict(list)
-                
-                for idx, embedding in enumerate(embeddings):
-                    # 計算到各質心的距離
-                    distances = [
-                        1 - self.cosine_similarity(embedding, centroid)
-                        for centroid in centroids
-                    ]
-                    
-                    # 找到最近的質心
-                    closest_centroid = distances.index(min(distances))
-                    new_clusters[closest_centroid].append(idx)
+                # 分配每個點到最近的質心（餘弦相似度最大）
+                similarities = normalized @ self._normalize_rows(centroids).T
+                assignments = np.argmax(similarities, axis=1)
                 
                 # 更新質心
-                new_centroids = []
+                new_centroids = centroids.copy()
                 converged = True
                 
                 for cluster_id in range(k):
-                    if cluster_id in new_clusters and len(new_clusters[cluster_id]) > 0:
-                        # 計算新質心（平均向量）
-                        cluster_vectors = [embeddings[idx] for idx in new_clusters[cluster_id]]
-                        new_centroid = np.mean(cluster_vectors, axis=0).tolist()
-                        
-                        # 檢查是否收斂
-                        if (len(centroids) > cluster_id and 
-                            self.cosine_similarity(new_centroid, centroids[cluster_id]) < 0.99):
-                            converged = False
-                        
-                        new_centroids.append(new_centroid)
-                    else:
+                    members = assignments == cluster_id
+                    if not members.any():
                         # 空聚類，保持原質心
-                        if len(centroids) > cluster_id:
-                            new_centroids.append(centroids[cluster_id])
-                        else:
-                            new_centroids.append(embeddings[0])  # 預設值
+                        continue
+                    new_centroid = matrix.vectors[members].mean(axis=0)
+                    
+                    # 檢查是否收斂
+                    if self.cosine_similarity(new_centroid, centroids[cluster_id]) < 0.99:
+                        converged = False
+                    new_centroids[cluster_id] = new_centroid
                 
                 centroids = new_centroids
-                clusters = dict(new_clusters)
                 
                 if converged:
                     self.logger.info(f"K-means 收斂於第 {iteration + 1} 次迭代")
                     break
             
+            clusters = {
+                int(cluster_id): np.flatnonzero(assignments == cluster_id).tolist()
+                for cluster_id in np.unique(assignments)
+            }
+            centroid_list = centroids.tolist()
+            
             # 生成聚類統計
-            stats = self._calculate_cluster_stats(vector_data, clusters, centroids)
+            stats = self._calculate_cluster_stats(vector_data, clusters, centroid_list)
             
             return {
                 'clusters': clusters,
-                'centroids': centroids,
+                'centroids': centroid_list,
+                'point_ids': matrix.ids.tolist(),
                 'stats': stats,
                 'algorithm': 'k-means',
                 'k': k,
@@ -202,14 +224,14 @@ class ChatClusteringService:
             self.logger.error(f"K-means 聚類失敗: {str(e)}")
             return {'error': str(e)}
     
-    def density_based_clustering(self, vector_data: List[Dict], 
+    def density_based_clustering(self, vector_data, 
                                eps: float = 0.3, 
                                min_samples: int = 3) -> Dict:
         """
         基於密度的聚類（簡化版 DBSCAN）
         
         Args:
-            vector_data: 向量數據
+            vector_data: VectorMatrix 或向量數據列表
             eps: 鄰域半徑
             min_samples: 最小樣本數
             
@@ -217,22 +239,18 @@ class ChatClusteringService:
             聚類結果
         """
         try:
-            if not vector_data:
+            if vector_data is None or len(vector_data) == 0:
                 return {'clusters': {}, 'noise': [], 'stats': {}}
             
-            embeddings = [data['embedding'] for data in vector_data]
-            n_samples = len(embeddings)
+            matrix = self._as_vector_matrix(vector_data)
+            normalized = self._normalize_rows(matrix.vectors)
+            n_samples = len(matrix)
             
             self.logger.info(f"開始密度聚類: 樣本數={n_samples}, eps={eps}, min_samples={min_samples}")
             
-            # 計算距離矩陣
-            distances = np.zeros((n_samples, n_samples))
-            for i in range(n_samples):
-                for j in range(i + 1, n_samples):
-                    sim = self.cosine_similarity(embeddings[i], embeddings[j])
-                    distance = 1 - sim
-                    distances[i][j] = distance
-                    distances[j][i] = distance
+            # 計算距離矩陣（一次矩陣乘法）
+            distances = 1.0 - np.clip(normalized @ normalized.T, 0.0, 1.0)
+            np.fill_diagonal(distances, 0.0)
             
             # DBSCAN 演算法
             visited = [False] * n_samples
@@ -247,7 +265,7 @@ class ChatClusteringService:
                 visited[i] = True
                 
                 # 找到鄰域
-                neighbors = [j for j in range(n_samples) if distances[i][j] <= eps]
+                neighbors = np.flatnonzero(distances[i] <= eps).tolist()
                 
                 if len(neighbors) < min_samples:
                     # 噪點
@@ -270,6 +288,7 @@ class ChatClusteringService:
             return {
                 'clusters': clusters,
                 'noise': noise,
+                'point_ids': matrix.ids.tolist(),
                 'stats': stats,
                 'algorithm': 'dbscan',
                 'eps': eps,
@@ -284,6 +303,9 @@ class ChatClusteringService:
                        visited, cluster, noise):
         """擴展聚類（DBSCAN 輔助函數）"""
         cluster.append(point)
+        in_neighbors = set(neighbors)
+        in_cluster = {point}
+        noise_set = set(noise)
         
         i = 0
         while i < len(neighbors):
@@ -293,22 +315,32 @@ class ChatClusteringService:
                 visited[neighbor] = True
                 
                 # 找到鄰域
-                neighbor_neighbors = [j for j in range(len(distances)) 
-                                    if distances[neighbor][j] <= eps]
+                neighbor_neighbors = np.flatnonzero(distances[neighbor] <= eps)
                 
                 if len(neighbor_neighbors) >= min_samples:
                     # 合併鄰域
-                    for nn in neighbor_neighbors:
-                        if nn not in neighbors:
+                    for nn in neighbor_neighbors.tolist():
+                        if nn not in in_neighbors:
                             neighbors.append(nn)
+                            in_neighbors.add(nn)
             
             # 如果不在任何聚類中，加入當前聚類
-            if neighbor not in cluster and neighbor not in noise:
+            if neighbor not in in_cluster and neighbor not in noise_set:
                 cluster.append(neighbor)
+                in_cluster.add(neighbor)
             
             i += 1
     
-    def _calculate_cluster_stats(self, vector_data: List[Dict], 
+    def _load_cluster_metadata(self, matrix: VectorMatrix, clusters: Dict) -> Dict[int, Dict]:
+        """按需查詢聚類統計所需的元數據（關鍵字、示例文字）"""
+        reader = getattr(self, '_reader', None)
+        if reader is None:
+            return {}
+        ids = [int(matrix.ids[idx]) for indices in clusters.values() for idx in indices
+               if idx < len(matrix)]
+        return reader.fetch_metadata(ids, ['text_content', 'message_length', 'question_keywords'])
+    
+    def _calculate_cluster_stats(self, vector_data, 
                                clusters: Dict, centroids: List) -> Dict:
         """計算聚類統計資訊"""
         try:
@@ -320,6 +352,16 @@ class ChatClusteringService:
                 'quality_metrics': {}
             }
             
+            if isinstance(vector_data, VectorMatrix):
+                matrix = vector_data
+                metadata = self._load_cluster_metadata(matrix, clusters)
+                rows = [metadata.get(int(vector_id), {}) for vector_id in matrix.ids]
+            else:
+                matrix = self._as_vector_matrix(vector_data)
+                rows = vector_data
+            
+            normalized = self._normalize_rows(matrix.vectors)
+            
             for cluster_id, point_indices in clusters.items():
                 cluster_size = len(point_indices)
                 stats['cluster_sizes'][cluster_id] = cluster_size
@@ -329,16 +371,16 @@ class ChatClusteringService:
                 examples = []
                 
                 for idx in point_indices:
-                    if idx < len(vector_data):
-                        data = vector_data[idx]
+                    if idx < len(rows):
+                        data = rows[idx]
                         if data.get('question_keywords'):
                             all_keywords.extend(data['question_keywords'])
                         
                         # 收集代表性例子
-                        if len(examples) < 3:
+                        if len(examples) < 3 and data.get('text_content'):
                             examples.append({
                                 'text': data['text_content'][:100] + '...',
-                                'length': data['message_length']
+                                'length': data.get('message_length')
                             })
                 
                 # 統計關鍵字頻率
@@ -348,20 +390,18 @@ class ChatClusteringService:
                 
                 # 計算聚類內部相似度
                 if cluster_size > 1 and cluster_id < len(centroids):
-                    similarities = []
-                    centroid = centroids[cluster_id]
-                    
-                    for idx in point_indices:
-                        if idx < len(vector_data):
-                            embedding = vector_data[idx]['embedding']
-                            sim = self.cosine_similarity(embedding, centroid)
-                            similarities.append(sim)
+                    valid_indices = [idx for idx in point_indices if idx < len(matrix)]
+                    centroid = np.asarray(centroids[cluster_id], dtype=np.float32)
+                    centroid_norm = np.linalg.norm(centroid)
                     
-                    if similarities:
+                    if valid_indices and centroid_norm > 0:
+                        similarities = np.clip(
+                            normalized[valid_indices] @ (centroid / centroid_norm), 0.0, 1.0
+                        )
                         stats['quality_metrics'][cluster_id] = {
-                            'avg_similarity': np.mean(similarities),
-                            'min_similarity': np.min(similarities),
-                            'max_similarity': np.max(similarities)
+                            'avg_similarity': float(np.mean(similarities)),
+                            'min_similarity': float(np.min(similarities)),
+                            'max_similarity': float(np.max(similarities))
                         }
             
             return stats
@@ -386,46 +426,45 @@ class ChatClusteringService:
                 return False
             
             clusters = clustering_result.get('clusters', {})
+            point_ids = clustering_result.get('point_ids')
+            if point_ids is None:
+                matrix = self.get_vector_matrix()
+                point_ids = matrix.ids.tolist() if matrix is not None else []
+            
+            cluster_stats = clustering_result.get('stats', {})
+            quality_metrics = cluster_stats.get('quality_metrics', {})
+            
+            # 組裝批量更新參數
+            update_params = []
+            for cluster_id, point_indices in clusters.items():
+                # 計算聚類信心分數
+                confidence = 0.5  # 預設信心分數
+                
+                if cluster_id in quality_metrics:
+                    avg_similarity = quality_metrics[cluster_id].get('avg_similarity', 0.5)
+                    confidence = min(0.9, max(0.1, avg_similarity))
+                
+                for idx in point_indices:
+                    if idx < len(point_ids):
+                        update_params.append((cluster_id, confidence, point_ids[idx]))
             
             with transaction.atomic():
-                # 首先清除現有聚類分配
                 with connection.cursor() as cursor:
+                    # 首先清除現有聚類分配
                     cursor.execute("""
                         UPDATE chat_message_embeddings_1024 
                         SET cluster_id = NULL, confidence_score = 0.0, updated_at = NOW()
                     """)
-                
-                # 更新新的聚類分配
-                updated_count = 0
-                
-                for cluster_id, point_indices in clusters.items():
-                    # 計算聚類信心分數
-                    cluster_stats = clustering_result.get('stats', {})
-                    quality_metrics = cluster_stats.get('quality_metrics', {})
-                    confidence = 0.5  # 預設信心分數
-                    
-                    if cluster_id in quality_metrics:
-                        avg_similarity = quality_metrics[cluster_id].get('avg_similarity', 0.5)
-                        confidence = min(0.9, max(0.1, avg_similarity))
-                    
-                    # 獲取對應的向量數據
-                    vector_data = self.get_vector_data()
                     
-                    for idx in point_indices:
-                        if idx < len(vector_data):
-                            embedding_id = vector_data[idx]['id']
-                            
-                            with connection.cursor() as cursor:
-                                cursor.execute("""
-                                    UPDATE chat_message_embeddings_1024 
-                                    SET cluster_id = %s, confidence_score = %s, updated_at = NOW()
-                                    WHERE id = %s
-                                """, [cluster_id, confidence, embedding_id])
-                                
-                            updated_count += 1
+                    # 更新新的聚類分配
+                    cursor.executemany("""
+                        UPDATE chat_message_embeddings_1024 
+                        SET cluster_id = %s, confidence_score = %s, updated_at = NOW()
+                        WHERE id = %s
+                    """, update_params)
                 
-                self.logger.info(f"聚類分配更新完成: 更新了 {updated_count} 筆記錄")
-                return True
+            self.logger.info(f"聚類分配更新完成: 更新了 {len(update_params)} 筆記錄")
+            return True
                 
         except Exception as e:
             self.logger.error(f"更新聚類分配失敗: {str(e)}")
@@ -486,7 +525,7 @@ class ChatClusteringService:
     
     def perform_clustering_analysis(self, algorithm: str = 'kmeans') -> Dict:
         """
-        執行完整的聚類分析
+        執行完整的聚類分析（完整重建，屬維護操作；日常由增量聚類處理新消息）
         
         Args:
             algorithm: 聚類算法 ('kmeans' 或 'dbscan')
@@ -497,9 +536,9 @@ class ChatClusteringService:
         try:
             self.logger.info(f"開始聚類分析: algorithm={algorithm}")
             
-            # 獲取向量數據
-            vector_data = self.get_vector_data()
-            if not vector_data:
+            # 獲取向量矩陣（元數據按需查詢）
+            vector_data = self.get_vector_matrix()
+            if vector_data is None or len(vector_data) == 0:
                 return {'error': '沒有可用的向量數據'}
             
             # 執行聚類
@@ -519,11 +558,20 @@ class ChatClusteringService:
             # 更新資料庫
             update_success = self.update_cluster_assignments(clustering_result)
             
+            # 持久化質心，之後新消息改由增量聚類分配
+            centroids_persisted = 0
+            if update_success:
+                from library.rvt_analytics.incremental_clustering import get_incremental_clustering_service
+                centroids_persisted = get_incremental_clustering_service().persist_centroids(
+                    vector_data, clustering_result, categories
+                )
+            
             # 完整結果
             result = {
                 'clustering_result': clustering_result,
                 'category_suggestions': categories,
                 'database_updated': update_success,
+                'centroids_persisted': centroids_persisted,
                 'analysis_summary': {
                     'total_messages': len(vector_data),
                     'n_clusters': clustering_result.get('stats', {}).get('n_clusters', 0),
@@ -0,0 +1,306 @@
+"""
+Chat Vector Pipeline - 聊天消息批量向量化管線
+
+取代逐筆「查詢是否存在 → 生成向量 → INSERT」的處理方式，分四個階段串流處理：
+1. 以 anti-join + keyset 分頁讀取未向量化的消息 ID（依 id 遞增）
+2. 依內容雜湊跳過已存在（或同批重複）的內容
+3. 以模型批次大小批量生成向量
+4. 以 execute_values 批量寫入 chat_message_embeddings_1024
+
+進度（最後處理的消息 id）存入快取作為檢查點，中斷後可從檢查點續跑；
+結果包含吞吐量（messages/sec）。
+"""
+
+import logging
+import time
+from typing import Dict, List, Optional, Any
+
+from django.core.cache import cache
+from django.db import connection
+from psycopg2.extras import execute_values
+
+from library.rvt_analytics.chat_vector_service import get_chat_vector_service
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_KEY_PREFIX = 'chat_vector_pipeline:checkpoint'
+
+
+class ChatVectorPipeline:
+    """聊天消息批量向量化管線"""
+
+    def __init__(self, user_role: str = 'user', min_length: int = 5,
+                 chunk_size: int = 500, encode_batch_size: int = 32,
+                 vector_service=None):
+        """
+        Args:
+            user_role: 處理的消息角色 ('user', 'assistant', 'all')
+            min_length: 最小消息長度
+            chunk_size: 每次從資料庫讀取的消息數
+            encode_batch_size: 每次送入模型的文本數
+            vector_service: 共用的 ChatVectorService（預設自動建立）
+        """
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.user_role = user_role
+        self.min_length = min_length
+        self.chunk_size = chunk_size
+        self.encode_batch_size = encode_batch_size
+        self.vector_service = vector_service or get_chat_vector_service()
+
+    # ------------------------------------------------------------------
+    # 檢查點
+    # ------------------------------------------------------------------
+
+    @property
+    def checkpoint_key(self) -> str:
+        return f"{CHECKPOINT_KEY_PREFIX}:{self.user_role}:{self.min_length}"
+
+    def get_checkpoint(self) -> int:
+        """最後處理完成的消息 id"""
+        try:
+            return int(cache.get(self.checkpoint_key) or 0)
+        except Exception as e:
+            self.logger.warning(f"讀取檢查點失敗: {str(e)}")
+            return 0
+
+    def save_checkpoint(self, last_message_id: int):
+        try:
+            cache.set(self.checkpoint_key, int(last_message_id), timeout=None)
+        except Exception as e:
+            self.logger.warning(f"儲存檢查點失敗: {str(e)}")
+
+    def reset_checkpoint(self):
+        try:
+            cache.delete(self.checkpoint_key)
+        except Exception as e:
+            self.logger.warning(f"重設檢查點失敗: {str(e)}")
+
+    # ------------------------------------------------------------------
+    # 階段 1：讀取未向量化的消息
+    # ------------------------------------------------------------------
+
+    def fetch_pending_chunk(self, after_id: int) -> List[Dict[str, Any]]:
+        """以 keyset 分頁讀取下一批未向量化的消息"""
+        conditions = ["cm.id > %s", "LENGTH(cm.content) >= %s"]
+        params: List[Any] = [after_id, self.min_length]
+        if self.user_role != 'all':
+            conditions.append("cm.role = %s")
+            params.append(self.user_role)
+        params.append(self.chunk_size)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT cm.id, cm.conversation_id, cm.content, cm.role
+                FROM chat_messages cm
+                LEFT JOIN chat_message_embeddings_1024 ce ON ce.chat_message_id = cm.id
+                WHERE ce.id IS NULL AND {' AND '.join(conditions)}
+                ORDER BY cm.id
+                LIMIT %s
+            """, params)
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    # ------------------------------------------------------------------
+    # 階段 2：內容雜湊去重
+    # ------------------------------------------------------------------
+
+    def filter_known_content(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        計算內容雜湊並移除已存在於向量表（或同批重複）的消息
+
+        Returns:
+            {'pending': [...], 'skipped': int}
+        """
+        candidates = []
+        for msg in messages:
+            content = (msg.get('content') or '').strip()
+            if not content:
+                continue
+            msg['content_hash'] = self.vector_service.generate_content_hash(msg['content'])
+            candidates.append(msg)
+
+        hashes = list({msg['content_hash'] for msg in candidates})
+        existing = set()
+        if hashes:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT content_hash FROM chat_message_embeddings_1024 WHERE content_hash = ANY(%s)",
+                    [hashes]
+                )
+                existing = {row[0] for row in cursor.fetchall()}
+
+        pending = []
+        seen = set(existing)
+        for msg in candidates:
+            if msg['content_hash'] in seen:
+                continue
+            seen.add(msg['content_hash'])
+            pending.append(msg)
+
+        return {'pending': pending, 'skipped': len(messages) - len(pending)}
+
+    # ------------------------------------------------------------------
+    # 階段 3：批量生成向量
+    # ------------------------------------------------------------------
+
+    def encode(self, messages: List[Dict[str, Any]]) -> List[List[float]]:
+        """以模型批次大小生成向量（順序與輸入一致）"""
+        embedding_service = self.vector_service.embedding_service
+        if not embedding_service:
+            raise RuntimeError("Embedding service 不可用")
+
+        return embedding_service.generate_embeddings_batch(
+            [msg['content'] for msg in messages], batch_size=self.encode_batch_size
+        )
+
+    # ------------------------------------------------------------------
+    # 階段 4：批量寫入
+    # ------------------------------------------------------------------
+
+    def bulk_insert(self, messages: List[Dict[str, Any]],
+                    embeddings: List[List[float]]) -> List[tuple]:
+        """
+        以 execute_values 批量寫入向量
+
+        Returns:
+            實際寫入的 (embedding_id, chat_message_id, role) 列表
+        """
+        rows = []
+        for msg, embedding in zip(messages, embeddings):
+            if not embedding or not any(embedding):
+                # 生成失敗時 embedding service 返回零向量，跳過不寫入
+                continue
+            content = msg['content']
+            rows.append((
+                msg['id'], msg.get('conversation_id'), content, embedding, msg['content_hash'],
+                msg.get('role', 'user'), len(content),
+                self.vector_service.extract_keywords(content),
+                self.vector_service.detect_language(content)
+            ))
+
+        if not rows:
+            return []
+
+        with connection.cursor() as cursor:
+            inserted = execute_values(cursor.cursor, """
+                INSERT INTO chat_message_embeddings_1024
+                (chat_message_id, conversation_id, text_content, embedding, content_hash,
+                 user_role, message_length, question_keywords, language_detected, created_at)
+                VALUES %s
+                ON CONFLICT DO NOTHING
+                RETURNING id, chat_message_id, user_role
+            """, rows,
+                template="(%s, %s, %s, %s::vector, %s, %s, %s, %s, %s, NOW())",
+                page_size=len(rows), fetch=True)
+
+        return inserted
+
+    def _assign_clusters(self, inserted: List[tuple], messages: List[Dict[str, Any]],
+                         embeddings: List[List[float]]):
+        """將新寫入的用戶問題交給增量聚類"""
+        from library.rvt_analytics.incremental_clustering import get_incremental_clustering_service
+
+        incremental_service = get_incremental_clustering_service()
+        embedding_by_message = {msg['id']: emb for msg, emb in zip(messages, embeddings)}
+        for embedding_id, chat_message_id, role in inserted:
+            if role == 'user':
+                incremental_service.assign_vector(embedding_id, embedding_by_message[chat_message_id])
+
+    def process_messages(self, messages: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        對一批消息執行去重 → 向量化 → 批量寫入
+
+        Args:
+            messages: [{'id', 'content', 'conversation_id', 'role'}, ...]
+
+        Returns:
+            {'processed', 'inserted', 'skipped', 'failed'}
+        """
+        filtered = self.filter_known_content(messages)
+        pending = filtered['pending']
+
+        inserted = []
+        if pending:
+            embeddings = self.encode(pending)
+            inserted = self.bulk_insert(pending, embeddings)
+            if inserted:
+                try:
+                    self._assign_clusters(inserted, pending, embeddings)
+                except Exception as e:
+                    self.logger.warning(f"增量聚類分配失敗: {str(e)}")
+
+        return {
+            'processed': len(messages),
+            'inserted': len(inserted),
+            'skipped': filtered['skipped'],
+            'failed': len(pending) - len(inserted),
+        }
+
+    def run(self, max_messages: Optional[int] = None, resume: bool = True) -> Dict[str, Any]:
+        """
+        執行向量化管線直到沒有待處理消息（或達到 max_messages）
+
+        Args:
+            max_messages: 本次最多處理的消息數
+            resume: 是否從檢查點續跑（False 則從頭掃描）
+
+        Returns:
+            處理結果統計（含 messages_per_second）
+        """
+        results = {
+            'total_processed': 0,
+            'successful': 0,
+            'skipped': 0,
+            'failed': 0,
+            'chunks': 0,
+            'errors': []
+        }
+
+        last_id = self.get_checkpoint() if resume else 0
+        results['resumed_from'] = last_id
+        started = time.monotonic()
+
+        while max_messages is None or results['total_processed'] < max_messages:
+            messages = self.fetch_pending_chunk(last_id)
+            if max_messages is not None:
+                messages = messages[:max_messages - results['total_processed']]
+            if not messages:
+                break
+
+            try:
+                chunk_result = self.process_messages(messages)
+            except Exception as e:
+                self.logger.error(f"批次處理失敗 (after_id={last_id}): {str(e)}")
+                results['errors'].append({'after_id': last_id, 'error': str(e)})
+                break
+
+            results['total_processed'] += chunk_result['processed']
+            results['successful'] += chunk_result['inserted']
+            results['skipped'] += chunk_result['skipped']
+            results['failed'] += chunk_result['failed']
+            results['chunks'] += 1
+
+            last_id = messages[-1]['id']
+            self.save_checkpoint(last_id)
+
+            elapsed = time.monotonic() - started
+            self.logger.info(
+                f"向量化進度: {results['total_processed']} 則 "
+                f"(寫入 {results['successful']}, 跳過 {results['skipped']}) "
+                f"{results['total_processed'] / elapsed if elapsed else 0:.1f} msg/s"
+            )
+
+        elapsed = time.monotonic() - started
+        results['checkpoint'] = last_id
+        results['elapsed_seconds'] = round(elapsed, 2)
+        results['messages_per_second'] = round(results['total_processed'] / elapsed, 2) if elapsed else 0.0
+        return results
+
+
+# 便利函數
+def run_chat_vector_pipeline(user_role: str = 'user', min_length: int = 5,
+                             max_messages: Optional[int] = None,
+                             resume: bool = True) -> Dict[str, Any]:
+    """執行聊天消息批量向量化便利函數"""
+    pipeline = ChatVectorPipeline(user_role=user_role, min_length=min_length)
+    return pipeline.run(max_messages=max_messages, resume=resume)
@@ -157,10 +157,16 @@ class ChatVectorService:
                         question_keywords = EXCLUDED.question_keywords,
                         language_detected = EXCLUDED.language_detected,
                         updated_at = NOW()
+                    RETURNING id
                 """, [
                     chat_message_id, conversation_id, content, embedding, content_hash,
                     user_role, message_length, keywords, language
                 ])
+                embedding_id = cursor.fetchone()[0]
+            
+            # 增量聚類：將用戶問題分配到最近的質心
+            if user_role == 'user':
+                self._assign_cluster(embedding_id, embedding)
             
             self.logger.info(f"聊天消息向量存儲成功: chat_message_id={chat_message_id}")
             return True
@@ -169,6 +175,19 @@ class ChatVectorService:
             self.logger.error(f"生成和存儲向量失敗: {str(e)}")
             return False
     
+    def _assign_cluster(self, embedding_id: int, embedding: List[float]):
+        """將新向量分配到最近的持久化質心（失敗不影響向量存儲）"""
+        try:
+            from library.rvt_analytics.incremental_clustering import assign_to_nearest_cluster
+            assignment = assign_to_nearest_cluster(embedding_id, embedding)
+            if assignment:
+                self.logger.debug(
+                    f"向量 {embedding_id} 分配到聚類 {assignment['cluster_id']} "
+                    f"(相似度 {assignment['similarity']:.3f})"
+                )
+        except Exception as e:
+            self.logger.warning(f"增量聚類分配失敗: {str(e)}")
+    
     def search_similar_messages(self, query: str, limit: int = 10, 
                               threshold: float = 0.3, 
                               user_role: str = 'user') -> List[Dict]:
@@ -238,7 +257,7 @@ class ChatVectorService:
     
     def batch_process_messages(self, chat_messages: List[Dict]) -> Dict:
         """
-        批量處理聊天消息向量化
+        批量處理聊天消息向量化（雜湊去重 → 批量生成向量 → 批量寫入）
         
         Args:
             chat_messages: 聊天消息列表 [{'id': int, 'content': str, 'conversation_id': int, 'role': str}, ...]
@@ -255,28 +274,20 @@ class ChatVectorService:
         }
         
         try:
-            for msg in chat_messages:
-                results['total_processed'] += 1
-                
-                try:
-                    success = self.generate_and_store_vector(
-                        chat_message_id=msg['id'],
-                        content=msg['content'],
-                        conversation_id=msg.get('conversation_id'),
-                        user_role=msg.get('role', 'user')
-                    )
-                    
-                    if success:
-                        results['successful'] += 1
-                    else:
-                        results['failed'] += 1
-                        
-                except Exception as e:
-                    results['failed'] += 1
-                    results['errors'].append({
-                        'message_id': msg['id'],
-                        'error': str(e)
-                    })
+            if not self.embedding_service:
+                self.logger.warning("Embedding service 不可用，跳過向量生成")
+                results['failed'] = len(chat_messages)
+                results['total_processed'] = len(chat_messages)
+                return results
+            
+            from library.rvt_analytics.chat_vector_pipeline import ChatVectorPipeline
+            pipeline = ChatVectorPipeline(vector_service=self)
+            
+            batch_result = pipeline.process_messages(chat_messages)
+            results['total_processed'] = batch_result['processed']
+            results['successful'] = batch_result['inserted']
+            results['skipped'] = batch_result['skipped']
+            results['failed'] = batch_result['failed']
             
             self.logger.info(f"批量處理完成: {results}")
             return results
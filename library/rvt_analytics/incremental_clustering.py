@@ -0,0 +1,492 @@
+"""
+Incremental Clustering Service - 聊天消息增量聚類服務
+
+此模組負責：
+- 持久化聚類質心（chat_cluster_centroids 表，含成員數與變異數）
+- 新消息向量化時即時分配到最近的質心（不需重新聚類整張表）
+- 定期再平衡：只對漂移的聚類進行分裂 / 合併，並收編離群消息
+- 完整重建（ChatClusteringService.perform_clustering_analysis）僅作為維護操作
+
+變異數定義：成員到質心的餘弦距離平方平均值 (Σd² / n)。
+建表腳本：scripts/create_chat_cluster_centroids_table.sql
+"""
+
+import logging
+import time
+from threading import Lock
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+
+import numpy as np
+from django.db import connection, transaction
+
+from library.common.vector_bulk_reader import VectorBulkReader, VectorMatrix
+
+logger = logging.getLogger(__name__)
+
+CENTROID_TABLE = 'chat_cluster_centroids'
+EMBEDDING_TABLE = 'chat_message_embeddings_1024'
+
+# 質心快取存活時間（秒）
+CENTROID_CACHE_TTL = 300
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2 正規化（每列）"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def running_mean(centroid: np.ndarray, count: int, vector: np.ndarray) -> np.ndarray:
+    """加入一個成員後的質心（count 為加入前的成員數）"""
+    return (centroid * count + vector) / (count + 1)
+
+
+def member_stats(vectors: np.ndarray, centroid: np.ndarray) -> Dict[str, float]:
+    """計算成員到質心的餘弦距離統計"""
+    distances = 1.0 - np.clip(normalize_rows(vectors) @ normalize_rows(centroid), 0.0, 1.0)
+    return {
+        'member_count': int(len(vectors)),
+        'distance_sum': float(distances.sum()),
+        'distance_sq_sum': float((distances ** 2).sum()),
+    }
+
+
+def needs_split(variance: float, baseline_variance: Optional[float],
+                ratio: float, min_variance: float) -> bool:
+    """
+    變異數是否漂移到需要分裂
+
+    沒有基準（舊資料）時以目前變異數作為基準，此時不會分裂。
+    """
+    baseline = baseline_variance or variance
+    return variance > max(min_variance, baseline * ratio)
+
+
+def plan_merges(centroids: np.ndarray, member_counts: Sequence[int],
+                min_similarity: float) -> List[Tuple[int, int]]:
+    """
+    找出需要合併的質心配對
+
+    每個質心最多被併入一次，被併入的質心不再保留其他配對；成員較多者保留。
+
+    Returns:
+        [(保留索引, 併入索引), ...]
+    """
+    if len(centroids) < 2:
+        return []
+
+    normalized = normalize_rows(np.asarray(centroids, dtype=np.float32))
+    similarities = normalized @ normalized.T
+    np.fill_diagonal(similarities, -1.0)
+
+    merges = []
+    dropped = set()
+    for i, j in zip(*np.where(similarities >= min_similarity)):
+        i, j = int(i), int(j)
+        if i >= j or i in dropped or j in dropped:
+            continue
+        keep, drop = (i, j) if member_counts[i] >= member_counts[j] else (j, i)
+        merges.append((keep, drop))
+        dropped.add(drop)
+    return merges
+
+
+def is_cohesive(vectors: np.ndarray, min_similarity: float) -> bool:
+    """群組成員與其平均向量的平均相似度是否達到門檻"""
+    cohesion = normalize_rows(vectors) @ normalize_rows(vectors.mean(axis=0))
+    return float(cohesion.mean()) >= min_similarity
+
+
+class IncrementalClusteringService:
+    """
+    增量聚類服務（Singleton 模式）
+
+    質心矩陣保存在行程記憶體中（TTL 快取），分配新消息只需一次矩陣乘法；
+    成員統計以資料列鎖 (SELECT ... FOR UPDATE) 增量更新。
+    """
+
+    # 分配門檻：與最近質心的相似度低於此值視為離群，等待再平衡處理
+    ASSIGN_MIN_SIMILARITY = 0.80
+    # 分裂條件：變異數超過基準的倍數，且超過最小絕對值
+    SPLIT_VARIANCE_RATIO = 1.5
+    SPLIT_MIN_VARIANCE = 0.01
+    # 合併條件：兩個質心的相似度高於此值
+    MERGE_MIN_SIMILARITY = 0.95
+
+    _instance = None
+    _lock = Lock()
+
+    def __new__(cls, *args, **kwargs):
+        """Singleton 模式實作"""
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super().__new__(cls)
+                    cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self, min_cluster_size: int = 3):
+        """初始化（只執行一次）"""
+        if self._initialized:
+            return
+
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.min_cluster_size = min_cluster_size
+        self._cache_lock = Lock()
+        self._cluster_ids = np.empty(0, dtype=np.int64)
+        self._normalized_centroids = np.empty((0, 0), dtype=np.float32)
+        self._cache_timestamp = 0.0
+        self._initialized = True
+
+    # ------------------------------------------------------------------
+    # 質心快取
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2 正規化（每列）"""
+        return normalize_rows(vectors)
+
+    def _centroid_reader(self) -> VectorBulkReader:
+        return VectorBulkReader(CENTROID_TABLE, id_column='cluster_id',
+                                vector_column='centroid', order_by='cluster_id')
+
+    def invalidate_cache(self):
+        """清除質心快取（重建 / 再平衡後呼叫）"""
+        with self._cache_lock:
+            self._cache_timestamp = 0.0
+
+    def _get_centroids(self):
+        """取得 (cluster_ids, 正規化質心矩陣)，過期時從資料庫重新載入"""
+        with self._cache_lock:
+            if time.time() - self._cache_timestamp < CENTROID_CACHE_TTL:
+                return self._cluster_ids, self._normalized_centroids
+
+            try:
+                matrix = self._centroid_reader().read_matrix()
+                self._cluster_ids = matrix.ids
+                self._normalized_centroids = (
+                    matrix.normalized() if len(matrix) else np.empty((0, 0), dtype=np.float32)
+                )
+                self._cache_timestamp = time.time()
+                self.logger.debug(f"載入聚類質心: {len(matrix)} 個")
+            except Exception as e:
+                self.logger.error(f"載入聚類質心失敗: {str(e)}")
+            return self._cluster_ids, self._normalized_centroids
+
+    def has_centroids(self) -> bool:
+        """是否已有持久化的質心"""
+        cluster_ids, _ = self._get_centroids()
+        return len(cluster_ids) > 0
+
+    # ------------------------------------------------------------------
+    # 即時分配
+    # ------------------------------------------------------------------
+
+    def assign_vector(self, embedding_id: int, embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """
+        將新向量分配到最近的質心，並增量更新該聚類的統計
+
+        Args:
+            embedding_id: chat_message_embeddings_1024.id
+            embedding: 向量
+
+        Returns:
+            {'cluster_id', 'similarity'}；沒有質心或相似度不足時返回 None
+        """
+        try:
+            cluster_ids, centroids = self._get_centroids()
+            if len(cluster_ids) == 0:
+                return None
+
+            vector = np.asarray(embedding, dtype=np.float32)
+            similarities = centroids @ self._normalize(vector)
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+
+            if similarity < self.ASSIGN_MIN_SIMILARITY:
+                self.logger.debug(f"向量 {embedding_id} 為離群點 (相似度 {similarity:.3f})，等待再平衡")
+                return None
+
+            cluster_id = int(cluster_ids[best])
+            self._add_member(cluster_id, embedding_id, vector, similarity)
+            return {'cluster_id': cluster_id, 'similarity': similarity}
+
+        except Exception as e:
+            self.logger.error(f"增量分配聚類失敗: {str(e)}")
+            return None
+
+    def _add_member(self, cluster_id: int, embedding_id: int,
+                    vector: np.ndarray, similarity: float):
+        """在資料列鎖內更新質心（滑動平均）與距離統計"""
+        distance = 1.0 - similarity
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT centroid::real[], member_count FROM {CENTROID_TABLE} "
+                    f"WHERE cluster_id = %s FOR UPDATE",
+                    [cluster_id]
+                )
+                row = cursor.fetchone()
+                if row is None:
+                    return
+
+                centroid = np.asarray(row[0], dtype=np.float32)
+                count = row[1]
+                new_centroid = running_mean(centroid, count, vector)
+
+                cursor.execute(f"""
+                    UPDATE {CENTROID_TABLE}
+                    SET centroid = %s::vector,
+                        member_count = member_count + 1,
+                        distance_sum = distance_sum + %s,
+                        distance_sq_sum = distance_sq_sum + %s,
+                        updated_at = NOW()
+                    WHERE cluster_id = %s
+                """, [new_centroid.tolist(), distance, distance * distance, cluster_id])
+
+                cursor.execute(f"""
+                    UPDATE {EMBEDDING_TABLE}
+                    SET cluster_id = %s, confidence_score = %s, updated_at = NOW()
+                    WHERE id = %s
+                """, [cluster_id, similarity, embedding_id])
+
+    # ------------------------------------------------------------------
+    # 持久化（完整重建後）
+    # ------------------------------------------------------------------
+
+    def _write_centroid(self, cursor, cluster_id: int, centroid: np.ndarray,
+                        stats: Dict[str, float], category: Optional[str] = None):
+        """寫入（或覆蓋）單一質心，並以目前變異數作為漂移基準"""
+        variance = stats['distance_sq_sum'] / stats['member_count'] if stats['member_count'] else 0.0
+        cursor.execute(f"""
+            INSERT INTO {CENTROID_TABLE}
+            (cluster_id, centroid, member_count, distance_sum, distance_sq_sum,
+             baseline_variance, predicted_category, rebalanced_at, created_at, updated_at)
+            VALUES (%s, %s::vector, %s, %s, %s, %s, %s, NOW(), NOW(), NOW())
+            ON CONFLICT (cluster_id) DO UPDATE SET
+                centroid = EXCLUDED.centroid,
+                member_count = EXCLUDED.member_count,
+                distance_sum = EXCLUDED.distance_sum,
+                distance_sq_sum = EXCLUDED.distance_sq_sum,
+                baseline_variance = EXCLUDED.baseline_variance,
+                predicted_category = COALESCE(EXCLUDED.predicted_category,
+                                              {CENTROID_TABLE}.predicted_category),
+                rebalanced_at = NOW(),
+                updated_at = NOW()
+        """, [cluster_id, centroid.tolist(), stats['member_count'], stats['distance_sum'],
+              stats['distance_sq_sum'], variance, category])
+
+    def persist_centroids(self, matrix: VectorMatrix, clustering_result: Dict,
+                          categories: Optional[Dict] = None) -> int:
+        """
+        以完整聚類結果覆蓋持久化質心
+
+        Args:
+            matrix: 聚類使用的向量矩陣
+            clustering_result: ChatClusteringService 的聚類結果
+            categories: auto_categorize_clusters 的類別建議
+
+        Returns:
+            寫入的質心數量
+        """
+        try:
+            clusters = clustering_result.get('clusters', {})
+            categories = categories or {}
+
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DELETE FROM {CENTROID_TABLE}")
+                    for cluster_id, point_indices in clusters.items():
+                        indices = [idx for idx in point_indices if idx < len(matrix)]
+                        if not indices:
+                            continue
+                        vectors = matrix.vectors[indices]
+                        centroid = vectors.mean(axis=0)
+                        self._write_centroid(
+                            cursor, int(cluster_id), centroid, member_stats(vectors, centroid),
+                            categories.get(cluster_id, {}).get('category')
+                        )
+
+            self.invalidate_cache()
+            self.logger.info(f"持久化聚類質心完成: {len(clusters)} 個")
+            return len(clusters)
+
+        except Exception as e:
+            self.logger.error(f"持久化聚類質心失敗: {str(e)}")
+            return 0
+
+    # ------------------------------------------------------------------
+    # 再平衡
+    # ------------------------------------------------------------------
+
+    def _load_centroid_rows(self) -> List[Dict[str, Any]]:
+        """讀取所有質心與統計"""
+        reader = self._centroid_reader()
+        matrix = reader.read_matrix()
+        metadata = reader.fetch_metadata(
+            matrix.ids, ['member_count', 'distance_sq_sum', 'baseline_variance']
+        )
+        rows = []
+        for cluster_id, centroid in zip(matrix.ids.tolist(), matrix.vectors):
+            meta = metadata.get(cluster_id, {})
+            count = meta.get('member_count') or 0
+            rows.append({
+                'cluster_id': cluster_id,
+                'centroid': centroid,
+                'member_count': count,
+                'variance': (meta.get('distance_sq_sum') or 0.0) / count if count else 0.0,
+                'baseline_variance': meta.get('baseline_variance'),
+            })
+        return rows
+
+    def _read_members(self, cluster_id: Optional[int]) -> VectorMatrix:
+        """讀取聚類成員向量（cluster_id=None 表示尚未分配的用戶問題）"""
+        if cluster_id is None:
+            return VectorBulkReader(
+                EMBEDDING_TABLE, where="user_role = 'user' AND cluster_id IS NULL"
+            ).read_matrix()
+        return VectorBulkReader(
+            EMBEDDING_TABLE, where="cluster_id = %s", params=[cluster_id]
+        ).read_matrix()
+
+    def _reassign_members(self, cursor, ids: np.ndarray, cluster_id: int, confidence: np.ndarray):
+        """批量更新成員的聚類分配"""
+        cursor.executemany(f"""
+            UPDATE {EMBEDDING_TABLE}
+            SET cluster_id = %s, confidence_score = %s, updated_at = NOW()
+            WHERE id = %s
+        """, [(cluster_id, float(conf), int(vector_id)) for vector_id, conf in zip(ids, confidence)])
+
+    def _rewrite_cluster(self, cursor, cluster_id: int, members: VectorMatrix):
+        """以成員向量重新計算並寫入質心與分配"""
+        centroid = members.vectors.mean(axis=0)
+        stats = member_stats(members.vectors, centroid)
+        confidence = np.clip(members.normalized() @ self._normalize(centroid), 0.0, 1.0)
+        self._write_centroid(cursor, cluster_id, centroid, stats)
+        self._reassign_members(cursor, members.ids, cluster_id, confidence)
+
+    def _split_cluster(self, cursor, cluster_id: int, next_cluster_id: int) -> bool:
+        """以 2-means 將漂移的聚類分裂為兩個"""
+        from library.rvt_analytics.chat_clustering_service import get_clustering_service
+
+        members = self._read_members(cluster_id)
+        if len(members) < 2 * self.min_cluster_size:
+            return False
+
+        result = get_clustering_service().simple_kmeans_clustering(members, k=2)
+        parts = [indices for indices in result.get('clusters', {}).values()
+                 if len(indices) >= self.min_cluster_size]
+        if len(parts) < 2:
+            return False
+
+        for target_id, indices in zip((cluster_id, next_cluster_id), parts):
+            self._rewrite_cluster(
+                cursor, target_id,
+                VectorMatrix(ids=members.ids[indices], vectors=members.vectors[indices])
+            )
+        return True
+
+    def _merge_clusters(self, cursor, keep_id: int, drop_id: int):
+        """將 drop_id 聚類併入 keep_id"""
+        cursor.execute(
+            f"UPDATE {EMBEDDING_TABLE} SET cluster_id = %s WHERE cluster_id = %s",
+            [keep_id, drop_id]
+        )
+        cursor.execute(f"DELETE FROM {CENTROID_TABLE} WHERE cluster_id = %s", [drop_id])
+        self._rewrite_cluster(cursor, keep_id, self._read_members(keep_id))
+
+    def _absorb_outliers(self, cursor, next_cluster_id: int) -> int:
+        """將累積的離群消息聚成新的聚類"""
+        from library.rvt_analytics.chat_clustering_service import get_clustering_service
+
+        outliers = self._read_members(None)
+        if len(outliers) < self.min_cluster_size:
+            return 0
+
+        result = get_clustering_service().simple_kmeans_clustering(outliers)
+        created = 0
+        for indices in result.get('clusters', {}).values():
+            if len(indices) < self.min_cluster_size:
+                continue
+            members = VectorMatrix(ids=outliers.ids[indices], vectors=outliers.vectors[indices])
+            # 只收編內部足夠緊密的群組
+            if not is_cohesive(members.vectors, self.ASSIGN_MIN_SIMILARITY):
+                continue
+            self._rewrite_cluster(cursor, next_cluster_id + created, members)
+            created += 1
+        return created
+
+    def rebalance_drifted_clusters(self) -> Dict[str, Any]:
+        """
+        只對漂移的聚類進行再平衡
+
+        - 變異數超出基準 SPLIT_VARIANCE_RATIO 倍 → 分裂
+        - 質心相似度高於 MERGE_MIN_SIMILARITY → 合併
+        - 累積的離群消息 → 聚成新聚類
+
+        Returns:
+            再平衡結果統計
+        """
+        summary = {'split': [], 'merged': [], 'new_clusters': 0, 'checked': 0}
+
+        try:
+            rows = self._load_centroid_rows()
+            if not rows:
+                return {'success': False, 'error': '沒有持久化的聚類質心，請先執行完整聚類'}
+
+            summary['checked'] = len(rows)
+            next_cluster_id = max(row['cluster_id'] for row in rows) + 1
+
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    # 1. 分裂變異數漂移的聚類
+                    for row in rows:
+                        drifted = needs_split(row['variance'], row['baseline_variance'],
+                                              self.SPLIT_VARIANCE_RATIO, self.SPLIT_MIN_VARIANCE)
+                        if drifted and self._split_cluster(cursor, row['cluster_id'], next_cluster_id):
+                            summary['split'].append([row['cluster_id'], next_cluster_id])
+                            next_cluster_id += 1
+
+                    # 2. 合併過於接近的聚類
+                    stable = [row for row in rows
+                              if row['cluster_id'] not in {pair[0] for pair in summary['split']}]
+                    if len(stable) > 1:
+                        merges = plan_merges(
+                            np.stack([row['centroid'] for row in stable]),
+                            [row['member_count'] for row in stable],
+                            self.MERGE_MIN_SIMILARITY
+                        )
+                        for keep, drop in merges:
+                            self._merge_clusters(cursor, stable[keep]['cluster_id'], stable[drop]['cluster_id'])
+                            summary['merged'].append([stable[keep]['cluster_id'], stable[drop]['cluster_id']])
+
+                    # 3. 收編離群消息
+                    summary['new_clusters'] = self._absorb_outliers(cursor, next_cluster_id)
+
+            self.invalidate_cache()
+            summary['success'] = True
+            self.logger.info(f"聚類再平衡完成: {summary}")
+            return summary
+
+        except Exception as e:
+            self.logger.error(f"聚類再平衡失敗: {str(e)}")
+            return {'success': False, 'error': str(e)}
+
+
+# 便利函數
+def get_incremental_clustering_service() -> IncrementalClusteringService:
+    """獲取增量聚類服務實例"""
+    return IncrementalClusteringService()
+
+
+def assign_to_nearest_cluster(embedding_id: int, embedding: List[float]) -> Optional[Dict[str, Any]]:
+    """將新向量分配到最近聚類便利函數"""
+    return get_incremental_clustering_service().assign_vector(embedding_id, embedding)
+
+
+def rebalance_clusters() -> Dict[str, Any]:
+    """再平衡漂移聚類便利函數"""
+    return get_incremental_clustering_service().rebalance_drifted_clusters()
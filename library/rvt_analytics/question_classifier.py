@@ -2,7 +2,7 @@
 Question Classifier - RVT Assistant 問題智能分類器
 
 此模組負責：
-- 自動分類用戶問題類型（基於向量聚類）
+- 自動分類用戶問題類型（基於類別原型向量，見 category_prototypes.py）
 - 識別相似問題並歸併
 - 提供問題趨勢分析
 - 支持規則式和AI輔助分類
@@ -15,8 +15,8 @@ from typing import List, Dict, Optional, Tuple
 
 # 導入向量化服務
 try:
-    from .chat_vector_service import get_chat_vector_service, search_similar_chat_messages
-    from .chat_clustering_service import get_clustering_service, get_cluster_categories
+    from .chat_vector_service import search_similar_chat_messages
+    from .chat_clustering_service import get_cluster_categories
     VECTOR_SERVICE_AVAILABLE = False  # 臨時禁用以提升載入速度
 except ImportError:
     VECTOR_SERVICE_AVAILABLE = False
@@ -121,17 +121,16 @@ class QuestionClassifier:
             use_vector_classification (bool): 是否使用向量聚類分類
         """
         self.use_ai_classification = use_ai_classification
-        self.use_vector_classification = use_vector_classification and VECTOR_SERVICE_AVAILABLE
+        self.use_vector_classification = use_vector_classification
         self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         
-        # 初始化向量服務
+        # 向量分類使用類別原型索引（原型矩陣常駐記憶體，無原型時不做 embedding）
         if self.use_vector_classification:
             try:
-                self.vector_service = get_chat_vector_service()
-                self.clustering_service = get_clustering_service()
-                self.logger.info("向量化分類服務初始化成功")
+                from .category_prototypes import get_category_prototype_index
+                self.prototype_index = get_category_prototype_index()
             except Exception as e:
-                self.logger.error(f"向量化服務初始化失敗: {str(e)}")
+                self.logger.error(f"類別原型索引初始化失敗: {str(e)}")
                 self.use_vector_classification = False
     
     def classify_question(self, question_text: str, chat_message_id: Optional[int] = None) -> Dict:
@@ -240,77 +239,49 @@ class QuestionClassifier:
     def _vector_based_classify(self, question_text: str, 
                               chat_message_id: Optional[int] = None) -> Optional[Dict]:
         """
-        基於向量聚類的分類
+        基於類別原型的向量分類（一次 embedding + 一次矩陣乘法）
         
         Args:
             question_text: 問題文本
             chat_message_id: 聊天消息 ID
             
         Returns:
-            分類結果或 None
+            分類結果或 None（無原型或相似度不足）
         """
         try:
             if not self.use_vector_classification:
                 return None
             
-            # 搜索相似的聊天消息
-            similar_messages = search_similar_chat_messages(
-                query=question_text,
-                limit=5,
-                threshold=0.7
-            )
-            
-            if not similar_messages:
-                self.logger.debug("沒有找到相似的聊天消息")
-                return None
-            
-            # 分析相似消息的聚類和類別
-            cluster_votes = {}
-            category_votes = {}
-            total_similarity = 0
-            
-            for msg in similar_messages:
-                similarity = msg.get('similarity', 0)
-                cluster_id = msg.get('cluster_id')
-                category = msg.get('predicted_category')
-                
-                total_similarity += similarity
-                
-                if cluster_id is not None:
-                    cluster_votes[cluster_id] = cluster_votes.get(cluster_id, 0) + similarity
-                
-                if category:
-                    category_votes[category] = category_votes.get(category, 0) + similarity
-            
-            # 決定最佳類別
-            if category_votes:
-                best_category = max(category_votes.keys(), key=lambda k: category_votes[k])
-                confidence = category_votes[best_category] / total_similarity if total_similarity > 0 else 0
-                
-                # 獲取聚類資訊
-                best_cluster = None
-                if cluster_votes:
-                    best_cluster = max(cluster_votes.keys(), key=lambda k: cluster_votes[k])
-                
-                return {
-                    'category': best_category,
-                    'confidence': min(0.95, confidence),  # 最高信心度限制為 0.95
-                    'method': 'vector_clustering',
-                    'cluster_id': best_cluster,
-                    'similar_count': len(similar_messages),
-                    'details': {
-                        'category_votes': category_votes,
-                        'cluster_votes': cluster_votes,
-                        'avg_similarity': total_similarity / len(similar_messages)
-                    }
-                }
-            
-            return None
+            return self.prototype_index.classify_text(question_text)
             
         except Exception as e:
             self.logger.error(f"向量分類失敗: {str(e)}")
             return None
     
+    def classify_questions(self, question_texts: List[str]) -> List[Dict]:
+        """
+        批量分類問題（向量分類一次批量 embedding，規則分類逐筆）
+        
+        Args:
+            question_texts: 問題文本列表
+            
+        Returns:
+            與輸入對齊的分類結果列表
+        """
+        vector_results = [None] * len(question_texts)
+        if self.use_vector_classification and question_texts:
+            try:
+                vector_results = self.prototype_index.classify_texts(question_texts)
+            except Exception as e:
+                self.logger.error(f"批量向量分類失敗: {str(e)}")
+        
+        return [
+            self._merge_multiple_classification_results(
+                vector_result, self._rule_based_classify(text), None
+            )
+            for text, vector_result in zip(question_texts, vector_results)
+        ]
+    
     def _ai_based_classify(self, question_text: str) -> Optional[Dict]:
         """基於 AI 的分類（需要 embedding 服務支援）"""
         try:
@@ -389,45 +360,45 @@ class QuestionClassifier:
         rule_result['ai_suggestion'] = ai_result
         return rule_result
     
-    def find_similar_questions(self, question_text: str, existing_questions: List[str], 
+    def find_similar_questions(self, question_text: str, existing_questions: Optional[List[str]] = None, 
                              similarity_threshold: float = 0.7) -> List[Tuple[str, float]]:
         """
-        查找相似問題
+        查找相似問題（Jaccard 相似度）
         
         Args:
             question_text (str): 當前問題
-            existing_questions (List[str]): 已存在的問題列表
+            existing_questions (List[str], optional): 要比對的問題列表；
+                None 時查詢歷史用戶問題的 MinHash LSH 索引（次線性）
             similarity_threshold (float): 相似度閾值
             
         Returns:
             List[Tuple[str, float]]: 相似問題和相似度分數列表
         """
-        similar_questions = []
-        
         try:
-            # 簡化版本：基於關鍵字重疊度計算相似度
-            current_words = set(re.findall(r'\w+', question_text.lower()))
+            from library.common.analytics.question_minhash import (
+                get_question_history_index, jaccard, question_shingles
+            )
+            
+            if existing_questions is None:
+                return get_question_history_index('rvt_assistant').find_similar(
+                    question_text, threshold=similarity_threshold
+                )
             
+            # 指定列表：逐一比對（當前問題只分詞一次）
+            current_shingles = question_shingles(question_text)
+            similar_questions = []
             for existing_question in existing_questions:
-                existing_words = set(re.findall(r'\w+', existing_question.lower()))
-                
-                # 計算 Jaccard 相似度
-                intersection = current_words.intersection(existing_words)
-                union = current_words.union(existing_words)
-                
-                if len(union) > 0:
-                    similarity = len(intersection) / len(union)
-                    
-                    if similarity >= similarity_threshold:
-                        similar_questions.append((existing_question, similarity))
+                similarity = jaccard(current_shingles, question_shingles(existing_question))
+                if similarity >= similarity_threshold:
+                    similar_questions.append((existing_question, similarity))
             
             # 按相似度排序
             similar_questions.sort(key=lambda x: x[1], reverse=True)
+            return similar_questions
             
         except Exception as e:
             self.logger.error(f"查找相似問題失敗: {str(e)}")
-        
-        return similar_questions
+            return []
     
     def get_category_stats(self, questions_with_categories: List[Tuple[str, str]]) -> Dict:
         """
@@ -486,10 +457,10 @@ def get_question_categories() -> Dict:
         for category, rules in QuestionClassifier.CATEGORY_RULES.items()
     }
 
-def find_similar_questions(question_text: str, existing_questions: List[str], 
+def find_similar_questions(question_text: str, existing_questions: Optional[List[str]] = None, 
                           similarity_threshold: float = 0.7) -> List[Tuple[str, float]]:
     """查找相似問題便利函數"""
-    classifier = QuestionClassifier()
+    classifier = QuestionClassifier(use_vector_classification=False)
     return classifier.find_similar_questions(question_text, existing_questions, similarity_threshold)
 
 def get_vector_similar_questions(question_text: str, limit: int = 10, 
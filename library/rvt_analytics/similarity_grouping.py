@@ -0,0 +1,175 @@
+"""
+Similarity Grouping Engine - 問題相似度分組引擎
+
+取代「每個問題重新 embedding + 一次 pgvector 掃描」的分組方式：
+1. 一次讀取候選問題已存儲的向量（VectorBulkReader）
+2. 以分塊 NumPy 矩陣乘法計算相似度矩陣（只看上三角）
+3. 以 Union-Find 將相似度 ≥ 閾值的問題合併為群組
+
+候選窗口可遠大於原本寫死的 LIMIT 100；分塊計算讓記憶體維持在
+block_size × n 的範圍內。
+"""
+
+import logging
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+from library.common.vector_bulk_reader import VectorBulkReader, VectorMatrix
+
+logger = logging.getLogger(__name__)
+
+# 預設候選窗口與分塊大小
+DEFAULT_CANDIDATE_WINDOW = 2000
+DEFAULT_BLOCK_SIZE = 1024
+
+
+class UnionFind:
+    """Union-Find（路徑壓縮 + 依大小合併）"""
+
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+        self.size = [1] * size
+
+    def find(self, x: int) -> int:
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a: int, b: int) -> int:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return root_a
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+        return root_a
+
+    def groups(self) -> List[List[int]]:
+        """回傳所有群組（每組為成員索引列表）"""
+        members: Dict[int, List[int]] = {}
+        for idx in range(len(self.parent)):
+            members.setdefault(self.find(idx), []).append(idx)
+        return list(members.values())
+
+
+def group_by_similarity(vectors: np.ndarray, threshold: float,
+                        block_size: int = DEFAULT_BLOCK_SIZE) -> List[List[int]]:
+    """
+    依餘弦相似度閾值將向量分組（連通分量）
+
+    Args:
+        vectors: (n, dim) 向量矩陣
+        threshold: 相似度閾值
+        block_size: 每次矩陣乘法的列數
+
+    Returns:
+        群組列表（依大小遞減），每組為列索引列表
+    """
+    n_samples = len(vectors)
+    if n_samples == 0:
+        return []
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    normalized = (vectors / norms).astype(np.float32, copy=False)
+
+    union_find = UnionFind(n_samples)
+    for start in range(0, n_samples, block_size):
+        block = normalized[start:start + block_size]
+        # 只需與自身之後的列比較（上三角）
+        similarities = block @ normalized[start:].T
+        rows, cols = np.nonzero(similarities >= threshold)
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            i, j = start + row, start + col
+            if i < j:
+                union_find.union(i, j)
+
+    groups = union_find.groups()
+    groups.sort(key=len, reverse=True)
+    return groups
+
+
+class SimilarityGroupingEngine:
+    """基於已存儲向量的問題相似度分組引擎"""
+
+    def __init__(self, candidate_window: int = DEFAULT_CANDIDATE_WINDOW,
+                 block_size: int = DEFAULT_BLOCK_SIZE):
+        self.logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.candidate_window = candidate_window
+        self.block_size = block_size
+        self._reader: Optional[VectorBulkReader] = None
+
+    def load_candidates(self, days: Optional[int] = None) -> VectorMatrix:
+        """
+        讀取最近的用戶問題向量
+
+        Args:
+            days: 只取最近 N 天（None 則不限）
+        """
+        where = "user_role = 'user'"
+        params: List[Any] = []
+        if days:
+            where += " AND created_at >= NOW() - (%s * INTERVAL '1 day')"
+            params.append(days)
+
+        self._reader = VectorBulkReader(
+            'chat_message_embeddings_1024',
+            where=where,
+            params=params,
+            order_by='created_at DESC',
+            limit=self.candidate_window
+        )
+        return self._reader.read_matrix()
+
+    def build_groups(self, threshold: float = 0.8, days: Optional[int] = None,
+                     min_group_size: int = 2) -> List[Dict[str, Any]]:
+        """
+        計算相似問題群組
+
+        Args:
+            threshold: 相似度閾值
+            days: 只分析最近 N 天
+            min_group_size: 最小群組大小
+
+        Returns:
+            群組列表，每組含成員 id、代表問題索引與平均相似度
+        """
+        matrix = self.load_candidates(days)
+        if len(matrix) == 0:
+            return []
+
+        normalized = matrix.normalized()
+        groups = []
+        for indices in group_by_similarity(matrix.vectors, threshold, self.block_size):
+            if len(indices) < min_group_size:
+                break
+
+            member_vectors = normalized[indices]
+            centroid = member_vectors.mean(axis=0)
+            centroid /= (np.linalg.norm(centroid) or 1.0)
+            centroid_similarity = member_vectors @ centroid
+
+            groups.append({
+                'member_ids': matrix.ids[indices].tolist(),
+                # 代表問題：最接近群組中心者
+                'representative_id': int(matrix.ids[indices[int(np.argmax(centroid_similarity))]]),
+                'avg_similarity': round(float(centroid_similarity.mean()), 4),
+                'count': len(indices),
+            })
+
+        self.logger.info(
+            f"相似度分組完成: 候選 {len(matrix)} 筆, 閾值 {threshold}, 群組 {len(groups)} 個"
+        )
+        return groups
+
+    def fetch_texts(self, ids: List[int]) -> Dict[int, str]:
+        """按需查詢群組成員的文字內容"""
+        if self._reader is None:
+            return {}
+        metadata = self._reader.fetch_metadata(ids, ['text_content'])
+        return {vector_id: row['text_content'] for vector_id, row in metadata.items()}
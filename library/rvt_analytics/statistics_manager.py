@@ -26,7 +26,7 @@ Usage:
 
 import logging
 from typing import Dict, Optional
-from datetime import datetime, timedelta
+from datetime import datetime
 from library.common.analytics.base_statistics_manager import BaseStatisticsManager
 
 logger = logging.getLogger(__name__)
@@ -93,88 +93,25 @@ class StatisticsManager(BaseStatisticsManager):
                 'generated_at': datetime.now().isoformat()
             }
     
-    def _get_question_stats(self, days: int, user=None) -> Dict:
-        """獲取問題統計（RVT 特定邏輯）"""
-        try:
-            from .question_classifier import QuestionClassifier, classify_question
-            from django.utils import timezone
-            from api.models import ChatMessage, ConversationSession
-            from collections import Counter
-            
-            # 獲取用戶消息
-            start_date = timezone.now() - timedelta(days=days)
-            messages_query = ChatMessage.objects.filter(
-                role='user',
-                created_at__gte=start_date
-            )
-            
-            if user:
-                user_sessions = ConversationSession.objects.filter(user=user)
-                messages_query = messages_query.filter(
-                    conversation_id__in=user_sessions.values_list('id', flat=True)
-                )
-            
-            user_messages = list(messages_query.values_list('content', flat=True))
-            
-            if not user_messages:
-                return {
-                    'total_questions': 0,
-                    'category_distribution': {},
-                    'top_questions': [],
-                    'popular_questions': []
-                }
-            
-            # 問題分類統計
-            classifier = QuestionClassifier()
-            category_counts = {}
-            classified_questions = []
-            
-            for question in user_messages:
-                classification = classify_question(question)
-                category = classification['category']
-                
-                if category not in category_counts:
-                    category_counts[category] = 0
-                category_counts[category] += 1
-                
-                classified_questions.append((question, category))
-            
-            # 獲取分類統計
-            category_stats = classifier.get_category_stats(classified_questions)
-            
-            # 計算熱門問題（問題頻率統計）
-            question_counter = Counter(user_messages)
-            popular_questions = [
-                {
-                    'question': question,
-                    'count': count,
-                    'percentage': round((count / len(user_messages)) * 100, 2)
-                }
-                for question, count in question_counter.most_common(20)
-            ]
-            
-            return {
-                'total_questions': len(user_messages),
-                'category_distribution': category_counts,
-                'category_percentages': category_stats.get('category_percentages', {}),
-                'top_categories': category_stats.get('top_categories', []),
-                'popular_questions': popular_questions  # 添加熱門問題
-            }
-            
-        except Exception as e:
-            self.logger.error(f"獲取問題統計失敗: {str(e)}")
-            return {'error': str(e)}
+    def get_question_classifier(self):
+        """返回 RVT 問題分類器（問題統計由基類串流計算，逐筆分類只用規則以免每題 embedding）"""
+        from .question_classifier import QuestionClassifier
+        return QuestionClassifier(use_vector_classification=False)
     
     def _get_satisfaction_stats(self, days: int, user=None) -> Dict:
-        """獲取滿意度統計（RVT 特定邏輯）"""
+        """獲取滿意度統計（讀取每日彙總；詳細分析見 satisfaction_analyzer）"""
         try:
-            from .satisfaction_analyzer import analyze_user_satisfaction
-            
-            satisfaction_result = analyze_user_satisfaction(
-                user=user,
-                days=days
+            from library.common.analytics.daily_rollup import (
+                get_daily_rollup_service, satisfaction_from_totals
             )
-            
+
+            totals = get_daily_rollup_service().get_totals(self.get_assistant_type(), days, user)
+            satisfaction_result = satisfaction_from_totals(totals)
+            satisfaction_result.update({
+                'analysis_period': f'{days} 天',
+                'analyzed_at': datetime.now().isoformat()
+            })
+
             return satisfaction_result
             
         except Exception as e:
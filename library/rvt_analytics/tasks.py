@@ -8,12 +8,16 @@ RVT Analytics Celery Tasks - 向量資料維護和問題分析任務
 📋 核心任務:
 - rebuild_chat_vectors: 處理未向量化的聊天消息 (每小時執行)
 - preload_vector_services: 預載入向量服務
-- precompute_question_classifications: 更新問題分類統計  
+- precompute_question_classifications: 更新問題分類統計（含批量原型分類）
+- refresh_question_prototypes: 重算問題分類原型向量
+- rebalance_chat_clusters: 增量聚類再平衡（只處理漂移聚類）
+- rebuild_chat_clusters: 完整重建聚類（維護操作）
+- refresh_analytics_rollups: 更新對話分析每日彙總（儀表板讀取）
 - cleanup_expired_cache: 清理過期快取
 
 🚀 實施效果:
 - 向量化率: 8.1% → 30.6% (2025-10-09 驗證)
-- 處理效率: ~5 消息/秒
+- 處理效率: ~5 消息/秒（逐筆處理）→ 批量管線 (chat_vector_pipeline.py)
 - 熱門問題分析: 更準確反映用戶關注點
 
 📖 完整文檔: /docs/vector-database-scheduled-update-architecture.md
@@ -109,8 +113,9 @@ def precompute_question_classifications(self):
     
     這個任務會：
     1. 更新問題聚類
-    2. 重新計算熱門問題排名
-    3. 更新問題統計快取
+    2. 批量分類未分類的問題向量（類別原型 + 一次矩陣乘法）
+    3. 重新計算熱門問題排名
+    4. 更新問題統計快取
     
     Returns:
         dict: 預計算結果
@@ -122,27 +127,54 @@ def precompute_question_classifications(self):
             'clustering_updated': False,
             'popular_questions_updated': False,
             'cache_refreshed': False,
+            'questions_classified': 0,
             'total_questions_processed': 0
         }
         
-        # 更新問題聚類
+        # 更新問題聚類（已有質心時只做增量再平衡，完整重建僅在首次執行）
         try:
-            from library.rvt_analytics.chat_clustering_service import get_clustering_service
-            clustering_service = get_clustering_service()
-            if clustering_service:
-                # 執行聚類更新
-                cluster_result = clustering_service.perform_auto_clustering()
-                if cluster_result.get('success'):
+            from library.rvt_analytics.incremental_clustering import get_incremental_clustering_service
+            incremental_service = get_incremental_clustering_service()
+            if incremental_service.has_centroids():
+                rebalance_result = incremental_service.rebalance_drifted_clusters()
+                if rebalance_result.get('success'):
                     results['clustering_updated'] = True
-                    results['total_questions_processed'] = cluster_result.get('n_samples', 0)
-                    logger.info(f"✅ 問題聚類更新成功，處理了 {results['total_questions_processed']} 個問題")
+                    logger.info(f"✅ 問題聚類增量再平衡完成: {rebalance_result}")
                 else:
-                    logger.warning("⚠️  問題聚類更新未完成")
+                    logger.warning(f"⚠️  問題聚類再平衡未完成: {rebalance_result.get('error')}")
             else:
-                logger.warning("⚠️  聚類服務不可用")
+                from library.rvt_analytics.chat_clustering_service import get_clustering_service
+                cluster_result = get_clustering_service().perform_clustering_analysis()
+                if 'error' not in cluster_result:
+                    results['clustering_updated'] = True
+                    results['total_questions_processed'] = cluster_result.get(
+                        'analysis_summary', {}).get('total_messages', 0)
+                    logger.info(f"✅ 問題聚類完整重建成功，處理了 {results['total_questions_processed']} 個問題")
+                else:
+                    logger.warning(f"⚠️  問題聚類更新未完成: {cluster_result.get('error')}")
         except Exception as e:
             logger.error(f"❌ 問題聚類更新失敗: {str(e)}")
         
+        # 批量分類未分類的問題（使用已存向量，不重新 embedding）
+        try:
+            from library.rvt_analytics.category_prototypes import get_category_prototype_index
+            from library.rvt_analytics.question_classifier import QuestionClassifier
+            prototype_index = get_category_prototype_index()
+            prototype_index.refresh()
+            label_result = prototype_index.label_unclassified(
+                rule_classifier=QuestionClassifier(use_vector_classification=False)
+            )
+            if label_result.get('success'):
+                results['questions_classified'] = label_result['labeled']
+                if label_result['method'] == 'rule_based_seed' and label_result['labeled']:
+                    # 初始標記完成後立即建立原型
+                    prototype_index.refresh()
+                logger.info(f"✅ 批量問題分類完成: {label_result}")
+            else:
+                logger.warning(f"⚠️  批量問題分類未完成: {label_result.get('error')}")
+        except Exception as e:
+            logger.error(f"❌ 批量問題分類失敗: {str(e)}")
+        
         # 更新熱門問題統計
         try:
             from library.rvt_analytics.vector_question_analyzer import get_enhanced_question_analysis
@@ -181,6 +213,136 @@ def precompute_question_classifications(self):
             'error': error_msg
         }
 
+@shared_task(bind=True, ignore_result=False)
+def refresh_question_prototypes(self):
+    """
+    重算問題分類原型任務（定期執行）
+    
+    以已標記問題的平均向量建立各類別原型，寫入共享快取；
+    各 worker 的 QuestionClassifier 在記憶體 TTL 過期後載入新原型。
+    
+    Returns:
+        dict: 更新結果
+    """
+    try:
+        from library.rvt_analytics.category_prototypes import refresh_category_prototypes
+        result = refresh_category_prototypes()
+        logger.info(f"✅ 問題分類原型更新: {result}")
+        return result
+        
+    except Exception as e:
+        error_msg = f"問題分類原型更新任務失敗: {str(e)}"
+        logger.error(f"❌ {error_msg}")
+        return {
+            'success': False,
+            'error': error_msg
+        }
+
+@shared_task(bind=True, ignore_result=False)
+def rebalance_chat_clusters(self):
+    """
+    聚類再平衡任務（定期執行）
+    
+    只處理漂移的聚類：
+    1. 變異數明顯增加的聚類 → 分裂
+    2. 質心過於接近的聚類 → 合併
+    3. 累積的離群消息 → 聚成新聚類
+    
+    Returns:
+        dict: 再平衡結果
+    """
+    try:
+        logger.info("開始聚類再平衡...")
+        
+        from library.rvt_analytics.incremental_clustering import get_incremental_clustering_service
+        result = get_incremental_clustering_service().rebalance_drifted_clusters()
+        result['timestamp'] = self.request.called_directly and "immediate" or "scheduled"
+        
+        if result.get('success'):
+            logger.info(f"✅ 聚類再平衡任務完成: 分裂 {len(result['split'])} 個, "
+                        f"合併 {len(result['merged'])} 個, 新增 {result['new_clusters']} 個")
+        else:
+            logger.warning(f"⚠️  聚類再平衡未完成: {result.get('error')}")
+        return result
+        
+    except Exception as e:
+        error_msg = f"聚類再平衡任務失敗: {str(e)}"
+        logger.error(f"❌ {error_msg}")
+        return {
+            'success': False,
+            'error': error_msg
+        }
+
+@shared_task(bind=True, ignore_result=False)
+def rebuild_chat_clusters(self, algorithm: str = 'kmeans'):
+    """
+    完整重建聊天聚類（維護操作，按需執行）
+    
+    重新聚類整張向量表並覆蓋持久化質心。
+    
+    Args:
+        algorithm: 聚類算法 ('kmeans' 或 'dbscan')
+        
+    Returns:
+        dict: 重建結果摘要
+    """
+    try:
+        logger.info(f"開始完整重建聊天聚類... (algorithm={algorithm})")
+        
+        from library.rvt_analytics.chat_clustering_service import get_clustering_service
+        result = get_clustering_service().perform_clustering_analysis(algorithm)
+        
+        if 'error' in result:
+            return {'success': False, 'error': result['error']}
+        
+        return {
+            'success': True,
+            'analysis_summary': result.get('analysis_summary', {}),
+            'centroids_persisted': result.get('centroids_persisted', 0)
+        }
+        
+    except Exception as e:
+        error_msg = f"完整重建聊天聚類失敗: {str(e)}"
+        logger.error(f"❌ {error_msg}")
+        return {
+            'success': False,
+            'error': error_msg
+        }
+
+@shared_task(bind=True, ignore_result=False)
+def refresh_analytics_rollups(self, full_days: Optional[int] = None):
+    """
+    更新對話分析每日彙總（conversation_daily_rollups）
+    
+    預設只重算自上次執行後有變動的日期（新訊息、事後反饋）；
+    指定 full_days 時重算最近 N 天，涵蓋刪除對話等無法以水位線偵測的變動。
+    
+    Args:
+        full_days: 重算最近 N 天（None 則只重算有變動的日期）
+        
+    Returns:
+        dict: 重算結果
+    """
+    try:
+        from library.common.analytics.daily_rollup import get_daily_rollup_service
+        service = get_daily_rollup_service()
+        
+        if full_days:
+            result = service.rebuild_recent(full_days)
+        else:
+            result = service.refresh_changed_days()
+        
+        logger.info(f"✅ 每日彙總更新完成: {result['days']} 天, {result['rows']} 列")
+        return result
+        
+    except Exception as e:
+        error_msg = f"每日彙總更新失敗: {str(e)}"
+        logger.error(f"❌ {error_msg}")
+        return {
+            'success': False,
+            'error': error_msg
+        }
+
 @shared_task(bind=True, ignore_result=False)
 def cleanup_expired_cache(self):
     """
@@ -234,14 +396,19 @@ def cleanup_expired_cache(self):
         }
 
 @shared_task(bind=True, ignore_result=False)
-def rebuild_chat_vectors(self, force_rebuild: bool = False, user_role: str = 'user', min_length: int = 5):
+def rebuild_chat_vectors(self, force_rebuild: bool = False, user_role: str = 'user', min_length: int = 5,
+                         max_messages: Optional[int] = None):
     """
     重建聊天向量任務（按需執行）
     
+    使用批量向量化管線：anti-join 分塊讀取 → 雜湊去重 → 批量生成向量 → 批量寫入，
+    並以檢查點記錄進度，下次執行從檢查點續跑。
+    
     Args:
-        force_rebuild: 是否強制重建已存在的向量
+        force_rebuild: 忽略檢查點，從頭掃描所有未向量化的消息
         user_role: 處理的用戶角色 ('user', 'assistant', 'all')
         min_length: 最小消息長度過濾
+        max_messages: 本次最多處理的消息數（None 表示處理全部）
         
     Returns:
         dict: 重建結果
@@ -249,53 +416,12 @@ def rebuild_chat_vectors(self, force_rebuild: bool = False, user_role: str = 'us
     try:
         logger.info(f"開始重建聊天向量... (force_rebuild={force_rebuild}, user_role={user_role})")
         
-        from library.rvt_analytics.chat_vector_service import get_chat_vector_service
-        from django.db import connection
-        
-        vector_service = get_chat_vector_service()
-        if not vector_service:
-            raise Exception("聊天向量服務不可用")
+        from library.rvt_analytics.chat_vector_pipeline import ChatVectorPipeline
         
-        # 獲取需要處理的消息
-        role_filter = ""
-        if user_role != 'all':
-            role_filter = f"AND cm.role = '{user_role}'"
+        pipeline = ChatVectorPipeline(user_role=user_role, min_length=min_length)
+        pipeline_result = pipeline.run(max_messages=max_messages, resume=not force_rebuild)
         
-        exclude_processed = ""
-        if not force_rebuild:
-            exclude_processed = """
-            AND NOT EXISTS (
-                SELECT 1 FROM chat_message_embeddings_1024 ce 
-                WHERE ce.chat_message_id = cm.id
-            )
-            """
-        
-        with connection.cursor() as cursor:
-            cursor.execute(f"""
-                SELECT 
-                    cm.id,
-                    cm.conversation_id,
-                    cm.content,
-                    cm.role
-                FROM chat_messages cm
-                WHERE LENGTH(cm.content) >= %s
-                {role_filter}
-                {exclude_processed}
-                ORDER BY cm.created_at DESC
-                LIMIT 1000  -- 限制批次大小
-            """, [min_length])
-            
-            messages = [
-                {
-                    'id': row[0],
-                    'conversation_id': row[1], 
-                    'content': row[2],
-                    'role': row[3]
-                }
-                for row in cursor.fetchall()
-            ]
-        
-        if not messages:
+        if pipeline_result['total_processed'] == 0:
             logger.info("沒有需要處理的消息")
             return {
                 'success': True,
@@ -303,20 +429,19 @@ def rebuild_chat_vectors(self, force_rebuild: bool = False, user_role: str = 'us
                 'processed': 0
             }
         
-        # 批量處理
-        batch_result = vector_service.batch_process_messages(messages)
-        
         result = {
-            'success': True,
+            'success': not pipeline_result['errors'],
             'message': f'聊天向量重建完成',
-            'total_messages': len(messages),
-            'successful': batch_result.get('successful', 0),
-            'failed': batch_result.get('failed', 0),
-            'skipped': batch_result.get('skipped', 0),
-            'errors': batch_result.get('errors', [])
+            'total_messages': pipeline_result['total_processed'],
+            'successful': pipeline_result['successful'],
+            'failed': pipeline_result['failed'],
+            'skipped': pipeline_result['skipped'],
+            'checkpoint': pipeline_result['checkpoint'],
+            'messages_per_second': pipeline_result['messages_per_second'],
+            'errors': pipeline_result['errors']
         }
         
-        logger.info(f"✅ 聊天向量重建任務完成: {batch_result}")
+        logger.info(f"✅ 聊天向量重建任務完成: {pipeline_result}")
         return result
         
     except Exception as e:
@@ -176,86 +176,58 @@ class VectorQuestionAnalyzer:
             return question[:20] + ('...' if len(question) > 20 else '')
     
     def get_question_similarity_groups(self, threshold: float = 0.8, 
-                                     limit: int = 10) -> List[Dict]:
+                                     limit: int = 10,
+                                     candidate_window: int = 2000,
+                                     days: Optional[int] = None) -> List[Dict]:
         """
         基於向量相似度分析問題組群
         
+        一次讀取候選問題的已存儲向量，以矩陣乘法計算相似度，
+        再以 Union-Find 依閾值分組（不再逐題重新 embedding 與搜尋）。
+        
         Args:
             threshold: 相似度閾值
             limit: 返回組群數量
+            candidate_window: 候選問題數量（最近的 N 個向量化問題）
+            days: 只分析最近 N 天（None 則不限）
             
         Returns:
             List[Dict]: 相似問題組群
         """
         try:
-            vector_service = self._get_vector_service()
-            if not vector_service:
-                return []
-            
-            # 獲取所有向量化的用戶消息
-            from django.db import connection
-            
-            with connection.cursor() as cursor:
-                cursor.execute('''
-                    SELECT DISTINCT cm.content
-                    FROM chat_messages cm
-                    JOIN chat_message_embeddings_1024 cme ON cm.id = cme.chat_message_id
-                    WHERE cm.role = 'user'
-                    ORDER BY cm.created_at DESC
-                    LIMIT 100  -- 限制數量以提高性能
-                ''')
-                
-                questions = [row[0] for row in cursor.fetchall()]
+            from library.rvt_analytics.similarity_grouping import SimilarityGroupingEngine
             
-            if not questions:
+            engine = SimilarityGroupingEngine(candidate_window=candidate_window)
+            groups = engine.build_groups(threshold=threshold, days=days)[:limit]
+            if not groups:
                 return []
             
-            # 使用向量相似度進行分組
-            similarity_groups = []
-            processed_questions = set()
+            # 只查詢要回傳的群組成員文字
+            needed_ids = []
+            for group in groups:
+                needed_ids.append(group['representative_id'])
+                needed_ids.extend(group['member_ids'][:5])
+            texts = engine.fetch_texts(needed_ids)
             
-            for base_question in questions:
-                if base_question in processed_questions:
-                    continue
+            similarity_groups = []
+            for group in groups:
+                base_question = texts.get(group['representative_id'], '')
+                examples = [texts[vector_id] for vector_id in group['member_ids'][:5]
+                            if vector_id in texts]
                 
-                # 搜索相似問題
-                try:
-                    from library.rvt_analytics.chat_vector_service import search_similar_chat_messages
-                    similar_questions = search_similar_chat_messages(
-                        base_question, 
-                        limit=10, 
-                        threshold=threshold
-                    )
-                    
-                    if len(similar_questions) > 1:  # 至少2個相似問題才組成群組
-                        group_questions = [item['content'] for item in similar_questions]
-                        
-                        # 統計頻率
-                        group_count = len(group_questions)
-                        
-                        similarity_groups.append({
-                            'pattern': self._generate_question_label(base_question),
-                            'question': base_question,
-                            'count': group_count,
-                            'examples': group_questions[:5],
-                            'similarity_threshold': threshold,
-                            'is_vector_based': True,
-                            'analysis_method': 'vector_similarity',
-                            'avg_similarity': sum(item.get('score', 0) for item in similar_questions) / len(similar_questions)
-                        })
-                        
-                        # 標記已處理的問題
-                        processed_questions.update(group_questions)
-                        
-                except Exception as e:
-                    self.logger.warning(f"相似度搜索失敗 for '{base_question}': {e}")
-                    continue
-            
-            # 按組群大小排序
-            similarity_groups.sort(key=lambda x: x['count'], reverse=True)
+                similarity_groups.append({
+                    'pattern': self._generate_question_label(base_question),
+                    'question': base_question,
+                    'count': group['count'],
+                    'examples': examples,
+                    'similarity_threshold': threshold,
+                    'is_vector_based': True,
+                    'analysis_method': 'vector_similarity',
+                    'avg_similarity': group['avg_similarity']
+                })
             
             self.logger.info(f"相似度分析完成，發現 {len(similarity_groups)} 個相似問題組群")
-            return similarity_groups[:limit]
+            return similarity_groups
             
         except Exception as e:
             self.logger.error(f"相似度問題分析失敗: {str(e)}")
@@ -276,7 +248,7 @@ class VectorQuestionAnalyzer:
             cluster_analysis = self.analyze_popular_questions_by_clusters(days=days, limit=15)
             
             # 獲取相似度統計  
-            similarity_analysis = self.get_question_similarity_groups(threshold=0.7, limit=10)
+            similarity_analysis = self.get_question_similarity_groups(threshold=0.7, limit=10, days=days)
             
             # 合併並去重
             all_questions = cluster_analysis.copy()
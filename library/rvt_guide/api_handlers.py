@@ -155,6 +155,64 @@ class RVTGuideAPIHandler(BaseKnowledgeBaseAPIHandler):
                 'error': f'服務器錯誤: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
+    @classmethod
+    def handle_chat_stream_api(cls, request):
+        """
+        處理 RVT Guide 聊天 API 的 streaming 版本（Server-Sent Events）
+        
+        與 handle_chat_api 使用相同的智能搜尋路由，Dify 的回答片段到達即轉送給前端；
+        送出 message_end 後以完整回答保存對話記錄。
+        
+        Args:
+            request: Django request 對象
+            
+        Returns:
+            StreamingHttpResponse: text/event-stream
+        """
+        from library.dify_integration.stream_relay import sse_response
+        
+        data = request.data
+        message = data.get('message', '').strip()
+        conversation_id = data.get('conversation_id', '')
+        
+        if not message:
+            return sse_response([{'event': 'error', 'error': '訊息內容不能為空'}], status=400)
+        
+        user_id = f"rvt_guide_user_{request.user.id if request.user.is_authenticated else 'guest'}"
+        
+        logger.info(f"📩 RVT Guide Chat Stream Request (智能搜尋)")
+        logger.info(f"   Message: {message[:50]}...")
+        logger.info(f"   Conversation ID: {conversation_id if conversation_id else 'New'}")
+        
+        from .smart_search_router import SmartSearchRouter
+        
+        router = SmartSearchRouter()
+        
+        def events():
+            for event in router.stream_smart_search(
+                user_query=message,
+                conversation_id=conversation_id,
+                user_id=user_id,
+                request=request
+            ):
+                yield event
+                if event.get('event') != 'message_end':
+                    continue
+                try:
+                    RVTGuideAPIHandler._save_conversation_to_db(
+                        request=request,
+                        user_message=message,
+                        assistant_answer=event.get('answer', ''),
+                        conversation_id=event.get('conversation_id') or conversation_id,
+                        message_id=event.get('message_id', ''),
+                        response_time=event.get('response_time', 0),
+                        tokens=event.get('tokens', {})
+                    )
+                except Exception as save_error:
+                    logger.warning(f"保存對話記錄失敗（不影響回應）: {str(save_error)}")
+        
+        return sse_response(events())
+    
     @staticmethod
     def _save_conversation_to_db(
         request,
@@ -364,7 +422,8 @@ class RVTGuideAPIHandler(BaseKnowledgeBaseAPIHandler):
                                 'dify_metadata': result.get('metadata', {}),
                                 'workspace': rvt_config.get('workspace', 'RVT_Guide'),
                                 'app_name': rvt_config.get('app_name', 'RVT Guide')
-                            }
+                            },
+                            defer=True
                         )
                         
                         if conversation_result.get('success'):
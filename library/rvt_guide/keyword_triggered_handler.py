@@ -14,9 +14,10 @@ Date: 2025-11-11
 
 import logging
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Iterator
 
 from library.dify_integration.chat_client import DifyChatClient
+from library.dify_integration.stream_relay import StreamAccumulator, build_stream_result, relay_answer
 from library.config.dify_config_manager import get_rvt_guide_config
 
 logger = logging.getLogger(__name__)
@@ -112,3 +113,35 @@ class KeywordTriggeredSearchHandler:
         except Exception as e:
             logger.error(f"❌ RVT 模式 A 處理失敗: {str(e)}", exc_info=True)
             raise
+    
+    def stream_keyword_triggered_search(
+        self,
+        user_query: str,
+        conversation_id: str,
+        user_id: str,
+        **kwargs
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        關鍵字觸發全文搜尋的 streaming 版本（片段到達即轉送，最後送出 message_end）
+        
+        Yields:
+            Dict: 前端事件（見 library.dify_integration.stream_relay）
+        """
+        start_time = time.time()
+        logger.info(f"🔍 RVT 模式 A: 關鍵字優先全文搜尋（streaming）")
+        
+        accumulator = StreamAccumulator(start_time)
+        yield from relay_answer(
+            self.dify_client.stream_chat_events(
+                question=user_query,
+                conversation_id=conversation_id if conversation_id else "",
+                user=user_id
+            ),
+            accumulator
+        )
+        accumulator.raise_for_error()
+        
+        logger.info(f"   ✅ RVT 模式 A 完成（首字 {accumulator.first_token_time or 0:.2f} 秒）")
+        yield {'event': 'message_end', **build_stream_result(
+            accumulator, conversation_id, start_time, mode='mode_a', is_fallback=False
+        )}
@@ -12,7 +12,7 @@ Date: 2025-11-11
 """
 
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Iterator
 
 # 導入關鍵字檢測器
 from library.common.query_analysis import contains_full_document_keywords
@@ -123,3 +123,39 @@ class SmartSearchRouter:
                 'is_fallback': True,
                 'error': str(e),
             }
+    
+    def stream_smart_search(
+        self,
+        user_query: str,
+        conversation_id: str,
+        user_id: str,
+        **kwargs
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        智能搜尋的 streaming 版本（路由方式與 handle_smart_search 相同）
+        
+        Yields:
+            Dict: 前端事件（見 library.dify_integration.stream_relay），
+                  最後一個為 message_end 或 error
+        """
+        search_mode = self.route_search_strategy(user_query)
+        
+        try:
+            if search_mode == 'mode_a':
+                yield from self.mode_a_handler.stream_keyword_triggered_search(
+                    user_query=user_query,
+                    conversation_id=conversation_id,
+                    user_id=user_id,
+                    **kwargs
+                )
+            else:
+                yield from self.mode_b_handler.stream_two_tier_search(
+                    user_query=user_query,
+                    conversation_id=conversation_id,
+                    user_id=user_id,
+                    **kwargs
+                )
+        
+        except Exception as e:
+            logger.error(f"❌ RVT 智能搜尋串流失敗: {str(e)}", exc_info=True)
+            yield {'event': 'error', 'error': str(e)}
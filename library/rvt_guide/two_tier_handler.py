@@ -24,9 +24,12 @@ Date: 2025-11-11
 
 import logging
 import time
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterator, List
 
 from library.dify_integration.chat_client import DifyChatClient
+from library.dify_integration.stream_relay import (
+    FALLBACK_SUFFIX, StreamAccumulator, build_stream_result, relay_answer
+)
 from library.config.dify_config_manager import get_rvt_guide_config
 from library.common.ai_response import is_uncertain_response
 
@@ -226,19 +229,7 @@ class TwoTierSearchHandler:
             # 保持原查詢不變
             rewritten_query = query
             
-            if is_full_search:
-                # Stage 2：通過 inputs 傳遞文檔搜索模式
-                logger.info(f"   📝 Stage 2: 使用文檔搜索模式 (search_mode='document_only')")
-                inputs = {
-                    'search_mode': 'document_only',  # ← 顯式指定文檔搜索
-                    'require_detailed_answer': 'true'
-                }
-            else:
-                # Stage 1：使用自動模式（段落優先）
-                logger.info(f"   📝 Stage 1: 使用自動搜索模式 (search_mode='auto')")
-                inputs = {
-                    'search_mode': 'auto'
-                }
+            inputs = self._search_inputs(is_full_search)
             
             # 使用 DifyChatClient
             response = self.dify_client.chat(
@@ -254,3 +245,107 @@ class TwoTierSearchHandler:
         except Exception as e:
             logger.error(f"❌ RVT Dify 請求失敗: {str(e)}", exc_info=True)
             raise
+    
+    @staticmethod
+    def _search_inputs(is_full_search: bool) -> Dict[str, Any]:
+        """Stage 1 段落搜尋 / Stage 2 文檔搜尋的 Dify inputs"""
+        if is_full_search:
+            # Stage 2：通過 inputs 傳遞文檔搜索模式
+            logger.info(f"   📝 Stage 2: 使用文檔搜索模式 (search_mode='document_only')")
+            return {
+                'search_mode': 'document_only',  # ← 顯式指定文檔搜索
+                'require_detailed_answer': 'true'
+            }
+        # Stage 1：使用自動模式（段落優先）
+        logger.info(f"   📝 Stage 1: 使用自動搜索模式 (search_mode='auto')")
+        return {
+            'search_mode': 'auto'
+        }
+    
+    # ------------------------------------------------------------
+    # Streaming（SSE 轉送）
+    # ------------------------------------------------------------
+    
+    def stream_two_tier_search(
+        self,
+        user_query: str,
+        conversation_id: str,
+        user_id: str,
+        **kwargs
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        兩階段搜尋的 streaming 版本
+        
+        Stage 1 的片段到達即轉送；串流結束後以組裝好的完整回答檢測不確定，
+        不確定時送出 stage_retry（前端清除已顯示內容）再轉送 Stage 2。
+        最後送出 message_end，內容與 handle_two_tier_search 的回傳格式相同。
+        
+        Yields:
+            Dict: 前端事件（見 library.dify_integration.stream_relay）
+        """
+        start_time = time.time()
+        logger.info(f"🔄 RVT 模式 B: 兩階段搜尋（streaming）")
+        
+        # === 階段 1：段落級搜尋 ===
+        stage_1 = StreamAccumulator(start_time)
+        yield from relay_answer(
+            self._stream_dify_chat(user_query, conversation_id, user_id, is_full_search=False),
+            stage_1, stage=1
+        )
+        stage_1.raise_for_error()
+        
+        is_stage_1_uncertain, stage_1_keyword = is_uncertain_response(stage_1.answer)
+        if not is_stage_1_uncertain:
+            logger.info(f"   ✅ 階段 1 回答確定（首字 {stage_1.first_token_time or 0:.2f} 秒）")
+            yield {'event': 'message_end', **build_stream_result(
+                stage_1, conversation_id, start_time, mode='mode_b', stage=1, is_fallback=False
+            )}
+            return
+        
+        # === 階段 2：全文級搜尋 ===
+        logger.info(f"   ⚠️ 階段 1 回答不確定 (含關鍵字: {stage_1_keyword})，進入階段 2")
+        yield {'event': 'stage_retry', 'stage': 2, 'reason': f'階段 1 AI 回答不確定 (含: {stage_1_keyword})'}
+        
+        stage_2_query = user_query
+        stage_2 = StreamAccumulator(start_time)
+        yield from relay_answer(
+            self._stream_dify_chat(stage_2_query, conversation_id, user_id, is_full_search=True),
+            stage_2, stage=2
+        )
+        stage_2.raise_for_error()
+        
+        is_stage_2_uncertain, stage_2_keyword = is_uncertain_response(stage_2.answer)
+        result_fields = {'mode': 'mode_b', 'stage': 2, 'first_token_time': stage_1.first_token_time}
+        if not is_stage_2_uncertain:
+            logger.info(f"   ✅ 階段 2 回答確定")
+            yield {'event': 'message_end', **build_stream_result(
+                stage_2, conversation_id, start_time, is_fallback=False, **result_fields
+            )}
+            return
+        
+        # 階段 2 仍不確定：降級模式（AI 原始回答 + 友善提示）
+        logger.info(f"   ⚠️ 階段 2 回答不確定 (含關鍵字: {stage_2_keyword})，進入降級模式")
+        yield {'event': 'message', 'answer': FALLBACK_SUFFIX, 'stage': 2}
+        yield {'event': 'message_end', **build_stream_result(
+            stage_2, conversation_id, start_time,
+            answer=f"{stage_2.answer.strip()}{FALLBACK_SUFFIX}",
+            is_fallback=True,
+            fallback_reason=f'階段 2 AI 回答不確定 (含: {stage_2_keyword})',
+            **result_fields
+        )}
+    
+    def _stream_dify_chat(
+        self,
+        query: str,
+        conversation_id: str,
+        user_id: str,
+        is_full_search: bool = False
+    ) -> Iterator[Dict[str, Any]]:
+        """以 streaming 請求 Dify AI 回答（inputs 與 _request_dify_chat 相同）"""
+        return self.dify_client.stream_chat_events(
+            question=query,
+            conversation_id=conversation_id if conversation_id else "",
+            user=user_id,
+            inputs=self._search_inputs(is_full_search)
+        )
+
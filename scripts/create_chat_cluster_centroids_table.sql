@@ -0,0 +1,33 @@
+-- 創建聊天消息聚類質心表（增量聚類用）
+-- 執行命令: docker exec postgres_db psql -U postgres -d ai_platform -f /scripts/create_chat_cluster_centroids_table.sql
+
+-- 創建 chat_cluster_centroids 表
+CREATE TABLE IF NOT EXISTS chat_cluster_centroids (
+    cluster_id INTEGER PRIMARY KEY,
+
+    -- 質心向量（成員向量平均值）
+    centroid vector(1024) NOT NULL,
+
+    -- 成員統計（增量維護）
+    member_count INTEGER NOT NULL DEFAULT 0,
+    distance_sum FLOAT NOT NULL DEFAULT 0.0,       -- Σ 餘弦距離
+    distance_sq_sum FLOAT NOT NULL DEFAULT 0.0,    -- Σ 餘弦距離²（用於計算變異數）
+    baseline_variance FLOAT,                       -- 上次重建/再平衡時的變異數，用於偵測漂移
+
+    -- 分類資訊
+    predicted_category VARCHAR(50),
+
+    -- 時間戳記
+    rebalanced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS chat_cluster_centroids_updated_idx
+ON chat_cluster_centroids(updated_at DESC);
+
+-- 輸出創建結果
+\echo '✅ chat_cluster_centroids 表創建完成'
+
+-- 顯示表結構
+\d chat_cluster_centroids
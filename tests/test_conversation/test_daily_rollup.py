@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+對話每日彙總單元測試
+====================
+
+測試 library/common/analytics/daily_rollup.py 的增量計算邏輯，
+以及在專案設定（USE_TZ = False）下的日期計算（不需要資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_conversation/test_daily_rollup.py -v
+"""
+
+import os
+import sys
+from datetime import date, timedelta
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import pytest
+
+from library.common.analytics import daily_rollup
+from library.common.analytics.daily_rollup import (
+    COUNTER_COLUMNS, WATERMARK_CACHE_KEY, feedback_deltas, get_daily_rollup_service,
+    message_deltas, satisfaction_from_totals, to_chat_type
+)
+
+
+class FakeCache:
+    """只實作水位線用到的 get / set"""
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.values[key] = value
+
+
+class TestMessageDeltas:
+    """測試單則訊息的彙總增量"""
+
+    def test_user_message(self):
+        assert message_deltas('user') == {'message_count': 1, 'user_message_count': 1}
+
+    def test_assistant_message_with_feedback(self):
+        deltas = message_deltas('assistant', response_time=4.5, is_helpful=True,
+                                token_usage={'total_tokens': 120})
+
+        assert deltas['assistant_message_count'] == 1
+        assert deltas['helpful_count'] == 1
+        assert deltas['response_time_sum'] == 4.5
+        assert deltas['response_3_10s_count'] == 1
+        assert deltas['rated_medium_count'] == 1
+        assert deltas['rated_medium_helpful_count'] == 1
+        assert deltas['total_tokens'] == 120
+        assert set(deltas) <= set(COUNTER_COLUMNS)
+
+    def test_outlier_response_time_excluded_from_performance(self):
+        deltas = message_deltas('assistant', response_time=500, is_helpful=False)
+
+        assert 'response_time_count' not in deltas
+        assert deltas['rated_slow_count'] == 1
+        assert 'rated_slow_helpful_count' not in deltas
+
+    def test_invalid_token_usage_ignored(self):
+        assert 'total_tokens' not in message_deltas('assistant', token_usage={'total_tokens': 'n/a'})
+        assert 'total_tokens' not in message_deltas('assistant', token_usage=None)
+
+
+class TestFeedbackDeltas:
+    """測試反饋變更的增量"""
+
+    def test_unrated_to_helpful(self):
+        assert feedback_deltas(1.0, None, True) == {
+            'helpful_count': 1, 'rated_fast_count': 1, 'rated_fast_helpful_count': 1
+        }
+
+    def test_helpful_to_unhelpful(self):
+        assert feedback_deltas(12.0, True, False) == {
+            'helpful_count': -1, 'unhelpful_count': 1, 'rated_slow_helpful_count': -1
+        }
+
+    def test_without_response_time(self):
+        assert feedback_deltas(None, None, False) == {'unhelpful_count': 1}
+
+
+class TestSatisfactionFromTotals:
+    """測試由彙總計算滿意度"""
+
+    def test_rates(self):
+        totals = {col: 0 for col in COUNTER_COLUMNS}
+        totals.update({
+            'assistant_message_count': 10, 'helpful_count': 3, 'unhelpful_count': 1,
+            'rated_fast_count': 2, 'rated_fast_helpful_count': 2,
+        })
+        result = satisfaction_from_totals(totals)
+
+        assert result['basic_stats']['unrated_count'] == 6
+        assert result['basic_stats']['satisfaction_rate'] == 0.75
+        assert result['basic_stats']['feedback_rate'] == 0.4
+        assert result['response_time_analysis']['fast']['satisfaction_rate'] == 1.0
+        assert result['response_time_analysis']['slow']['satisfaction_rate'] == 0
+
+
+def test_to_chat_type():
+    assert to_chat_type('rvt_assistant') == 'rvt_assistant_chat'
+    assert to_chat_type('protocol_assistant_chat') == 'protocol_assistant_chat'
+
+
+class TestRollupDates:
+    """測試專案設定（naive datetime）下的查詢期間與重算日期"""
+
+    @pytest.fixture
+    def refreshed(self, monkeypatch):
+        """以假的快取取代 Redis，記錄 refresh_days 收到的日期"""
+        calls = []
+
+        def refresh_days(self, days):
+            calls.append(sorted(days))
+            return {'days': len(calls[-1]), 'rows': 0}
+
+        monkeypatch.setattr(daily_rollup, 'cache', FakeCache())
+        monkeypatch.setattr(daily_rollup.DailyRollupService, 'refresh_days', refresh_days)
+        return calls
+
+    def test_get_queryset_period(self):
+        queryset = get_daily_rollup_service().get_queryset('rvt_assistant', 30)
+
+        sql = str(queryset.query)
+        assert 'rvt_assistant_chat' in sql
+        assert f'>= {date.today() - timedelta(days=30)}' in sql
+
+    def test_refresh_without_watermark_rebuilds_recent_days(self, refreshed):
+        result = get_daily_rollup_service().refresh_changed_days(fallback_days=2)
+
+        assert result['success'] and result['full_rebuild']
+        assert refreshed == [[date.today() - timedelta(days=offset) for offset in (2, 1, 0)]]
+        assert daily_rollup.cache.get(WATERMARK_CACHE_KEY) == result['watermark']
+
+    def test_refresh_with_watermark_uses_changed_days(self, refreshed, monkeypatch):
+        daily_rollup.cache.set(WATERMARK_CACHE_KEY, '2026-01-01T00:00:00')
+        monkeypatch.setattr(daily_rollup.DailyRollupService, '_changed_days_since',
+                            lambda self, watermark: [watermark.date()])
+
+        result = get_daily_rollup_service().refresh_changed_days()
+
+        assert not result['full_rebuild']
+        assert refreshed == [[date(2026, 1, 1)]]
+
+    def test_rebuild_recent(self, refreshed):
+        assert get_daily_rollup_service().rebuild_recent(days=1)['days'] == 2
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+問題歷史查詢單元測試
+====================
+
+測試 library/common/analytics/question_history.py 的游標編碼、
+篩選條件組裝與結果格式（不需要資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_conversation/test_question_history.py -v
+"""
+
+import os
+import sys
+from datetime import datetime
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import pytest
+
+from library.common.analytics.question_history import (
+    QuestionHistoryQuery, decode_cursor, encode_cursor
+)
+
+
+class TestCursor:
+    """測試 keyset 游標"""
+
+    def test_round_trip(self):
+        created_at = datetime(2025, 10, 1, 8, 30, 15, 123456)
+        assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+    def test_invalid_cursor(self):
+        with pytest.raises(ValueError):
+            decode_cursor('not-a-cursor')
+
+
+class TestQuestionHistoryQuery:
+    """測試條件組裝與結果格式"""
+
+    def test_where_filters(self):
+        query = QuestionHistoryQuery(
+            'protocol_assistant_chat', user_id=3, owner_id=7, rating='dislike', search='ULINK'
+        )
+        where, params = query._where()
+
+        assert 'a.is_helpful IS FALSE' in where
+        assert params == ['protocol_assistant_chat', 3, 7, '%ULINK%']
+
+    def test_unknown_rating_is_ignored(self):
+        where, params = QuestionHistoryQuery('rvt_assistant_chat', rating='maybe')._where()
+        assert 'is_helpful' not in where
+        assert params == ['rvt_assistant_chat']
+
+    def test_format_row(self):
+        created_at = datetime(2025, 10, 1, 8, 0)
+        row = (10, '問題', created_at, 'dify-1', None,
+               'sess-1', None, 'guest-abc', None, 'x' * 101, True)
+        result = QuestionHistoryQuery._format_row(row)
+
+        assert result['user'] == {'id': None, 'username': 'guest-abc'}
+        assert result['answer_preview'] == 'x' * 100 + '...'
+        assert result['rating'] == 'like'
+        assert result['created_at'] == created_at.isoformat()
+
+    def test_format_row_without_answer(self):
+        row = (11, '問題', datetime(2025, 10, 1), None, None,
+               'sess-2', 5, '', 'alice', None, None)
+        result = QuestionHistoryQuery._format_row(row)
+
+        assert result['user'] == {'id': 5, 'username': 'alice'}
+        assert result['answer_preview'] is None
+        assert result['rating'] is None
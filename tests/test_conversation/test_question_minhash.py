@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+相似問題 MinHash 索引單元測試
+==============================
+
+測試 library/common/analytics/question_minhash.py 的分詞、LSH 查詢與
+熱門問題去重（不需要資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_conversation/test_question_minhash.py -v
+"""
+
+import os
+import sys
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+from library.common.analytics.question_minhash import (
+    MinHashLSH, jaccard, lsh_params, merge_near_duplicates, question_shingles
+)
+from library.common.analytics.question_stream import QuestionStreamStats
+
+
+class TestShingles:
+    """測試分詞"""
+
+    def test_mixed_language(self):
+        assert question_shingles('Jenkins 建置失敗') == frozenset({'jenkins', '建置', '置失', '失敗'})
+
+    def test_single_cjk_character(self):
+        assert question_shingles('ULINK 卡') == frozenset({'ulink', '卡'})
+
+
+class TestMinHashLSH:
+    """測試 LSH 索引"""
+
+    def test_params_favor_recall(self):
+        bands, rows = lsh_params(0.7, 128)
+        assert bands * rows <= 128
+        assert (1.0 / bands) ** (1.0 / rows) <= 0.7
+
+    def test_query_finds_near_duplicates_only(self):
+        index = MinHashLSH(threshold=0.6)
+        index.add(1, 'Jenkins pipeline build 失敗 怎麼辦')
+        index.add(2, 'Samsung SSD 效能測試步驟')
+        index.add(3, 'Ansible playbook 部署逾時')
+
+        matches = index.query('Jenkins pipeline build 失敗 怎麼辦呢')
+        assert [key for key, _ in matches] == [1]
+        expected = jaccard(question_shingles('Jenkins pipeline build 失敗 怎麼辦呢'),
+                           question_shingles('Jenkins pipeline build 失敗 怎麼辦'))
+        assert matches[0][1] == expected
+
+    def test_remove_and_overwrite(self):
+        index = MinHashLSH()
+        index.add('a', 'ULINK 連線問題')
+        index.add('a', 'MDT WinPE 開機')
+        assert index.query('ULINK 連線問題') == []
+        assert index.query('MDT WinPE 開機')[0][0] == 'a'
+
+        index.remove('a')
+        assert len(index) == 0
+        assert index.query('MDT WinPE 開機') == []
+
+
+class TestMergeNearDuplicates:
+    """測試熱門問題去重"""
+
+    def test_counts_merge_into_most_frequent(self):
+        merged = merge_near_duplicates([
+            ('Jenkins build 失敗怎麼辦', 5),
+            ('Jenkins build 失敗怎麼辦?', 3),
+            ('如何設定 IP', 4),
+        ])
+
+        assert merged[0][:2] == ('Jenkins build 失敗怎麼辦', 8)
+        assert merged[0][2] == ['Jenkins build 失敗怎麼辦?']
+        assert merged[1][:2] == ('如何設定 IP', 4)
+
+    def test_stream_stats_merge_option(self):
+        stats = QuestionStreamStats(extract_keywords=False)
+        stats.consume(['ping 不通'] * 2 + ['ping 不通 !'] * 2 + ['SSD 測試'] * 3)
+
+        assert stats.popular_questions(1) == [('SSD 測試', 3)]
+        assert stats.popular_questions(1, merge_similar=True) == [('ping 不通', 4)]
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+串流問題統計單元測試
+====================
+
+測試 library/common/analytics/question_stream.py 的 Space-Saving 草圖與
+單次掃描累計器（不需要資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_conversation/test_question_stream.py -v
+"""
+
+import os
+import random
+import sys
+from collections import Counter
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import pytest
+
+from library.common.analytics.question_stream import QuestionStreamStats, SpaceSaving
+
+
+class TestSpaceSaving:
+    """測試 Space-Saving 草圖"""
+
+    def test_exact_when_under_capacity(self):
+        items = ['a'] * 5 + ['b'] * 3 + ['c']
+        sketch = SpaceSaving(capacity=10)
+        sketch.update(items)
+
+        assert sketch.top(3) == [('a', 5), ('b', 3), ('c', 1)]
+        assert sketch.total == len(items)
+
+    def test_memory_is_bounded(self):
+        sketch = SpaceSaving(capacity=50)
+        sketch.update(str(i) for i in range(10000))
+
+        assert len(sketch) == 50
+        assert len(sketch._heap) <= 4 * 50 + 1
+
+    def test_heavy_hitters_survive_noise(self):
+        rng = random.Random(3)
+        stream = ['hot-1'] * 500 + ['hot-2'] * 300 + [f'noise-{rng.randrange(5000)}' for _ in range(3000)]
+        rng.shuffle(stream)
+
+        sketch = SpaceSaving(capacity=100)
+        sketch.update(stream)
+        exact = Counter(stream)
+
+        assert [item for item, _ in sketch.top(2)] == ['hot-1', 'hot-2']
+        for item, count in sketch.top(2):
+            # 上界估計，且保證下界不超過真實值
+            assert count >= exact[item]
+            assert sketch.guaranteed_count(item) <= exact[item]
+
+    def test_invalid_capacity(self):
+        with pytest.raises(ValueError):
+            SpaceSaving(capacity=0)
+
+
+class TestQuestionStreamStats:
+    """測試單次掃描累計器"""
+
+    def test_counts_and_categories(self):
+        stats = QuestionStreamStats(
+            classify=lambda text: 'error' if 'fail' in text else 'other',
+            extract_keywords=False
+        )
+        stats.consume([
+            {'content': 'jenkins build fail'},
+            {'content': 'jenkins build fail'},
+            {'content': 'how to deploy'},
+            {'content': ''},
+        ], key='content')
+
+        assert stats.total_questions == 3
+        assert stats.popular_questions(1) == [('jenkins build fail', 2)]
+        assert stats.categories == {'error': 2, 'other': 1}
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+對話會話增量統計單元測試
+======================
+
+測試 ChatMessage.save 以 F() 增量維護 ConversationSession 統計並由計數列配發序號
+（以假的 QuerySet 攔截 UPDATE，不需要資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_conversation/test_session_stats.py -v
+"""
+
+import os
+import sys
+from contextlib import nullcontext
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import pytest
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from api.models import ChatMessage, ConversationSession
+
+
+class FakeSessions:
+    """記錄 update() 參數，values().get() 回傳遞增後的計數"""
+
+    def __init__(self):
+        self.updates = []
+        self.last_sequence_number = 4
+
+    def filter(self, **kwargs):
+        return self
+
+    def update(self, **updates):
+        self.updates.append(updates)
+        if 'last_sequence_number' in updates and isinstance(updates['last_sequence_number'], type(F('x') + 1)):
+            self.last_sequence_number += 1
+        return 1
+
+    def values(self, *fields):
+        return self
+
+    def get(self):
+        return {'message_count': 5, 'total_tokens': 120, 'total_response_time': 3.5,
+                'last_sequence_number': self.last_sequence_number, 'last_message_at': None}
+
+
+@pytest.fixture
+def sessions(monkeypatch):
+    fake = FakeSessions()
+    monkeypatch.setattr(ConversationSession, 'objects', fake)
+    monkeypatch.setattr(transaction, 'atomic', lambda *a, **k: nullcontext())
+    monkeypatch.setattr(models.Model, 'save', lambda self, *a, **k: None)
+    return fake
+
+
+def test_token_count():
+    assert ChatMessage.token_count({'total_tokens': 150}) == 150
+    assert ChatMessage.token_count({'total_tokens': 12.9}) == 12
+    assert ChatMessage.token_count({'total_tokens': '150'}) == 0
+    assert ChatMessage.token_count({'total_tokens': True}) == 0
+    assert ChatMessage.token_count(None) == 0
+
+
+def test_new_message_increments_and_allocates_sequence(sessions):
+    session = ConversationSession(id=7, session_id='s', message_count=4)
+    message = ChatMessage(conversation=session, role='assistant', content='hi',
+                          response_time=1.5, token_usage={'total_tokens': 20})
+
+    message.save()
+
+    updates = sessions.updates[0]
+    assert message.sequence_number == 5
+    assert updates['message_count'] == F('message_count') + 1
+    assert updates['total_tokens'] == F('total_tokens') + 20
+    assert updates['total_response_time'] == F('total_response_time') + 1.5
+    # 已載入的會話實例同步為資料庫中的累計值
+    assert session.message_count == 5
+    assert session.last_sequence_number == 5
+
+
+def test_explicit_sequence_only_raises_counter(sessions):
+    session = ConversationSession(id=7, session_id='s')
+    message = ChatMessage(conversation=session, role='user', content='q', sequence_number=9)
+
+    message.save()
+
+    updates = sessions.updates[0]
+    assert message.sequence_number == 9
+    assert isinstance(updates['last_sequence_number'], Greatest)
+    assert 'total_tokens' not in updates and 'total_response_time' not in updates
+
+
+def test_unrelated_update_skips_stats(sessions):
+    message = ChatMessage(id=3, conversation_id=7, role='assistant', content='a', sequence_number=2)
+    message._state.adding = False
+
+    message.save(update_fields=['is_helpful'])
+
+    assert sessions.updates == []
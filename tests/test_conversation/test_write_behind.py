@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+對話記錄延後寫入單元測試
+======================
+
+測試 library/conversation_management/write_behind.py 的事件彙整、會話統計增量，
+以及行程內佇列溢出到 Redis 時的取用順序（以假的 Redis 取代，不需要資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_conversation/test_write_behind.py -v
+"""
+
+import os
+import queue
+import sys
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import pytest
+from django.db.models import F
+
+from library.benchmark.result_sink import _STOP
+from library.conversation_management.write_behind import (
+    SPILL_REGISTRY_KEY, ConversationWriteBehind, exchange_event, group_session_messages,
+    session_stat_updates, usage_event
+)
+
+
+class FakeRedis:
+    """只實作溢出用到的 Redis 指令"""
+
+    def __init__(self):
+        self.lists = {}
+        self.sets = {}
+        self.values = {}
+
+    def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+
+    def lpop(self, key, count):
+        items = self.lists.get(key, [])
+        popped, self.lists[key] = items[:count], items[count:]
+        return popped or None
+
+    def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member)
+
+    def srem(self, key, member):
+        self.sets.get(key, set()).discard(member)
+
+    def smembers(self, key):
+        return {member.encode('utf-8') for member in self.sets.get(key, set())}
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def exists(self, key):
+        return int(key in self.values)
+
+
+@pytest.fixture
+def redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def recorder(monkeypatch, redis):
+    monkeypatch.setattr(ConversationWriteBehind, '_instance', None)
+    return ConversationWriteBehind(batch_size=2, max_queue_size=2, redis_client=redis, autostart=False)
+
+
+def drain(recorder):
+    items = []
+    while True:
+        try:
+            items.append(recorder._next_item(0))
+        except queue.Empty:
+            return items
+
+
+def make_exchange(session_id, question='Q', answer='A', tokens=0, response_time=None):
+    session = {'user_id': None, 'guest_identifier': 'g', 'is_guest_session': True,
+               'chat_type': 'protocol_assistant_chat', 'title': '訪客對話'}
+    return exchange_event(session_id, session, question, answer, response_time=response_time,
+                          token_usage={'total_tokens': tokens}, metadata={'dify_message_id': f'm-{session_id}'})
+
+
+class TestEvents:
+    """測試事件格式與批次彙整"""
+
+    def test_exchange_keeps_turn_order(self):
+        event = make_exchange('s1', 'IOL 是什麼', '說明')
+
+        assert [m['role'] for m in event['messages']] == ['user', 'assistant']
+        assert event['messages'][1]['message_id'] == 'm-s1'
+
+    def test_group_by_session_in_event_order(self):
+        events = [make_exchange('s1', 'q1'), usage_event({'chat_type': 'x'}),
+                  make_exchange('s2', 'q2'), make_exchange('s1', 'q3')]
+
+        groups = group_session_messages(events)
+
+        assert list(groups) == ['s1', 's2']
+        assert [m['content'] for m in groups['s1']['messages']] == ['q1', 'A', 'q3', 'A']
+
+    def test_session_stat_updates(self):
+        messages = make_exchange('s1', tokens=30, response_time=2.5)['messages'] + \
+            make_exchange('s1', tokens=0)['messages']
+
+        updates = session_stat_updates(messages)
+
+        assert updates['message_count'] == F('message_count') + 4
+        assert updates['last_sequence_number'] == F('last_sequence_number') + 4
+        assert updates['total_tokens'] == F('total_tokens') + 30
+        assert updates['total_response_time'] == F('total_response_time') + 2.5
+
+
+class TestOverflow:
+    """測試行程內佇列溢出到 Redis"""
+
+    def test_overflow_preserves_order(self, recorder, redis):
+        for i in range(5):
+            recorder.put_item(usage_event({'n': i}))
+
+        assert recorder._overflowing
+        assert redis.llen(recorder.spill_key) == 3
+        assert recorder.spill_key in redis.sets[SPILL_REGISTRY_KEY]
+        assert [e['fields']['n'] for e in drain(recorder)] == [0, 1, 2, 3, 4]
+
+        # 溢出清空後恢復使用行程內佇列
+        assert not recorder._overflowing
+        recorder.put_item(usage_event({'n': 5}))
+        assert redis.llen(recorder.spill_key) == 0
+        assert recorder._queue.qsize() == 1
+
+    def test_stop_waits_for_overflow(self, recorder):
+        for i in range(3):
+            recorder.put_item(usage_event({'n': i}))
+        recorder._queue.get_nowait()
+        recorder._queue.put(_STOP)
+
+        items = [recorder._next_item(0) for _ in range(3)]
+
+        assert [item['fields']['n'] if item is not _STOP else 'stop' for item in items] == [1, 2, 'stop']
+
+    def test_adopts_orphaned_spill(self, recorder, redis):
+        orphan = 'ai_platform:conversation_write_behind:spill:dead-host:1'
+        redis.rpush(orphan, '{"type": "usage", "fields": {"n": 9}}')
+        redis.sadd(SPILL_REGISTRY_KEY, orphan)
+        recorder._last_adopt = float('-inf')
+
+        assert [e['fields']['n'] for e in drain(recorder)] == [9]
+        # 下一輪確認清單已空後移出登記表
+        recorder._last_adopt = float('-inf')
+        drain(recorder)
+        assert orphan not in redis.sets[SPILL_REGISTRY_KEY]
+
+    def test_without_redis_waits_for_writer(self, monkeypatch):
+        monkeypatch.setattr(ConversationWriteBehind, '_instance', None)
+        recorder = ConversationWriteBehind(max_queue_size=1, autostart=False)
+        recorder._redis_checked = True
+
+        blocking_puts = []
+
+        def put(item, block=True, timeout=None):
+            if not block:
+                raise queue.Full
+            blocking_puts.append(item)
+
+        monkeypatch.setattr(recorder._queue, 'put', put)
+        recorder.put_item(usage_event({'n': 1}))
+
+        # Redis 無法使用時改為阻塞等待（背壓），不溢出
+        assert [e['fields']['n'] for e in blocking_puts] == [1]
+        assert not recorder._overflowing
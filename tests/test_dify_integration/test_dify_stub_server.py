@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Dify Stub Server 單元測試
+========================
+
+測試 library/dify_integration/stub_server.py 的回應重播（blocking / streaming）、
+檔案上傳、知識庫檢索、錯誤注入，以及 library/dify_benchmark/load_test.py 的離線壓測。
+（在本機埠號啟動 stub，不需要 Dify 與資料庫）
+
+執行方式：
+    docker exec ai-django pytest tests/test_dify_integration/test_dify_stub_server.py -v
+"""
+
+import json
+import os
+import sys
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import pytest
+import requests
+
+from library.dify_benchmark import request_scheduler
+from library.dify_benchmark.load_test import build_stub_client, run_offline_load_test
+from library.dify_integration.chat_client import DifyChatClient
+from library.dify_integration.stub_server import DifyFixtureStore, DifyStubServer, FaultConfig
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'dify_responses.json')
+
+
+@pytest.fixture
+def store():
+    return DifyFixtureStore.load(FIXTURES_PATH)
+
+
+@pytest.fixture
+def server(store):
+    with DifyStubServer(store) as stub:
+        yield stub
+
+
+class TestFixtureStore:
+    """測試 fixture 查詢"""
+
+    def test_query_is_normalized(self, store):
+        assert store.get('  iol   測試步驟 ')['answer'].startswith('IOL')
+        assert store.get('沒有錄製的問題') is None
+
+    def test_record_keeps_keywords(self, store):
+        store.record('I3C 是什麼', {'answer': '新的回答', 'retrieved_documents': [{'content': 'x'}]})
+
+        fixture = store.get('I3C 是什麼')
+        assert fixture['answer'] == '新的回答'
+        assert fixture['answer_keywords'] == ['MIPI', 'I2C', 'In-Band Interrupt']
+
+    def test_fault_config_validates_rates(self):
+        with pytest.raises(ValueError):
+            FaultConfig(error_rate=1.5)
+
+
+class TestStubEndpoints:
+    """測試 Dify 相容端點"""
+
+    def _headers(self, server):
+        return {'Authorization': f'Bearer {server.api_key}'}
+
+    def test_blocking_chat_via_api_client(self, server):
+        client = build_stub_client(server, max_retries=0)
+        response = client.send_question('IOL 測試步驟', user_id='t')
+
+        assert response['success']
+        assert 'UNH-IOL' in response['answer']
+        assert response['retrieved_documents'][0]['document_name'] == 'UNH-IOL SOP'
+        assert response['conversation_id']
+
+    def test_streaming_chat_via_chat_client(self, server, store):
+        client = DifyChatClient(api_url=server.api_url, api_key=server.api_key)
+        result = client.chat_stream('Burn in Test 需要多久')
+
+        events = [json.loads(line[len(b'data: '):]) for line in result['stream'] if line]
+        assert result['success']
+        assert events[-1]['event'] == 'message_end'
+        assert ''.join(e['answer'] for e in events if e['event'] == 'message') == \
+            store.get('Burn in Test 需要多久')['answer']
+
+    def test_unknown_query_and_auth(self, server):
+        response = requests.post(server.api_url, json={'query': '不存在'}, headers=self._headers(server))
+        assert response.status_code == 404
+
+        response = requests.post(server.api_url, json={'query': 'I3C 是什麼'})
+        assert response.status_code == 401
+
+    def test_file_upload(self, server):
+        response = requests.post(
+            f"{server.base_url}/v1/files/upload",
+            files={'file': ('report.pdf', b'%PDF-1.4 test', 'application/pdf')},
+            data={'user': 't'},
+            headers=self._headers(server)
+        )
+
+        assert response.status_code == 201
+        assert response.json()['name'] == 'report.pdf'
+        assert response.json()['extension'] == 'pdf'
+
+    def test_dataset_retrieve(self, server):
+        response = requests.post(
+            f"{server.base_url}/v1/datasets/ds-1/retrieve",
+            json={'query': 'CrystalDiskMark 如何設定測試參數'},
+            headers=self._headers(server)
+        )
+
+        records = response.json()['records']
+        assert records[0]['segment']['document']['name'] == 'CrystalDiskMark 5'
+        assert records[0]['score'] == 0.77
+
+    def test_error_injection(self, store):
+        with DifyStubServer(store, fault=FaultConfig(error_rate=1.0, error_statuses=(429,))) as server:
+            client = build_stub_client(server, max_retries=0)
+            response = client.send_question('I3C 是什麼', user_id='t')
+
+        assert not response['success']
+        assert response['status_code'] == 429
+        assert server.stats.as_dict()['injected_errors'] == 1
+
+
+def test_offline_load_test_retries_injected_errors(store, monkeypatch):
+    monkeypatch.setattr(request_scheduler, 'backoff_delay', lambda attempt: 0)
+
+    report = run_offline_load_test(
+        store,
+        repeat=5,
+        fault=FaultConfig(latency_ms=5, error_rate=0.2, seed=7),
+        rate_per_second=1000,
+        per_key_limit=8
+    )
+
+    assert report['total_cases'] == 20
+    assert report['success'] + report['failed'] == 20
+    assert report['scheduler']['retried'] == report['stub']['injected_errors'] - report['failed']
+    assert report['latency']['dify_llm']['count'] == report['success']
+    assert report['passed'] == report['success']
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+關鍵字評分器單元測試
+==================
+
+測試 library/dify_benchmark/evaluators/keyword_matcher.py 的正規化、Aho-Corasick 自動機與
+有界編輯距離模糊匹配，以及 KeywordEvaluator 以編譯後自動機評分的結果格式。
+
+執行方式：
+    docker exec ai-django pytest tests/test_dify_integration/test_keyword_evaluator.py -v
+"""
+
+import os
+import sys
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+from library.dify_benchmark.evaluators import KeywordEvaluator, KeywordMatcher, normalize_text
+from library.dify_benchmark.evaluators.keyword_matcher import AhoCorasickAutomaton, bounded_edit_distance
+
+
+class TestKeywordMatcher:
+    """測試正規化與自動機"""
+
+    def test_normalize_folds_width_case_and_punctuation(self):
+        assert normalize_text('ＩＯＬ　測試，步驟！') == 'iol測試步驟'
+        assert normalize_text('Burn-in Test') == normalize_text('burn in test')
+        assert normalize_text('PCIe 4.0 與 C#、C++') == 'pcie4.0與c#c++'
+        assert normalize_text('結束。') == '結束'
+
+    def test_automaton_finds_overlapping_patterns(self):
+        automaton = AhoCorasickAutomaton(['he', 'she', 'his', 'hers', ''])
+        assert automaton.search('ushers') == {0, 1, 3}
+        assert automaton.search('通訊') == set()
+
+    def test_matches_against_brute_force(self):
+        keywords = ['I3C', 'MIPI', '通訊協定', '協定', 'In-Band Interrupt', 'i3c', '主從架構']
+        answer = 'I3C 是 MIPI 定義的新一代「通訊 協定」，支援 in band interrupt。'
+        matcher = KeywordMatcher(keywords)
+
+        expected = {kw for kw in keywords if normalize_text(kw) in normalize_text(answer)}
+        assert set(matcher.match(answer)) == expected
+        assert '主從架構' not in expected
+
+    def test_punctuation_only_keyword_matches_raw_text(self):
+        matcher = KeywordMatcher(['→', '：'])
+        assert matcher.match('A → B') == {'→': 0}
+
+    def test_fuzzy_match_is_bounded(self):
+        assert bounded_edit_distance('crystaldiskmark', 'xxcrystaldiskmarkyy', 2) == 0
+        assert bounded_edit_distance('crystaldiskmark', '用crystaldiskmak測試', 2) == 1
+        assert bounded_edit_distance('crystaldiskmark', 'diskinfo', 2) is None
+
+        matcher = KeywordMatcher(['CrystalDiskMark', 'I3C'], max_distance=2)
+        assert matcher.match('使用 CrystalDiskMak 與 I2C') == {'CrystalDiskMark': 1}
+        assert KeywordMatcher(['CrystalDiskMark']).match('CrystalDiskMak') == {}
+
+
+class TestKeywordEvaluator:
+    """測試評分結果"""
+
+    def test_result_format_and_score(self):
+        evaluator = KeywordEvaluator()
+        result = evaluator.evaluate(
+            question='什麼是 I3C?',
+            expected_answer='',
+            actual_answer='I3C 是 MIPI 定義的新一代通訊協定',
+            keywords=['I3C', 'mipi', '通訊協定', '主從架構']
+        )
+
+        assert result == {
+            'score': 75,
+            'is_passed': True,
+            'matched_keywords': ['I3C', 'mipi', '通訊協定'],
+            'missing_keywords': ['主從架構'],
+            'match_details': {'I3C': True, 'mipi': True, '通訊協定': True, '主從架構': False},
+        }
+
+    def test_empty_inputs(self):
+        evaluator = KeywordEvaluator()
+        assert evaluator.evaluate('q', '', '  ', ['A'])['score'] == 0
+        assert evaluator.evaluate('q', '', '答案', [])['score'] == 100
+        # 空白關鍵字不參與匹配但計入總數（與既有行為一致）
+        assert evaluator.evaluate('q', '', 'A', ['A', ' '])['score'] == 50
+
+    def test_compiled_suite_is_shared_and_falls_back(self):
+        evaluator = KeywordEvaluator()
+        matcher = evaluator.compile([['IOL', 'UNH'], ['Burn in', '8 小時'], None])
+
+        assert len(matcher) == 4
+        assert evaluator.evaluate('q', '', 'burn-in 需要 8小時', ['Burn in', '8 小時'])['score'] == 100
+        # 未編譯的關鍵字臨時編譯，不影響既有自動機
+        assert evaluator.evaluate('q', '', 'SATA 介面', ['SATA'])['score'] == 100
+        assert evaluator._matcher is matcher
+
+    def test_fuzzy_matches_are_reported(self):
+        evaluator = KeywordEvaluator(fuzzy_distance=1)
+        result = evaluator.evaluate('q', '', 'CrystalDiskMak 測試', ['CrystalDiskMark'])
+
+        assert result['score'] == 100
+        assert result['fuzzy_matches'] == {'CrystalDiskMark': 1}
+
+    def test_batch_evaluate(self):
+        results = KeywordEvaluator().batch_evaluate([
+            {'question': 'a', 'actual_answer': 'UNH-IOL 測試', 'keywords': ['IOL', 'UNH']},
+            {'question': 'b', 'actual_answer': '', 'keywords': ['IOL']},
+            {'question': 'c', 'actual_answer': '需要 8 小時', 'keywords': ['8小時', 'Burn in']},
+        ])
+
+        assert [r['case_index'] for r in results] == [1, 2, 3]
+        assert [r['score'] for r in results] == [100, 0, 50]
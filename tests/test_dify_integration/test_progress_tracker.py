@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+批量測試進度追蹤器單元測試
+==========================
+
+測試 library/dify_benchmark/progress_tracker.py 的計數、版本進度、完成狀態與續跑判斷
+（使用行程內儲存取代 Redis，不需要 Redis 與資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_dify_integration/test_progress_tracker.py -v
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import pytest
+
+from library.dify_benchmark.progress_tracker import (
+    BatchTestProgressTracker, _LocalStore, estimate_remaining_time
+)
+
+
+VERSIONS = [{'id': 1, 'name': 'v1', 'test_count': 3}, {'id': 2, 'name': 'v2', 'test_count': 3}]
+
+
+class TestProgressTracker:
+    """測試進度追蹤（行程內儲存）"""
+
+    def setup_method(self):
+        self.tracker = BatchTestProgressTracker()
+        self._original_client = self.tracker._client
+        self.tracker._client = _LocalStore()
+        self.tracker.initialize_batch('batch_t', total_tests=6, versions=VERSIONS, batch_name='測試批次',
+                                      params={'version_ids': [1, 2], 'test_case_ids': [7, 8, 9]})
+
+    def teardown_method(self):
+        self.tracker._client = self._original_client
+
+    def test_initialize(self):
+        progress = self.tracker.get_progress('batch_t')
+
+        assert progress['status'] == 'running'
+        assert progress['completed_tests'] == 0
+        assert progress['total_tests'] == 6
+        assert set(progress['versions']) == {1, 2}
+        assert progress['versions'][1]['start_time'] is None
+        assert progress['params']['test_case_ids'] == [7, 8, 9]
+
+    def test_counters_accumulate(self):
+        for passed in (True, False, True):
+            self.tracker.update_progress('batch_t', completed_tests=1, failed_tests=0 if passed else 1,
+                                         current_test_case='問題')
+            self.tracker.update_version_progress('batch_t', 1, completed_tests=1,
+                                                 failed_tests=0 if passed else 1)
+
+        progress = self.tracker.get_progress('batch_t')
+        assert progress['completed_tests'] == 3
+        assert progress['failed_tests'] == 1
+        assert progress['current_test_case'] == '問題'
+        assert progress['versions'][1]['completed_tests'] == 3
+        assert progress['versions'][2]['completed_tests'] == 0
+
+    def test_version_start_time_set_once(self):
+        self.tracker.update_version_progress('batch_t', 1, status='running')
+        first = self.tracker.get_progress('batch_t')['versions'][1]['start_time']
+        self.tracker.update_version_progress('batch_t', 1, status='running')
+
+        assert first is not None
+        assert self.tracker.get_progress('batch_t')['versions'][1]['start_time'] == first
+
+    def test_unknown_batch_is_ignored(self):
+        self.tracker.update_progress('missing', completed_tests=1)
+        assert self.tracker.get_progress('missing') is None
+
+    def test_completed_batch_is_not_resumable(self):
+        self.tracker.mark_completed('batch_t', success=True)
+
+        assert self.tracker.get_progress('batch_t')['status'] == 'completed'
+        assert not self.tracker.is_batch_alive('batch_t')
+        assert self.tracker.get_resumable_batches() == []
+
+    def test_batch_without_lease_is_resumable(self):
+        assert self.tracker.get_all_active_batches() == ['batch_t']
+        assert self.tracker.get_resumable_batches() == []
+
+        # 模擬行程崩潰：租約過期
+        self.tracker.client.delete(self.tracker._lease_key('batch_t'))
+
+        assert self.tracker.get_all_active_batches() == []
+        assert [p['batch_id'] for p in self.tracker.get_resumable_batches()] == ['batch_t']
+
+    def test_acquire_lease_only_once(self):
+        assert not self.tracker.acquire_lease('batch_t')  # 執行中的批次持有租約
+
+        self.tracker.client.delete(self.tracker._lease_key('batch_t'))
+
+        assert self.tracker.acquire_lease('batch_t')
+        assert not self.tracker.acquire_lease('batch_t')
+        assert self.tracker.is_batch_alive('batch_t')
+
+    def test_concurrent_resume_runs_once(self, monkeypatch):
+        from library.dify_benchmark import dify_batch_tester
+        from library.dify_benchmark.dify_batch_tester import DifyBatchTester
+
+        monkeypatch.setattr(dify_batch_tester, 'progress_tracker', self.tracker)
+        self.tracker.client.delete(self.tracker._lease_key('batch_t'))
+        rejected = []
+
+        def load_versions(self, version_ids):
+            # 第一個續跑載入資料期間，第二個續跑請求抵達
+            try:
+                DifyBatchTester().resume_batch_test('batch_t')
+            except ValueError:
+                rejected.append(True)
+            raise RuntimeError('stop')
+
+        monkeypatch.setattr(DifyBatchTester, '_load_versions', load_versions)
+
+        with pytest.raises(RuntimeError):
+            DifyBatchTester().resume_batch_test('batch_t')
+        assert rejected == [True]
+
+    def test_subscribe_stops_after_completion(self):
+        self.tracker.mark_completed('batch_t', success=False, error_message='boom')
+
+        snapshots = list(self.tracker.subscribe('batch_t'))
+        assert len(snapshots) == 1
+        assert snapshots[0]['status'] == 'error'
+        assert snapshots[0]['error_message'] == 'boom'
+
+
+def test_estimate_remaining_time():
+    start = datetime(2025, 1, 1, 0, 0, 0)
+    now = start + timedelta(seconds=30)
+
+    assert estimate_remaining_time(start.isoformat(), 3, 9, now=now) == 60
+    assert estimate_remaining_time(start.isoformat(), 0, 9, now=now) is None
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Dify 請求排程器單元測試
+======================
+
+測試 library/dify_benchmark/request_scheduler.py 的限流判斷、AIMD 並行上限、
+Token Bucket 與全域佇列排程（以假的 call 函數取代 Dify API）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_dify_integration/test_request_scheduler.py -v
+"""
+
+import os
+import sys
+import threading
+import time
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+from library.dify_benchmark import request_scheduler
+from library.dify_benchmark.request_scheduler import (
+    AdaptiveConcurrencyLimiter, DifyRequestScheduler, SchedulerJob, TokenBucket, is_throttled_response
+)
+
+
+class TestThrottleDetection:
+    """測試限流判斷"""
+
+    def test_status_codes(self):
+        assert is_throttled_response({'success': False, 'status_code': 429})
+        assert is_throttled_response({'success': False, 'status_code': 503})
+        assert not is_throttled_response({'success': False, 'status_code': 400})
+        assert not is_throttled_response({'success': True, 'answer': 'ok'})
+
+    def test_parses_error_message(self):
+        assert is_throttled_response({'success': False, 'error': 'HTTP 502: Bad Gateway'})
+        assert is_throttled_response({'success': False, 'error': 'Read timed out. (read timeout=75)'})
+        assert not is_throttled_response({'success': False, 'error': 'HTTP 404: not found'})
+
+    def test_exception_counts_as_throttled(self):
+        assert is_throttled_response(None, RuntimeError('connection reset'))
+
+
+class TestAdaptiveConcurrencyLimiter:
+    """測試 AIMD 並行上限"""
+
+    def test_halves_on_throttle_and_recovers(self):
+        limiter = AdaptiveConcurrencyLimiter(limit=8)
+
+        limiter.acquire()
+        limiter.release(throttled=True)
+        assert limiter.limit == 4
+
+        for _ in range(40):
+            limiter.acquire()
+            limiter.release()
+        assert limiter.limit == 8
+
+    def test_never_below_minimum(self):
+        limiter = AdaptiveConcurrencyLimiter(limit=2)
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release(throttled=True)
+        assert limiter.limit == 1
+
+
+class TestTokenBucket:
+    """測試 Token Bucket"""
+
+    def test_burst_then_empty(self):
+        bucket = TokenBucket(rate=1, capacity=3)
+        assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+class TestScheduler:
+    """測試全域佇列排程"""
+
+    def test_runs_every_job_once_within_key_limit(self):
+        in_flight = {'a': 0, 'b': 0}
+        peak = {'a': 0, 'b': 0}
+        lock = threading.Lock()
+        done = []
+
+        def call(payload):
+            key, _ = payload
+            with lock:
+                in_flight[key] += 1
+                peak[key] = max(peak[key], in_flight[key])
+            time.sleep(0.005)
+            with lock:
+                in_flight[key] -= 1
+            return {'success': True}
+
+        scheduler = DifyRequestScheduler(rate_per_second=10000, burst=10000, per_key_limit=3, max_workers=8)
+        jobs = [SchedulerJob(key=key, payload=(key, i)) for i in range(20) for key in ('a', 'b')]
+        stats = scheduler.run(jobs, call=call, on_done=lambda payload, response, error: done.append(payload))
+
+        assert sorted(done) == sorted(job.payload for job in jobs)
+        assert stats['completed'] == 40
+        assert peak['a'] <= 3 and peak['b'] <= 3
+
+    def test_throttled_jobs_are_retried(self, monkeypatch):
+        monkeypatch.setattr(request_scheduler, 'backoff_delay', lambda attempt: 0)
+        attempts = {}
+        results = {}
+
+        def call(payload):
+            attempts[payload] = attempts.get(payload, 0) + 1
+            if payload == 'flaky' and attempts[payload] < 3:
+                return {'success': False, 'status_code': 429}
+            if payload == 'down':
+                return {'success': False, 'status_code': 503}
+            return {'success': True}
+
+        scheduler = DifyRequestScheduler(rate_per_second=10000, burst=10000, max_attempts=3)
+        stats = scheduler.run(
+            [SchedulerJob(key='k', payload=p) for p in ('ok', 'flaky', 'down')],
+            call=call,
+            on_done=lambda payload, response, error: results.__setitem__(payload, response['success'])
+        )
+
+        assert results == {'ok': True, 'flaky': True, 'down': False}
+        assert attempts == {'ok': 1, 'flaky': 3, 'down': 3}
+        assert stats['retried'] == 4
+        assert scheduler.limiter('k').limit < scheduler.per_key_limit
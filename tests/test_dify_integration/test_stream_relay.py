@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Dify Streaming 轉送單元測試
+========================
+
+測試 library/dify_integration/stream_relay.py 的 SSE 解析與回答組裝，
+以及兩階段搜尋 streaming 版本的事件順序（在本機埠號啟動 Dify stub，不需要 Dify 與資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_dify_integration/test_stream_relay.py -v
+"""
+
+import json
+import os
+import sys
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import pytest
+
+from library.dify_integration.chat_client import DifyChatClient
+from library.dify_integration.stream_relay import (
+    FALLBACK_SUFFIX, StreamAccumulator, format_sse, parse_stream_line, relay_answer
+)
+from library.dify_integration.stub_server import DifyFixtureStore, DifyStubServer
+from library.protocol_guide.two_tier_handler import TwoTierSearchHandler
+
+FIXTURES_PATH = os.path.join(os.path.dirname(__file__), 'fixtures', 'dify_responses.json')
+
+UNCERTAIN_ANSWER = '抱歉，目前的段落中沒有找到相關資料。'
+
+
+@pytest.fixture
+def store():
+    return DifyFixtureStore.load(FIXTURES_PATH)
+
+
+@pytest.fixture
+def handler(store):
+    with DifyStubServer(store) as server:
+        handler = TwoTierSearchHandler()
+        handler._dify_client = DifyChatClient(api_url=server.api_url, api_key=server.api_key)
+        yield handler
+
+
+def run_stream(handler, query):
+    return list(handler.stream_two_tier_search(query, conversation_id='', user_id='t'))
+
+
+class TestStreamParsing:
+    """測試 SSE 解析與回答組裝"""
+
+    def test_parse_stream_line(self):
+        assert parse_stream_line(b'data: {"event": "message", "answer": "I"}') == {'event': 'message', 'answer': 'I'}
+        assert parse_stream_line('event: ping') is None
+        assert parse_stream_line(b'data: not-json') is None
+        assert parse_stream_line(b'') is None
+
+    def test_format_sse_round_trip(self):
+        payload = {'event': 'message', 'answer': '測試'}
+
+        assert parse_stream_line(format_sse(payload)) == payload
+
+    def test_accumulator_assembles_answer(self):
+        accumulator = StreamAccumulator()
+        events = [
+            {'event': 'message', 'answer': 'IOL ', 'message_id': 'm1', 'conversation_id': 'c1'},
+            {'event': 'agent_thought'},
+            {'event': 'message', 'answer': '測試步驟'},
+            {'event': 'message_end', 'metadata': {'usage': {'total_tokens': 12}}},
+        ]
+
+        relayed = list(relay_answer(events, accumulator, stage=1))
+
+        assert [e['answer'] for e in relayed] == ['IOL ', '測試步驟']
+        assert all(e['stage'] == 1 for e in relayed)
+        response = accumulator.as_response()
+        assert response['answer'] == 'IOL 測試步驟'
+        assert response['conversation_id'] == 'c1'
+        assert response['usage'] == {'total_tokens': 12}
+        assert accumulator.first_token_time is not None
+        accumulator.raise_for_error()
+
+    def test_message_replace_and_errors(self):
+        accumulator = StreamAccumulator()
+        relayed = list(relay_answer([
+            {'event': 'message', 'answer': '原始'},
+            {'event': 'message_replace', 'answer': '已審查'},
+        ], accumulator))
+
+        assert relayed[-1] == {'event': 'message_replace', 'answer': '已審查'}
+        assert accumulator.answer == '已審查'
+        with pytest.raises(RuntimeError):
+            accumulator.raise_for_error()  # 未收到 message_end
+
+        accumulator.feed({'event': 'error', 'message': 'Conversation Not Exists.'})
+        assert not accumulator.as_response()['success']
+
+
+class TestTwoTierStream:
+    """測試兩階段搜尋的 streaming 事件順序"""
+
+    def test_confident_stage_1_ends_after_first_stage(self, handler):
+        events = run_stream(handler, 'IOL 測試步驟')
+
+        kinds = [e['event'] for e in events]
+        assert kinds[-1] == 'message_end'
+        assert 'stage_retry' not in kinds
+        end = events[-1]
+        assert end['stage'] == 1 and not end['is_fallback']
+        assert end['answer'] == ''.join(e['answer'] for e in events if e['event'] == 'message')
+        assert end['conversation_id']
+        json.dumps(end)  # message_end 必須可直接序列化給前端
+
+    def test_uncertain_stage_1_retries_with_full_search(self, handler, store):
+        store.record('I3C 是什麼', {'answer': UNCERTAIN_ANSWER})
+        store.record('I3C 是什麼 __FULL_SEARCH__', {'answer': 'I3C 是 MIPI 制定的 I2C 後繼匯流排。'})
+
+        events = run_stream(handler, 'I3C 是什麼')
+
+        retry_at = [e['event'] for e in events].index('stage_retry')
+        stage_2 = [e['answer'] for e in events[retry_at:] if e['event'] == 'message']
+        end = events[-1]
+        assert all(e['stage'] == 1 for e in events[:retry_at])
+        assert end['event'] == 'message_end' and end['stage'] == 2 and not end['is_fallback']
+        assert end['answer'] == ''.join(stage_2)
+        assert end['first_token_time'] is not None
+
+    def test_uncertain_stage_2_appends_fallback_hint(self, handler, store):
+        store.record('I3C 是什麼', {'answer': UNCERTAIN_ANSWER})
+        store.record('I3C 是什麼 __FULL_SEARCH__', {'answer': UNCERTAIN_ANSWER})
+
+        events = run_stream(handler, 'I3C 是什麼')
+
+        assert events[-2] == {'event': 'message', 'answer': FALLBACK_SUFFIX, 'stage': 2}
+        assert events[-1]['is_fallback']
+        assert events[-1]['answer'].endswith(FALLBACK_SUFFIX)
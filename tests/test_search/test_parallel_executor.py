@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+並行基準測試執行器單元測試
+==========================
+
+測試 library/benchmark/parallel_executor.py 的配對規劃與行程數計算，
+以及 BatchVersionTester 的預設並行方式（不需要資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_search/test_parallel_executor.py -v
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+from library.benchmark.parallel_executor import MAX_WORKERS, default_worker_count, plan_pairs
+
+
+class TestPlanPairs:
+    """測試 (版本, 測試案例) 配對"""
+
+    def test_seq_restores_version_and_case_order(self):
+        pairs = plan_pairs([5, 9], [101, 102, 103])
+
+        assert len(pairs) == 6
+        for seq, version_id, test_case_id in pairs:
+            vi, ci = divmod(seq, 3)
+            assert [5, 9][vi] == version_id
+            assert [101, 102, 103][ci] == test_case_id
+
+    def test_seq_is_dense_and_unique(self):
+        pairs = plan_pairs([1, 2, 3], [10, 20])
+        assert sorted(seq for seq, _, _ in pairs) == list(range(6))
+
+
+class TestWorkerCount:
+    """測試行程數計算"""
+
+    def test_limited_by_pairs(self):
+        assert default_worker_count(8, total_pairs=3) == 3
+
+    def test_limited_by_max_workers(self):
+        assert default_worker_count(MAX_WORKERS * 4) == MAX_WORKERS
+
+    def test_at_least_one(self):
+        assert default_worker_count(4, total_pairs=0) == 1
+
+
+class TestBatchVersionTesterWorkers:
+    """測試批量版本測試預設使用多行程"""
+
+    def run(self, monkeypatch, max_workers, cpu_count=4):
+        from library.benchmark import parallel_executor
+        from library.benchmark.batch_version_tester import BatchVersionTester
+
+        calls = []
+        monkeypatch.setattr(parallel_executor.os, 'cpu_count', lambda: cpu_count)
+        versions = [SimpleNamespace(id=1, version_name='v1'), SimpleNamespace(id=2, version_name='v2')]
+        monkeypatch.setattr(BatchVersionTester, '_prepare_versions', lambda self, ids: versions)
+        monkeypatch.setattr(BatchVersionTester, '_prepare_test_cases', lambda self, ids: ['c1', 'c2'])
+        monkeypatch.setattr(BatchVersionTester, '_prepare_result_cache', lambda self: None)
+        monkeypatch.setattr(BatchVersionTester, '_run_parallel_versions_test',
+                            lambda self, versions, *args: calls.append('parallel') or [])
+        monkeypatch.setattr(BatchVersionTester, '_run_single_version_test',
+                            lambda self, *args: calls.append('serial') or SimpleNamespace(id=1))
+        monkeypatch.setattr(BatchVersionTester, '_generate_comparison', lambda self, runs: {})
+        monkeypatch.setattr(BatchVersionTester, '_generate_summary', lambda self, *args: {})
+
+        BatchVersionTester().run_batch_test(max_workers=max_workers)
+        return calls
+
+    def test_default_uses_cpu_cores(self, monkeypatch):
+        assert self.run(monkeypatch, max_workers=None) == ['parallel']
+
+    def test_single_worker_is_serial(self, monkeypatch):
+        assert self.run(monkeypatch, max_workers=1) == ['serial', 'serial']
+
+    def test_single_core_is_serial(self, monkeypatch):
+        assert self.run(monkeypatch, max_workers=None, cpu_count=1) == ['serial', 'serial']
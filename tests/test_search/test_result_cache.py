@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark 結果快取單元測試
+========================
+
+測試 library/benchmark/result_cache.py 的快取鍵（版本參數、測試案例內容、知識庫版次）
+與由已儲存結果還原 run_single_test 格式（不需要資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_search/test_result_cache.py -v
+"""
+
+import os
+import sys
+from decimal import Decimal
+from types import SimpleNamespace
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+from library.benchmark.result_cache import BenchmarkResultCache, result_from_record
+from library.benchmark.scoring_engine import ScoringEngine
+
+
+def make_version(version_id=1, **parameters):
+    return SimpleNamespace(id=version_id, parameters=parameters)
+
+
+def make_case(case_id=10, question='IOL 測試步驟', expected=(1, 2), min_required=1):
+    return SimpleNamespace(id=case_id, question=question, expected_document_ids=list(expected),
+                           min_required_matches=min_required)
+
+
+class TestCacheKey:
+    """測試快取鍵的穩定性與失效條件"""
+
+    def test_parameter_order_does_not_matter(self):
+        cache = BenchmarkResultCache(corpus_rev='r1')
+        a = make_version(1, strategy='section_only', section_threshold=0.7)
+        b = make_version(2, section_threshold=0.7, strategy='section_only')
+
+        assert cache.key(a, make_case()) == cache.key(b, make_case())
+
+    def test_changes_invalidate_key(self):
+        cache = BenchmarkResultCache(corpus_rev='r1')
+        version, case = make_version(1, section_threshold=0.7), make_case()
+        key = cache.key(version, case)
+
+        assert BenchmarkResultCache(corpus_rev='r1').key(make_version(1, section_threshold=0.8), case) != key
+        assert BenchmarkResultCache(corpus_rev='r1').key(version, make_case(question='IOL 步驟')) != key
+        assert BenchmarkResultCache(corpus_rev='r1').key(version, make_case(expected=(1,))) != key
+        assert BenchmarkResultCache(corpus_rev='r2').key(version, case) == \
+            BenchmarkResultCache(corpus_rev='r2').key(version, case) != key
+
+
+class TestResultFromRecord:
+    """測試由 BenchmarkTestResult 還原結果"""
+
+    def test_metrics_are_recomputed(self):
+        case = make_case(expected=(2, 7), min_required=2)
+        record = SimpleNamespace(
+            search_query=case.question, returned_document_ids=[7, 3, 2], returned_document_scores=[0.9, 0.8, 0.7],
+            response_time=Decimal('350.00'), stage_timings={'section_sql': 0.1}, cache_key='k', test_run_id=42
+        )
+
+        result = result_from_record(record, case)
+
+        assert result['is_passed'] is True
+        assert result['cached_from_run'] == 42
+        assert result['response_time'] == 350.0
+        for name, value in ScoringEngine.calculate_all_metrics([7, 3, 2], [2, 7], 350.0, 10).items():
+            assert result[name] == value
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+測試結果緩衝寫入器單元測試
+==========================
+
+測試 library/benchmark/result_sink.py 的批次觸發、關閉時寫入與失敗逐筆重試
+（以記錄批次的子類取代資料庫寫入，不需要資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_search/test_result_sink.py -v
+"""
+
+import os
+import sys
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import pytest
+
+from library.benchmark.result_sink import BufferedResultSink
+
+
+class RecordingSink(BufferedResultSink):
+    """記錄每批寫入內容；bad 中的項目所在批次會寫入失敗"""
+
+    def __init__(self, bad=(), **kwargs):
+        self.batches = []
+        self.bad = set(bad)
+        super().__init__(**kwargs)
+
+    def write_batch(self, items):
+        if self.bad.intersection(items):
+            raise ValueError('bad item')
+        self.batches.append(list(items))
+
+
+class TestSyncMode:
+    """測試同步模式（background=False）"""
+
+    def test_flushes_on_batch_size(self):
+        sink = RecordingSink(batch_size=3, flush_interval=3600, background=False)
+        for i in range(7):
+            sink.put_item(i)
+
+        assert sink.batches == [[0, 1, 2], [3, 4, 5]]
+
+        sink.close()
+        assert sink.batches[-1] == [6]
+        assert sink.written_count == 7
+
+    def test_failed_batch_retries_per_item(self):
+        sink = RecordingSink(bad={2}, batch_size=4, flush_interval=3600, background=False)
+        with sink:
+            for i in range(4):
+                sink.put_item(i)
+
+        assert sink.batches == [[0], [1], [3]]
+        assert sink.written_count == 3
+        assert sink.failed_count == 1
+
+    def test_put_after_close_raises(self):
+        sink = RecordingSink(background=False)
+        sink.close()
+        with pytest.raises(RuntimeError):
+            sink.put_item(1)
+
+
+class TestBackgroundMode:
+    """測試背景寫入執行緒"""
+
+    def test_close_writes_everything_in_order(self):
+        with RecordingSink(batch_size=10, flush_interval=3600) as sink:
+            for i in range(25):
+                sink.put_item(i)
+
+        assert [item for batch in sink.batches for item in batch] == list(range(25))
+        assert all(len(batch) <= 10 for batch in sink.batches)
+        assert sink.written_count == 25
+        assert sink.failed_count == 0
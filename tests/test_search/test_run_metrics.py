@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+向量化 Run 指標單元測試
+======================
+
+測試 library/benchmark/run_metrics.py：逐案例指標需與 ScoringEngine.calculate_all_metrics 一致，
+並驗證 MRR / AP / Recall@k、bootstrap 信賴區間與配對置換檢定。
+
+執行方式：
+    docker exec ai-django pytest tests/test_search/test_run_metrics.py -v
+"""
+
+import os
+import sys
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import numpy as np
+import pytest
+
+from library.benchmark.run_metrics import (
+    bootstrap_ci, build_run_matrix, compute_run_metrics, paired_test, summarize_results, summarize_run_metrics
+)
+from library.benchmark.scoring_engine import ScoringEngine
+
+
+CASES = [
+    # (回傳 IDs, 預期 IDs, 回應時間 ms)
+    ([3, 1, 7], [1, 2], 40),
+    ([5, 5, 2, 9, 1], [2, 1, 8], 220),
+    ([], [4], 0),
+    ([6, 4], [], 800),
+    ([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12], [12, 2], 6000),
+    ([8, 2], [2, 2], 450),
+]
+
+
+class TestRunMetrics:
+    """測試逐案例指標"""
+
+    def test_matches_scoring_engine(self):
+        batch = ScoringEngine.calculate_batch_metrics(
+            [c[0] for c in CASES], [c[1] for c in CASES], [c[2] for c in CASES], top_k=10
+        )
+        for (returned, expected, rt), record in zip(CASES, batch):
+            assert record == ScoringEngine.calculate_all_metrics(returned, expected, rt, 10)
+
+    def test_rank_metrics(self):
+        matrix = build_run_matrix([[3, 1, 7], [2, 9, 1]], [[1, 2], [2, 1, 8]], top_k=3)
+        metrics = compute_run_metrics(matrix)
+
+        assert metrics['reciprocal_rank'].tolist() == [0.5, 1.0]
+        # AP@3：案例 1 只在第 2 名命中 → (1/2) / 2
+        assert metrics['average_precision'][0] == pytest.approx(0.25)
+        assert metrics['average_precision'][1] == pytest.approx((1 + 2 / 3) / 3)
+        assert metrics['recall_at_k'][1].tolist() == pytest.approx([1 / 3, 1 / 3, 2 / 3])
+
+        summary = summarize_run_metrics(metrics)
+        assert summary['mrr'] == 0.75
+        assert len(summary['recall_at_k']) == 3
+
+    def test_summarize_results_matches_run_averages(self):
+        results = [
+            {**ScoringEngine.calculate_all_metrics(r, e, t, 10), 'response_time': t, 'is_passed': bool(e)}
+            for r, e, t in CASES
+        ]
+        summary = summarize_results(results)
+
+        n = len(results)
+        ap = sum(r['precision'] for r in results) / n
+        assert summary['avg_precision'] == round(ap, 4)
+        assert summary['passed'] == 5
+        assert summary['overall_score'] == ScoringEngine.calculate_overall_score(
+            ap,
+            sum(r['recall'] for r in results) / n,
+            sum(r['f1_score'] for r in results) / n,
+            sum(r['ndcg'] for r in results) / n,
+            sum(r['speed_score'] for r in results) / n,
+        )
+
+
+class TestStatistics:
+    """測試 bootstrap 與配對檢定"""
+
+    def test_bootstrap_ci_contains_mean(self):
+        values = np.random.default_rng(0).normal(0.6, 0.1, size=200)
+        ci = bootstrap_ci(values, seed=1)
+
+        assert ci['low'] < ci['mean'] < ci['high']
+        assert ci['high'] - ci['low'] < 0.05
+
+    def test_bootstrap_ci_for_many_runs(self):
+        values = np.vstack([np.full(50, 0.2), np.full(50, 0.8)])
+        ci = bootstrap_ci(values, seed=1)
+
+        assert ci['low'] == pytest.approx([0.2, 0.8])
+        assert ci['high'] == pytest.approx([0.2, 0.8])
+
+    def test_paired_test_detects_consistent_improvement(self):
+        rng = np.random.default_rng(3)
+        baseline = rng.uniform(0.3, 0.7, size=60)
+        better = baseline + rng.uniform(0.02, 0.08, size=60)
+
+        result = paired_test(better, baseline, n_resamples=2000, seed=4)
+        assert result['p_value'] < 0.01
+        assert result['wins'] == 60
+        assert result['ci_low'] > 0
+
+        same = paired_test(baseline, baseline, n_resamples=2000, seed=4)
+        assert same['p_value'] == 1.0
+        assert same['ties'] == 60
+
+    def test_paired_test_many_runs_against_baseline(self):
+        baseline = np.linspace(0, 1, 40)
+        runs = np.vstack([baseline, baseline + 0.1])
+
+        result = paired_test(runs, baseline, n_resamples=1000, seed=0)
+        assert result['mean_diff'] == pytest.approx([0.0, 0.1])
+        assert result['p_value'][0] == 1.0
+        assert result['p_value'][1] < 0.01
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+搜尋服務註冊表單元測試
+====================
+
+測試 library/common/knowledge_base/service_registry.py 的共用實例與預熱，
+以及段落 / 文檔搜尋權重改由 ThresholdManager 快取讀取（不需要 Redis 與資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_search/test_service_registry.py -v
+"""
+
+import os
+import sys
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import pytest
+
+from library.common.knowledge_base.service_registry import (
+    SERVICE_CLASSES, get_search_service, get_search_service_registry, warm_up_search_services
+)
+from library.common.knowledge_base.vector_search_helper import _get_weights_for_assistant
+from library.common.threshold_manager import ThresholdManager, get_threshold_manager
+from library.config import versioned_config_cache as config_cache
+from library.protocol_guide.search_service import ProtocolGuideSearchService
+
+PROTOCOL_SETTING = {
+    'stage1_threshold': 0.8, 'stage1_title_weight': 95, 'stage1_content_weight': 5,
+    'stage2_threshold': 0.6, 'stage2_title_weight': 10, 'stage2_content_weight': 90,
+    'use_unified_weights': False,
+    'master_threshold': 0.8, 'title_weight': 95, 'content_weight': 5,
+}
+
+
+def section_search_service():
+    """段落搜尋服務需要嵌入模型套件（容器內已安裝）"""
+    return pytest.importorskip('library.common.knowledge_base.section_search_service')
+
+
+@pytest.fixture
+def registry():
+    registry = get_search_service_registry()
+    registry.reset()
+    yield registry
+    registry.reset()
+
+
+@pytest.fixture
+def thresholds(monkeypatch):
+    """假的 SearchThresholdSetting，記錄查詢次數"""
+    queries = []
+
+    def load(self):
+        queries.append(1)
+        return {'protocol_assistant': dict(PROTOCOL_SETTING)}
+
+    monkeypatch.setattr(config_cache, '_client', False)
+    monkeypatch.setattr(ThresholdManager, '_load_from_database', load)
+    get_threshold_manager().clear_cache()
+    yield queries
+    get_threshold_manager().clear_cache()
+
+
+class TestSearchServiceRegistry:
+    """測試共用實例與預熱"""
+
+    def test_same_instance_per_process(self, registry):
+        service = get_search_service('protocol_guide')
+
+        assert isinstance(service, ProtocolGuideSearchService)
+        assert get_search_service('protocol_guide') is service
+
+    def test_unknown_service(self, registry):
+        with pytest.raises(KeyError):
+            get_search_service('unknown')
+
+    def test_warm_up_builds_all_services(self, registry, monkeypatch):
+        monkeypatch.setenv('SEARCH_SERVICE_WARMUP', 'true')
+
+        status = warm_up_search_services()
+
+        assert set(status) == set(SERVICE_CLASSES)
+        assert status['database'] and status['protocol_guide']
+        assert get_search_service_registry().get('rvt_guide') is get_search_service('rvt_guide')
+
+    def test_warm_up_disabled(self, registry, monkeypatch):
+        monkeypatch.setenv('SEARCH_SERVICE_WARMUP', 'false')
+
+        assert warm_up_search_services() == {}
+
+
+class TestCachedWeights:
+    """測試權重由 ThresholdManager 快取讀取"""
+
+    def test_section_weights_per_stage(self, thresholds):
+        service = section_search_service().SectionSearchService()
+
+        assert service._get_weights_for_assistant('protocol_guide', stage=1) == (0.95, 0.05, 0.8)
+        assert service._get_weights_for_assistant('protocol_guide', stage=2) == (0.1, 0.9, 0.6)
+        assert len(thresholds) == 1
+
+    def test_document_weights_and_defaults(self, thresholds):
+        assert _get_weights_for_assistant('protocol_guide', stage=2) == (0.1, 0.9)
+        assert _get_weights_for_assistant('rvt_guide', stage=1) == (0.6, 0.4)
+        assert len(thresholds) == 1
+
+    def test_setting_change_reloads(self, thresholds):
+        _get_weights_for_assistant('protocol_guide')
+
+        config_cache.bump_generation(config_cache.SEARCH_THRESHOLD_SETTING)
+        get_threshold_manager()._guard.checked_at = 0  # 略過 Redis 查詢間隔
+        _get_weights_for_assistant('protocol_guide')
+
+        assert len(thresholds) == 2
+
+    def test_load_failure_keeps_previous_settings(self, thresholds, monkeypatch):
+        manager = get_threshold_manager()
+        assert _get_weights_for_assistant('protocol_guide', stage=2) == (0.1, 0.9)
+
+        def broken(self):
+            raise RuntimeError('db down')
+
+        monkeypatch.setattr(ThresholdManager, '_load_from_database', broken)
+        config_cache.bump_generation(config_cache.SEARCH_THRESHOLD_SETTING)
+        manager._guard.checked_at = 0
+
+        # 保留舊設定，且不標記為已載入
+        assert _get_weights_for_assistant('protocol_guide', stage=2) == (0.1, 0.9)
+        manager._guard.checked_at = 0
+        assert not manager._is_cache_valid()
+
+    def test_first_load_failure_retried(self, thresholds, monkeypatch):
+        def broken(self):
+            raise RuntimeError('db down')
+
+        with monkeypatch.context() as patch:
+            patch.setattr(ThresholdManager, '_load_from_database', broken)
+            assert get_threshold_manager().get_threshold('protocol_assistant', stage=1) == 0.7
+
+        assert get_threshold_manager().get_threshold('protocol_assistant', stage=1) == 0.8
+        assert len(thresholds) == 1
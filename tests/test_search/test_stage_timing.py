@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+分段計時單元測試
+================
+
+測試 library/common/stage_timing.py 的收集範圍、同名累加、執行緒隔離與 p50 / p95 彙總。
+
+執行方式：
+    docker exec ai-django pytest tests/test_search/test_stage_timing.py -v
+"""
+
+import os
+import sys
+import threading
+import time
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import pytest
+
+from library.common.stage_timing import (
+    collect_stages, current_timings, stage, summarize_stage_timings
+)
+
+
+class TestStageCollection:
+    """測試分段收集"""
+
+    def test_noop_without_collector(self):
+        with stage('section_sql'):
+            pass
+        assert current_timings() is None
+
+    def test_same_stage_accumulates(self):
+        with collect_stages() as timings:
+            for _ in range(2):
+                with stage('section_sql'):
+                    time.sleep(0.01)
+            with stage('title_boost'):
+                pass
+
+        result = timings.as_dict()
+        assert set(result) == {'section_sql', 'title_boost'}
+        assert result['section_sql'] >= 0.02
+        assert current_timings() is None
+
+    def test_initial_values_are_extended(self):
+        with collect_stages({'dify_llm': 1.5}) as timings:
+            with stage('evaluation'):
+                pass
+
+        result = timings.as_dict()
+        assert result['dify_llm'] == 1.5
+        assert 'evaluation' in result
+
+    def test_records_time_when_stage_raises(self):
+        with collect_stages() as timings:
+            with pytest.raises(ValueError):
+                with stage('query_embedding'):
+                    raise ValueError('boom')
+
+        assert 'query_embedding' in timings
+
+    def test_threads_are_isolated(self):
+        seen = {}
+
+        def worker(name):
+            with collect_stages() as timings:
+                with stage(name):
+                    pass
+            seen[name] = set(timings.as_dict())
+
+        threads = [threading.Thread(target=worker, args=(name,)) for name in ('a', 'b')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert seen == {'a': {'a'}, 'b': {'b'}}
+
+
+class FakeCursor:
+    """依序回傳多向量檢查與段落查詢的結果"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.description = None
+        self._result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        if 'EXISTS' in sql or 'COUNT(*)' in sql:
+            self._result = [(True,)]
+            self.description = [('exists',)]
+        else:
+            self._result = self.rows
+            self.description = [('section_id',), ('similarity',)]
+
+    def fetchone(self):
+        return self._result[0]
+
+    def fetchall(self):
+        return self._result
+
+
+class TestSectionSearchStages:
+    """測試段落搜尋在 stage 參數下仍記錄分段時間並回傳結果"""
+
+    def test_search_sections_records_stages(self, monkeypatch):
+        module = pytest.importorskip('library.common.knowledge_base.section_search_service')
+        service = module.SectionSearchService.__new__(module.SectionSearchService)
+        service.embedding_service = type('FakeEmbedding', (), {'generate_embedding': lambda self, q: [0.1, 0.2]})()
+        monkeypatch.setattr(service, '_get_weights_for_assistant', lambda table, stage=1: (0.6, 0.4, 0.7))
+        monkeypatch.setattr(module.connection, 'cursor', lambda: FakeCursor([('s1', 0.9)]))
+
+        with collect_stages() as timings:
+            results = service.search_sections('IOL', source_table='protocol_guide', stage=1)
+
+        assert results == [{'section_id': 's1', 'similarity': 0.9}]
+        assert {'query_embedding', 'section_sql'} <= set(timings.as_dict())
+
+
+def test_smart_router_recorded_separately_from_dify_llm(monkeypatch):
+    from library.dify_benchmark.dify_api_client import DifyAPIClient
+    from library.protocol_guide.smart_search_router import SmartSearchRouter
+
+    monkeypatch.setattr(SmartSearchRouter, '__init__', lambda self: None)
+    monkeypatch.setattr(SmartSearchRouter, 'handle_smart_search',
+                        lambda self, user_query, conversation_id, user_id: {'answer': 'ok'})
+    client = DifyAPIClient.__new__(DifyAPIClient)
+
+    with collect_stages() as timings:
+        result = client.send_question_with_smart_router('IOL 測試步驟')
+
+    assert result['success']
+    assert 'smart_router' in timings and 'dify_llm' not in timings
+
+
+def test_summarize_stage_timings():
+    samples = [{'section_sql': float(i), 'dify_llm': 2.0} for i in range(1, 101)]
+    samples.append({})
+    samples.append(None)
+
+    summary = summarize_stage_timings(samples)
+
+    assert summary['section_sql']['count'] == 100
+    assert summary['section_sql']['p50'] == pytest.approx(50.5)
+    assert summary['section_sql']['p95'] == pytest.approx(95.05)
+    assert summary['section_sql']['max'] == 100.0
+    assert summary['dify_llm']['mean'] == 2.0
+    assert summarize_stage_timings([]) == {}
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+參數掃描引擎單元測試
+====================
+
+測試 library/benchmark/sweep_engine.py 的記憶體重排邏輯（不需要資料庫）：
+以人工建立的候選池驗證段落分組、閾值、exact 判斷與各策略重現。
+
+執行方式：
+    docker exec ai-django pytest tests/test_search/test_sweep_engine.py -v
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import numpy as np
+
+from library.benchmark.sweep_engine import (
+    CandidatePool, QueryPool, SweepEngine, expand_grid, rank_documents, rank_sections
+)
+from library.protocol_guide.search_service import ProtocolGuideSearchService
+
+
+def make_pool(section_rows, doc_rows=(), truncated=False, floor=0.0):
+    """section_rows: [(section_pk, doc_id, title_score, content_score)]"""
+    return QueryPool(
+        query='iol 測試',
+        section_ids=np.array([r[0] for r in section_rows], dtype=np.int64),
+        section_source_ids=np.array([r[1] for r in section_rows], dtype=np.int64),
+        section_title_scores=np.array([r[2] for r in section_rows], dtype=np.float64),
+        section_content_scores=np.array([r[3] for r in section_rows], dtype=np.float64),
+        section_truncated=truncated,
+        section_floor=floor,
+        doc_source_ids=np.array([r[0] for r in doc_rows], dtype=np.int64),
+        doc_title_scores=np.array([r[1] for r in doc_rows], dtype=np.float64),
+        doc_content_scores=np.array([r[2] for r in doc_rows], dtype=np.float64),
+    )
+
+
+TITLES = {1: 'IOL 測試指南', 2: 'USB 測試', 3: 'PCIe 驗證'}
+
+
+class TestRankSections:
+    """測試段落重排"""
+
+    def test_groups_by_document_with_max_score(self):
+        pool = make_pool([
+            (10, 1, 0.9, 0.5),   # 0.5*0.9 + 0.5*0.5 = 0.70
+            (11, 1, 0.6, 0.6),   # 0.60
+            (12, 2, 0.8, 0.8),   # 0.80
+            (13, 3, 0.2, 0.2),   # 0.20（低於閾值）
+        ])
+        results, exact, matched = rank_sections(pool, TITLES, 0.5, 0.5, 0.55, limit=10)
+
+        assert [r['metadata']['id'] for r in results] == [2, 1]
+        assert results[1]['score'] == 0.7
+        assert results[1]['metadata']['sections_found'] == 2
+        assert matched == 3
+        assert exact
+
+    def test_weights_change_ranking(self):
+        pool = make_pool([(10, 1, 0.95, 0.3), (11, 2, 0.5, 0.9)])
+
+        title_heavy, _, _ = rank_sections(pool, TITLES, 0.9, 0.1, 0.0, limit=10)
+        content_heavy, _, _ = rank_sections(pool, TITLES, 0.1, 0.9, 0.0, limit=10)
+
+        assert [r['metadata']['id'] for r in title_heavy] == [1, 2]
+        assert [r['metadata']['id'] for r in content_heavy] == [2, 1]
+
+    def test_truncated_pool_exactness(self):
+        # 池底 GREATEST 分數 0.6：池外段落加權後不會超過 0.6
+        pool = make_pool([(10, 1, 0.9, 0.9), (11, 2, 0.6, 0.6)], truncated=True, floor=0.6)
+
+        _, exact_high, _ = rank_sections(pool, TITLES, 0.5, 0.5, 0.65, limit=10)
+        _, exact_low, _ = rank_sections(pool, TITLES, 0.5, 0.5, 0.3, limit=10)
+
+        assert exact_high
+        assert not exact_low
+
+    def test_missing_documents_are_skipped(self):
+        pool = make_pool([(10, 99, 0.9, 0.9), (11, 1, 0.8, 0.8)])
+        results, _, _ = rank_sections(pool, TITLES, 0.5, 0.5, 0.0, limit=10)
+
+        assert [r['metadata']['id'] for r in results] == [1]
+
+
+class TestRankDocuments:
+    """測試全文重排"""
+
+    def test_threshold_applied_after_limit(self):
+        pool = make_pool([], doc_rows=[(1, 0.9, 0.9), (2, 0.7, 0.7), (3, 0.4, 0.4)])
+        results, exact = rank_documents(pool, TITLES, 0.5, 0.5, 0.6, limit=2)
+
+        assert [r['metadata']['id'] for r in results] == [1, 2]
+        assert exact
+
+
+class TestSweepEngine:
+    """測試策略重現"""
+
+    def setup_method(self):
+        self.engine = SweepEngine(
+            search_service=ProtocolGuideSearchService(),
+            stage_weights={1: (0.5, 0.5), 2: (0.5, 0.5)},
+            rrf_defaults={'rrf_k': 60, 'section_threshold': 0.5},
+        )
+        self.test_case = SimpleNamespace(question='iol 測試', expected_document_ids=[1], min_required_matches=1)
+
+    def test_hybrid_weighted_merges_section_and_document(self):
+        raw = make_pool(
+            [(10, 1, 0.8, 0.8), (11, 2, 0.9, 0.9)],
+            doc_rows=[(1, 0.9, 0.9), (3, 0.8, 0.8)],
+        )
+        pool = CandidatePool(test_case=self.test_case, raw=raw, titles=TITLES)
+
+        results, exact = self.engine.rank(pool, {
+            'strategy': 'hybrid_weighted', 'section_weight': 0.5, 'document_weight': 0.5,
+            'section_threshold': 0.5, 'document_threshold': 0.5,
+        })
+
+        # 文件 1 同時出現在段落與全文：0.8*0.5 + 0.9*0.5
+        assert results[0]['metadata']['id'] == 1
+        assert results[0]['source'] == 'both'
+        assert abs(results[0]['final_score'] - 0.85) < 1e-9
+        assert exact
+
+    def test_hybrid_rrf_fuses_keyword_results(self):
+        raw = make_pool([(10, 1, 0.9, 0.9), (11, 2, 0.8, 0.8)])
+        keyword_rows = [
+            {'id': 1, 'source_id': 1, 'title': 'IOL 測試指南', 'content': '', 'document_id': 'doc-1',
+             'document_title': 'IOL 測試指南', 'rank': 1.0, 'match_count': 2,
+             'matched_keywords': ['iol', '測試'], 'scan_order': 1},
+            {'id': 7, 'source_id': 3, 'title': 'PCIe 驗證', 'content': '', 'document_id': 'doc-3',
+             'document_title': 'PCIe 驗證', 'rank': 0.5, 'match_count': 1,
+             'matched_keywords': ['測試'], 'scan_order': 0},
+        ]
+        pool = CandidatePool(
+            test_case=self.test_case, raw=raw, query_type='section', cleaned_query='iol 測試',
+            cleaned=raw, keyword_rows=keyword_rows, titles=TITLES,
+        )
+
+        results, _ = self.engine.rank(pool, {'strategy': 'hybrid_rrf'})
+
+        # 向量與關鍵字都排第一的項目 RRF 分數最高，正規化為 1.0
+        assert results[0]['metadata']['id'] == 1
+        assert results[0]['score'] == 1.0
+        assert {r['metadata']['id'] for r in results} == {1, 2, 7}
+
+    def test_evaluate_case_scores_like_runner(self):
+        raw = make_pool([(10, 1, 0.9, 0.9), (11, 2, 0.8, 0.8)])
+        pool = CandidatePool(test_case=self.test_case, raw=raw, titles=TITLES)
+
+        result = self.engine.evaluate_case(pool, {'strategy': 'section_only', 'section_threshold': 0.5})
+
+        assert result['returned_document_ids'] == [1, 2]
+        assert result['true_positives'] == 1
+        assert result['is_passed']
+
+
+def test_expand_grid():
+    param_sets = expand_grid(
+        {'strategy': 'hybrid_weighted'},
+        {'section_weight': [0.6, 0.7], 'section_threshold': [0.7, 0.8, 0.9]}
+    )
+
+    assert len(param_sets) == 6
+    assert param_sets['section_weight=0.6,section_threshold=0.8'] == {
+        'strategy': 'hybrid_weighted', 'section_weight': 0.6, 'section_threshold': 0.8
+    }
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+設定版本快取單元測試
+==================
+
+測試 library/config/versioned_config_cache.py 的世代失效與版本解析
+（以假的 Redis 與假的版本資料取代，不需要 Redis 與資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_search/test_versioned_config_cache.py -v
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import pytest
+
+from library.config import versioned_config_cache as config_cache
+from library.config.versioned_config_cache import (
+    DIFY_CONFIG_VERSION, SEARCH_THRESHOLD_SETTING, GenerationGuard, VersionedConfigCache, bump_generation
+)
+
+
+class FakeRedis:
+    """只實作世代計數用到的 INCR / MGET"""
+
+    def __init__(self):
+        self.values = {}
+
+    def incr(self, key):
+        self.values[key] = self.values.get(key, 0) + 1
+        return self.values[key]
+
+    def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+
+def make_version(code, is_baseline=False, retrieval_mode='two_stage_with_title_boost', bonus=15):
+    return SimpleNamespace(
+        id=hash(code) % 1000, version_code=code, version_name=code, is_baseline=is_baseline,
+        model_config={}, rag_settings={
+            'retrieval_mode': retrieval_mode,
+            'stage1': {'title_match_bonus': bonus},
+            'stage2': {'title_match_bonus': 10},
+        }
+    )
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(config_cache, '_client', fake)
+    monkeypatch.setattr(config_cache, '_local_generations', {})
+    return fake
+
+
+@pytest.fixture
+def db(monkeypatch, redis):
+    """假的 DifyConfigVersion 資料表，記錄查詢次數"""
+    state = SimpleNamespace(versions=[make_version('v1', is_baseline=True), make_version('v2')], queries=0)
+
+    def load(self):
+        state.queries += 1
+        versions = {v.version_code: config_cache._parse_version(v) for v in state.versions}
+        baseline = next((v.version_code for v in state.versions if v.is_baseline), None)
+        return versions, baseline
+
+    monkeypatch.setattr(VersionedConfigCache, '_instance', None)
+    monkeypatch.setattr(VersionedConfigCache, '_load', load)
+    monkeypatch.setattr(config_cache, 'GENERATION_CHECK_INTERVAL', 0)
+    return state
+
+
+class TestGenerationGuard:
+    """測試世代比對"""
+
+    def test_stale_until_loaded_and_after_bump(self, redis):
+        guard = GenerationGuard(DIFY_CONFIG_VERSION, check_interval=0)
+        assert guard.is_stale()
+
+        guard.loaded(guard.read())
+        assert not guard.is_stale()
+
+        bump_generation(DIFY_CONFIG_VERSION)
+        assert guard.is_stale()
+
+    def test_other_worker_bump_seen_through_redis(self, redis):
+        guard = GenerationGuard(SEARCH_THRESHOLD_SETTING, check_interval=0)
+        guard.loaded(guard.read())
+
+        redis.incr(config_cache.generation_key(SEARCH_THRESHOLD_SETTING))
+
+        assert guard.is_stale()
+
+    def test_check_interval_skips_redis(self, redis):
+        guard = GenerationGuard(DIFY_CONFIG_VERSION, check_interval=60)
+        guard.loaded(guard.read())
+
+        redis.incr(config_cache.generation_key(DIFY_CONFIG_VERSION))
+
+        assert not guard.is_stale()
+
+    def test_ttl_fallback_without_redis(self, monkeypatch):
+        monkeypatch.setattr(config_cache, '_client', False)
+        guard = GenerationGuard(DIFY_CONFIG_VERSION, check_interval=0, ttl=0)
+        guard.loaded(guard.read())
+
+        assert guard.is_stale()
+
+
+class TestVersionedConfigCache:
+    """測試版本快取的載入與失效"""
+
+    def test_versions_parsed_once(self, db):
+        cache = VersionedConfigCache()
+
+        assert cache.get_baseline().version_code == 'v1'
+        version_config = cache.get_version('v2').as_version_config()
+
+        assert db.queries == 1
+        assert version_config['retrieval_mode'] == 'two_stage_with_title_boost'
+        assert version_config['title_boost'][1]['enabled'] is True
+        assert version_config['title_boost'][1]['title_match_bonus'] == 0.15
+        assert cache.get_version('missing') is None
+
+    def test_baseline_switch_reloads(self, db):
+        cache = VersionedConfigCache()
+        assert cache.get_baseline().version_code == 'v1'
+
+        db.versions = [make_version('v1'), make_version('v2', is_baseline=True)]
+        assert cache.get_baseline().version_code == 'v1'  # 尚未遞增世代
+
+        bump_generation(DIFY_CONFIG_VERSION)
+
+        assert cache.get_baseline().version_code == 'v2'
+        assert db.queries == 2
+
+    def test_threshold_change_reloads(self, db):
+        cache = VersionedConfigCache()
+        cache.get_version('v1')
+
+        bump_generation(SEARCH_THRESHOLD_SETTING)
+        cache.get_version('v1')
+
+        assert db.queries == 2
+
+    def test_load_failure_keeps_previous_versions(self, db, monkeypatch):
+        cache = VersionedConfigCache()
+        cache.get_version('v1')
+
+        def broken(self):
+            raise RuntimeError('db down')
+
+        monkeypatch.setattr(VersionedConfigCache, '_load', broken)
+        bump_generation(DIFY_CONFIG_VERSION)
+
+        assert cache.get_version('v1').version_code == 'v1'
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+兩階段搜尋推測執行單元測試
+========================
+
+測試 library/common/ai_response/speculation.py 的 Stage 2 需求預測與命中統計，
+以及 Protocol TwoTierSearchHandler 推測執行時的取用與中止
+（在本機埠號啟動 Dify stub、段落搜尋以假的分數取代，不需要 Dify 與資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_two_tier/test_speculation.py -v
+"""
+
+import os
+import sys
+import time
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import pytest
+
+from library.common.ai_response.speculation import StagePrediction, StagePredictor, _LocalHashes
+from library.dify_integration.chat_client import DifyChatClient
+from library.dify_integration.stub_server import DifyFixtureStore, DifyStubServer, FaultConfig
+from library.protocol_guide.search_service import ProtocolGuideSearchService
+from library.protocol_guide.two_tier_handler import TwoTierSearchHandler
+
+FIXTURES_PATH = os.path.join(
+    os.path.dirname(__file__), '..', 'test_dify_integration', 'fixtures', 'dify_responses.json'
+)
+
+UNCERTAIN_ANSWER = '抱歉，目前的段落中沒有找到相關資料。'
+FULL_SEARCH_ANSWER = 'I3C 是 MIPI 制定的 I2C 後繼匯流排，支援 In-Band Interrupt。'
+
+
+@pytest.fixture
+def predictor():
+    return StagePredictor('test', min_samples=2, redis_client=_LocalHashes())
+
+
+class TestStagePredictor:
+    """測試 Stage 2 需求預測"""
+
+    def test_document_query(self, predictor):
+        assert predictor.predict('document', 'USB').reason == 'document_query'
+
+    def test_low_section_score(self, predictor):
+        assert predictor.predict('section', 'USB', top_score=0.3).reason == 'low_section_score'
+        assert not predictor.predict('section', 'USB', top_score=0.9).speculate
+
+    def test_history_rate_for_similar_queries(self, predictor):
+        for _ in range(2):
+            predictor.record('section', 'I3C', None, needed_stage_2=True)
+
+        prediction = predictor.predict('section', ' i3c ')
+
+        assert prediction.reason == 'history_uncertain_rate'
+        assert prediction.uncertain_rate == 1.0 and prediction.history_samples == 2
+
+    def test_history_falls_back_to_query_type(self, predictor):
+        predictor.record('section', 'A', None, needed_stage_2=True)
+        predictor.record('section', 'B', None, needed_stage_2=False)
+
+        rate, samples = predictor.uncertain_rate('section', 'C')
+
+        assert (rate, samples) == (0.5, 2)
+
+    def test_report(self, predictor):
+        speculated = StagePrediction(True, 'low_section_score')
+        predictor.record('section', 'A', speculated, needed_stage_2=True, saved_seconds=1.5)
+        predictor.record('section', 'B', speculated, needed_stage_2=False, wasted_seconds=0.5)
+        predictor.record('section', 'C', StagePrediction(False, 'confident'), needed_stage_2=True)
+        predictor.record('section', 'D', speculated, needed_stage_2=True, wasted_seconds=0.25, failed=True)
+
+        report = predictor.report()
+
+        assert (report['speculated'], report['hits'], report['wasted'], report['failed'], report['missed']) == \
+            (3, 1, 1, 1, 1)
+        assert report['hit_rate'] == 1 / 3 and report['recall'] == 1 / 3
+        assert report['avg_saved_seconds'] == 1.5 and report['wasted_seconds'] == 0.75
+        assert report['by_reason'] == {'low_section_score': {'hits': 1, 'wasted': 1, 'failed': 1}}
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    monkeypatch.setenv('TWO_TIER_SPECULATION', 'true')
+    # 段落搜尋最高分偏低 → 一律推測
+    monkeypatch.setattr(ProtocolGuideSearchService, 'section_search',
+                        lambda self, query, top_k=5, threshold=0.5: [{'similarity': 0.2}])
+    fault = FaultConfig(latency_ms=200, stream_chunk_chars=4, stream_chunk_delay_ms=50)
+    with DifyStubServer(DifyFixtureStore.load(FIXTURES_PATH), fault=fault) as server:
+        yield server
+
+
+@pytest.fixture
+def handler(stub, monkeypatch):
+    monkeypatch.setattr(TwoTierSearchHandler, 'stage_predictor', StagePredictor('test', redis_client=_LocalHashes()))
+    handler = TwoTierSearchHandler()
+    handler._dify_client = DifyChatClient(api_url=stub.api_url, api_key=stub.api_key)
+    return handler
+
+
+class TestSpeculativeTwoTier:
+    """測試推測執行的取用與中止"""
+
+    def test_uncertain_stage_1_uses_speculative_stage_2(self, handler, stub):
+        stub.store.record('I3C 是什麼', {'answer': UNCERTAIN_ANSWER})
+        stub.store.record('I3C 是什麼 __FULL_SEARCH__', {'answer': FULL_SEARCH_ANSWER})
+
+        result = handler.handle_two_tier_search('I3C 是什麼', conversation_id='', user_id='t')
+
+        assert result['stage'] == 2 and result['answer'] == FULL_SEARCH_ANSWER
+        # Stage 2 只送出一次（推測的 streaming 請求），回應的是 Stage 2 另開的對話
+        assert stub.stats.requests['chat-messages'] == 2
+        assert stub.messages(result['conversation_id']) == ['I3C 是什麼 __FULL_SEARCH__']
+        report = handler.stage_predictor.report()
+        assert report['hits'] == 1 and report['saved_seconds'] > 0
+
+    def test_confident_stage_1_stops_speculation(self, handler, stub):
+        stub.store.record('IOL 測試步驟 __FULL_SEARCH__', {'answer': 'IOL 完整步驟 ' * 20})
+
+        result = handler.handle_two_tier_search('IOL 測試步驟', conversation_id='', user_id='t')
+
+        assert result['stage'] == 1
+        deadline = time.time() + 5
+        while 'chat-stop' not in stub.stats.requests and time.time() < deadline:
+            time.sleep(0.05)
+        assert stub.stats.requests.get('chat-stop') == 1
+        assert handler.stage_predictor.report()['wasted'] == 1
+
+    def test_cancelled_speculation_leaves_no_message_in_user_conversation(self, handler, stub):
+        stub.store.record('IOL 測試步驟 __FULL_SEARCH__', {'answer': 'IOL 完整步驟 ' * 20})
+
+        result = handler.handle_two_tier_search('IOL 測試步驟', conversation_id='', user_id='t')
+
+        deadline = time.time() + 5
+        while 'chat-stop' not in stub.stats.requests and time.time() < deadline:
+            time.sleep(0.05)
+        assert stub.stats.requests.get('chat-stop') == 1
+        assert stub.messages(result['conversation_id']) == ['IOL 測試步驟']
+
+    def test_existing_conversation_runs_stage_2_in_order(self, handler, stub):
+        stub.store.record('I3C 是什麼', {'answer': UNCERTAIN_ANSWER})
+        stub.store.record('I3C 是什麼 __FULL_SEARCH__', {'answer': FULL_SEARCH_ANSWER})
+
+        result = handler.handle_two_tier_search('I3C 是什麼', conversation_id='conv-1', user_id='t')
+
+        assert result['stage'] == 2 and result['conversation_id'] == 'conv-1'
+        # 不推測：Stage 2 在同一對話、看得到 Stage 1 那一輪
+        assert stub.messages('conv-1') == ['I3C 是什麼', 'I3C 是什麼 __FULL_SEARCH__']
+        assert handler.stage_predictor.report()['speculated'] == 0
+
+    def test_failed_speculation_not_counted_as_hit(self, handler, stub, monkeypatch):
+        stub.store.record('I3C 是什麼', {'answer': UNCERTAIN_ANSWER})
+        stub.store.record('I3C 是什麼 __FULL_SEARCH__', {'answer': FULL_SEARCH_ANSWER})
+
+        def broken_stream(self, *args, **kwargs):
+            raise ConnectionError('stream dropped')
+
+        monkeypatch.setattr(DifyChatClient, 'stream_chat_events', broken_stream)
+
+        result = handler.handle_two_tier_search('I3C 是什麼', conversation_id='', user_id='t')
+
+        # 推測失敗後依序送出 Stage 2
+        assert result['stage'] == 2 and result['answer'] == FULL_SEARCH_ANSWER
+        report = handler.stage_predictor.report()
+        assert (report['speculated'], report['hits'], report['failed']) == (1, 0, 1)
+        assert report['saved_seconds'] == 0
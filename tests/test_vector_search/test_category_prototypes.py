@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+問題分類原型單元測試
+====================
+
+測試 library/rvt_analytics/category_prototypes.py 的原型建立與批量分類
+（不需要資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_vector_search/test_category_prototypes.py -v
+"""
+
+import os
+import sys
+
+import numpy as np
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+from library.rvt_analytics.category_prototypes import (
+    CategoryPrototypeIndex, CategoryPrototypes, build_prototypes
+)
+
+
+def _axis(dim, idx, noise=0.0, rng=None):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[idx] = 1.0
+    if noise and rng is not None:
+        vector += rng.normal(0, noise, dim).astype(np.float32)
+    return vector
+
+
+class TestBuildPrototypes:
+    """測試原型建立"""
+
+    def test_weighted_means_are_normalized(self):
+        labels = ['jenkins', 'jenkins', 'network']
+        vectors = np.stack([_axis(4, 0), _axis(4, 1), _axis(4, 2)])
+        prototypes = build_prototypes(labels, vectors, weights=[3, 1, 2])
+
+        assert prototypes.categories == ['jenkins', 'network']
+        assert prototypes.sample_counts == [4, 2]
+        np.testing.assert_allclose(np.linalg.norm(prototypes.matrix, axis=1), 1.0, rtol=1e-5)
+        # 權重 3:1 → 原型偏向第一軸
+        assert prototypes.matrix[0, 0] > prototypes.matrix[0, 1]
+
+    def test_empty_input(self):
+        assert len(build_prototypes([], np.empty((0, 4)))) == 0
+
+
+class TestClassifyMatrix:
+    """測試批量分類"""
+
+    def test_nearest_prototype_with_margin(self):
+        rng = np.random.default_rng(1)
+        labels = ['hardware'] * 5 + ['jenkins'] * 5 + ['network'] * 5
+        vectors = np.stack([_axis(16, i // 5, 0.05, rng) for i in range(15)])
+        prototypes = build_prototypes(labels, vectors)
+
+        queries = np.stack([_axis(16, 1, 0.05, rng), _axis(16, 2, 0.05, rng)])
+        results = prototypes.classify_matrix(queries)
+
+        assert [r['category'] for r in results] == ['jenkins', 'network']
+        for result in results:
+            assert result['similarity'] > 0.9
+            assert result['margin'] > 0.5
+            assert result['runner_up'] != result['category']
+
+    def test_single_category(self):
+        prototypes = build_prototypes(['mdt'], np.stack([_axis(4, 0)]))
+        result = prototypes.classify_matrix(np.stack([_axis(4, 0)]))[0]
+
+        assert result['category'] == 'mdt'
+        assert result['runner_up'] is None
+
+    def test_low_similarity_is_rejected(self):
+        index = CategoryPrototypeIndex()
+        index._prototypes = build_prototypes(['mdt', 'network'], np.stack([_axis(4, 0), _axis(4, 1)]))
+        index._loaded_at = float('inf')
+        try:
+            results = index.classify_vectors(np.stack([_axis(4, 0), _axis(4, 3)]))
+            assert results[0]['category'] == 'mdt'
+            assert results[0]['method'] == 'vector_prototype'
+            assert results[1] is None
+        finally:
+            index._prototypes = CategoryPrototypes()
+            index._loaded_at = 0.0
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+聊天消息向量化管線單元測試
+==========================
+
+測試 library/rvt_analytics/chat_vector_pipeline.py 的內容雜湊去重、零向量跳過與檢查點續跑，
+以及 generate_embeddings_batch 的輸出對齊（以假的資料庫游標與模型取代，不需要資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_vector_search/test_chat_vector_pipeline.py -v
+"""
+
+import hashlib
+import os
+import sys
+
+import numpy as np
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+import pytest
+
+from library.rvt_analytics import chat_vector_pipeline
+from library.rvt_analytics.chat_vector_pipeline import ChatVectorPipeline
+
+
+def content_hash(content):
+    return hashlib.md5(content.encode('utf-8')).hexdigest()
+
+
+class FakeEmbeddingService:
+    """以文本長度產生向量；'失敗' 開頭的文本回傳零向量"""
+
+    def generate_embeddings_batch(self, texts, batch_size=32):
+        return [[0.0, 0.0] if text.startswith('失敗') else [float(len(text)), 1.0] for text in texts]
+
+
+class FakeVectorService:
+    embedding_service = FakeEmbeddingService()
+
+    def generate_content_hash(self, content):
+        return content_hash(content)
+
+    def extract_keywords(self, content):
+        return []
+
+    def detect_language(self, content):
+        return 'zh'
+
+
+class FakeCursor:
+    """只回應 content_hash 查詢，回傳已存在於向量表的雜湊"""
+
+    def __init__(self, existing):
+        self.existing = existing
+        self.cursor = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        self.rows = [(h,) for h in params[0] if h in self.existing]
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, existing=()):
+        self.existing = set(existing)
+
+    def cursor(self):
+        return FakeCursor(self.existing)
+
+
+class FakeCache:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.values[key] = value
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+def message(message_id, content, role='user'):
+    return {'id': message_id, 'conversation_id': 1, 'content': content, 'role': role}
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    monkeypatch.setattr(chat_vector_pipeline, 'connection', FakeConnection({content_hash('已向量化的問題')}))
+    monkeypatch.setattr(chat_vector_pipeline, 'cache', FakeCache())
+    return ChatVectorPipeline(chunk_size=2, vector_service=FakeVectorService())
+
+
+@pytest.fixture
+def inserted_rows(monkeypatch):
+    """假的 execute_values：記錄寫入列並回傳 (embedding_id, chat_message_id, role)"""
+    rows = []
+
+    def execute_values(cursor, sql, values, **kwargs):
+        rows.extend(values)
+        return [(100 + i, row[0], row[5]) for i, row in enumerate(values)]
+
+    monkeypatch.setattr(chat_vector_pipeline, 'execute_values', execute_values)
+    monkeypatch.setattr(ChatVectorPipeline, '_assign_clusters', lambda self, *args: None)
+    return rows
+
+
+class TestFilterKnownContent:
+    """測試內容雜湊去重"""
+
+    def test_skips_existing_duplicate_and_blank(self, pipeline):
+        messages = [
+            message(1, 'IOL 測試步驟'),
+            message(2, '已向量化的問題'),
+            message(3, 'IOL 測試步驟'),
+            message(4, '   '),
+            message(5, 'I3C 是什麼'),
+        ]
+
+        result = pipeline.filter_known_content(messages)
+
+        assert [msg['id'] for msg in result['pending']] == [1, 5]
+        assert result['skipped'] == 3
+        assert result['pending'][0]['content_hash'] == content_hash('IOL 測試步驟')
+
+
+class TestProcessMessages:
+    """測試去重 → 向量化 → 批量寫入"""
+
+    def test_zero_vectors_not_written(self, pipeline, inserted_rows):
+        result = pipeline.process_messages([
+            message(1, 'IOL 測試步驟'),
+            message(2, '失敗的問題'),
+            message(3, '已向量化的問題'),
+        ])
+
+        assert [row[0] for row in inserted_rows] == [1]
+        assert inserted_rows[0][3] == [float(len('IOL 測試步驟')), 1.0]
+        assert result == {'processed': 3, 'inserted': 1, 'skipped': 1, 'failed': 1}
+
+
+class TestCheckpoint:
+    """測試 keyset 分頁與檢查點續跑"""
+
+    def test_resume_from_checkpoint(self, pipeline, inserted_rows, monkeypatch):
+        table = [message(i, f'問題 {i}') for i in range(1, 6)]
+        reads = []
+
+        def fetch(self, after_id):
+            reads.append(after_id)
+            return [msg for msg in table if msg['id'] > after_id][:self.chunk_size]
+
+        monkeypatch.setattr(ChatVectorPipeline, 'fetch_pending_chunk', fetch)
+        pipeline.save_checkpoint(2)
+
+        result = pipeline.run()
+
+        assert reads == [2, 4, 5]
+        assert result['resumed_from'] == 2
+        assert result['total_processed'] == 3 and result['chunks'] == 2
+        assert pipeline.get_checkpoint() == 5 == result['checkpoint']
+
+    def test_max_messages(self, pipeline, inserted_rows, monkeypatch):
+        table = [message(i, f'問題 {i}') for i in range(1, 6)]
+        monkeypatch.setattr(ChatVectorPipeline, 'fetch_pending_chunk',
+                            lambda self, after_id: [m for m in table if m['id'] > after_id][:self.chunk_size])
+
+        result = pipeline.run(max_messages=3, resume=False)
+
+        assert result['total_processed'] == 3
+        assert pipeline.get_checkpoint() == 3
+
+
+class TestEmbeddingAlignment:
+    """測試 generate_embeddings_batch 的輸出與輸入位置一致"""
+
+    def test_blank_texts_keep_positions(self):
+        module = pytest.importorskip('api.services.embedding_service')
+
+        class FakeModel:
+            def encode(self, texts, batch_size=32):
+                return np.array([[float(len(text)), 1.0] for text in texts])
+
+        service = module.OpenSourceEmbeddingService('lightweight')
+        service._model = FakeModel()
+        zero = [0.0] * service.embedding_dimension
+
+        embeddings = service.generate_embeddings_batch(['', 'ab', '   ', ' abcd ', None])
+
+        assert embeddings == [zero, [2.0, 1.0], zero, [4.0, 1.0], zero]
+
+    def test_all_blank(self):
+        module = pytest.importorskip('api.services.embedding_service')
+        service = module.OpenSourceEmbeddingService('lightweight')
+
+        assert service.generate_embeddings_batch(['', ' ']) == [[0.0] * 384] * 2
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+增量聚類單元測試
+================
+
+測試 library/rvt_analytics/incremental_clustering.py 的滑動平均、距離統計、
+分裂 / 合併判斷與離群群組緊密度（不需要資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_vector_search/test_incremental_clustering.py -v
+"""
+
+import os
+import sys
+
+import numpy as np
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+from library.rvt_analytics.incremental_clustering import (
+    IncrementalClusteringService, is_cohesive, member_stats, needs_split, plan_merges, running_mean
+)
+
+RATIO = IncrementalClusteringService.SPLIT_VARIANCE_RATIO
+MIN_VARIANCE = IncrementalClusteringService.SPLIT_MIN_VARIANCE
+MERGE_SIMILARITY = IncrementalClusteringService.MERGE_MIN_SIMILARITY
+
+
+def _axis(dim, idx):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[idx] = 1.0
+    return vector
+
+
+class TestRunningMean:
+    """測試質心滑動平均"""
+
+    def test_matches_full_mean(self):
+        rng = np.random.default_rng(3)
+        vectors = rng.normal(size=(6, 8)).astype(np.float32)
+
+        centroid = vectors[0]
+        for count, vector in enumerate(vectors[1:], start=1):
+            centroid = running_mean(centroid, count, vector)
+
+        np.testing.assert_allclose(centroid, vectors.mean(axis=0), rtol=1e-5, atol=1e-6)
+
+    def test_first_member(self):
+        vector = _axis(4, 1)
+        np.testing.assert_array_equal(running_mean(np.zeros(4), 0, vector), vector)
+
+
+class TestMemberStats:
+    """測試成員距離統計"""
+
+    def test_distances(self):
+        vectors = np.stack([_axis(3, 0), _axis(3, 1)])
+        stats = member_stats(vectors, _axis(3, 0))
+
+        assert stats['member_count'] == 2
+        assert stats['distance_sum'] == 1.0
+        assert stats['distance_sq_sum'] == 1.0
+
+    def test_opposite_vectors_clipped(self):
+        stats = member_stats(np.stack([-_axis(3, 0)]), _axis(3, 0))
+        assert stats['distance_sum'] == 1.0
+
+
+class TestNeedsSplit:
+    """測試分裂判斷"""
+
+    def test_drift_over_baseline_ratio(self):
+        assert needs_split(0.05, 0.02, RATIO, MIN_VARIANCE)
+        assert not needs_split(0.029, 0.02, RATIO, MIN_VARIANCE)
+
+    def test_below_min_variance(self):
+        # 基準極小時，未達絕對門檻不分裂
+        assert not needs_split(0.008, 0.001, RATIO, MIN_VARIANCE)
+        assert needs_split(0.011, 0.001, RATIO, MIN_VARIANCE)
+
+    def test_without_baseline(self):
+        assert not needs_split(0.5, None, RATIO, MIN_VARIANCE)
+        assert not needs_split(0.5, 0.0, RATIO, MIN_VARIANCE)
+
+
+class TestPlanMerges:
+    """測試合併配對"""
+
+    def test_larger_cluster_kept(self):
+        near = _axis(4, 0) + 0.01 * _axis(4, 1)
+        centroids = np.stack([_axis(4, 0), near, _axis(4, 2)])
+
+        assert plan_merges(centroids, [3, 10, 5], MERGE_SIMILARITY) == [(1, 0)]
+
+    def test_dropped_cluster_not_merged_again(self):
+        # 三個幾乎相同的質心：0 併入 1 後，0 不再參與配對；1 與 2 仍可合併
+        centroids = np.stack([_axis(4, 0), _axis(4, 0) * 1.01, _axis(4, 0) * 0.99])
+
+        merges = plan_merges(centroids, [5, 8, 2], MERGE_SIMILARITY)
+
+        assert merges == [(1, 0), (1, 2)]
+        dropped = [drop for _, drop in merges]
+        assert len(dropped) == len(set(dropped))
+        assert not set(dropped) & {keep for keep, _ in merges}
+
+    def test_distinct_clusters(self):
+        centroids = np.stack([_axis(4, i) for i in range(3)])
+        assert plan_merges(centroids, [1, 1, 1], MERGE_SIMILARITY) == []
+
+    def test_single_cluster(self):
+        assert plan_merges(np.stack([_axis(4, 0)]), [1], MERGE_SIMILARITY) == []
+
+
+class TestCohesion:
+    """測試離群群組的緊密度篩選"""
+
+    def test_tight_group(self):
+        rng = np.random.default_rng(5)
+        vectors = _axis(16, 0) + 0.05 * rng.normal(size=(5, 16))
+
+        assert is_cohesive(vectors, IncrementalClusteringService.ASSIGN_MIN_SIMILARITY)
+
+    def test_loose_group(self):
+        vectors = np.stack([_axis(16, i) for i in range(4)])
+
+        assert not is_cohesive(vectors, IncrementalClusteringService.ASSIGN_MIN_SIMILARITY)
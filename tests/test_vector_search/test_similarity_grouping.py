@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+相似度分組引擎單元測試
+======================
+
+測試 library/rvt_analytics/similarity_grouping.py 的 Union-Find 與矩陣分組邏輯
+（不需要資料庫）。
+
+執行方式：
+    docker exec ai-django pytest tests/test_vector_search/test_similarity_grouping.py -v
+"""
+
+import os
+import sys
+
+import numpy as np
+
+# 設定 Django 環境
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'backend'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_platform.settings')
+
+import django
+django.setup()
+
+from library.rvt_analytics.similarity_grouping import UnionFind, group_by_similarity
+
+
+class TestUnionFind:
+    """測試 Union-Find"""
+
+    def test_union_merges_components(self):
+        uf = UnionFind(5)
+        uf.union(0, 1)
+        uf.union(3, 4)
+        uf.union(1, 4)
+
+        assert uf.find(0) == uf.find(3)
+        assert uf.find(2) != uf.find(0)
+        assert sorted(len(group) for group in uf.groups()) == [1, 4]
+
+
+class TestGroupBySimilarity:
+    """測試矩陣相似度分組"""
+
+    def _make_clusters(self, n_per_cluster=10, dim=32, noise=0.02):
+        rng = np.random.default_rng(7)
+        bases = np.eye(3, dim)
+        return np.vstack([
+            base + noise * rng.normal(size=(n_per_cluster, dim)) for base in bases
+        ]).astype(np.float32)
+
+    def test_groups_match_clusters(self):
+        vectors = self._make_clusters()
+        groups = group_by_similarity(vectors, threshold=0.9)
+
+        assert len(groups) == 3
+        assert sorted(sorted(group) for group in groups) == [
+            list(range(0, 10)), list(range(10, 20)), list(range(20, 30))
+        ]
+
+    def test_block_size_does_not_change_result(self):
+        vectors = self._make_clusters()
+        full = group_by_similarity(vectors, threshold=0.9, block_size=1024)
+        blocked = group_by_similarity(vectors, threshold=0.9, block_size=4)
+
+        assert sorted(map(sorted, full)) == sorted(map(sorted, blocked))
+
+    def test_transitive_chain_is_grouped(self):
+        # a~b、b~c 但 a 與 c 不相似，仍應在同一群組（連通分量）
+        angle = np.deg2rad(20)
+        vectors = np.array([
+            [1.0, 0.0],
+            [np.cos(angle), np.sin(angle)],
+            [np.cos(2 * angle), np.sin(2 * angle)],
+        ])
+        groups = group_by_similarity(vectors, threshold=0.9)
+
+        assert groups == [[0, 1, 2]]
+
+    def test_empty_input(self):
+        assert group_by_similarity(np.empty((0, 8)), threshold=0.8) == []